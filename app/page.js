@@ -111,6 +111,26 @@ export default function RealEstateCRM() {
     }
   }, [leads, searchTerm, filterType, activeTab])
 
+  // AI insights are generated in the background after a lead is created; swap in the
+  // updated lead when the server says it's done
+  useEffect(() => {
+    let es
+    try {
+      es = new EventSource('/api/assistant/stream')
+      es.addEventListener('leads:changed', async (e) => {
+        try {
+          const p = JSON.parse(e.data || '{}')
+          if (!p.id) return
+          const response = await fetch(`/api/leads/${p.id}`)
+          if (!response.ok) return
+          const updated = await response.json()
+          setLeads(prev => prev.map(l => (l.id === updated.id ? updated : l)))
+        } catch {}
+      })
+    } catch {}
+    return () => { try { es && es.close() } catch {} }
+  }, [])
+
   const fetchLeads = async () => {
     try {
       const response = await fetch('/api/leads')
@@ -568,6 +588,11 @@ export default function RealEstateCRM() {
                         </div>
                       </div>
                       
+                      {!lead.ai_insights && lead.ai_insights_status === 'pending' && (
+                        <div className="mt-4 p-3 bg-muted rounded-lg">
+                          <p className="text-sm text-muted-foreground">Generating AI insights…</p>
+                        </div>
+                      )}
                       {lead.ai_insights && (
                         <div className="mt-4 p-3 bg-muted rounded-lg">
                           <p className="text-sm font-medium text-muted-foreground mb-1">AI Insights:</p>
@@ -10,6 +10,7 @@ import { Checkbox } from '@/components/ui/checkbox'
 import { Separator } from '@/components/ui/separator'
 import { DropdownMenu, DropdownMenuTrigger, DropdownMenuContent, DropdownMenuItem } from '@/components/ui/dropdown-menu'
 import { toast as showToast } from '@/hooks/use-toast'
+import { useInvalidation } from '@/hooks/use-invalidation'
 import { PlanDayGrid } from '@/components/PlanDayGrid'
 
 const API_BASE = process.env.NEXT_PUBLIC_API_BASE_URL || ''
@@ -37,31 +38,13 @@ export default function PlanPage() {
   const [mounted, setMounted] = useState(false)
   const [dateKey, setDateKey] = useState(() => new Date().toISOString().slice(0,10))
   const [viewMode, setViewMode] = useState('list') // 'list' | 'grid'
+  const [nextOffset, setNextOffset] = useState(null) // next page of ranked tasks, null when done
+  const [loadingMore, setLoadingMore] = useState(false)
 
   useEffect(() => { setMounted(true) }, [])
 
-  // Live updates via SSE so changes in Transactions page reflect here
-  const sseTimerRef = useRef(null)
-  useEffect(() => {
-    let es
-    try {
-      es = new EventSource(apiUrl('/api/assistant/stream'))
-      const scheduleReload = () => {
-        if (sseTimerRef.current) clearTimeout(sseTimerRef.current)
-        sseTimerRef.current = setTimeout(() => { loadData() }, 300)
-      }
-      es.addEventListener('ready', scheduleReload)
-      es.addEventListener('tasks:changed', scheduleReload)
-      es.addEventListener('suggestions:update', scheduleReload)
-      es.onerror = () => {
-        try { es.close() } catch {}
-      }
-    } catch (_) { /* ignore SSE failures */ }
-    return () => {
-      if (sseTimerRef.current) clearTimeout(sseTimerRef.current)
-      try { es && es.close() } catch {}
-    }
-  }, [dateKey])
+  // Live updates so changes in Transactions page reflect here
+  useInvalidation(['tasks', 'plans'], () => loadData())
 
   const loadData = async () => {
     setLoading(true); setError(null)
@@ -72,15 +55,24 @@ export default function PlanPage() {
       ])
       const tasksJson = await tasksRes.json().catch(() => ({}))
       if (!tasksRes.ok || tasksJson?.success === false) throw new Error(tasksJson?.error || 'Failed tasks')
-      setTasks(Array.isArray(tasksJson.tasks) ? tasksJson.tasks : [])
+      let feed = Array.isArray(tasksJson.tasks) ? tasksJson.tasks : []
+      setNextOffset(tasksJson.next_offset ?? null)
 
       const planJson = await planRes.json().catch(() => ({}))
       if (planRes.ok && planJson?.plan?.items) {
         const ids = planJson.plan.items.map((it) => (typeof it === 'string' ? it : it.id)).filter(Boolean)
+        // The feed is paged by rank; fetch saved selections that aren't on the first page
+        const missing = ids.filter((id) => !feed.some((t) => t.id === id))
+        if (missing.length > 0) {
+          const extraRes = await fetch(apiUrl(`/api/pmd/tasks?date=${dateKey}&ids=${missing.map(encodeURIComponent).join(',')}`))
+          const extraJson = await extraRes.json().catch(() => ({}))
+          if (extraRes.ok && Array.isArray(extraJson.tasks)) feed = [...feed, ...extraJson.tasks]
+        }
         setSelectedIds(ids)
       } else {
         setSelectedIds([])
       }
+      setTasks(feed)
     } catch (e) {
       setError(e.message || 'Failed to load')
     }
@@ -89,6 +81,22 @@ export default function PlanPage() {
 
   useEffect(() => { loadData() }, [dateKey])
 
+  const loadMore = async () => {
+    if (nextOffset === null) return
+    setLoadingMore(true)
+    try {
+      const res = await fetch(apiUrl(`/api/pmd/tasks?date=${dateKey}&offset=${nextOffset}`))
+      const json = await res.json().catch(() => ({}))
+      if (!res.ok || json?.success === false) throw new Error(json?.error || 'Failed tasks')
+      const page = Array.isArray(json.tasks) ? json.tasks : []
+      setTasks((prev) => [...prev, ...page.filter((t) => !prev.some((p) => p.id === t.id))])
+      setNextOffset(json.next_offset ?? null)
+    } catch (e) {
+      setError(e.message || 'Failed to load')
+    }
+    setLoadingMore(false)
+  }
+
   const suggested = useMemo(() => tasks.filter(t => !selectedIds.includes(t.id)), [tasks, selectedIds])
   const selected = useMemo(() => selectedIds.map(id => tasks.find(t => t.id === id)).filter(Boolean), [tasks, selectedIds])
   const selectedGridItems = useMemo(() => selected.map((t) => ({
@@ -267,9 +275,14 @@ export default function PlanPage() {
                     </div>
                   </Card>
                 ))}
-                {suggested.length === 0 && (
+                {suggested.length === 0 && nextOffset === null && (
                   <div className="text-xs text-muted-foreground px-2">Nothing to suggest. You’re all set!</div>
                 )}
+                {nextOffset !== null && (
+                  <Button size="sm" variant="outline" className="w-full" onClick={loadMore} disabled={loadingMore}>
+                    {loadingMore ? 'Loading…' : 'Load more'}
+                  </Button>
+                )}
               </div>
             </ScrollArea>
           </div>
@@ -44,6 +44,7 @@ import { MarkdownText } from '@/components/ui/markdown'
 import { PlanDayGrid } from '@/components/PlanDayGrid'
 import { ToggleGroup, ToggleGroupItem } from '@/components/ui/toggle-group'
 import { useReminders, requestNotificationPermission } from '@/hooks/use-reminders'
+import { useInvalidation, useServerEvent } from '@/hooks/use-invalidation'
 import { toast as showToast } from '@/hooks/use-toast'
 // Helper to target API whether UI and API are on same host or different ports/domains
 // Set NEXT_PUBLIC_API_BASE_URL in .env.local if your API is not on the same origin as the UI
@@ -194,8 +195,6 @@ export function AssistantPanel() {
   const undoTimerRef = useRef(null)
   // Nudges state
   const [nudges, setNudges] = useState([])
-  const esRef = useRef(null)
-  const sseRefreshTimerRef = useRef(null)
 
   // Manually trigger a persisted Nudge notification for a stalled deal
   const triggerNudge = async (deal) => {
@@ -238,74 +237,23 @@ export function AssistantPanel() {
     }
     setLoading(false)
   }
-  const scheduleSuggestionsRefresh = () => {
-    if (sseRefreshTimerRef.current) clearTimeout(sseRefreshTimerRef.current)
-    sseRefreshTimerRef.current = setTimeout(() => {
-      if (typeof document === 'undefined' || document.visibilityState === 'visible') {
-        fetchSuggestions()
-      }
-    }, 400)
-  }
 
-  useEffect(() => { fetchSuggestions() }, [])
-
-  // Light polling (every 30s) while page is visible
-  useEffect(() => {
-    const tick = () => {
-      if (typeof document !== 'undefined' && document.visibilityState !== 'visible') return
-      if (!loading) fetchSuggestions()
-    }
-    const id = setInterval(tick, 30000)
-    return () => clearInterval(id)
-  }, [agent, loading])
-
-  // Refresh when tab becomes visible
-  useEffect(() => {
-    const onVis = () => {
-      if (document.visibilityState === 'visible') fetchSuggestions()
-    }
-    document.addEventListener('visibilitychange', onVis)
-    return () => document.removeEventListener('visibilitychange', onVis)
-  }, [agent])
+  // Refetch on agent change, and when the server reports a change that affects suggestions
+  useEffect(() => { fetchSuggestions() }, [agent])
+  useInvalidation(['suggestions'], fetchSuggestions, { delay: 400 })
 
   // Request browser notification permission (non-intrusive; prompts only if default)
   useEffect(() => {
     requestNotificationPermission()
   }, [])
 
-  // Real-time updates via SSE
-  useEffect(() => {
-    const url = apiUrl('/api/assistant/stream')
-    let es
-    try {
-      es = new EventSource(url)
-      esRef.current = es
-      es.addEventListener('ready', () => scheduleSuggestionsRefresh())
-      es.addEventListener('suggestions:update', () => scheduleSuggestionsRefresh())
-      es.addEventListener('tasks:changed', () => scheduleSuggestionsRefresh())
-      es.addEventListener('alerts:changed', () => scheduleSuggestionsRefresh())
-      // Proactive nudges
-      es.addEventListener('nudge', (ev) => {
-        try {
-          const data = JSON.parse(ev.data || '{}')
-          if (data && data.message) {
-            try { showToast({ title: 'Nudge', description: data.message }) } catch {}
-            setNudges((prev) => [data, ...prev.slice(0, 4)]) // keep last 5
-          }
-        } catch (_) { /* ignore */ }
-      })
-      es.onerror = () => {
-        try { es.close() } catch {}
-        esRef.current = null
-        scheduleSuggestionsRefresh()
-      }
-    } catch (_) { /* ignore */ }
-    return () => {
-      if (sseRefreshTimerRef.current) clearTimeout(sseRefreshTimerRef.current)
-      try { esRef.current && esRef.current.close() } catch {}
-      esRef.current = null
+  // Proactive nudges
+  useServerEvent('nudge', (data) => {
+    if (data && data.message) {
+      try { showToast({ title: 'Nudge', description: data.message }) } catch {}
+      setNudges((prev) => [data, ...prev.slice(0, 4)]) // keep last 5
     }
-  }, [agent])
+  })
 
   const summary = data?.summary || {}
 
@@ -7,6 +7,7 @@ import { Button } from "@/components/ui/button";
 import { Badge } from "@/components/ui/badge";
 import { Bell, RefreshCcw, Check, Clock, Trash2 } from "lucide-react";
 import { useToast } from "@/hooks/use-toast";
+import { useInvalidation, useServerEvent } from "@/hooks/use-invalidation";
 import { DropdownMenu, DropdownMenuContent, DropdownMenuItem, DropdownMenuTrigger } from "@/components/ui/dropdown-menu";
 
 const API_BASE = process.env.NEXT_PUBLIC_API_BASE_URL || ''
@@ -30,33 +31,23 @@ export function NotificationBell() {
     } catch {}
   }
 
-  useEffect(() => {
-    loadCount()
-    const t = setInterval(loadCount, 30000)
-    return () => clearInterval(t)
-  }, [])
+  useEffect(() => { loadCount() }, [])
+  useInvalidation(['notifications'], loadCount)
 
   // Listen globally for reminders so user gets a toast even if drawer is closed
-  useEffect(() => {
-    let es
-    try {
-      es = new EventSource(apiUrl('/api/assistant/stream'))
-      es.addEventListener('notifications:remind', (e) => {
-        try {
-          const p = JSON.parse(e.data || '{}')
-          toast({ title: p.title || 'Reminder', description: p.message || '' })
-          // Try browser notification too
-          if (typeof window !== 'undefined' && 'Notification' in window) {
-            if (Notification.permission === 'granted') {
-              new Notification(p.title || 'Reminder', { body: p.message || '', icon: '/snaphomz-logo.svg' })
-            }
-          }
-        } catch {}
-        setTimeout(loadCount, 250)
-      })
-    } catch {}
-    return () => { try { es && es.close() } catch {} }
-  }, [])
+  useServerEvent('notifications:remind', (p) => {
+    toast({ title: p.title || 'Reminder', description: p.message || '' })
+    // Try browser notification too
+    if (typeof window !== 'undefined' && 'Notification' in window) {
+      if (Notification.permission === 'granted') {
+        new Notification(p.title || 'Reminder', { body: p.message || '', icon: '/snaphomz-logo.svg' })
+      } else if (Notification.permission === 'default') {
+        Notification.requestPermission().then((perm) => {
+          if (perm === 'granted') new Notification(p.title || 'Reminder', { body: p.message || '', icon: '/snaphomz-logo.svg' })
+        })
+      }
+    }
+  })
 
   // When sheet closes, refresh counters (in case actions happened)
   const onOpenChange = (v) => { setOpen(v); if (!v) setTimeout(loadCount, 500) }
@@ -118,35 +109,7 @@ export default function NotificationCenter({ onAnyAction }) {
   }
 
   useEffect(() => { loadAll() }, [])
-  useEffect(() => {
-    let es
-    try {
-      es = new EventSource(apiUrl('/api/assistant/stream'))
-      const onBump = () => { loadAll(); onAnyAction && onAnyAction() }
-      es.addEventListener('notifications:changed', onBump)
-      es.addEventListener('alerts:changed', onBump)
-      es.addEventListener('nudge', onBump)
-      es.addEventListener('notifications:remind', (e) => {
-        try {
-          const p = JSON.parse(e.data || '{}')
-          // In-app toast
-          toast({ title: p.title || 'Reminder', description: p.message || '' })
-          // Browser notification (if permitted)
-          if (typeof window !== 'undefined' && 'Notification' in window) {
-            if (Notification.permission === 'granted') {
-              new Notification(p.title || 'Reminder', { body: p.message || '', icon: '/snaphomz-logo.svg' })
-            } else if (Notification.permission === 'default') {
-              Notification.requestPermission().then((perm) => {
-                if (perm === 'granted') new Notification(p.title || 'Reminder', { body: p.message || '', icon: '/snaphomz-logo.svg' })
-              })
-            }
-          }
-        } catch {}
-        loadAll(); onAnyAction && onAnyAction()
-      })
-    } catch {}
-    return () => { try { es && es.close() } catch {} }
-  }, [])
+  useInvalidation(['notifications', 'alerts'], () => { loadAll(); onAnyAction && onAnyAction() })
 
   const markRead = async (id) => {
     try { await fetchJSON(apiUrl(`/api/notifications/${id}/read`), { method: 'POST' }); await loadAll(); onAnyAction && onAnyAction() } catch {}
@@ -36,6 +36,7 @@ import {
   Mic,
   Square
 } from 'lucide-react'
+import { useInvalidation } from '@/hooks/use-invalidation'
 
 // Stage configurations for seller (sale) and buyer (purchase) transactions
 const STAGE_CONFIGS = {
@@ -168,27 +169,10 @@ export function TransactionTimeline({ transactionId }) {
     }
   }, [editingItem])
 
-  // Live sync: refresh checklist when tasks are changed elsewhere (PMD or other tabs)
-  useEffect(() => {
-    if (!transactionId) return
-    let es
-    let t = null
-    const schedule = () => {
-      if (t) clearTimeout(t)
-      t = setTimeout(() => { fetchChecklist() }, 250)
-    }
-    try {
-      es = new EventSource('/api/assistant/stream')
-      es.addEventListener('ready', schedule)
-      es.addEventListener('tasks:changed', schedule)
-      es.addEventListener('suggestions:update', schedule)
-      es.onerror = () => { try { es.close() } catch {} }
-    } catch (_) { /* ignore SSE errors */ }
-    return () => {
-      if (t) clearTimeout(t)
-      try { es && es.close() } catch {}
-    }
-  }, [transactionId])
+  // Live sync: refresh when this deal's checklist or stage changes elsewhere (PMD, other tabs,
+  // background transcription)
+  useInvalidation(['tasks'], () => fetchChecklist(), { transactionId, delay: 250 })
+  useInvalidation(['transactions'], () => fetchTransaction(), { transactionId, delay: 250 })
 
   const fetchTransaction = async () => {
     try {
@@ -612,7 +596,11 @@ export function TransactionTimeline({ transactionId }) {
                       {item.voice_memos.map((m) => (
                         <div key={m.id} className="flex items-start justify-between bg-muted/40 p-2 rounded">
                           <div className="flex-1 pr-2">
-                            <div className="text-foreground break-words"><strong>Transcript:</strong> {m.text || '(empty)'}
+                            <div className="text-foreground break-words"><strong>Transcript:</strong> {m.transcription === 'pending'
+                              ? <span className="text-muted-foreground italic">Transcribing…</span>
+                              : m.transcription === 'failed'
+                                ? <span className="text-destructive">Transcription failed</span>
+                                : (m.text || '(empty)')}
                             </div>
                             <div className="text-muted-foreground text-xs mt-1 flex items-center gap-2">
                               {m.note && <span>Note: {m.note}</span>}
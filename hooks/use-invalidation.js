@@ -0,0 +1,138 @@
+"use client";
+
+import { useEffect, useRef } from "react";
+
+const API_BASE = process.env.NEXT_PUBLIC_API_BASE_URL || "";
+const RETRY_MS = 5000;
+
+// One /api/assistant/stream connection per tab, shared by every subscriber.
+// listeners: event name -> Set<handler(data)>
+const channel = { source: null, listeners: new Map(), attached: new Set(), connected: false, retry: null };
+
+function dispatch(event, data) {
+  for (const handler of channel.listeners.get(event) || []) {
+    try { handler(data); } catch (_) { /* ignore subscriber errors */ }
+  }
+}
+
+function attach(event) {
+  const es = channel.source;
+  if (!es || channel.attached.has(event) || event === "reconnect") return;
+  channel.attached.add(event);
+  es.addEventListener(event, (e) => {
+    let data = {};
+    try { data = JSON.parse(e.data || "{}"); } catch (_) { /* non-JSON payload */ }
+    dispatch(event, data);
+  });
+}
+
+function connect() {
+  if (channel.source || typeof EventSource === "undefined") return;
+  const es = new EventSource(`${API_BASE}/api/assistant/stream`);
+  channel.source = es;
+  channel.attached = new Set();
+  es.addEventListener("ready", () => {
+    // Events sent while we were disconnected are lost; let subscribers refetch
+    if (channel.connected) dispatch("reconnect", {});
+    channel.connected = true;
+  });
+  for (const event of channel.listeners.keys()) attach(event);
+  es.onerror = () => {
+    // The browser retries on its own unless the server refused the stream
+    if (es.readyState !== EventSource.CLOSED) return;
+    disconnect();
+    channel.retry = setTimeout(() => { channel.retry = null; if (channel.listeners.size > 0) connect(); }, RETRY_MS);
+  };
+}
+
+function disconnect() {
+  try { channel.source && channel.source.close(); } catch (_) { /* ignore */ }
+  channel.source = null;
+}
+
+function subscribe(event, handler) {
+  if (!channel.listeners.has(event)) channel.listeners.set(event, new Set());
+  channel.listeners.get(event).add(handler);
+  connect();
+  attach(event);
+  return () => {
+    const set = channel.listeners.get(event);
+    if (set) {
+      set.delete(handler);
+      if (set.size === 0) channel.listeners.delete(event);
+    }
+    if (channel.listeners.size === 0) {
+      if (channel.retry) clearTimeout(channel.retry);
+      channel.retry = null;
+      disconnect();
+    }
+  };
+}
+
+/**
+ * useServerEvent
+ * Subscribes to one event on the shared server event stream.
+ *
+ * event: string event name (e.g. 'nudge', 'notifications:remind')
+ * handler: (data: object) => void, called with the parsed event payload
+ */
+export function useServerEvent(event, handler) {
+  const handlerRef = useRef(handler);
+  handlerRef.current = handler;
+
+  useEffect(() => subscribe(event, (data) => handlerRef.current(data)), [event]);
+}
+
+/**
+ * useInvalidation
+ * Calls `onInvalidate` when the server reports a change to any of `resources`
+ * (see lib/api/invalidation.js), instead of polling.
+ *
+ * resources: string[] e.g. ['tasks', 'suggestions']
+ * options:
+ *  - transactionId: only react to changes scoped to this transaction (or unscoped ones)
+ *  - delay: debounce in ms so a burst of changes causes one refetch (default 300)
+ *
+ * While the tab is hidden, changes are remembered and the refetch happens when it becomes
+ * visible again. After a dropped connection it fires once, since changes may have been missed.
+ */
+export function useInvalidation(resources, onInvalidate, options = {}) {
+  const { transactionId = null, delay = 300 } = options;
+  const callbackRef = useRef(onInvalidate);
+  callbackRef.current = onInvalidate;
+  const key = resources.join(",");
+
+  useEffect(() => {
+    const watched = key.split(",");
+    let timer = null;
+    let stale = false;
+
+    const run = () => {
+      if (typeof document !== "undefined" && document.visibilityState !== "visible") {
+        stale = true;
+        return;
+      }
+      stale = false;
+      if (timer) clearTimeout(timer);
+      timer = setTimeout(() => { timer = null; callbackRef.current(); }, delay);
+    };
+
+    const affects = (changed) => watched.some((resource) => {
+      if (!(resource in changed)) return false;
+      const ids = changed[resource];
+      return ids === null || !transactionId || ids.includes(transactionId);
+    });
+
+    const onVisible = () => { if (stale && document.visibilityState === "visible") run(); };
+    document.addEventListener("visibilitychange", onVisible);
+    const unsubscribe = subscribe("invalidate", (data) => { if (affects(data.resources || {})) run(); });
+    const unsubscribeReconnect = subscribe("reconnect", run);
+
+    return () => {
+      if (timer) clearTimeout(timer);
+      document.removeEventListener("visibilitychange", onVisible);
+      unsubscribe();
+      unsubscribeReconnect();
+    };
+  }, [key, transactionId, delay]);
+}
@@ -0,0 +1,13 @@
+// Runs once when a Next.js server instance starts, before it serves requests.
+// Warm-up work here is kicked off without awaiting it, so the server is ready
+// immediately and the first request finds the MongoDB connection already in flight.
+export async function register() {
+  if (process.env.NEXT_RUNTIME !== 'nodejs') return
+
+  const { markPhase } = await import('@/lib/api/startup')
+  const { warmMongo } = await import('@/lib/api/db')
+  const { startSchedulers } = await import('@/lib/api/schedulers')
+
+  markPhase('instrumentation_register')
+  warmMongo().then(() => startSchedulers())
+}
@@ -0,0 +1,186 @@
+// Address matching for transactions. Each transaction stores:
+// - address_key: the street line in a canonical form (lowercase, no punctuation, standard
+//   USPS suffix/directional abbreviations, "unit N" for apt/suite/#), for exact lookups
+// - address_tokens: the distinctive tokens of the whole address (house number, street name,
+//   unit, city, zip), a multikey index used as the candidate set for fuzzy matches
+// Both are indexed, so finding "125 maple avenue" never scans the collection.
+
+const SUFFIXES = {
+  avenue: 'ave', av: 'ave', aven: 'ave', avenu: 'ave',
+  street: 'st', str: 'st', strt: 'st',
+  road: 'rd', drive: 'dr', drv: 'dr', boulevard: 'blvd', boul: 'blvd',
+  lane: 'ln', court: 'ct', place: 'pl', circle: 'cir', terrace: 'ter',
+  parkway: 'pkwy', pky: 'pkwy', highway: 'hwy', trail: 'trl', square: 'sq',
+  crossing: 'xing', expressway: 'expy', freeway: 'fwy', point: 'pt', loop: 'loop', way: 'way'
+}
+const DIRECTIONALS = {
+  north: 'n', south: 's', east: 'e', west: 'w',
+  northeast: 'ne', northwest: 'nw', southeast: 'se', southwest: 'sw'
+}
+const UNIT_WORDS = new Set(['apt', 'apartment', 'unit', 'suite', 'ste', 'no', '#'])
+const STATES = new Set([
+  'al','ak','az','ar','ca','co','ct','de','fl','ga','hi','id','il','in','ia','ks','ky','la','me','md','ma','mi','mn','ms','mo',
+  'mt','ne','nv','nh','nj','nm','ny','nc','nd','oh','ok','or','pa','ri','sc','sd','tn','tx','ut','vt','va','wa','wv','wi','wy','dc'
+])
+// Too common to narrow anything down, so left out of address_tokens
+const STOP_TOKENS = new Set([...Object.values(SUFFIXES), ...Object.values(DIRECTIONALS), 'unit', 'usa', 'us'])
+
+const FUZZY_CANDIDATES = 200
+const FUZZY_MIN_SCORE = 0.6
+
+function words(text) {
+  return String(text || '')
+    .toLowerCase()
+    .replace(/#\s*/g, ' # ')
+    .replace(/[^a-z0-9# ]+/g, ' ')
+    .split(/\s+/)
+    .filter(Boolean)
+}
+
+function canonicalWords(text) {
+  const out = []
+  const list = words(text)
+  for (let i = 0; i < list.length; i++) {
+    const w = list[i]
+    if (UNIT_WORDS.has(w) && list[i + 1]) {
+      out.push('unit', list[++i])
+    } else {
+      out.push(SUFFIXES[w] || DIRECTIONALS[w] || w)
+    }
+  }
+  return out
+}
+
+// Canonical street line: everything before the first comma (the city/state/zip part is
+// left to the fuzzy tokens)
+export function addressKey(address) {
+  const street = String(address || '').split(',')[0]
+  const key = canonicalWords(street).join(' ')
+  return key || null
+}
+
+export function addressTokens(address) {
+  const tokens = canonicalWords(address).filter(t => !STOP_TOKENS.has(t) && !STATES.has(t) && t !== '#')
+  return [...new Set(tokens)]
+}
+
+export function addressFields(address) {
+  return { address_key: addressKey(address), address_tokens: addressTokens(address) }
+}
+
+// Indexes plus a one-time backfill of address_key/address_tokens on older transactions
+export async function ensureAddressIndexes(db) {
+  const g = globalThis
+  if (g.__crmAddressIndexes) return g.__crmAddressIndexes
+  g.__crmAddressIndexes = (async () => {
+    const coll = db.collection('transactions')
+    try {
+      if (typeof coll.createIndex === 'function') {
+        await coll.createIndex({ address_key: 1 })
+        await coll.createIndex({ address_tokens: 1 })
+      }
+      const missing = await coll.find({ address_key: { $exists: false } }, { projection: { id: 1, property_address: 1 } }).toArray()
+      for (let i = 0; i < missing.length; i += 1000) {
+        await coll.bulkWrite(missing.slice(i, i + 1000).map(t => ({
+          updateOne: { filter: { id: t.id }, update: { $set: addressFields(t.property_address) } }
+        })), { ordered: false })
+      }
+    } catch (e) {
+      console.warn('Transaction address index/backfill error', e)
+    }
+  })()
+  return g.__crmAddressIndexes
+}
+
+// Edit distance counting adjacent transpositions as one edit ("mapel" -> "maple"),
+// stopping early once it exceeds max
+function editDistance(a, b, max) {
+  if (Math.abs(a.length - b.length) > max) return max + 1
+  let prev2 = null
+  let prev = Array.from({ length: b.length + 1 }, (_, j) => j)
+  for (let i = 1; i <= a.length; i++) {
+    const cur = [i]
+    let rowMin = i
+    for (let j = 1; j <= b.length; j++) {
+      cur[j] = Math.min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (a[i - 1] === b[j - 1] ? 0 : 1))
+      if (prev2 && i > 1 && j > 1 && a[i - 1] === b[j - 2] && a[i - 2] === b[j - 1]) {
+        cur[j] = Math.min(cur[j], prev2[j - 2] + 1)
+      }
+      rowMin = Math.min(rowMin, cur[j])
+    }
+    if (rowMin > max) return max + 1
+    prev2 = prev
+    prev = cur
+  }
+  return prev[b.length]
+}
+
+const tokensMatch = (a, b) => {
+  if (a === b) return true
+  // Numbers must match exactly; words may carry a typo
+  if (/^\d/.test(a) || /^\d/.test(b) || Math.min(a.length, b.length) < 4) return false
+  const max = a.length >= 8 ? 2 : 1
+  return editDistance(a, b, max) <= max
+}
+
+// Share of the query's tokens found in the candidate; a house number alone (half the
+// tokens of "125 Oak") isn't enough to clear FUZZY_MIN_SCORE
+export function addressMatchScore(queryTokens, candidateTokens) {
+  if (queryTokens.length === 0) return 0
+  const matched = queryTokens.filter(q => candidateTokens.some(c => tokensMatch(q, c))).length
+  return matched / queryTokens.length
+}
+
+// Scoring needs the key and tokens; only an inclusion projection can leave them out
+function withMatchFields(projection) {
+  if (!projection) return undefined
+  const inclusive = Object.entries(projection).some(([field, on]) => field !== '_id' && on)
+  return inclusive ? { ...projection, address_key: 1, address_tokens: 1 } : projection
+}
+
+// Best transaction for a free-text address: exact address_key first, then the highest
+// scoring candidate from the token index. Returns { transaction, match, score } or null.
+export async function findTransactionByAddress(db, address, { projection } = {}) {
+  await ensureAddressIndexes(db)
+  const coll = db.collection('transactions')
+  const key = addressKey(address)
+  if (!key) return null
+
+  const [exact] = await coll.find({ address_key: key }, { projection }).sort({ updated_at: -1 }).limit(1).toArray()
+  if (exact) return { transaction: exact, match: 'exact', score: 1 }
+
+  const queryTokens = addressTokens(address)
+  if (queryTokens.length === 0) return null
+  // The house number is by far the most selective token; fall back to the rest when absent
+  const numbers = queryTokens.filter(t => /^\d+$/.test(t) && t.length < 5)
+  const candidateQuery = numbers.length > 0
+    ? { address_tokens: { $in: numbers } }
+    : { address_tokens: { $in: queryTokens } }
+  // A common house number ("100") can match far more than FUZZY_CANDIDATES deals, so rank by
+  // how many query tokens each one shares exactly (street, city, zip) before cutting the list;
+  // a misspelled street still gets in behind the exact matches when there's room
+  const fields = withMatchFields(projection)
+  const candidates = await coll.aggregate([
+    { $match: candidateQuery },
+    { $addFields: { match_rank: { $size: { $setIntersection: ['$address_tokens', queryTokens] } } } },
+    { $sort: { match_rank: -1, updated_at: -1 } },
+    { $limit: FUZZY_CANDIDATES },
+    { $project: { match_rank: 0 } },
+    ...(fields ? [{ $project: fields }] : [])
+  ]).toArray()
+
+  let best = null
+  for (const candidate of candidates) {
+    const tokens = candidate.address_tokens || []
+    const score = addressMatchScore(queryTokens, tokens)
+    if (score < FUZZY_MIN_SCORE) continue
+    // Ties go to the closest street line (suffixes aren't tokens, but they are in the key)
+    const distance = editDistance(key, candidate.address_key || '', key.length)
+    if (!best || score > best.score || (score === best.score && distance < best.distance)) {
+      best = { transaction: candidate, match: 'fuzzy', score, distance }
+    }
+  }
+  if (!best) return null
+  const { transaction, match, score } = best
+  return { transaction, match, score }
+}
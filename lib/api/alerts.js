@@ -0,0 +1,338 @@
+import { v4 as uuidv4 } from 'uuid'
+import { connectToMongo } from '@/lib/api/db'
+import { getTransactionRollups, rollupOverdue } from '@/lib/api/rollups'
+import { timeScheduler } from '@/lib/api/telemetry'
+import { notifyChange, sendToClients } from '@/lib/api/invalidation'
+
+// Smart Alerts System. Reads are served from smart_alerts alone; the alerts themselves
+// are kept current by generateSmartAlerts, which runs on a schedule (startAlertScheduler)
+// for the whole book and, debounced, for single transactions right after their checklist
+// or deal changes (scheduleAlertRefresh). Runs in one process take turns; across instances the
+// unique (transaction_id, alert_type) index keeps their upserts from creating duplicates.
+// Every full run records a generated_at watermark that reads return, so clients can tell how
+// fresh the list is.
+const ALERTS = 'smart_alerts'
+const RUNS = 'smart_alert_runs'
+const ALERT_INTERVAL_MS = Math.max(10 * 1000, Number(process.env.SMART_ALERTS_INTERVAL_MS) || 5 * 60 * 1000)
+const ALERT_INITIAL_DELAY_MS = Number(process.env.SMART_ALERTS_INITIAL_DELAY_MS) || 5 * 1000
+const REFRESH_DEBOUNCE_MS = 1000
+
+function state() {
+  return globalThis.__crmSmartAlerts || (globalThis.__crmSmartAlerts = {
+    indexed: null, running: null, queue: null, timer: null, pending: new Set(), flushTimer: null
+  })
+}
+
+async function ensureAlertIndexes(db) {
+  const s = state()
+  if (!s.indexed) {
+    s.indexed = (async () => {
+      try {
+        const coll = db.collection(ALERTS)
+        if (typeof coll.createIndex === 'function') {
+          await coll.createIndex({ status: 1, assigned_agent: 1, priority: 1, alert_type: 1, created_at: -1 })
+          await coll.createIndex({ status: 1, created_at: -1 })
+          await ensureAlertKeyIndex(coll)
+          await coll.createIndex({ id: 1 })
+        }
+        // Legacy alerts written without an id
+        const missing = await coll.find({ id: { $exists: false } }, { projection: { transaction_id: 1, alert_type: 1 } }).toArray()
+        if (missing.length > 0) {
+          await coll.bulkWrite(missing.map(a => ({
+            updateOne: { filter: { transaction_id: a.transaction_id, alert_type: a.alert_type, id: { $exists: false } }, update: { $set: { id: uuidv4() } } }
+          })), { ordered: false })
+        }
+      } catch (e) {
+        console.warn('Smart alert index error', e)
+      }
+    })()
+  }
+  return s.indexed
+}
+
+// One alert per (transaction, type). Older deployments have a non-unique index on the same
+// key, and may hold duplicates from concurrent runs: keep the newest of each, then rebuild
+// the index as unique.
+async function ensureAlertKeyIndex(coll) {
+  const duplicates = await coll.aggregate([
+    { $sort: { updated_at: -1 } },
+    { $group: { _id: { transaction_id: '$transaction_id', alert_type: '$alert_type' }, ids: { $push: '$_id' }, count: { $sum: 1 } } },
+    { $match: { count: { $gt: 1 } } }
+  ], { allowDiskUse: true }).toArray()
+  const extra = duplicates.flatMap(d => d.ids.slice(1))
+  for (let i = 0; i < extra.length; i += 1000) {
+    await coll.deleteMany({ _id: { $in: extra.slice(i, i + 1000) } })
+  }
+  try {
+    await coll.createIndex({ transaction_id: 1, alert_type: 1 }, { unique: true })
+  } catch (e) {
+    // IndexKeySpecsConflict: the non-unique index from before
+    if (e?.code !== 86 && e?.codeName !== 'IndexKeySpecsConflict') throw e
+    await coll.dropIndex('transaction_id_1_alert_type_1')
+    await coll.createIndex({ transaction_id: 1, alert_type: 1 }, { unique: true })
+  }
+}
+
+// Generation runs, full or scoped, one after another: a scoped refresh racing a full run
+// could otherwise read the same alerts and write them twice
+function inTurn(run) {
+  const s = state()
+  const next = (s.queue || Promise.resolve()).catch(() => {}).then(run)
+  s.queue = next
+  return next
+}
+
+function pushSSE(payload) {
+  sendToClients('suggestions:update', { reason: payload.reason })
+  notifyChange('alerts:changed', payload, ['alerts', 'suggestions'])
+}
+
+export async function getSmartAlerts(db, filters = {}) {
+  try {
+    await ensureAlertIndexes(db)
+    const query = { status: 'active' }
+    if (filters.agent) query.assigned_agent = filters.agent
+    if (filters.priority) query.priority = filters.priority
+    if (filters.type) query.alert_type = filters.type
+
+    const [alerts, run] = await Promise.all([
+      db.collection(ALERTS)
+        .find(query, { projection: { _id: 0 } })
+        .sort({ created_at: -1 })
+        .limit(50)
+        .toArray(),
+      db.collection(RUNS).findOne({ id: 'full' }, { projection: { _id: 0, generated_at: 1 } })
+    ])
+    // Nothing generated yet (fresh database): start a run for the next read
+    if (!run) refreshAllAlerts(db)
+
+    return {
+      success: true,
+      alerts,
+      total: alerts.length,
+      filters_applied: filters,
+      generated_at: run?.generated_at || null
+    }
+  } catch (error) {
+    console.error('Smart alerts error:', error)
+    return {
+      success: false,
+      error: "Failed to get smart alerts"
+    }
+  }
+}
+
+// Recompute alerts, for every open transaction or only the given ones. Alerts whose
+// condition no longer holds are marked resolved; dismissed alerts stay dismissed. Returns
+// { active, created, resolved }.
+export async function generateSmartAlerts(db, { transactionIds = null } = {}) {
+  try {
+    await ensureAlertIndexes(db)
+    const now = new Date()
+    const threeDaysAgo = new Date(now.getTime() - (3 * 24 * 60 * 60 * 1000))
+    const sevenDaysAgo = new Date(now.getTime() - (7 * 24 * 60 * 60 * 1000))
+
+    // A scoped run also loads closed deals, so their alerts get resolved
+    const transactions = await db.collection('transactions')
+      .find(transactionIds ? { id: { $in: transactionIds } } : { current_stage: { $ne: 'closed' } })
+      .toArray()
+    const open = transactions.filter(t => t.current_stage !== 'closed')
+
+    // Checklist state for every transaction in one read of the stage rollups
+    const rollupsByTransaction = await getTransactionRollups(db, open.map(t => t.id))
+
+    // Build candidate alerts based on current state
+    const candidates = []
+    for (const transaction of open) {
+      const rollups = rollupsByTransaction.get(transaction.id) || []
+
+      // Overdue tasks (> 3 days)
+      const overdueTasks = rollups.flatMap(r => rollupOverdue(r, threeDaysAgo))
+
+      if (overdueTasks.length > 0) {
+        candidates.push({
+          alert_type: 'overdue_tasks',
+          priority: overdueTasks.some(task => task.priority === 'urgent') ? 'urgent' : 'high',
+          transaction_id: transaction.id,
+          property_address: transaction.property_address,
+          client_name: transaction.client_name,
+          assigned_agent: transaction.assigned_agent,
+          title: `${overdueTasks.length} Overdue Tasks`,
+          message: `${transaction.property_address} has ${overdueTasks.length} tasks overdue by more than 3 days`,
+          details: {
+            overdue_count: overdueTasks.length,
+            most_overdue: overdueTasks[0]?.title,
+            overdue_tasks: overdueTasks.slice(0, 5).map(task => ({
+              title: task.title,
+              due_date: task.due_date,
+              priority: task.priority,
+              days_overdue: Math.ceil((now - new Date(task.due_date)) / (1000 * 60 * 60 * 24))
+            }))
+          }
+        })
+      }
+
+      // Deal inactivity (> 7 days)
+      if (new Date(transaction.updated_at) < sevenDaysAgo) {
+        candidates.push({
+          alert_type: 'deal_inactivity',
+          priority: 'medium',
+          transaction_id: transaction.id,
+          property_address: transaction.property_address,
+          client_name: transaction.client_name,
+          assigned_agent: transaction.assigned_agent,
+          title: 'Deal Inactive',
+          message: `${transaction.property_address} has been inactive for ${Math.ceil((now - new Date(transaction.updated_at)) / (1000 * 60 * 60 * 24))} days`,
+          details: {
+            days_inactive: Math.ceil((now - new Date(transaction.updated_at)) / (1000 * 60 * 60 * 24)),
+            current_stage: transaction.current_stage,
+            last_update: transaction.updated_at
+          }
+        })
+      }
+
+      // Approaching closing date (<= 7 days)
+      if (transaction.closing_date) {
+        const closingDate = new Date(transaction.closing_date)
+        const daysToClosing = Math.ceil((closingDate - now) / (1000 * 60 * 60 * 24))
+        if (daysToClosing <= 7 && daysToClosing > 0) {
+          const incompleteCount = rollups.find(r => r.stage === transaction.current_stage)?.open || 0
+          if (incompleteCount > 0) {
+            candidates.push({
+              alert_type: 'closing_approaching',
+              priority: daysToClosing <= 3 ? 'urgent' : 'high',
+              transaction_id: transaction.id,
+              property_address: transaction.property_address,
+              client_name: transaction.client_name,
+              assigned_agent: transaction.assigned_agent,
+              title: `Closing in ${daysToClosing} Days`,
+              message: `${transaction.property_address} closes in ${daysToClosing} days with ${incompleteCount} incomplete tasks`,
+              details: {
+                days_to_closing: daysToClosing,
+                closing_date: transaction.closing_date,
+                incomplete_tasks: incompleteCount,
+                current_stage: transaction.current_stage
+              }
+            })
+          }
+        }
+      }
+    }
+
+    // Upsert per (transaction_id, alert_type) in one bulk write; dismissed alerts keep
+    // their status
+    const collection = db.collection(ALERTS)
+    const keyOf = (a) => `${a.transaction_id}\u0000${a.alert_type}`
+    const current = new Set(candidates.map(keyOf))
+    let created = 0
+    if (candidates.length > 0) {
+      const result = await collection.bulkWrite(candidates.map(cand => ({
+        updateOne: {
+          filter: { transaction_id: cand.transaction_id, alert_type: cand.alert_type },
+          update: {
+            $set: {
+              priority: cand.priority,
+              property_address: cand.property_address,
+              client_name: cand.client_name,
+              assigned_agent: cand.assigned_agent,
+              title: cand.title,
+              message: cand.message,
+              details: cand.details,
+              updated_at: now
+            },
+            $setOnInsert: { id: uuidv4(), created_at: now, status: 'active' }
+          },
+          upsert: true
+        }
+      })), { ordered: false })
+      created = result.upsertedCount || 0
+    }
+
+    // Resolve active alerts whose condition has cleared, reactivate resolved ones whose
+    // condition is back
+    const scope = transactionIds ? { transaction_id: { $in: transactionIds } } : {}
+    const existing = await collection
+      .find({ status: { $in: ['active', 'resolved'] }, ...scope }, { projection: { _id: 0, id: 1, transaction_id: 1, alert_type: 1, status: 1 } })
+      .toArray()
+    const stale = existing.filter(a => a.status === 'active' && !current.has(keyOf(a))).map(a => a.id)
+    const returning = existing.filter(a => a.status === 'resolved' && current.has(keyOf(a))).map(a => a.id)
+    if (stale.length > 0) {
+      await collection.updateMany({ id: { $in: stale } }, { $set: { status: 'resolved', resolved_at: now } })
+    }
+    if (returning.length > 0) {
+      await collection.updateMany({ id: { $in: returning } }, { $set: { status: 'active', created_at: now }, $unset: { resolved_at: '' } })
+      created += returning.length
+    }
+
+    if (!transactionIds) {
+      await db.collection(RUNS).updateOne(
+        { id: 'full' },
+        { $set: { generated_at: now, duration_ms: Date.now() - now.getTime(), transactions: open.length, candidates: candidates.length } },
+        { upsert: true }
+      )
+    }
+    return { active: candidates.length, created, resolved: stale.length }
+  } catch (error) {
+    console.error('Smart alerts generation error:', error)
+    return { active: 0, created: 0, resolved: 0 }
+  }
+}
+
+// Full regeneration, one at a time per process
+export function refreshAllAlerts(db) {
+  const s = state()
+  if (!s.running) {
+    s.running = inTurn(() => generateSmartAlerts(db))
+      .then(result => {
+        if (result.created || result.resolved) pushSSE({ reason: 'alerts_refreshed', ...result })
+        return result
+      })
+      .finally(() => { s.running = null })
+  }
+  return s.running
+}
+
+// Regenerate one transaction's alerts shortly after it changes; changes within the
+// debounce window are handled in one scoped run
+export function scheduleAlertRefresh(transactionId) {
+  if (!transactionId) return
+  const s = state()
+  s.pending.add(transactionId)
+  if (s.flushTimer) return
+  s.flushTimer = setTimeout(async () => {
+    s.flushTimer = null
+    const ids = [...s.pending]
+    s.pending.clear()
+    try {
+      const db = await connectToMongo()
+      const result = await inTurn(() => generateSmartAlerts(db, { transactionIds: ids }))
+      if (result.created || result.resolved) pushSSE({ reason: 'alerts_refreshed', transaction_ids: ids, ...result })
+    } catch (e) {
+      console.warn('Smart alert refresh error', e)
+    }
+  }, REFRESH_DEBOUNCE_MS)
+  if (typeof s.flushTimer.unref === 'function') s.flushTimer.unref()
+}
+
+// Periodic full run: time-based alerts (inactivity, closing dates, overdue tasks) change
+// without any write. Skips a run when another instance generated recently.
+export function startAlertScheduler() {
+  const s = state()
+  if (s.timer) return
+  const run = async () => {
+    try {
+      const db = await connectToMongo()
+      const last = await db.collection(RUNS).findOne({ id: 'full' }, { projection: { generated_at: 1 } })
+      if (last?.generated_at && Date.now() - new Date(last.generated_at).getTime() < ALERT_INTERVAL_MS / 2) return
+      await timeScheduler('smart_alerts', () => refreshAllAlerts(db))
+    } catch (e) {
+      console.warn('Smart alert scheduler error', e)
+    }
+  }
+  s.timer = setTimeout(() => {
+    run()
+    s.timer = setInterval(run, ALERT_INTERVAL_MS)
+    if (typeof s.timer.unref === 'function') s.timer.unref()
+  }, ALERT_INITIAL_DELAY_MS)
+  if (typeof s.timer.unref === 'function') s.timer.unref()
+}
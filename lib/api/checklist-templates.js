@@ -0,0 +1,497 @@
+import { createHash } from 'crypto'
+import { getDefaultTasksForStage, getStageOrder } from '@/lib/api/checklists'
+import { estimateTaskDuration } from '@/lib/api/plans'
+
+// Default checklists are stored once, as versioned templates (checklist_templates, one document
+// per transaction type + stage + version), instead of being copied into checklist_items for
+// every transaction. Entering a stage writes one small seed (checklist_seeds: transaction, stage,
+// template version, seeded_at and the template items removed from this transaction); its items
+// are "virtual": built from the template on read, with due dates counted from seeded_at and
+// stable ids (`<transaction>.<stage>.<key>`). The seed also keeps the due dates of its dated
+// items still pending, i.e. neither materialized nor removed (`tasks`), so due-date queries
+// find only seeds with something left by index and /pmd/tasks can rank template items inside
+// MongoDB (templateTaskStages). The first write to one materializes it into
+// checklist_items under the same id, and from then on the stored document overrides the
+// template. A new template version is created when getDefaultTasksForStage changes; existing
+// seeds keep the version they were created with.
+//
+// Reads merge both sides: loadChecklistItems for one transaction's checklist (one aggregation
+// that $lookups both from the transaction, which also works inside a MongoDB transaction),
+// findTemplateTasks next to an index-sorted checklist_items query for the checklist view,
+// findTasks/countTasks for task queries across transactions.
+const TEMPLATES = 'checklist_templates'
+const SEEDS = 'checklist_seeds'
+const DAY_MS = 86400000
+const STAGES = {
+  sale: ['pre_listing', 'listing', 'under_contract', 'escrow_closing'],
+  purchase: ['pre_approval', 'home_search', 'offer', 'under_contract', 'escrow_closing']
+}
+
+function state() {
+  return globalThis.__crmChecklistTemplates || (globalThis.__crmChecklistTemplates = {
+    ready: null, latest: new Map(), versions: new Map()
+  })
+}
+
+const templateType = (transactionType) => (String(transactionType || 'sale').toLowerCase() === 'purchase' ? 'purchase' : 'sale')
+const versionKey = (id, version) => `${id}@${version}`
+
+function buildTemplateItems(type, stage) {
+  const weightOf = (t) => (typeof t.weight === 'number' ? t.weight : 1)
+  return getDefaultTasksForStage(stage, type).map((task, index) => ({
+    key: String(index + 1),
+    title: task.title,
+    description: task.description || '',
+    priority: task.priority || 'medium',
+    due_days: task.due_days || null,
+    weight: weightOf(task),
+    dependencies: task.dependencies || [],
+    est_duration_min: estimateTaskDuration(task.title),
+    subtasks: (Array.isArray(task.subtasks) ? task.subtasks : []).map((sub, sIdx) => ({
+      key: `${index + 1}-${sIdx + 1}`,
+      title: sub.title,
+      description: sub.description || '',
+      priority: sub.priority || task.priority || 'medium',
+      due_days: sub.due_days || null,
+      weight: weightOf(sub),
+      dependencies: Array.isArray(sub.dependencies) ? sub.dependencies : [],
+      est_duration_min: estimateTaskDuration(sub.title)
+    }))
+  }))
+}
+
+function cacheTemplate(template) {
+  const s = state()
+  s.versions.set(versionKey(template.id, template.version), template)
+  if ((s.latest.get(template.id)?.version || 0) < template.version) s.latest.set(template.id, template)
+}
+
+// The dated items of a seed as stored on it: what task queries and ranking need in MongoDB
+function seedTasks(template, seededAt, done = new Set()) {
+  return template.items
+    .flatMap(task => [task, ...task.subtasks])
+    .filter(item => item.due_days && !done.has(item.key))
+    .map(item => ({
+      key: item.key,
+      due_date: new Date(seededAt.getTime() + item.due_days * DAY_MS),
+      priority: item.priority,
+      est_duration_min: item.est_duration_min
+    }))
+}
+
+// Load every template version, and store a new version for each stage whose defaults changed
+export function ensureChecklistTemplates(db) {
+  const s = state()
+  if (!s.ready) {
+    s.ready = (async () => {
+      const templates = db.collection(TEMPLATES)
+      const seeds = db.collection(SEEDS)
+      try {
+        if (typeof templates.createIndex === 'function') {
+          await templates.createIndex({ id: 1, version: 1 }, { unique: true })
+          await seeds.createIndex({ transaction_id: 1, stage: 1 }, { unique: true })
+          await seeds.createIndex({ 'tasks.due_date': 1 })
+          // Concurrent first writes to a template item must not materialize it twice. Keyed on
+          // template_key too so the plain id index below (which the partial one can't stand in
+          // for) doesn't share its key pattern; replaces the older partial index on id alone.
+          const items = db.collection('checklist_items')
+          await items.createIndex(
+            { id: 1, template_key: 1 },
+            { name: 'template_item_key', unique: true, partialFilterExpression: { template_key: { $exists: true } } }
+          )
+          await items.dropIndex('template_item_id').catch(() => {})
+          await items.createIndex({ id: 1 })
+        }
+      } catch (e) {
+        console.warn('Checklist template index error', e)
+      }
+      for (const template of await templates.find({}, { projection: { _id: 0 } }).toArray()) cacheTemplate(template)
+      for (const [type, stages] of Object.entries(STAGES)) {
+        for (const stage of stages) {
+          const id = `${type}:${stage}`
+          const items = buildTemplateItems(type, stage)
+          const hash = createHash('sha1').update(JSON.stringify(items)).digest('hex')
+          const latest = s.latest.get(id)
+          if (latest?.hash === hash) continue
+          const template = { id, transaction_type: type, stage, version: (latest?.version || 0) + 1, hash, items, created_at: new Date() }
+          try {
+            await templates.insertOne(template)
+            const { _id, ...clean } = template
+            cacheTemplate(clean)
+          } catch (e) {
+            // Another instance stored this version first
+            if (e?.code !== 11000) throw e
+            cacheTemplate(await templates.findOne({ id, version: template.version }, { projection: { _id: 0 } }))
+          }
+        }
+      }
+      // Seeds stored before `tasks` left out materialized and removed items (or existed at all)
+      const stale = seeds.find({ pending_only: { $ne: true } }, { projection: { _id: 1, transaction_id: 1, stage: 1, template: 1, version: 1, seeded_at: 1, removed: 1 } })
+      for await (const seed of stale) {
+        const template = await getTemplateVersion(db, seed.template, seed.version)
+        if (!template) continue
+        const materialized = await db.collection('checklist_items')
+          .find({ transaction_id: seed.transaction_id, template_key: { $exists: true } }, { projection: { _id: 0, id: 1 } })
+          .toArray()
+        const done = new Set(seed.removed || [])
+        for (const { id } of materialized) {
+          const ref = parseTemplateItemId(id)
+          if (ref?.stage === seed.stage) done.add(ref.key)
+        }
+        await seeds.updateOne({ _id: seed._id }, { $set: { tasks: seedTasks(template, new Date(seed.seeded_at), done), pending_only: true } })
+      }
+    })().catch((e) => {
+      s.ready = null
+      throw e
+    })
+  }
+  return s.ready
+}
+
+async function getTemplateVersion(db, id, version) {
+  const s = state()
+  const cached = s.versions.get(versionKey(id, version))
+  if (cached) return cached
+  const template = await db.collection(TEMPLATES).findOne({ id, version }, { projection: { _id: 0 } })
+  if (template) cacheTemplate(template)
+  return template
+}
+
+export function templateItemId(transactionId, stage, key) {
+  return `${transactionId}.${stage}.${key}`
+}
+
+// { transaction_id, stage, key } for ids of template items, null for ids of stored-only items
+export function parseTemplateItemId(id) {
+  const parts = String(id || '').split('.')
+  if (parts.length !== 3 || parts.some(p => !p)) return null
+  return { transaction_id: parts[0], stage: parts[1], key: parts[2] }
+}
+
+// The checklist items a seed stands for, minus the ones removed from the transaction
+function expandSeed(seed, template) {
+  const removed = new Set(seed.removed || [])
+  const seededAt = new Date(seed.seeded_at)
+  const build = (item, index, parentId) => ({
+    id: templateItemId(seed.transaction_id, seed.stage, item.key),
+    transaction_id: seed.transaction_id,
+    title: item.title,
+    description: item.description,
+    stage: seed.stage,
+    status: 'not_started',
+    priority: item.priority,
+    assignee: '',
+    due_date: item.due_days ? new Date(seededAt.getTime() + item.due_days * DAY_MS) : null,
+    completed_date: null,
+    notes: '',
+    order: index + 1,
+    stage_order: seed.stage_order,
+    dependencies: item.dependencies,
+    weight: item.weight,
+    est_duration_min: item.est_duration_min,
+    parent_id: parentId,
+    template_key: item.key,
+    template_version: seed.version,
+    virtual: true,
+    created_at: seededAt,
+    updated_at: seededAt
+  })
+  const items = []
+  template.items.forEach((task, index) => {
+    const parentId = templateItemId(seed.transaction_id, seed.stage, task.key)
+    if (!removed.has(task.key)) items.push(build(task, index, null))
+    for (const sub of task.subtasks) {
+      if (!removed.has(sub.key)) items.push(build(sub, index, parentId))
+    }
+  })
+  return items
+}
+
+async function expandSeeds(db, seeds, materializedIds) {
+  const items = []
+  for (const seed of seeds) {
+    const template = await getTemplateVersion(db, seed.template, seed.version)
+    if (!template) continue
+    for (const item of expandSeed(seed, template)) {
+      if (!materializedIds.has(item.id)) items.push(item)
+    }
+  }
+  return items
+}
+
+// Minimal query matching for virtual items: equality, $ne, $in, $nin, $exists, range operators,
+// $and/$or. Arrays match when any element does, as in MongoDB.
+const comparable = (value) => (value instanceof Date ? value.getTime() : value)
+
+function matchesValue(value, condition) {
+  if (condition && typeof condition === 'object' && !(condition instanceof Date) && !Array.isArray(condition)
+      && Object.keys(condition).some(k => k.startsWith('$'))) {
+    return Object.entries(condition).every(([op, arg]) => {
+      switch (op) {
+        case '$ne': return !matchesValue(value, arg)
+        case '$in': return arg.some(a => matchesValue(value, a))
+        case '$nin': return !arg.some(a => matchesValue(value, a))
+        case '$exists': return (value !== undefined) === Boolean(arg)
+        case '$lt': return value != null && comparable(value) < comparable(arg)
+        case '$lte': return value != null && comparable(value) <= comparable(arg)
+        case '$gt': return value != null && comparable(value) > comparable(arg)
+        case '$gte': return value != null && comparable(value) >= comparable(arg)
+        default: throw new Error(`Unsupported operator ${op} in a checklist template query`)
+      }
+    })
+  }
+  if (Array.isArray(value)) return value.some(v => matchesValue(v, condition))
+  if (condition === null) return value === null || value === undefined
+  return comparable(value) === comparable(condition)
+}
+
+export function matchesQuery(doc, query) {
+  return Object.entries(query).every(([key, condition]) => {
+    if (key === '$or') return condition.some(q => matchesQuery(doc, q))
+    if (key === '$and') return condition.every(q => matchesQuery(doc, q))
+    return matchesValue(doc[key], condition)
+  })
+}
+
+const sortValue = (value) => (value instanceof Date ? value.getTime() : value)
+
+export function compareBy(sort) {
+  const keys = Object.entries(sort)
+  return (a, b) => {
+    for (const [key, direction] of keys) {
+      const x = sortValue(a[key])
+      const y = sortValue(b[key])
+      if (x === y) continue
+      // Missing values sort first, as in MongoDB
+      if (x == null) return -direction
+      if (y == null) return direction
+      return (x < y ? -1 : 1) * direction
+    }
+    return 0
+  }
+}
+
+// Checklist items of one or more transactions (query.transaction_id, optionally query.stage),
+// stored and template-backed, filtered by the rest of the query. One round trip once the
+// templates are loaded. Materialized items hide their template counterpart.
+export async function loadChecklistItems(db, query, { session } = {}) {
+  await ensureChecklistTemplates(db)
+  const rows = await db.collection('transactions').aggregate([
+    { $match: { id: query.transaction_id } },
+    { $project: { _id: 0, id: 1 } },
+    { $lookup: { from: 'checklist_items', localField: 'id', foreignField: 'transaction_id', as: 'items' } },
+    { $lookup: { from: SEEDS, localField: 'id', foreignField: 'transaction_id', as: 'seeds' } }
+  ], { session }).toArray()
+  // A materialized item may have moved to another stage; it still hides its template item
+  const stored = rows.flatMap(row => row.items)
+  const seeds = rows.flatMap(row => row.seeds).filter(seed => !query.stage || matchesQuery(seed, { stage: query.stage }))
+  const virtual = await expandSeeds(db, seeds, new Set(stored.map(i => i.id)))
+  return [...stored, ...virtual]
+    .filter(item => matchesQuery(item, query))
+    .map(({ _id, ...item }) => item)
+}
+
+// Every template item is unassigned and not started until it's materialized
+const TEMPLATE_ITEM_DEFAULTS = { status: 'not_started', assignee: '' }
+
+const templateItemsCanMatch = (query) =>
+  Object.entries(TEMPLATE_ITEM_DEFAULTS).every(([field, value]) => !(field in query) || matchesValue(value, query[field]))
+
+// The seeds that can hold template items matching a task query (null: none can)
+function seedQueryFor(query) {
+  if (!templateItemsCanMatch(query)) return null
+  const seedQuery = {}
+  if (query.transaction_id) seedQuery.transaction_id = query.transaction_id
+  if (typeof query.stage === 'string') seedQuery.stage = query.stage
+  const ids = typeof query.id === 'string' ? [query.id] : query.id?.$in
+  if (ids) {
+    const refs = ids.map(parseTemplateItemId).filter(Boolean)
+    if (refs.length === 0) return null
+    seedQuery.$or = refs.map(ref => ({ transaction_id: ref.transaction_id, stage: ref.stage }))
+  }
+  // A due-date condition that excludes undated items only matches seeds with a matching dated item
+  if (query.due_date !== undefined && !matchesValue(null, query.due_date)) {
+    seedQuery.tasks = { $elemMatch: { due_date: query.due_date } }
+  }
+  return seedQuery
+}
+
+// Template items not yet materialized that match a task query spanning transactions
+export async function findTemplateTasks(db, query) {
+  const seedQuery = seedQueryFor(query)
+  if (!seedQuery) return []
+  await ensureChecklistTemplates(db)
+
+  const seeds = await db.collection(SEEDS).find(seedQuery, { projection: { _id: 0 } }).toArray()
+  if (seeds.length === 0) return []
+  const candidates = (await expandSeeds(db, seeds, new Set())).filter(item => matchesQuery(item, query))
+  if (candidates.length === 0) return []
+  const materialized = await db.collection('checklist_items')
+    .find({ id: { $in: candidates.map(i => i.id) } }, { projection: { _id: 0, id: 1 } })
+    .toArray()
+  const materializedIds = new Set(materialized.map(i => i.id))
+  return candidates.filter(item => !materializedIds.has(item.id))
+}
+
+// $unionWith stage adding the dated template items not yet materialized that match `query` to a
+// checklist_items aggregation, so both sides can be ranked and paged together. Seeds whose
+// dated items were all worked on have no `tasks` left and are skipped by the index before the
+// $unwind; the (indexed) id lookup only guards against a write racing the seed update. The rows
+// carry id, transaction_id, stage, status, assignee, priority, due_date, est_duration_min and
+// virtual: true (findTemplateTasks by id for the rest); `query` may only use those fields.
+export async function templateTaskStages(db, query) {
+  const seedQuery = seedQueryFor(query)
+  if (!seedQuery) return []
+  await ensureChecklistTemplates(db)
+  return [{
+    $unionWith: {
+      coll: SEEDS,
+      pipeline: [
+        { $match: seedQuery },
+        { $unwind: '$tasks' },
+        { $match: { $expr: { $not: [{ $in: ['$tasks.key', { $ifNull: ['$removed', []] }] }] } } },
+        {
+          $project: {
+            _id: 0,
+            id: { $concat: ['$transaction_id', '.', '$stage', '.', '$tasks.key'] },
+            transaction_id: 1,
+            stage: 1,
+            status: { $literal: TEMPLATE_ITEM_DEFAULTS.status },
+            assignee: { $literal: TEMPLATE_ITEM_DEFAULTS.assignee },
+            priority: '$tasks.priority',
+            due_date: '$tasks.due_date',
+            est_duration_min: '$tasks.est_duration_min',
+            virtual: { $literal: true }
+          }
+        },
+        { $match: query },
+        // A stored (materialized) item replaces its template item
+        { $lookup: { from: 'checklist_items', localField: 'id', foreignField: 'id', as: 'stored' } },
+        { $match: { stored: { $size: 0 } } },
+        { $project: { stored: 0 } }
+      ]
+    }
+  }]
+}
+
+// checklist_items.find(query).sort(sort).limit(limit), including template items
+export async function findTasks(db, query, { sort = null, limit = 0 } = {}) {
+  let cursor = db.collection('checklist_items').find(query, { projection: { _id: 0 } })
+  if (sort) cursor = cursor.sort(sort)
+  if (limit) cursor = cursor.limit(limit)
+  const [stored, virtual] = await Promise.all([cursor.toArray(), findTemplateTasks(db, query)])
+  if (virtual.length === 0) return stored
+  const tasks = [...stored, ...virtual]
+  if (sort) tasks.sort(compareBy(sort))
+  return limit ? tasks.slice(0, limit) : tasks
+}
+
+export async function countTasks(db, query) {
+  const [stored, virtual] = await Promise.all([
+    db.collection('checklist_items').countDocuments(query),
+    findTemplateTasks(db, query)
+  ])
+  return stored + virtual.length
+}
+
+// A checklist item by id, stored or template-backed (marked virtual: true)
+export async function getChecklistItem(db, id, { session } = {}) {
+  const ref = parseTemplateItemId(id)
+  if (!ref) return db.collection('checklist_items').findOne({ id }, { session, projection: { _id: 0 } })
+  const items = await loadChecklistItems(db, { transaction_id: ref.transaction_id, stage: ref.stage }, { session })
+  return items.find(i => i.id === id) || null
+}
+
+// First write to a template item: store it with `update` applied, in one upsert, and drop it
+// from its seed's pending tasks. Returns the stored document.
+export async function materializeChecklistItem(db, item, update, session = undefined) {
+  const { virtual, ...doc } = item
+  const touched = new Set(Object.values(update).flatMap(fields => Object.keys(fields)))
+  const base = Object.fromEntries(Object.entries(doc).filter(([key]) => !touched.has(key)))
+  const stored = await db.collection('checklist_items').findOneAndUpdate(
+    { id: item.id },
+    { ...update, $setOnInsert: base },
+    { upsert: true, session, returnDocument: 'after', projection: { _id: 0 } }
+  )
+  // Only dated items are listed in the seed's pending tasks
+  const ref = item.due_date ? parseTemplateItemId(item.id) : null
+  if (ref) {
+    await db.collection(SEEDS).updateOne(
+      { transaction_id: ref.transaction_id, stage: ref.stage },
+      { $pull: { tasks: { key: ref.key } } },
+      { session }
+    )
+  }
+  return stored
+}
+
+// Deleting a template item records it on the seed so it isn't rebuilt from the template
+export function removeTemplateItem(db, id, session = undefined) {
+  const ref = parseTemplateItemId(id)
+  if (!ref) return null
+  return db.collection(SEEDS).updateOne(
+    { transaction_id: ref.transaction_id, stage: ref.stage },
+    { $addToSet: { removed: ref.key }, $pull: { tasks: { key: ref.key } } },
+    { session }
+  )
+}
+
+// Seed a stage's default checklist. Returns the new (virtual) items, or [] when the stage was
+// already seeded for this transaction. `write` runs the seed upsert (e.g. in withChecklistWrite).
+export async function seedChecklistStage(db, transactionId, stage, transactionType, write) {
+  await ensureChecklistTemplates(db)
+  const template = state().latest.get(`${templateType(transactionType)}:${stage}`)
+  if (!template || template.items.length === 0) return []
+  const seededAt = new Date()
+  const seed = {
+    transaction_id: transactionId,
+    stage,
+    template: template.id,
+    version: template.version,
+    stage_order: getStageOrder(stage, transactionType),
+    seeded_at: seededAt,
+    removed: [],
+    tasks: seedTasks(template, seededAt),
+    pending_only: true
+  }
+  const result = await write((session) =>
+    db.collection(SEEDS).updateOne({ transaction_id: transactionId, stage }, { $setOnInsert: seed }, { upsert: true, session })
+  )
+  return result?.upsertedCount ? expandSeed(seed, template) : []
+}
+
+export function deleteChecklistSeeds(db, transactionId) {
+  return db.collection(SEEDS).deleteMany({ transaction_id: transactionId })
+}
+
+// Templates and how much of the checklist they keep out of checklist_items. With a transaction
+// id, also that transaction's seeds.
+export async function getTemplateStorage(db, transactionId = null) {
+  await ensureChecklistTemplates(db)
+  const s = state()
+  const [seeds, stored, materialized, mine] = await Promise.all([
+    db.collection(SEEDS).find({}, { projection: { _id: 0, template: 1, version: 1, removed: 1 } }).toArray(),
+    db.collection('checklist_items').countDocuments({}),
+    db.collection('checklist_items').countDocuments({ template_key: { $exists: true } }),
+    transactionId ? db.collection(SEEDS).find({ transaction_id: transactionId }, { projection: { _id: 0 } }).toArray() : null
+  ])
+  let templateItems = 0
+  for (const seed of seeds) {
+    const template = s.versions.get(versionKey(seed.template, seed.version))
+    const count = template ? template.items.reduce((n, t) => n + 1 + t.subtasks.length, 0) : 0
+    templateItems += Math.max(0, count - (seed.removed || []).length)
+  }
+  return {
+    templates: [...s.versions.values()]
+      .map(t => ({ id: t.id, transaction_type: t.transaction_type, stage: t.stage, version: t.version, items: t.items.length, created_at: t.created_at }))
+      .sort((a, b) => a.id.localeCompare(b.id) || a.version - b.version),
+    storage: {
+      seeds: seeds.length,
+      stored_items: stored,
+      materialized_items: materialized,
+      template_items: templateItems,
+      template_items_not_stored: Math.max(0, templateItems - materialized)
+    },
+    ...(mine ? { seeds: mine } : {})
+  }
+}
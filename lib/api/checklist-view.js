@@ -0,0 +1,122 @@
+import { createHash } from 'crypto'
+import { getStageOrder } from '@/lib/api/checklists'
+import { estimateTaskDuration } from '@/lib/api/plans'
+import { compareBy, findTemplateTasks } from '@/lib/api/checklist-templates'
+
+// Read side of GET /api/transactions/:id/checklist. Items are normalized when they're written
+// (stage_order, weight, parent_id and est_duration_min are always set), so stored items are read
+// already sorted by the { transaction_id, ...SORT } index and the stage templates' items (see
+// checklist-templates.js) are merged into them in order; stored items from before that are
+// backfilled once per process. Every checklist
+// write bumps the transaction's checklist_version (rollups.js), which makes the ETag: unchanged
+// checklists are answered 304 after a single transaction lookup.
+const SORT = { stage_order: 1, order: 1, title: 1 }
+
+function state() {
+  return globalThis.__crmChecklistView || (globalThis.__crmChecklistView = { indexed: null })
+}
+
+export async function ensureChecklistIndexes(db) {
+  const s = state()
+  if (!s.indexed) {
+    s.indexed = (async () => {
+      try {
+        const coll = db.collection('checklist_items')
+        if (typeof coll.createIndex === 'function') {
+          await coll.createIndex({ transaction_id: 1, ...SORT })
+        }
+        const legacy = await coll.find(
+          { $or: [{ stage_order: { $exists: false } }, { weight: { $exists: false } }, { parent_id: { $exists: false } }, { est_duration_min: { $exists: false } }] },
+          { projection: { _id: 0, id: 1, transaction_id: 1, title: 1, stage: 1, stage_order: 1, weight: 1, parent_id: 1, est_duration_min: 1 } }
+        ).toArray()
+        if (legacy.length > 0) {
+          const transactionIds = [...new Set(legacy.map(i => i.transaction_id))]
+          const types = new Map((await db.collection('transactions')
+            .find({ id: { $in: transactionIds } }, { projection: { _id: 0, id: 1, transaction_type: 1 } })
+            .toArray()).map(t => [t.id, (t.transaction_type || 'sale').toLowerCase()]))
+          await coll.bulkWrite(legacy.map(item => ({
+            updateOne: {
+              filter: { id: item.id },
+              update: {
+                $set: {
+                  stage_order: typeof item.stage_order === 'number' && !Number.isNaN(item.stage_order)
+                    ? item.stage_order
+                    : getStageOrder(item.stage, types.get(item.transaction_id)),
+                  weight: typeof item.weight === 'number' && !Number.isNaN(item.weight) ? item.weight : 1,
+                  parent_id: item.parent_id ?? null,
+                  est_duration_min: Number(item.est_duration_min) > 0 ? Number(item.est_duration_min) : estimateTaskDuration(item.title)
+                }
+              }
+            }
+          })), { ordered: false })
+        }
+      } catch (e) {
+        console.warn('Checklist index error', e)
+      }
+    })()
+  }
+  return s.indexed
+}
+
+// Weak validator for one transaction's checklist as returned for this query string
+export function checklistETag(transaction, variant) {
+  const key = createHash('sha1').update(variant).digest('hex').slice(0, 12)
+  return `W/"${transaction.id}.${transaction.checklist_version || 0}.${key}"`
+}
+
+export function etagMatches(request, etag) {
+  const header = request.headers.get('if-none-match')
+  if (!header) return false
+  return header.split(',').some(tag => tag.trim() === etag || tag.trim() === '*')
+}
+
+// Stored items come back sorted from MongoDB; only the template items not yet materialized are
+// sorted here and merged in (stored first on ties)
+export async function findChecklistItems(db, query) {
+  const [stored, virtual] = await Promise.all([
+    db.collection('checklist_items').find(query, { projection: { _id: 0 } }).sort(SORT).toArray(),
+    findTemplateTasks(db, query)
+  ])
+  if (virtual.length === 0) return stored
+  const compare = compareBy(SORT)
+  virtual.sort(compare)
+  const items = []
+  let i = 0
+  let j = 0
+  while (i < stored.length && j < virtual.length) {
+    items.push(compare(virtual[j], stored[i]) < 0 ? virtual[j++] : stored[i++])
+  }
+  return items.concat(stored.slice(i), virtual.slice(j))
+}
+
+// Stages in order, each with its top-level items and their subtasks nested under `children`.
+// Items whose parent isn't in the result (e.g. filtered out by status) are listed top-level.
+export function buildChecklistTree(items) {
+  const ids = new Set(items.map(i => i.id))
+  const childrenOf = new Map()
+  for (const item of items) {
+    if (item.parent_id && ids.has(item.parent_id)) {
+      if (!childrenOf.has(item.parent_id)) childrenOf.set(item.parent_id, [])
+      childrenOf.get(item.parent_id).push(item)
+    }
+  }
+
+  const stages = []
+  const byStage = new Map()
+  for (const item of items) {
+    if (item.parent_id && ids.has(item.parent_id)) continue
+    let stage = byStage.get(item.stage)
+    if (!stage) {
+      stage = { stage: item.stage, stage_order: item.stage_order, total: 0, completed: 0, items: [] }
+      byStage.set(item.stage, stage)
+      stages.push(stage)
+    }
+    const children = childrenOf.get(item.id) || []
+    stage.items.push({ ...item, children })
+    for (const it of [item, ...children]) {
+      stage.total++
+      if (it.status === 'completed') stage.completed++
+    }
+  }
+  return stages
+}
@@ -0,0 +1,550 @@
+import { createHash } from 'crypto'
+import { callOpenAI, fitLinesToTokens } from '@/lib/api/openai'
+import { getStageRollup, rollupStageSummary, withChecklistWrite } from '@/lib/api/rollups'
+import { notifyChange } from '@/lib/api/invalidation'
+import { getLoader } from '@/lib/api/loader'
+import { replanTasks } from '@/lib/api/plans'
+import { seedChecklistStage } from '@/lib/api/checklist-templates'
+
+// Token budget for each item list in the validation prompt; large checklists are trimmed
+// (most important items first) rather than sent whole
+const ITEM_LIST_TOKENS = 1500
+const PRIORITY_RANK = { critical: 0, high: 1, medium: 2, low: 3 }
+const byPriority = (a, b) => (PRIORITY_RANK[a.priority || 'medium'] ?? 2) - (PRIORITY_RANK[b.priority || 'medium'] ?? 2)
+
+// STAGE_VALIDATION_MODE=rules (default): the deterministic rules below decide the transition
+// and o1-mini only writes an explanation, in the background, cached per transaction, stage
+// pair and checklist state. STAGE_VALIDATION_MODE=ai keeps the AI in the request path.
+export const STAGE_VALIDATION_MODE = process.env.STAGE_VALIDATION_MODE === 'ai' ? 'ai' : 'rules'
+const EXPLANATIONS = 'stage_validation_explanations'
+const CRITICAL_PRIORITIES = new Set(['critical', 'urgent', 'high'])
+
+function explanationState() {
+  return globalThis.__crmStageExplanations || (globalThis.__crmStageExplanations = { inFlight: new Set(), indexed: false })
+}
+
+function stagesForType(txType) {
+  return txType === 'purchase'
+    ? ['pre_approval','home_search','offer','under_contract','escrow_closing']
+    : ['pre_listing','listing','under_contract','escrow_closing']
+}
+
+// The deterministic rule engine: stage order, critical tasks, blocked items and dependencies
+export function evaluateStageRules({ stagesInOrder, currentStage, targetStage, incompleteItems, blockedItems, unmetDependencyItems }) {
+  const curIdx = stagesInOrder.indexOf(currentStage)
+  const tgtIdx = stagesInOrder.indexOf(targetStage)
+  const inOrder = curIdx !== -1 && tgtIdx !== -1 && tgtIdx <= curIdx + 1 && tgtIdx >= curIdx
+  const criticalItems = incompleteItems.filter(i => CRITICAL_PRIORITIES.has(i.priority))
+  const otherIncomplete = incompleteItems.length - criticalItems.length
+  const canProceed = inOrder && criticalItems.length === 0 && blockedItems.length === 0 && unmetDependencyItems.length === 0
+
+  const recommendations = []
+  if (!inOrder && curIdx !== -1 && stagesInOrder[curIdx + 1]) recommendations.push(`Move to ${stagesInOrder[curIdx + 1]} next`)
+  if (criticalItems.length > 0) recommendations.push('Complete high-priority tasks before proceeding')
+  if (blockedItems.length > 0) recommendations.push('Resolve blocked tasks')
+  if (unmetDependencyItems.length > 0) recommendations.push('Complete prerequisite tasks first')
+  if (canProceed && otherIncomplete > 0) recommendations.push('Remaining tasks can be finished in the next stage')
+
+  return {
+    valid: inOrder && incompleteItems.length === 0 && blockedItems.length === 0 && unmetDependencyItems.length === 0,
+    confidence: 100,
+    errors: [
+      ...(inOrder ? [] : ["Invalid stage order for this transaction type"]),
+      ...(criticalItems.length > 0 ? [`${criticalItems.length} incomplete high-priority tasks`] : []),
+      ...(blockedItems.length > 0 ? [`${blockedItems.length} blocked tasks`] : []),
+      ...(unmetDependencyItems.length > 0 ? [`${unmetDependencyItems.length} items with unmet dependencies`] : [])
+    ],
+    warnings: otherIncomplete > 0 ? [`${otherIncomplete} incomplete tasks`] : [],
+    missing_critical: criticalItems.map(i => i.title),
+    can_proceed_with_warnings: canProceed,
+    recommendations
+  }
+}
+
+function buildValidationMessages({ isBuyer, stagesInOrder, currentStage, targetStage, incompleteItems, blockedItems, unmetDependencyItems, force }) {
+  return [
+    {
+      role: "system",
+      content: `You are a real estate transaction expert. Analyze stage transitions for completeness and compliance.
+
+      Transaction type: ${isBuyer ? 'purchase (buyer)' : 'sale (seller)'}
+      Current stage: ${currentStage}
+      Target stage: ${targetStage}
+      
+      Stages in order for this flow:
+      ${stagesInOrder.map((s, i) => `${i+1}. ${s}`).join('\n')}
+      
+      Rules:
+      - All critical tasks must be completed before advancing
+      - Some tasks can be moved to next stage if reasonable
+      - Blocked items must be resolved
+      - Cannot skip stages (must go in order)
+      
+      Return JSON with:
+      {
+        "valid": boolean,
+        "confidence": number (0-100),
+        "errors": ["error messages"],
+        "warnings": ["warning messages"],
+        "missing_critical": ["critical task titles"],
+        "can_proceed_with_warnings": boolean,
+        "recommendations": ["suggestions"]
+      }`
+    },
+    {
+      role: "user", 
+      content: `Validate transition from "${currentStage}" to "${targetStage}".
+      
+      Incomplete items (${incompleteItems.length}):
+      ${fitLinesToTokens([...incompleteItems].sort(byPriority).map(item => `- ${item.title} (${item.priority || 'medium'} priority, status: ${item.status}${item.parent_id ? ', subtask' : ''})`), ITEM_LIST_TOKENS, 'o1-mini')}
+      
+      Blocked items (${blockedItems.length}):
+      ${fitLinesToTokens([...blockedItems].sort(byPriority).map(item => `- ${item.title} (blocked: ${item.notes})`), ITEM_LIST_TOKENS, 'o1-mini')}
+
+      Items with unmet dependencies (${unmetDependencyItems.length}):
+      ${fitLinesToTokens(unmetDependencyItems.map(x => `- ${x.title} (${x.unmet_count} unmet)`), ITEM_LIST_TOKENS, 'o1-mini')}
+      
+      Force override requested: ${force}
+      
+      Should this transition be allowed?`
+    }
+  ]
+}
+
+async function ensureExplanationIndexes(db) {
+  const s = explanationState()
+  if (s.indexed) return
+  s.indexed = true
+  try {
+    const coll = db.collection(EXPLANATIONS)
+    if (typeof coll.createIndex === 'function') {
+      await coll.createIndex({ key: 1 }, { unique: true })
+      await coll.createIndex({ transaction_id: 1 })
+    }
+  } catch (e) {
+    console.warn('Stage explanation index error', e)
+  }
+}
+
+const pushExplanationSSE = (payload) =>
+  notifyChange('transactions:changed', payload, ['transactions'], { transactionId: payload.id })
+
+// Ask o1-mini to explain a transition off the request path; one call per key at a time
+async function explainStageTransition(db, key, context) {
+  const { inFlight } = explanationState()
+  if (inFlight.has(key)) return
+  inFlight.add(key)
+  let status = 'failed'
+  try {
+    const response = await callOpenAI('o1-mini', buildValidationMessages(context), { priority: 'background' })
+    const ai = JSON.parse(response)
+    const explanation = {
+      valid: !!ai.valid,
+      confidence: ai.confidence,
+      errors: ai.errors || [],
+      warnings: ai.warnings || [],
+      missing_critical: ai.missing_critical || [],
+      can_proceed_with_warnings: !!ai.can_proceed_with_warnings,
+      recommendations: ai.recommendations || []
+    }
+    await db.collection(EXPLANATIONS).updateOne(
+      { key },
+      {
+        $set: { explanation, updated_at: new Date() },
+        $setOnInsert: {
+          key,
+          transaction_id: context.transactionId,
+          from_stage: context.currentStage,
+          to_stage: context.targetStage,
+          created_at: new Date()
+        }
+      },
+      { upsert: true }
+    )
+    status = 'ready'
+  } catch (e) {
+    console.error('Stage explanation error:', e)
+  } finally {
+    inFlight.delete(key)
+    pushExplanationSSE({ action: 'validation_explained', id: context.transactionId, validation_key: key, ai_explanation_status: status })
+  }
+}
+
+// Validate a stage transition (aware of buyer vs seller flows)
+export async function validateStageTransition(db, transactionId, currentStage, targetStage, force = false, { mode = STAGE_VALIDATION_MODE } = {}) {
+  try {
+    // Load transaction to determine flow type
+    const tx = await getLoader(db).load('transactions', transactionId)
+    const txType = (tx?.transaction_type || 'sale').toLowerCase()
+    const isBuyer = txType === 'purchase'
+    const stagesInOrder = stagesForType(txType)
+
+    // Precomputed completeness for the current stage (one indexed read)
+    const rollup = await getStageRollup(db, transactionId, currentStage)
+    const summary = rollupStageSummary(rollup)
+    const { incompleteItems, blockedItems } = summary
+    const context = { transactionId, isBuyer, stagesInOrder, currentStage, targetStage, force, ...summary }
+    const rules = evaluateStageRules(context)
+
+    let validationResult
+    let explanationFields = {}
+    if (mode === 'ai') {
+      try {
+        validationResult = { ...JSON.parse(await callOpenAI('o1-mini', buildValidationMessages(context))), decided_by: 'ai' }
+      } catch (parseError) {
+        validationResult = { ...rules, confidence: 70, decided_by: 'rules' }
+      }
+    } else {
+      validationResult = { ...rules, decided_by: 'rules' }
+      // A clean pass has nothing to explain
+      if (rules.errors.length > 0 || rules.warnings.length > 0) {
+        const key = createHash('sha1')
+          .update(`${transactionId}|${currentStage}|${targetStage}|${rollup.state_hash}`)
+          .digest('hex')
+        await ensureExplanationIndexes(db)
+        const cached = await db.collection(EXPLANATIONS).findOne({ key }, { projection: { _id: 0, explanation: 1 } })
+        if (cached?.explanation) {
+          explanationFields = { validation_key: key, ai_explanation_status: 'ready', ai_explanation: cached.explanation }
+        } else {
+          explanationFields = { validation_key: key, ai_explanation_status: 'pending' }
+          explainStageTransition(db, key, context).catch(() => {})
+        }
+      } else {
+        explanationFields = { ai_explanation_status: 'not_needed' }
+      }
+    }
+
+    return {
+      ...validationResult,
+      // Open low/medium-priority tasks don't block a transition the rules allow with warnings
+      valid: force || (validationResult.valid || validationResult.can_proceed_with_warnings),
+      ...explanationFields,
+      incomplete_count: incompleteItems.length,
+      blocked_count: blockedItems.length,
+      missing_tasks: incompleteItems.map(item => ({
+        id: item.id,
+        title: item.title,
+        priority: item.priority,
+        status: item.status
+      }))
+    }
+  } catch (error) {
+    console.error('Stage validation error:', error)
+    return {
+      valid: false,
+      confidence: 0,
+      errors: ["Validation service unavailable"],
+      warnings: [],
+      missing_critical: [],
+      can_proceed_with_warnings: false,
+      recommendations: ["Please try again or contact support"]
+    }
+  }
+}
+
+// Seed the default checklist for a stage (aware of transaction type). The items come from the
+// stage's checklist template and are only stored once they're changed (checklist-templates.js).
+// Returns the new items; a stage that was already seeded for the transaction returns [].
+export async function createDefaultChecklistItems(db, transactionId, stage, transactionType = 'sale') {
+  const created = await seedChecklistStage(db, transactionId, stage, transactionType, (write) =>
+    withChecklistWrite(db, transactionId, [stage], write)
+  )
+  if (created.length > 0) replanTasks(created)
+  return created
+}
+
+// Get stage order for sorting, branching by transaction type
+export function getStageOrder(stage, transactionType = 'sale') {
+  const sellerOrder = {
+    'pre_listing': 1,
+    'listing': 2,
+    'under_contract': 3,
+    'escrow_closing': 4
+  }
+  const buyerOrder = {
+    'pre_approval': 1,
+    'home_search': 2,
+    'offer': 3,
+    'under_contract': 4,
+    'escrow_closing': 5
+  }
+  const mapping = (transactionType === 'purchase') ? buyerOrder : sellerOrder
+  return mapping[stage] || 999
+}
+
+export function getDefaultTasksForStage(stage, transactionType = 'sale') {
+  // Seller (listing) flow tasks
+  const sellerTasks = {
+    'pre_listing': [
+      {
+        title: 'Property Condition Assessment',
+        description: 'Conduct thorough walkthrough to identify needed repairs and improvements',
+        priority: 'high',
+        due_days: 3,
+        weight: 2,
+        subtasks: [
+          { title: 'Schedule walkthrough', weight: 1 },
+          { title: 'Document issues & photos', weight: 1 }
+        ]
+      },
+      {
+        title: 'Comparative Market Analysis (CMA)',
+        description: 'Research comparable sales, active listings, and market trends',
+        priority: 'high',
+        due_days: 5,
+        weight: 1
+      },
+      {
+        title: 'Pricing Strategy Development',
+        description: 'Set competitive listing price based on CMA and market conditions',
+        priority: 'high',
+        due_days: 7,
+        weight: 1
+      },
+      {
+        title: 'Home Staging Consultation',
+        description: 'Evaluate staging needs and arrange professional staging if needed',
+        priority: 'medium',
+        due_days: 10,
+        weight: 1,
+        subtasks: [
+          { title: 'Hire stager', weight: 1 },
+          { title: 'Staging day scheduled', weight: 1 }
+        ]
+      },
+      {
+        title: 'Professional Photography Scheduling',
+        description: 'Book professional photographer for listing photos',
+        priority: 'high',
+        due_days: 12,
+        weight: 1,
+        subtasks: [
+          { title: 'Select photographer', weight: 0.5 },
+          { title: 'Photoshoot completed', weight: 0.5 }
+        ]
+      },
+      {
+        title: 'Marketing Materials Preparation',
+        description: 'Create flyers, brochures, and property feature sheets',
+        priority: 'medium',
+        due_days: 14,
+        weight: 1
+      },
+      {
+        title: 'Pre-Listing Inspections',
+        description: 'Schedule home, pest, and other recommended inspections',
+        priority: 'medium',
+        due_days: 14,
+        weight: 1,
+        subtasks: [
+          { title: 'Home inspection', weight: 0.5 },
+          { title: 'Pest inspection', weight: 0.5 }
+        ]
+      },
+      {
+        title: 'Listing Agreement Execution',
+        description: 'Sign listing agreement and review all terms with seller',
+        priority: 'urgent',
+        due_days: 1,
+        weight: 1
+      }
+    ],
+    'listing': [
+      {
+        title: 'MLS Entry and Syndication',
+        description: 'Enter property details in MLS and syndicate to major real estate websites',
+        priority: 'urgent',
+        due_days: 1,
+        weight: 1
+      },
+      {
+        title: 'Listing Photos Upload',
+        description: 'Upload high-quality photos to MLS and marketing platforms',
+        priority: 'high',
+        due_days: 1,
+        weight: 1
+      },
+      {
+        title: 'Property Description Optimization',
+        description: 'Write compelling property description highlighting key features',
+        priority: 'high',
+        due_days: 2
+      },
+      {
+        title: 'Social Media Marketing Campaign',
+        description: 'Create and launch social media marketing posts and ads',
+        priority: 'medium',
+        due_days: 3
+      },
+      {
+        title: 'Open House Scheduling',
+        description: 'Schedule and advertise open house events',
+        priority: 'medium',
+        due_days: 7
+      },
+      {
+        title: 'Showing Management System Setup',
+        description: 'Configure showing system and coordinate with seller',
+        priority: 'high',
+        due_days: 2
+      },
+      {
+        title: 'Lead Follow-up System',
+        description: 'Implement system to track and follow up with interested buyers',
+        priority: 'high',
+        due_days: 5
+      },
+      {
+        title: 'Market Feedback Collection',
+        description: 'Gather feedback from showings and adjust strategy as needed',
+        priority: 'medium',
+        due_days: 14
+      }
+    ],
+    'under_contract': [
+      {
+        title: 'Purchase Agreement Review',
+        description: 'Review all contract terms and conditions with client',
+        priority: 'urgent',
+        due_days: 1,
+        weight: 2,
+        subtasks: [
+          { title: 'Confirm contingencies', weight: 1 },
+          { title: 'Review timelines', weight: 1 }
+        ]
+      },
+      {
+        title: 'Earnest Money Deposit',
+        description: 'Collect and deposit earnest money per contract terms',
+        priority: 'urgent',
+        due_days: 2,
+        weight: 1
+      },
+      {
+        title: 'Home Inspection Coordination',
+        description: 'Schedule home inspection and coordinate access',
+        priority: 'high',
+        due_days: 7,
+        weight: 1,
+        subtasks: [
+          { title: 'Schedule inspector', weight: 0.5 },
+          { title: 'Distribute report', weight: 0.5 }
+        ]
+      },
+      {
+        title: 'Appraisal Scheduling',
+        description: 'Coordinate appraisal appointment with lender and appraiser',
+        priority: 'high',
+        due_days: 10
+      },
+      {
+        title: 'Loan Processing Follow-up',
+        description: 'Monitor buyer\'s loan application progress with lender',
+        priority: 'high',
+        due_days: 14
+      },
+      {
+        title: 'Inspection Response Negotiation',
+        description: 'Review inspection report and negotiate any needed repairs',
+        priority: 'high',
+        due_days: 10
+      },
+      {
+        title: 'Insurance Verification',
+        description: 'Verify buyer has secured homeowner\'s insurance',
+        priority: 'medium',
+        due_days: 20
+      },
+      {
+        title: 'Final Walk-through Scheduling',
+        description: 'Schedule final walk-through 24-48 hours before closing',
+        priority: 'medium',
+        due_days: 25
+      }
+    ],
+    'escrow_closing': [
+      {
+        title: 'Title Company Coordination',
+        description: 'Coordinate with title company and review title commitment',
+        priority: 'high',
+        due_days: 3
+      },
+      {
+        title: 'Closing Disclosure Review',
+        description: 'Review closing disclosure with client for accuracy',
+        priority: 'high',
+        due_days: 5
+      },
+      {
+        title: 'Final Walk-through Execution',
+        description: 'Complete final walk-through with buyer',
+        priority: 'high',
+        due_days: 1
+      },
+      {
+        title: 'Closing Document Preparation',
+        description: 'Ensure all closing documents are prepared and reviewed',
+        priority: 'urgent',
+        due_days: 2
+      },
+      {
+        title: 'Keys and Garage Remote Transfer',
+        description: 'Coordinate transfer of all keys, garage remotes, and access codes',
+        priority: 'high',
+        due_days: 1
+      },
+      {
+        title: 'Utility Transfer Coordination',
+        description: 'Assist with utility transfer arrangements',
+        priority: 'medium',
+        due_days: 3
+      },
+      {
+        title: 'Closing Day Coordination',
+        description: 'Attend closing and ensure smooth transaction completion',
+        priority: 'urgent',
+        due_days: 0
+      },
+      {
+        title: 'Post-Closing Follow-up',
+        description: 'Follow up with clients to ensure satisfaction and gather feedback',
+        priority: 'low',
+        due_days: 7
+      }
+    ]
+  }
+
+  // Buyer (purchase) flow tasks
+  const buyerTasks = {
+    'pre_approval': [
+      { title: 'Lender Introduction', description: 'Connect client with preferred lenders to start pre-approval', priority: 'high', due_days: 2 },
+      { title: 'Collect Financial Docs', description: 'Gather pay stubs, W-2s, bank statements for lender', priority: 'high', due_days: 5 },
+      { title: 'Pre-Approval Letter', description: 'Obtain pre-approval letter with target price range and loan program', priority: 'urgent', due_days: 7 }
+    ],
+    'home_search': [
+      { title: 'Define Search Criteria', description: 'Clarify location, beds/baths, budget, must-haves and nice-to-haves', priority: 'high', due_days: 2 },
+      { title: 'Auto-Search Setup', description: 'Set up MLS/autosearch alerts matching buyer preferences', priority: 'medium', due_days: 2 },
+      { title: 'Schedule Showings', description: 'Organize tours for top candidate properties', priority: 'medium', due_days: 7 }
+    ],
+    'offer': [
+      { title: 'Offer Strategy', description: 'Discuss comps, contingencies, timelines, and negotiation plan', priority: 'high', due_days: 1 },
+      { title: 'Draft Offer', description: 'Prepare purchase contract and required disclosures', priority: 'urgent', due_days: 1 },
+      { title: 'Submit Offer', description: 'Submit offer and confirm receipt with listing agent', priority: 'urgent', due_days: 1 }
+    ],
+    'under_contract': [
+      { title: 'Earnest Money Deposit', description: 'Deliver EMD per contract terms', priority: 'urgent', due_days: 2 },
+      { title: 'Inspection Scheduling', description: 'Coordinate inspections and review findings', priority: 'high', due_days: 7 },
+      { title: 'Appraisal Ordered', description: 'Confirm appraisal is ordered and scheduled', priority: 'high', due_days: 10 },
+      { title: 'Loan Processing', description: 'Monitor underwriting and provide any additional docs', priority: 'high', due_days: 14 }
+    ],
+    'escrow_closing': [
+      { title: 'Title Review', description: 'Review title commitment and address issues', priority: 'high', due_days: 3 },
+      { title: 'Closing Disclosure Review', description: 'Review CD with buyer and verify figures', priority: 'high', due_days: 5 },
+      { title: 'Final Walk-through', description: 'Confirm property condition prior to close', priority: 'medium', due_days: 1 },
+      { title: 'Closing Logistics', description: 'Coordinate signing, funds, and key handoff', priority: 'urgent', due_days: 0 }
+    ]
+  }
+
+  const templates = transactionType === 'purchase' ? buyerTasks : sellerTasks
+  return templates[stage] || []
+}
@@ -0,0 +1,94 @@
+import { getLoader } from '@/lib/api/loader'
+import { findTemplateTasks, templateTaskStages } from '@/lib/api/checklist-templates'
+
+// Ranking for GET /api/pmd/tasks (plan my day). The score is computed inside an aggregation
+// and the result is cut to one page there, so MongoDB keeps a top-K heap instead of the API
+// loading and sorting every open task an agent has. The score depends on the current time,
+// so it can't be stored; instead its inputs are turned into due-date cutoffs up front and
+// the pipeline only compares dates.
+const DAY_MS = 86400000
+export const DEFAULT_PAGE_SIZE = 50
+export const MAX_PAGE_SIZE = 200
+
+function state() {
+  return globalThis.__crmDayTasks || (globalThis.__crmDayTasks = { indexed: null })
+}
+
+export function ensureDayTaskIndexes(db) {
+  const s = state()
+  if (!s.indexed) {
+    s.indexed = (async () => {
+      try {
+        const coll = db.collection('checklist_items')
+        if (typeof coll.createIndex === 'function') {
+          await coll.createIndex({ due_date: 1, status: 1 })
+          await coll.createIndex({ assignee: 1, due_date: 1, status: 1 })
+        }
+      } catch (e) {
+        console.warn('Day task index error', e)
+      }
+    })()
+  }
+  return s.indexed
+}
+
+// Same points as before the ranking moved into MongoDB:
+//   overdue by k whole days: 10 + min(5, k); due within the last day: 8; within 3 days: 5
+//   priority urgent +6, high +3; estimated at 30 minutes or less (or unestimated) +2
+export function taskScoreExpression(now = new Date()) {
+  const at = (days) => new Date(now.getTime() + days * DAY_MS)
+  return {
+    $add: [
+      {
+        $switch: {
+          branches: [
+            ...[5, 4, 3, 2, 1].map(k => ({ case: { $lte: ['$due_date', at(-k)] }, then: 10 + k })),
+            { case: { $lte: ['$due_date', now] }, then: 8 },
+            { case: { $lte: ['$due_date', at(3)] }, then: 5 }
+          ],
+          default: 0
+        }
+      },
+      { $switch: { branches: [{ case: { $eq: ['$priority', 'urgent'] }, then: 6 }, { case: { $eq: ['$priority', 'high'] }, then: 3 }], default: 0 } },
+      { $cond: [{ $lte: [{ $ifNull: ['$est_duration_min', 0] }, 30] }, 2, 0] }
+    ]
+  }
+}
+
+// Open, dated tasks not dismissed for `date`, best first. `ids` restricts the result to those
+// tasks (e.g. the ones already in a saved plan) regardless of rank.
+export async function rankDayTasks(db, { date, agent = null, offset = 0, limit = DEFAULT_PAGE_SIZE, ids = null, now = new Date() }) {
+  await ensureDayTaskIndexes(db)
+  const match = { due_date: { $ne: null }, status: { $ne: 'completed' }, dismissed_dates: { $ne: date } }
+  if (agent) match.assignee = agent
+  if (ids) match.id = { $in: ids }
+
+  // One extra row tells us whether there's another page without counting the whole set.
+  // Template items that haven't been stored yet are ranked in the same aggregation.
+  let rows = await db.collection('checklist_items').aggregate([
+    { $match: match },
+    ...(await templateTaskStages(db, match)),
+    { $addFields: { ai_score: taskScoreExpression(now) } },
+    { $sort: { ai_score: -1, due_date: 1, id: 1 } },
+    { $skip: offset },
+    { $limit: limit + 1 },
+    { $project: { _id: 0 } }
+  ]).toArray()
+  // ...and only those on the page are expanded into full items
+  const virtualIds = rows.filter(t => t.virtual).map(t => t.id)
+  if (virtualIds.length > 0) {
+    const full = new Map((await findTemplateTasks(db, { id: { $in: virtualIds } })).map(t => [t.id, t]))
+    rows = rows.map(t => (t.virtual ? { ...t, ...full.get(t.id), ai_score: t.ai_score } : t))
+  }
+
+  const tasks = rows.slice(0, limit)
+  const txMap = await getLoader(db).loadMany('transactions', tasks.map(t => t.transaction_id))
+  return {
+    tasks: tasks.map(t => ({
+      ...t,
+      client_name: t.client_name || txMap.get(t.transaction_id)?.client_name || null,
+      property_address: t.property_address || txMap.get(t.transaction_id)?.property_address || null
+    })),
+    has_more: rows.length > limit
+  }
+}
@@ -0,0 +1,131 @@
+import { counter, gauge, histogram, getMetric, quantileFromBuckets } from '@/lib/api/metrics'
+import { getRequestContext } from '@/lib/api/request-context'
+
+// MongoDB command and connection-pool monitoring. Per collection and operation we keep a
+// latency histogram, error count and the number of documents returned or written.
+const commandDuration = histogram('crm_db_command_duration_seconds', 'MongoDB command latency', ['collection', 'operation'])
+const commandErrors = counter('crm_db_command_errors_total', 'Failed MongoDB commands', ['collection', 'operation'])
+const commandDocuments = counter('crm_db_documents_total', 'Documents returned or written by MongoDB commands', ['collection', 'operation'])
+const poolConnections = gauge('crm_db_pool_connections', 'MongoDB pool connections by state', ['state'])
+const poolCheckoutFailures = counter('crm_db_pool_checkout_failures_total', 'Failed connection checkouts', ['reason'])
+const poolCheckoutWait = histogram('crm_db_pool_checkout_wait_seconds', 'Time spent waiting for a pooled connection')
+const requestRoundTrips = histogram('crm_http_db_round_trips', 'MongoDB commands issued per API request', ['method', 'route'], [0, 1, 2, 3, 5, 8, 13, 21, 34, 55])
+
+// Shared with the instrumentation bundle, which is where the client is usually created
+const monitor = globalThis.__crmDbMonitor || (globalThis.__crmDbMonitor = { attached: false })
+
+// Commands whose value is the collection name; anything else (hello, ping, auth,
+// endSessions, ...) is driver housekeeping and isn't recorded.
+const COLLECTION_COMMANDS = new Set([
+  'find', 'insert', 'update', 'delete', 'aggregate', 'count', 'distinct',
+  'findAndModify', 'createIndexes', 'listIndexes', 'getMore'
+])
+
+function documentCount(commandName, reply = {}) {
+  switch (commandName) {
+    case 'find':
+    case 'aggregate':
+    case 'getMore': {
+      const batch = reply.cursor?.firstBatch || reply.cursor?.nextBatch
+      return Array.isArray(batch) ? batch.length : 0
+    }
+    case 'update':
+      return Number(reply.nModified ?? reply.n) || 0
+    case 'findAndModify':
+      return reply.value ? 1 : 0
+    case 'distinct':
+      return Array.isArray(reply.values) ? reply.values.length : 0
+    default:
+      return Number(reply.n) || 0
+  }
+}
+
+export function attachDbMonitoring(client) {
+  const pending = new Map()
+  monitor.attached = client.options?.monitorCommands !== false
+
+  client.on('commandStarted', (event) => {
+    if (!COLLECTION_COMMANDS.has(event.commandName)) return
+    const command = event.command || {}
+    const collection = event.commandName === 'getMore' ? command.collection : command[event.commandName]
+    if (typeof collection !== 'string') return
+    pending.set(event.requestId, { collection, operation: event.commandName })
+    // Attributed to the API request whose async context issued the command
+    const context = getRequestContext()
+    if (context) context.dbRoundTrips = (context.dbRoundTrips || 0) + 1
+  })
+
+  client.on('commandSucceeded', (event) => {
+    const started = pending.get(event.requestId)
+    if (!started) return
+    pending.delete(event.requestId)
+    commandDuration.observe(started, (Number(event.duration) || 0) / 1000)
+    commandDocuments.inc(started, documentCount(event.commandName, event.reply))
+  })
+
+  client.on('commandFailed', (event) => {
+    const started = pending.get(event.requestId)
+    if (!started) return
+    pending.delete(event.requestId)
+    commandDuration.observe(started, (Number(event.duration) || 0) / 1000)
+    commandErrors.inc(started)
+  })
+
+  client.on('connectionCreated', () => poolConnections.inc({ state: 'open' }))
+  client.on('connectionClosed', () => poolConnections.dec({ state: 'open' }))
+  client.on('connectionCheckedOut', (event) => {
+    poolConnections.inc({ state: 'in_use' })
+    // durationMS is only reported by newer drivers
+    if (typeof event.durationMS === 'number') poolCheckoutWait.observe({}, event.durationMS / 1000)
+  })
+  client.on('connectionCheckedIn', () => poolConnections.dec({ state: 'in_use' }))
+  client.on('connectionCheckOutFailed', (event) => poolCheckoutFailures.inc({ reason: event.reason || 'unknown' }))
+}
+
+// Round trips made while handling one request (see runWithRequestContext); null when
+// command monitoring is off, since nothing is counted then
+export function recordRequestRoundTrips(context, method, route) {
+  if (!monitor.attached || !context) return null
+  const count = context.dbRoundTrips || 0
+  requestRoundTrips.observe({ method, route }, count)
+  return count
+}
+
+// JSON view of the command metrics, one row per collection + operation
+export function getDbMetrics() {
+  const duration = getMetric('crm_db_command_duration_seconds')
+  const errors = getMetric('crm_db_command_errors_total')
+  const docs = getMetric('crm_db_documents_total')
+  const pool = getMetric('crm_db_pool_connections')
+  const failures = getMetric('crm_db_pool_checkout_failures_total')
+
+  const commands = []
+  for (const [key, s] of duration.series) {
+    const totalMs = s.sum * 1000
+    commands.push({
+      collection: s.labels.collection,
+      operation: s.labels.operation,
+      count: s.count,
+      errors: errors.series.get(key)?.value || 0,
+      documents: docs.series.get(key)?.value || 0,
+      total_ms: Math.round(totalMs * 1000) / 1000,
+      avg_ms: s.count ? Math.round((totalMs / s.count) * 1000) / 1000 : 0,
+      p95_ms: quantileFromBuckets(duration.buckets, s.counts, 0.95) * 1000
+    })
+  }
+  commands.sort((a, b) => b.total_ms - a.total_ms)
+
+  return {
+    commands,
+    totals: {
+      count: commands.reduce((n, c) => n + c.count, 0),
+      errors: commands.reduce((n, c) => n + c.errors, 0),
+      total_ms: Math.round(commands.reduce((n, c) => n + c.total_ms, 0) * 1000) / 1000
+    },
+    pool: {
+      open: pool.series.get('open')?.value || 0,
+      in_use: pool.series.get('in_use')?.value || 0,
+      checkout_failures: [...failures.series.values()].reduce((n, s) => n + s.value, 0)
+    }
+  }
+}
@@ -0,0 +1,146 @@
+import { v4 as uuidv4 } from 'uuid'
+import { MongoClient } from 'mongodb'
+import { timePhase } from '@/lib/api/startup'
+import { attachDbMonitoring } from '@/lib/api/db-metrics'
+
+// MongoDB connection. Cached on globalThis so the instrumentation hook, the API route
+// bundle and dev hot reloads all share one client.
+const mongo = globalThis.__crmMongo || (globalThis.__crmMongo = { client: null, db: null, connecting: null })
+
+export async function connectToMongo() {
+  // Return existing connection if available
+  if (mongo.db) return mongo.db
+
+  // Concurrent callers during a cold start share a single connect()
+  if (!mongo.connecting) {
+    mongo.connecting = openConnection().finally(() => { mongo.connecting = null })
+  }
+  return mongo.connecting
+}
+
+// The MongoClient behind connectToMongo(), for sessions/transactions; null for the in-memory stub
+export function getMongoClient() {
+  return mongo.client
+}
+
+// Start connecting without waiting on it, so the first request finds the connection
+// ready (or already in flight) instead of paying for the handshake itself.
+export function warmMongo() {
+  return connectToMongo().catch((e) => {
+    console.warn('MongoDB warm-up failed', e)
+    return null
+  })
+}
+
+// Pool sizing and timeouts from the environment; unset values keep the driver defaults
+function mongoClientOptions() {
+  const num = (name) => {
+    const raw = process.env[name]
+    if (raw === undefined || raw === '') return undefined
+    const value = Number(raw)
+    return Number.isFinite(value) ? value : undefined
+  }
+  const options = {
+    maxPoolSize: num('MONGO_MAX_POOL_SIZE'),
+    minPoolSize: num('MONGO_MIN_POOL_SIZE'),
+    maxConnecting: num('MONGO_MAX_CONNECTING'),
+    maxIdleTimeMS: num('MONGO_MAX_IDLE_TIME_MS'),
+    waitQueueTimeoutMS: num('MONGO_WAIT_QUEUE_TIMEOUT_MS'),
+    connectTimeoutMS: num('MONGO_CONNECT_TIMEOUT_MS'),
+    socketTimeoutMS: num('MONGO_SOCKET_TIMEOUT_MS'),
+    serverSelectionTimeoutMS: num('MONGO_SERVER_SELECTION_TIMEOUT_MS'),
+    // Command monitoring feeds GET /api/metrics/db; set MONGO_MONITOR_COMMANDS=0 to turn it off
+    monitorCommands: process.env.MONGO_MONITOR_COMMANDS !== '0'
+  }
+  return Object.fromEntries(Object.entries(options).filter(([, v]) => v !== undefined))
+}
+
+async function openConnection() {
+  const url = process.env.MONGO_URL
+  const name = process.env.DB_NAME
+
+  // Development fallback: use an in-memory stub when env vars are missing
+  if (!url || !name) {
+    console.warn('⚠️  MONGO_URL or DB_NAME not set – using in-memory stub DB (development only).')
+    mongo.db = {
+      _data: {},
+      collection(col) {
+        if (!this._data[col]) this._data[col] = []
+        const list = this._data[col]
+        return {
+          find(query = {}) {
+            // minimal filter support for equality on top-level fields
+            const matches = (doc) => {
+              for (const [k, v] of Object.entries(query || {})) {
+                if (doc[k] !== v) return false
+              }
+              return true
+            }
+            const results = list.filter(matches)
+            return {
+              sort: () => ({
+              toArray: async () => results,
+              limit: () => ({ toArray: async () => results })
+            }),
+              limit: () => ({ toArray: async () => results }),
+              toArray: async () => results
+            }
+          },
+          findOne(filter = {}) {
+            return list.find((d) => d.id === filter.id)
+          },
+          countDocuments: async (filter = undefined) => {
+            if (!filter || Object.keys(filter).length === 0) return list.length
+            return list.filter((d) => {
+              for (const [k, v] of Object.entries(filter)) { if (d[k] !== v) return false }
+              return true
+            }).length
+          },
+          insertOne: async (doc) => {
+            const id = doc.id || uuidv4()
+            list.push({ ...doc, id })
+            return { insertedId: id }
+          },
+          updateOne: async (filter, { $set }) => {
+            const idx = list.findIndex((d) => d.id === filter.id)
+            if (idx !== -1) {
+              list[idx] = { ...list[idx], ...$set }
+              return { matchedCount: 1 }
+            }
+            return { matchedCount: 0 }
+          },
+          deleteMany: async (filter = {}) => {
+            const keep = []
+            let deletedCount = 0
+            for (const d of list) {
+              let match = true
+              for (const [k, v] of Object.entries(filter)) { if (d[k] !== v) { match = false; break } }
+              if (match) { deletedCount++ } else { keep.push(d) }
+            }
+            // mutate the original array in place
+            list.length = 0
+            for (const d of keep) list.push(d)
+            return { deletedCount }
+          },
+          deleteOne: async (filter) => {
+            const idx = list.findIndex((d) => d.id === filter.id)
+            if (idx !== -1) {
+              list.splice(idx, 1)
+              return { deletedCount: 1 }
+            }
+            return { deletedCount: 0 }
+          }
+        }
+      }
+    }
+    return mongo.db
+  }
+
+  // Normal Mongo connection
+  const client = new MongoClient(url, mongoClientOptions())
+  attachDbMonitoring(client)
+  await timePhase('mongo_connect', () => client.connect())
+  mongo.client = client
+  mongo.db = client.db(name)
+  return mongo.db
+}
@@ -0,0 +1,158 @@
+import { callOpenAI, fitLinesToTokens } from '@/lib/api/openai'
+import { findTransactionByAddress } from '@/lib/api/address'
+import { getTransactionRollups, rollupOverdue } from '@/lib/api/rollups'
+
+// Token budget for each checklist list in the analysis prompt
+const ITEM_LIST_TOKENS = 2000
+
+// Deal Summary Generation with o1-mini
+export async function generateDealSummary(db, propertyAddress) {
+  try {
+    // Find transaction by normalized address key, falling back to the fuzzy token index
+    const found = await findTransactionByAddress(db, propertyAddress, { projection: { id: 1 } })
+    const transaction = found?.transaction
+
+    if (!transaction) {
+      return {
+        success: false,
+        error: "Transaction not found",
+        property_address: propertyAddress
+      }
+    }
+
+    return {
+      ...(await generateDealSummaryById(db, transaction.id)),
+      address_match: { type: found.match, score: Math.round(found.score * 100) / 100 }
+    }
+  } catch (error) {
+    console.error('Deal summary error:', error)
+    return {
+      success: false,
+      error: "Failed to generate summary"
+    }
+  }
+}
+
+export async function generateDealSummaryById(db, transactionId) {
+  try {
+    // Get transaction details
+    const transaction = await db.collection('transactions').findOne({ id: transactionId })
+    if (!transaction) {
+      return {
+        success: false,
+        error: "Transaction not found"
+      }
+    }
+
+    // Per-stage rollups (one indexed read) instead of every checklist item
+    const rollups = (await getTransactionRollups(db, [transactionId])).get(transactionId) || []
+    const now = new Date()
+    const overdueTasks = rollups.flatMap(r => rollupOverdue(r, now))
+
+    // Stage completion
+    const currentRollup = rollups.find(r => r.stage === transaction.current_stage)
+    const currentStageItems = currentRollup?.items || []
+    const completedStageItems = currentStageItems.filter(item => item.status === 'completed')
+    const stageProgress = currentRollup?.progress || 0
+
+    // Use o1-mini for intelligent deal analysis
+    const analysisMessages = [
+      {
+        role: "system",
+        content: `You are a real estate deal analyst. Analyze the transaction data and provide a comprehensive summary with actionable insights.
+
+        Focus on:
+        - Current stage status and progress
+        - Critical overdue items requiring immediate attention
+        - Key next steps to keep the deal moving
+        - Risk factors and recommendations
+        - Timeline insights and potential delays
+
+        Return structured JSON with:
+        {
+          "summary": "Brief deal overview",
+          "current_status": "Current stage analysis",
+          "progress_assessment": "Overall progress evaluation",
+          "critical_actions": ["List of urgent actions needed"],
+          "overdue_risks": "Analysis of overdue items impact",
+          "next_steps": ["Prioritized next steps"],
+          "recommendations": ["Strategic recommendations"],
+          "timeline_outlook": "Timeline assessment and closing likelihood"
+        }`
+      },
+      {
+        role: "user",
+        content: `Analyze this real estate transaction:
+
+        Property: ${transaction.property_address}
+        Client: ${transaction.client_name}
+        Type: ${transaction.transaction_type}
+        Current Stage: ${transaction.current_stage}
+        Stage Progress: ${stageProgress}% (${completedStageItems.length}/${currentStageItems.length} tasks)
+        
+        Overdue Tasks (${overdueTasks.length}):
+        ${fitLinesToTokens(
+          [...overdueTasks].sort((a, b) => new Date(a.due_date) - new Date(b.due_date))
+            .map(task => `- ${task.title} (${task.priority} priority, due ${new Date(task.due_date).toLocaleDateString()})`),
+          ITEM_LIST_TOKENS, 'o1-mini'
+        )}
+        
+        Current Stage Items:
+        ${fitLinesToTokens(
+          // Open items first; completed ones are the first to be trimmed
+          [...currentStageItems].sort((a, b) => (a.status === 'completed') - (b.status === 'completed'))
+            .map(item => `- ${item.title}: ${item.status} (${item.priority})`),
+          ITEM_LIST_TOKENS, 'o1-mini'
+        )}
+        
+        Transaction Created: ${new Date(transaction.created_at).toLocaleDateString()}
+        Last Updated: ${new Date(transaction.updated_at).toLocaleDateString()}
+        
+        Provide comprehensive analysis and actionable recommendations.`
+      }
+    ]
+
+    const aiAnalysis = await callOpenAI('o1-mini', analysisMessages)
+    let analysisResult
+
+    try {
+      analysisResult = JSON.parse(aiAnalysis)
+    } catch (parseError) {
+      // Fallback analysis
+      analysisResult = {
+        summary: `${transaction.property_address} - ${transaction.current_stage} stage with ${stageProgress}% completion`,
+        current_status: `Currently in ${transaction.current_stage} stage`,
+        progress_assessment: stageProgress >= 75 ? "Good progress" : stageProgress >= 50 ? "Moderate progress" : "Needs attention",
+        critical_actions: overdueTasks.slice(0, 3).map(task => task.title),
+        overdue_risks: overdueTasks.length > 0 ? "Multiple overdue tasks may delay closing" : "No overdue tasks",
+        next_steps: currentStageItems.filter(item => item.status === 'not_started').slice(0, 3).map(item => item.title),
+        recommendations: ["Review overdue tasks", "Update task assignments", "Set realistic deadlines"],
+        timeline_outlook: "Timeline assessment pending detailed review"
+      }
+    }
+
+    return {
+      success: true,
+      transaction: {
+        ...transaction,
+        _id: undefined
+      },
+      checklist_summary: {
+        total_tasks: rollups.reduce((sum, r) => sum + r.total, 0),
+        completed_tasks: rollups.reduce((sum, r) => sum + r.completed, 0),
+        overdue_tasks: overdueTasks.length,
+        current_stage_progress: stageProgress,
+        current_stage_tasks: currentStageItems.length
+      },
+      overdue_tasks: overdueTasks,
+      ai_analysis: analysisResult,
+      generated_at: new Date()
+    }
+  } catch (error) {
+    console.error('Deal summary generation error:', error)
+    return {
+      success: false,
+      error: "Failed to generate deal summary"
+    }
+  }
+}
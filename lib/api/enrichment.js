@@ -0,0 +1,151 @@
+import { v4 as uuidv4 } from 'uuid'
+import { connectToMongo } from '@/lib/api/db'
+import { generateLeadInsights } from '@/lib/api/leads'
+import { timeScheduler } from '@/lib/api/telemetry'
+import { notifyChange } from '@/lib/api/invalidation'
+
+// Lead AI-insight enrichment. New leads are stored with ai_insights_status 'pending' and a
+// job in lead_enrichment_jobs; a small worker pool claims jobs one at a time with
+// findOneAndUpdate, so several app instances can share the queue and jobs left running
+// by a crashed process are picked up again once their lease expires.
+// LEAD_ENRICHMENT_MODE=sync keeps the old behaviour of enriching inside the request.
+export const ENRICHMENT_MODE = process.env.LEAD_ENRICHMENT_MODE === 'sync' ? 'sync' : 'async'
+const CONCURRENCY = Math.max(1, Number(process.env.LEAD_ENRICHMENT_CONCURRENCY) || 2)
+const LEASE_MS = 5 * 60 * 1000
+const MAX_ATTEMPTS = 3
+const RETRY_DELAY_MS = 30 * 1000
+const RECONCILE_MS = 60 * 1000
+
+const JOBS = 'lead_enrichment_jobs'
+
+function state() {
+  return globalThis.__crmEnrichment || (globalThis.__crmEnrichment = { active: 0, rerun: false, indexed: false, reconciler: null })
+}
+
+const pushSSE = (payload) => notifyChange('leads:changed', payload, ['leads'])
+
+async function ensureIndexes(db) {
+  const s = state()
+  if (s.indexed) return
+  s.indexed = true
+  try {
+    const coll = db.collection(JOBS)
+    if (typeof coll.createIndex === 'function') {
+      await coll.createIndex({ status: 1, available_at: 1 })
+      await coll.createIndex({ lead_id: 1 })
+    }
+  } catch (e) {
+    console.warn('Enrichment index error', e)
+  }
+}
+
+// Queue enrichment for one or more lead ids and wake the workers
+export async function enqueueLeadEnrichment(db, leadIds) {
+  const ids = (Array.isArray(leadIds) ? leadIds : [leadIds]).filter(Boolean)
+  if (ids.length === 0) return
+  await ensureIndexes(db)
+  const now = new Date()
+  const jobs = ids.map(leadId => ({
+    id: uuidv4(),
+    lead_id: leadId,
+    status: 'queued',
+    attempts: 0,
+    available_at: now,
+    created_at: now,
+    updated_at: now
+  }))
+  if (jobs.length === 1) await db.collection(JOBS).insertOne(jobs[0])
+  else await db.collection(JOBS).insertMany(jobs, { ordered: false })
+  kickEnrichmentWorkers()
+}
+
+async function claimJob(db) {
+  const now = new Date()
+  return db.collection(JOBS).findOneAndUpdate(
+    {
+      $or: [
+        { status: 'queued', available_at: { $lte: now } },
+        // Lease expired: the worker that held it died mid-job
+        { status: 'running', locked_until: { $lt: now } }
+      ]
+    },
+    { $set: { status: 'running', locked_until: new Date(now.getTime() + LEASE_MS), updated_at: now }, $inc: { attempts: 1 } },
+    { sort: { available_at: 1 }, returnDocument: 'after' }
+  )
+}
+
+async function processJob(db, job) {
+  const leads = db.collection('leads')
+  const lead = await leads.findOne({ id: job.lead_id })
+  if (!lead) {
+    await db.collection(JOBS).deleteOne({ id: job.id })
+    return
+  }
+
+  try {
+    const insights = await generateLeadInsights(lead, [], { priority: 'background' })
+    await leads.updateOne(
+      { id: lead.id },
+      { $set: { ai_insights: insights || lead.ai_insights || null, ai_insights_status: insights ? 'ready' : 'failed', updated_at: new Date() } }
+    )
+    await db.collection(JOBS).deleteOne({ id: job.id })
+    pushSSE({ action: 'insights', id: lead.id, ai_insights_status: insights ? 'ready' : 'failed' })
+  } catch (e) {
+    console.warn('Lead enrichment failed', lead.id, e)
+    const now = new Date()
+    if ((job.attempts || 0) < MAX_ATTEMPTS) {
+      await db.collection(JOBS).updateOne(
+        { id: job.id },
+        { $set: { status: 'queued', available_at: new Date(now.getTime() + RETRY_DELAY_MS * job.attempts), last_error: String(e?.message || e), updated_at: now } }
+      )
+      return
+    }
+    await db.collection(JOBS).updateOne({ id: job.id }, { $set: { status: 'failed', last_error: String(e?.message || e), updated_at: now } })
+    await leads.updateOne({ id: lead.id }, { $set: { ai_insights_status: 'failed', updated_at: now } })
+    pushSSE({ action: 'insights', id: lead.id, ai_insights_status: 'failed' })
+  }
+}
+
+async function runWorker() {
+  const s = state()
+  try {
+    const db = await connectToMongo()
+    await ensureIndexes(db)
+    for (;;) {
+      const job = await claimJob(db)
+      if (!job) break
+      await timeScheduler('lead_enrichment', () => processJob(db, job))
+    }
+  } catch (e) {
+    console.warn('Lead enrichment worker error', e)
+  } finally {
+    s.active--
+    // Jobs enqueued while every worker was busy draining are picked up by a fresh pass
+    if (s.rerun && s.active === 0) {
+      s.rerun = false
+      kickEnrichmentWorkers()
+    }
+  }
+}
+
+// Start workers up to the concurrency limit; idle workers exit when the queue is empty
+export function kickEnrichmentWorkers() {
+  const s = state()
+  if (s.active >= CONCURRENCY) {
+    s.rerun = true
+    return
+  }
+  while (s.active < CONCURRENCY) {
+    s.active++
+    runWorker()
+  }
+}
+
+// Periodic sweep for retries, expired leases and jobs queued by other instances
+export function startEnrichmentQueue() {
+  const s = state()
+  if (s.reconciler) return
+  kickEnrichmentWorkers()
+  s.reconciler = setInterval(kickEnrichmentWorkers, RECONCILE_MS)
+  if (typeof s.reconciler.unref === 'function') s.reconciler.unref()
+}
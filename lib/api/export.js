@@ -0,0 +1,210 @@
+import { ObjectId } from 'mongodb'
+import { counter } from '@/lib/api/metrics'
+import { compareBy, loadChecklistItems } from '@/lib/api/checklist-templates'
+
+// Streaming exports for reports (GET /api/export/:resource). Rows are read from a MongoDB cursor
+// in _id order and written as NDJSON or CSV by a pull-based ReadableStream: the next batch is
+// only read once the client has taken the previous one, so an export holds about one batch in
+// memory however many rows it has and however slowly it's read. The last row of every batch
+// carries `_cursor`, an opaque token; ?cursor=<token> resumes right after that row (with the
+// same filters). Checklists are exported a transaction at a time (stored and template items,
+// see checklist-templates.js), so their tokens and `limit` fall on transaction boundaries.
+const BATCH_SIZE = Math.max(1, Number(process.env.EXPORT_BATCH_SIZE) || 1000)
+const CHECKLIST_TRANSACTION_BATCH = 100
+const CHECKLIST_SORT = { stage_order: 1, order: 1, title: 1 }
+const FIELD = /^[A-Za-z0-9]\w*(\.\w+)*$/
+
+const exportedRows = counter('crm_export_rows_total', 'Rows written by streaming exports', ['resource', 'format'])
+
+export class ExportError extends Error {
+  constructor(status, message) {
+    super(message)
+    this.status = status
+  }
+}
+
+// Query-string filters (param -> field) and the default CSV columns of each export
+export const RESOURCES = {
+  transactions: {
+    collection: 'transactions',
+    filters: { status: 'status', agent: 'assigned_agent', stage: 'current_stage', type: 'transaction_type' },
+    columns: ['id', 'property_address', 'client_name', 'client_email', 'client_phone', 'transaction_type', 'current_stage', 'status', 'assigned_agent', 'created_at', 'updated_at']
+  },
+  leads: {
+    collection: 'leads',
+    filters: { status: 'status', agent: 'assigned_agent', source: 'source', lead_type: 'lead_type' },
+    columns: ['id', 'name', 'email', 'phone', 'lead_type', 'status', 'source', 'assigned_agent', 'created_at', 'updated_at']
+  },
+  checklists: {
+    collection: 'transactions',
+    filters: { transaction_id: 'id', agent: 'assigned_agent' },
+    itemFilters: { stage: 'stage', status: 'status', assignee: 'assignee' },
+    columns: ['id', 'transaction_id', 'stage', 'parent_id', 'title', 'status', 'priority', 'assignee', 'due_date', 'completed_date', 'created_at', 'updated_at']
+  }
+}
+
+function encodeCursor(resource, after) {
+  return Buffer.from(JSON.stringify({ r: resource, a: after.toHexString() })).toString('base64url')
+}
+
+function decodeCursor(resource, token) {
+  try {
+    const { r, a } = JSON.parse(Buffer.from(token, 'base64url').toString())
+    if (r === resource && /^[0-9a-f]{24}$/.test(a)) return new ObjectId(a)
+  } catch (_) { /* invalid below */ }
+  throw new ExportError(400, `cursor is not a ${resource} export cursor`)
+}
+
+const filtersFrom = (map, params) =>
+  Object.fromEntries(Object.entries(map || {}).filter(([param]) => params.get(param)).map(([param, field]) => [field, params.get(param)]))
+
+// Validate the query string of GET /api/export/:resource
+export function prepareExport(resource, params) {
+  const spec = RESOURCES[resource]
+  if (!spec) throw new ExportError(404, `Unknown export ${resource}; one of ${Object.keys(RESOURCES).join(', ')}`)
+  const format = params.get('format') || 'ndjson'
+  if (!['ndjson', 'csv'].includes(format)) throw new ExportError(400, 'format must be ndjson or csv')
+  const fields = params.get('fields') ? params.get('fields').split(',').map(f => f.trim()).filter(Boolean) : null
+  const invalid = (fields || []).filter(f => !FIELD.test(f))
+  if (invalid.length > 0) throw new ExportError(400, `Invalid fields: ${invalid.join(', ')}`)
+  const limit = params.get('limit') ? Number(params.get('limit')) : 0
+  if (!Number.isInteger(limit) || limit < 0) throw new ExportError(400, 'limit must be a positive integer')
+  return {
+    resource,
+    spec,
+    format,
+    fields,
+    columns: fields || spec.columns,
+    limit,
+    after: params.get('cursor') ? decodeCursor(resource, params.get('cursor')) : null,
+    query: filtersFrom(spec.filters, params),
+    itemQuery: filtersFrom(spec.itemFilters, params)
+  }
+}
+
+const valueAt = (doc, field) => field.split('.').reduce((v, key) => (v == null ? undefined : v[key]), doc)
+
+function pick(doc, fields) {
+  const out = {}
+  for (const field of fields) {
+    const value = valueAt(doc, field)
+    if (value === undefined) continue
+    const keys = field.split('.')
+    let target = out
+    for (const key of keys.slice(0, -1)) target = target[key] ??= {}
+    target[keys[keys.length - 1]] = value
+  }
+  return out
+}
+
+function csvCell(value) {
+  if (value === null || value === undefined) return ''
+  const text = value instanceof Date ? value.toISOString() : typeof value === 'object' ? JSON.stringify(value) : String(value)
+  return /[",\r\n]/.test(text) ? `"${text.replace(/"/g, '""')}"` : text
+}
+
+const csvLine = (values) => values.map(csvCell).join(',')
+
+// Batches of { rows, after }: rows without _id, after = _id to resume from
+async function* collectionBatches(db, plan) {
+  const query = plan.after ? { ...plan.query, _id: { $gt: plan.after } } : plan.query
+  const projection = plan.fields ? Object.fromEntries([['_id', 1], ...plan.fields.map(f => [f, 1])]) : undefined
+  const cursor = db.collection(plan.spec.collection).find(query, { projection }).sort({ _id: 1 }).batchSize(BATCH_SIZE)
+  if (plan.limit) cursor.limit(plan.limit)
+  try {
+    let docs = []
+    for await (const doc of cursor) {
+      docs.push(doc)
+      if (docs.length === BATCH_SIZE) {
+        yield { rows: docs.map(({ _id, ...row }) => row), after: docs[docs.length - 1]._id }
+        docs = []
+      }
+    }
+    if (docs.length > 0) yield { rows: docs.map(({ _id, ...row }) => row), after: docs[docs.length - 1]._id }
+  } finally {
+    await cursor.close()
+  }
+}
+
+async function* checklistBatches(db, plan) {
+  const query = plan.after ? { ...plan.query, _id: { $gt: plan.after } } : plan.query
+  const cursor = db.collection('transactions')
+    .find(query, { projection: { _id: 1, id: 1 } })
+    .sort({ _id: 1 })
+    .batchSize(CHECKLIST_TRANSACTION_BATCH)
+  let sent = 0
+  const flush = async (transactions) => {
+    const items = await loadChecklistItems(db, { transaction_id: { $in: transactions.map(t => t.id) }, ...plan.itemQuery })
+    const byTransaction = new Map()
+    for (const { virtual, ...item } of items) {
+      if (!byTransaction.has(item.transaction_id)) byTransaction.set(item.transaction_id, [])
+      byTransaction.get(item.transaction_id).push(item)
+    }
+    const rows = []
+    let after = null
+    for (const transaction of transactions) {
+      const own = (byTransaction.get(transaction.id) || []).sort(compareBy(CHECKLIST_SORT))
+      rows.push(...(plan.fields ? own.map(item => pick(item, plan.fields)) : own))
+      after = transaction._id
+      sent += own.length
+      if (plan.limit && sent >= plan.limit) break
+    }
+    return { rows, after }
+  }
+  try {
+    let transactions = []
+    for await (const transaction of cursor) {
+      transactions.push(transaction)
+      if (transactions.length === CHECKLIST_TRANSACTION_BATCH) {
+        yield await flush(transactions)
+        transactions = []
+        if (plan.limit && sent >= plan.limit) return
+      }
+    }
+    if (transactions.length > 0) yield await flush(transactions)
+  } finally {
+    await cursor.close()
+  }
+}
+
+export function exportStream(db, plan) {
+  const encoder = new TextEncoder()
+  const batches = plan.resource === 'checklists' ? checklistBatches(db, plan) : collectionBatches(db, plan)
+  const csv = plan.format === 'csv'
+  let header = csv ? csvLine([...plan.columns, '_cursor']) + '\n' : ''
+
+  return new ReadableStream({
+    // Called again only once the queued chunk has been read
+    async pull(controller) {
+      try {
+        for (;;) {
+          const { value, done } = await batches.next()
+          if (done) {
+            if (header) controller.enqueue(encoder.encode(header))
+            controller.close()
+            return
+          }
+          const { rows, after } = value
+          if (rows.length === 0) continue
+          const cursor = encodeCursor(plan.resource, after)
+          const last = rows.length - 1
+          const lines = csv
+            ? rows.map((row, i) => csvLine([...plan.columns.map(c => valueAt(row, c)), i === last ? cursor : '']))
+            : rows.map((row, i) => JSON.stringify(i === last ? { ...row, _cursor: cursor } : row))
+          controller.enqueue(encoder.encode(header + lines.join('\n') + '\n'))
+          header = ''
+          exportedRows.inc({ resource: plan.resource, format: plan.format }, rows.length)
+          return
+        }
+      } catch (error) {
+        console.error(`Export error (${plan.resource})`, error)
+        if (csv) return controller.error(error)
+        controller.enqueue(encoder.encode(JSON.stringify({ error: 'Export aborted', message: error.message }) + '\n'))
+        controller.close()
+      }
+    },
+    async cancel() {
+      await batches.return()
+    }
+  }, { highWaterMark: 1 })
+}
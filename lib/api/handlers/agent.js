@@ -0,0 +1,115 @@
+import { NextResponse } from 'next/server'
+import { handleCORS } from '@/lib/api/http'
+import { callOpenAI } from '@/lib/api/openai'
+import { generateDealSummary, generateDealSummaryById } from '@/lib/api/deals'
+import { getSmartAlerts } from '@/lib/api/alerts'
+
+// POST /api/agent/command - Process natural language agent commands
+export async function processAgentCommand({ request, db }) {
+  try {
+    const body = await request.json()
+    
+    if (!body.command) {
+      return handleCORS(NextResponse.json({
+        success: false,
+        error: "Command is required"
+      }, { status: 400 }))
+    }
+
+    // Use GPT-4o-mini to parse the command
+    const parseMessages = [
+      {
+        role: "system",
+        content: `You are a real estate assistant that processes agent commands. Parse the command and determine the action needed.
+        
+        For deal summary commands like "Summarize 125 Maple Ave deal", return:
+        {
+          "action": "deal_summary",
+          "property_address": "extracted property address",
+          "intent": "summary of what the agent wants"
+        }
+        
+        For alert commands, return:
+        {
+          "action": "alerts",
+          "filters": {...},
+          "intent": "what alerts they want to see"
+        }
+        
+        Return only valid JSON.`
+      },
+      {
+        role: "user",
+        content: body.command
+      }
+    ]
+
+    const parseResponse = await callOpenAI('gpt-4o-mini', parseMessages)
+    let parsedCommand
+
+    try {
+      parsedCommand = JSON.parse(parseResponse)
+    } catch (parseError) {
+      return handleCORS(NextResponse.json({
+        success: false,
+        error: "Could not parse command",
+        original_command: body.command
+      }))
+    }
+
+    // Process the parsed command
+    if (parsedCommand.action === 'deal_summary') {
+      const summaryResult = await generateDealSummary(db, parsedCommand.property_address)
+      return handleCORS(NextResponse.json({
+        success: true,
+        action: 'deal_summary',
+        ...summaryResult
+      }))
+    } else if (parsedCommand.action === 'alerts') {
+      const alertsResult = await getSmartAlerts(db, parsedCommand.filters)
+      return handleCORS(NextResponse.json({
+        success: true,
+        action: 'alerts',
+        ...alertsResult
+      }))
+    } else {
+      return handleCORS(NextResponse.json({
+        success: false,
+        error: "Unknown command action",
+        parsed_command: parsedCommand
+      }))
+    }
+
+  } catch (error) {
+    console.error('Agent command error:', error)
+    return handleCORS(NextResponse.json({
+      success: false,
+      error: "Failed to process command"
+    }, { status: 500 }))
+  }
+}
+
+// GET /api/deals/summary/:id - Get detailed deal summary
+export async function getDealSummary({ db, params }) {
+  try {
+    const transactionId = params.id
+    const summaryResult = await generateDealSummaryById(db, transactionId)
+    
+    if (summaryResult.success) {
+      return handleCORS(NextResponse.json(summaryResult))
+    } else {
+      return handleCORS(NextResponse.json(summaryResult, { status: 404 }))
+    }
+  } catch (error) {
+    console.error('Deal summary error:', error)
+    return handleCORS(NextResponse.json({
+      success: false,
+      error: "Failed to generate deal summary"
+    }, { status: 500 }))
+  }
+}
+
+export const routes = [
+  { method: 'POST', path: '/agent/command', handler: processAgentCommand },
+  { method: 'GET', path: '/deals/summary/:id', handler: getDealSummary }
+]
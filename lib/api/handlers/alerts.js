@@ -0,0 +1,92 @@
+import { NextResponse } from 'next/server'
+import { handleCORS } from '@/lib/api/http'
+import { getSmartAlerts, refreshAllAlerts } from '@/lib/api/alerts'
+import { replanAlert } from '@/lib/api/plans'
+import { notifyChange, sendToClients } from '@/lib/api/invalidation'
+
+// GET /api/alerts/smart - Get smart alerts for dashboard
+export async function listSmartAlerts({ request, db }) {
+  try {
+    const url = new URL(request.url)
+    const filters = {
+      agent: url.searchParams.get('agent'),
+      priority: url.searchParams.get('priority'),
+      type: url.searchParams.get('type')
+    }
+    
+    const alertsResult = await getSmartAlerts(db, filters)
+    return handleCORS(NextResponse.json(alertsResult))
+  } catch (error) {
+    console.error('Smart alerts error:', error)
+    return handleCORS(NextResponse.json({
+      success: false,
+      error: "Failed to get alerts"
+    }, { status: 500 }))
+  }
+}
+
+// POST /api/alerts/dismiss/:id - Dismiss alert
+export async function dismissAlert({ db, params }) {
+  try {
+    const alertId = params.id
+    
+    const result = await db.collection('smart_alerts').updateOne(
+      { id: alertId },
+      { 
+        $set: { 
+          dismissed_at: new Date(),
+          status: 'dismissed'
+        } 
+      }
+    )
+
+    if (result.matchedCount > 0) {
+      replanAlert(alertId)
+      notifyChange('alerts:changed', { id: alertId }, ['alerts', 'suggestions'])
+      sendToClients('suggestions:update', { reason: 'alert_dismissed', id: alertId })
+      return handleCORS(NextResponse.json({
+        success: true,
+        message: "Alert dismissed"
+      }))
+    } else {
+      return handleCORS(NextResponse.json({
+        success: false,
+        error: "Alert not found"
+      }, { status: 404 }))
+    }
+  } catch (error) {
+    console.error('Alert dismiss error:', error)
+    return handleCORS(NextResponse.json({
+      success: false,
+      error: "Failed to dismiss alert"
+    }, { status: 500 }))
+  }
+}
+
+// POST /api/alerts/generate - Manually trigger alert generation (the scheduler and
+// checklist/deal writes normally keep alerts current)
+export async function generateAlerts({ db }) {
+  try {
+    // refreshAllAlerts pushes alerts:changed itself when anything changed
+    const result = await refreshAllAlerts(db)
+    return handleCORS(NextResponse.json({
+      success: true,
+      message: "Alerts generated successfully",
+      generated: result.active,
+      created: result.created,
+      resolved: result.resolved
+    }))
+  } catch (error) {
+    console.error('Alert generation error:', error)
+    return handleCORS(NextResponse.json({
+      success: false,
+      error: "Failed to generate alerts"
+    }, { status: 500 }))
+  }
+}
+
+export const routes = [
+  { method: 'GET', path: '/alerts/smart', handler: listSmartAlerts },
+  { method: 'POST', path: '/alerts/dismiss/:id', handler: dismissAlert },
+  { method: 'POST', path: '/alerts/generate', handler: generateAlerts }
+]
@@ -0,0 +1,30 @@
+import { NextResponse } from 'next/server'
+import { handleCORS } from '@/lib/api/http'
+
+// GET /api/analytics/dashboard - Dashboard stats
+export async function getDashboard({ db }) {
+  const totalLeads = await db.collection('leads').countDocuments()
+  const activeLeads = await db.collection('leads').countDocuments({ status: { $ne: 'closed' } })
+  const buyerLeads = await db.collection('leads').countDocuments({ lead_type: 'buyer' })
+  const sellerLeads = await db.collection('leads').countDocuments({ lead_type: 'seller' })
+  
+  const recentLeads = await db.collection('leads')
+    .find({})
+    .sort({ created_at: -1 })
+    .limit(5)
+    .toArray()
+
+  const stats = {
+    total_leads: totalLeads,
+    active_leads: activeLeads,
+    buyer_leads: buyerLeads,
+    seller_leads: sellerLeads,
+    recent_leads: recentLeads.map(({ _id, ...rest }) => rest)
+  }
+
+  return handleCORS(NextResponse.json(stats))
+}
+
+export const routes = [
+  { method: 'GET', path: '/analytics/dashboard', handler: getDashboard }
+]
@@ -0,0 +1,1135 @@
+import { performance } from 'perf_hooks'
+import { v4 as uuidv4 } from 'uuid'
+import { NextResponse } from 'next/server'
+import { handleCORS } from '@/lib/api/http'
+import { callOpenAI } from '@/lib/api/openai'
+import { searchProperties, sanitizePreferences, mapLeadPreferencesToFilters } from '@/lib/api/properties'
+import { createDefaultChecklistItems } from '@/lib/api/checklists'
+import { addressFields } from '@/lib/api/address'
+import { findLeadForMessage, generateLeadInsights, leadIdentityFields } from '@/lib/api/leads'
+import { getSmartAlerts } from '@/lib/api/alerts'
+import { observeAssistantStage } from '@/lib/api/telemetry'
+import { getLoader } from '@/lib/api/loader'
+import { countTasks, findTasks } from '@/lib/api/checklist-templates'
+import { taskDuration } from '@/lib/api/plans'
+import { logWrite, flushCollection } from '@/lib/api/write-behind'
+import { followInvalidations } from '@/lib/api/invalidation'
+
+// Assistant pipeline. /assistant/parse classifies a message: questions about existing CRM
+// data (tasks, alerts, deals, the pipeline, a lead overview) are recognised by keyword rules
+// without a model call; anything else goes to the model for lead/preference/transaction
+// extraction. /assistant/match runs the matching pipeline in named stages, each timed
+// (logged, returned as `timings`, and exported as crm_assistant_stage_duration_seconds).
+const READ_INTENTS = new Set(['tasks.overdue', 'tasks.today', 'alerts.summary', 'pipeline.summary', 'transactions.status', 'leads.overview'])
+
+// New information (contact details, a price, "just met ...") is never a read question
+const CAPTURE_HINTS = /@|\$\s*\d|\b\d{3}[\s.-]?\d{3}[\s.-]?\d{4}\b|\b(?:just\s+)?met\b|\b\d+\s*bhk\b/i
+
+const EXTRACTION_PROMPT = `You are a real estate assistant that extracts structured information from agent messages.
+        
+        Extract the following information from the agent's message and return it as JSON:
+        {
+          "lead_info": {
+            "name": "extracted name or null",
+            "phone": "extracted phone or null",
+            "email": "extracted email or null",
+            "lead_type": "buyer or seller (inferred from context)"
+          },
+          "preferences": {
+            "zipcode": "extracted zipcode/area or null",
+            "city": "extracted city or null",
+            "state": "2-letter state code if present or null",
+            "min_price": "minimum price or null",
+            "max_price": "maximum price or null",
+            "bedrooms": "number of bedrooms or null",
+            "bathrooms": "number of bathrooms or null",
+            "property_type": "extracted property type or null"
+          },
+          "transaction_info": {
+            "property_address": "full address if provided or null",
+            "transaction_type": "purchase | sale | lease | null",
+            "price": "numeric price if stated (e.g. 500000) or null",
+            "listing_price": "if explicitly a listing price, else null",
+            "contract_price": "if explicitly a contract price, else null",
+            "closing_date": "ISO date string if a closing date is mentioned, else null"
+          },
+          "intent": "one of: find_properties | create_lead | update_preferences | create_transaction | other",
+          "summary": "brief summary of the request"
+        }
+        
+        For property preferences:
+        - Convert terms like "2BHK" to bedrooms: "2"
+        - Convert "under $500K" to max_price: "500000"
+        - Convert "above $300K" to min_price: "300000"
+        - Extract city/area names and map to zipcodes if possible (Frisco->75034, Dallas->75201, etc)
+        
+        For transaction extraction:
+        - Map phrases like "open a deal", "start a transaction", "create a transaction" to intent: "create_transaction"
+        - Prefer a full street address for property_address if present; otherwise leave null
+        - If lead_type is buyer and only one price is mentioned, map it to contract_price; if seller, map to listing_price
+        - Parse closing dates (e.g., "Nov 1", "11/01", "in 30 days") to an ISO date string when possible
+        
+        Return only valid JSON, no other text.`
+
+async function stage(timings, name, fn) {
+  const start = performance.now()
+  try {
+    return await fn()
+  } finally {
+    const ms = performance.now() - start
+    timings[name] = Math.round(ms)
+    observeAssistantStage(name, ms / 1000)
+  }
+}
+
+function logTimings(intent, timings) {
+  const stages = Object.entries(timings).map(([name, ms]) => `${name}=${ms}ms`).join(' ')
+  console.log(`[assistant.match] ${intent || 'unknown'} ${stages}`)
+}
+
+const stripId = (doc) => { if (!doc) return doc; const { _id, ...rest } = doc; return rest }
+const makeAnswer = (title, bullets) => `${title}\n- ${bullets.filter(Boolean).join('\n- ')}`
+const escapeRegex = (s) => s.replace(/[.*+?^${}()|[\]\\]/g, '\\$&')
+
+// Keyword intent rules for questions about existing data
+function classifyIntent(text) {
+  const raw = String(text || '')
+  const lc = raw.toLowerCase()
+  const entities = {}
+
+  // Extract potential transaction id (simple heuristic for UUID-like or custom ids)
+  const idMatch = lc.match(/(?:id|tx|transaction)[^\w]?[:#\s]*([a-z0-9\-]{6,})/)
+  if (idMatch) entities.transaction_id = idMatch[1]
+
+  // Extract an address-ish token (very naive fallback: quoted string or street number phrase)
+  const quoted = raw.match(/["']([^"']{5,})["']/)
+  if (quoted) entities.address = quoted[1]
+  else {
+    const addr = raw.match(/(\d{1,6}\s+[^,\n]{3,40}(?:\s+(?:st|street|ave|avenue|rd|road|dr|drive|blvd|lane|ln|court|ct)\b[^,\n]*)?)/i)
+    if (addr) entities.address = addr[1]
+  }
+
+  // Extract a person-like name (simple heuristic: two or three capitalized words)
+  const nameMatch = raw.match(/\b([A-Z][a-z]+(?:\s+[A-Z][a-z]+){1,2})\b/)
+  if (nameMatch) {
+    entities.client_name = nameMatch[1]
+  }
+
+  let intent = 'general.suggestions'
+  let confidence = 0.55
+
+  if ((lc.includes('overdue') || lc.includes('high priority')) && lc.includes('task')) { intent = 'tasks.overdue'; confidence = 0.9 }
+  else if (lc.includes('today') && lc.includes('task')) { intent = 'tasks.today'; confidence = 0.85 }
+  else if (lc.includes('alert')) { intent = 'alerts.summary'; confidence = 0.8 }
+  else if (lc.includes('pipeline') || (lc.includes('summary') && lc.includes('deal'))) { intent = 'pipeline.summary'; confidence = 0.75 }
+  else if ((lc.includes('transaction') || lc.includes('deal')) && (lc.includes('status') || lc.includes('update') || lc.includes('progress'))) { intent = 'transactions.status'; confidence = 0.88 }
+  else if ((lc.includes('seller') || lc.includes('listing') || lc.includes('lead')) && (lc.includes('overview') || lc.includes('know more') || lc.includes('about') || lc.includes('start') || lc.includes('how to start') || lc.includes('how to begin'))) { intent = 'leads.overview'; confidence = 0.9 }
+
+  return { intent, entities, confidence }
+}
+
+async function extractWithAI(message) {
+  const response = await callOpenAI('gpt-4o-mini', [
+    { role: "system", content: EXTRACTION_PROMPT },
+    { role: "user", content: message }
+  ], { maxTokens: 500 })
+  if (!response) {
+    throw new Error('No response from OpenAI')
+  }
+  try {
+    return JSON.parse(response)
+  } catch (parseErr) {
+    console.error('Assistant parse JSON error:', parseErr, 'Raw:', response)
+    throw Object.assign(new Error('Could not parse AI response'), { status: 502, raw: response })
+  }
+}
+
+// Rules first; the model only sees messages that aren't a recognised question
+async function parseQuery(text) {
+  const classified = classifyIntent(text)
+  if (READ_INTENTS.has(classified.intent) && !CAPTURE_HINTS.test(text)) {
+    return { ...classified, source: 'rules' }
+  }
+  const parsed_data = await extractWithAI(text)
+  return { intent: parsed_data?.intent || 'other', entities: classified.entities, confidence: null, source: 'ai', parsed_data }
+}
+
+// POST /api/assistant/parse - Parse natural language input
+export async function parseMessage({ request }) {
+  const body = await request.json().catch(() => ({}))
+  const message = (body.message || body.text || body.query || '').toString()
+
+  if (!message) {
+    return handleCORS(NextResponse.json(
+      { error: "Message is required" },
+      { status: 400 }
+    ))
+  }
+
+  try {
+    const parsed = await parseQuery(message)
+    return handleCORS(NextResponse.json({ success: true, ...parsed }))
+  } catch (error) {
+    if (error.status === 502) {
+      return handleCORS(NextResponse.json({
+        success: false,
+        error: error.message,
+        raw: error.raw
+      }, { status: 502 }))
+    }
+    console.error('Assistant parse error:', error)
+    return handleCORS(NextResponse.json({
+      success: false,
+      error: 'Failed to parse message',
+      details: error.message
+    }, { status: 500 }))
+  }
+}
+
+function findLikelyPrice(text) {
+  try {
+    const t = String(text || '')
+    const l = t.toLowerCase()
+    const toNumber = (numStr, unit) => {
+      let n = parseFloat(String(numStr).replace(/,/g, ''))
+      const u = (unit || '').toLowerCase()
+      if (u === 'm' || u === 'million') n *= 1_000_000
+      else if (u === 'k' || u === 'thousand') n *= 1_000
+      if (!isFinite(n)) return null
+      return Math.round(n)
+    }
+
+    // 1) Strong signal: keywords near amount
+    const kwRe = /(asking|ask|list(?:ing)?|price|offer|for)\s*[:\-]?\s*\$?\s*([0-9][\d,\.]*)\s*(m|million|k|thousand)?/i
+    const kw = l.match(kwRe)
+    if (kw) return toNumber(kw[2], kw[3])
+
+    // 2) Dollar amounts anywhere
+    const dollarRe = /\$\s*([0-9][\d,\.]*)\s*(m|million|k|thousand)?/ig
+    let m2, best2 = 0
+    while ((m2 = dollarRe.exec(l))) {
+      const val = toNumber(m2[1], m2[2])
+      if (val && val > best2) best2 = val
+    }
+    if (best2 >= 1000) return best2
+
+    // 3) Number + unit like 500k, 1.2m
+    const unitRe = /\b([0-9][\d,\.]*)\s*(m|million|k|thousand)\b/ig
+    let m3, best3 = 0
+    while ((m3 = unitRe.exec(l))) {
+      const val = toNumber(m3[1], m3[2])
+      if (val && val > best3) best3 = val
+    }
+    if (best3 >= 1000) return best3
+
+    // 4) Fallback: choose a large standalone number not tied to beds/baths/sqft/year/lot/hoa
+    const numRe = /\b([0-9][\d,\.]*)\b/g
+    let m4, best4 = 0
+    while ((m4 = numRe.exec(l))) {
+      const start = m4.index
+      const end = start + m4[0].length
+      const ctx = l.slice(Math.max(0, start - 10), Math.min(l.length, end + 10))
+      if (/(bed|br|bath|ba|sq\s?ft|sqft|square\s?feet|year|built|lot|hoa)/.test(ctx)) continue
+      const val = toNumber(m4[1], null)
+      if (val && val > best4) best4 = val
+    }
+    if (best4 >= 10000) return best4
+    return null
+  } catch { return null }
+}
+
+function extractSellerDetailsFromText(text) {
+  const out = {}
+  try {
+    const t = String(text || '')
+    const l = t.toLowerCase()
+    // property type
+    if (/\b(single[-\s]?family)\b/.test(l)) out.seller_property_type = 'single_family'
+    else if (/\bcondo\b/.test(l)) out.seller_property_type = 'condo'
+    else if (/\btown\s?house\b/.test(l)) out.seller_property_type = 'townhouse'
+    else if (/\bmulti[-\s]?family\b/.test(l)) out.seller_property_type = 'multi_family'
+    else if (/\bland\b/.test(l)) out.seller_property_type = 'land'
+
+    // bedrooms / bathrooms
+    const bed = l.match(/(\d+(?:\.5)?)\s*(?:bed(?:rooms?)?|br)\b/)
+    if (bed) out.seller_bedrooms = Number(bed[1])
+    const bath = l.match(/(\d+(?:\.5)?)\s*(?:bath(?:rooms?)?|ba)\b/)
+    if (bath) out.seller_bathrooms = Number(bath[1])
+
+    // year built
+    const year = l.match(/\b(?:built|year)\D{0,6}(19\d{2}|20\d{2})\b/)
+    if (year) out.seller_year_built = Number(year[1])
+
+    // square feet
+    const sqft = l.match(/(\d{3,5})\s*(?:sq\s?ft|sqft|square\s?feet)\b/)
+    if (sqft) out.seller_square_feet = Number(sqft[1].replace(/,/g, ''))
+
+    // lot size (sq ft or acres) with various phrasings
+    // e.g., "lot size is 2400 sqft", "lot 0.25 acres", "lot size: 6,500"
+    const lot1 = l.match(/\blot\s*size\s*(?:is|of|:|=)?\s*~?\s*([\d,\.]+)\s*(sq\s?ft|sqft|square\s?feet|acres?|ac)?\b/)
+    const lot2 = l.match(/\blot\s*(?:is|size)?\s*~?\s*([\d,\.]+)\s*(sq\s?ft|sqft|square\s?feet|acres?|ac)\b/)
+    const lot3 = l.match(/\b([\d,\.]+)\s*(sq\s?ft|sqft)\b[^\n]{0,15}\blot\b/)
+    const lot = lot1 || lot2 || lot3
+    if (lot) {
+      const num = parseFloat(lot[1].replace(/,/g, ''))
+      const unit = (lot[2] || 'sqft').toLowerCase()
+      if (isFinite(num)) {
+        out.seller_lot_size = unit.startsWith('ac') ? Math.round(num * 43560) : Math.round(num)
+      }
+    }
+
+    // occupancy
+    if (/owner[-\s]?occupied/.test(l) || /owner\b/.test(l)) out.seller_occupancy = 'owner'
+    else if (/tenant\b/.test(l)) out.seller_occupancy = 'tenant'
+    else if (/vacant\b/.test(l)) out.seller_occupancy = 'vacant'
+
+    // condition
+    if (/needs?\s+work/.test(l)) out.seller_condition = 'needs_work'
+    else if (/\baverage\b/.test(l)) out.seller_condition = 'average'
+    else if (/\bgood\b/.test(l)) out.seller_condition = 'good'
+    else if (/\bexcellent\b/.test(l)) out.seller_condition = 'excellent'
+
+    // timeline
+    if (/\basap\b|\bimmediately\b|\bright away\b/.test(l)) out.seller_timeline = 'asap'
+    else if (/(30|thirty)\s*[–-]?\s*(60|sixty)\s*days/.test(l)) out.seller_timeline = '30_60'
+    else if (/(60|sixty)\s*[–-]?\s*(90|ninety)\s*days/.test(l)) out.seller_timeline = '60_90'
+    else if (/(90|ninety)\+?\s*days/.test(l)) out.seller_timeline = '90_plus'
+
+    // HOA
+    const hoa = l.match(/\bhoa\b[^0-9$]{0,10}(?:fee|dues)?[^0-9$]{0,10}\$?\s*([\d,][\d,\.]*)/)
+    if (hoa) {
+      const n = parseFloat(String(hoa[1]).replace(/,/g, ''))
+      if (isFinite(n)) out.seller_hoa_fee = Math.round(n)
+    }
+
+    // Asking price (avoid picking up bed/bath counts)
+    const price = findLikelyPrice(t)
+    if (price) out.seller_price = price
+
+  } catch { /* ignore */ }
+  return out
+}
+
+
+// Seller fields to add or correct on a seller lead, from the parsed transaction info and
+// the message text
+function sellerPreferenceUpdates(effectivePrefs, transaction_info, wholeMessage) {
+  const prefsUpdate = {}
+  if (transaction_info?.property_address && !effectivePrefs.seller_address && !effectivePrefs.address) {
+    prefsUpdate.seller_address = transaction_info.property_address
+  }
+  if ((transaction_info?.listing_price || transaction_info?.price) && !effectivePrefs.seller_price && !effectivePrefs.asking_price) {
+    const priceNum = typeof transaction_info.listing_price === 'number' ? transaction_info.listing_price
+      : (typeof transaction_info.price === 'number' ? transaction_info.price : undefined)
+    if (typeof priceNum === 'number') prefsUpdate.seller_price = priceNum
+  }
+  // Extract more seller fields from message text if missing
+  const extracted = extractSellerDetailsFromText(wholeMessage)
+  for (const [k, v] of Object.entries(extracted)) {
+    if (v === undefined) continue
+    const curr = effectivePrefs[k]
+    const isMissing = (curr === undefined || curr === null || (typeof curr === 'string' && curr.trim() === ''))
+    if (isMissing) {
+      prefsUpdate[k] = v
+      continue
+    }
+    // Corrections for clearly wrong values
+    if (k === 'seller_price') {
+      const currNum = Number(curr)
+      const newNum = Number(v)
+      if (Number.isFinite(newNum) && (Number.isNaN(currNum) || currNum < 1000)) {
+        prefsUpdate[k] = newNum
+      }
+    } else if (k === 'seller_lot_size') {
+      const currNum = Number(curr)
+      const newNum = Number(v)
+      // treat < 200 sqft as unrealistic/placeholder
+      if (Number.isFinite(newNum) && (Number.isNaN(currNum) || currNum < 200)) {
+        prefsUpdate[k] = newNum
+      }
+    } else if (k === 'seller_hoa_fee') {
+      const currNum = Number(curr)
+      const newNum = Number(v)
+      if (Number.isFinite(newNum) && (Number.isNaN(currNum) || currNum <= 0 || currNum !== newNum)) {
+        prefsUpdate[k] = newNum
+      }
+    }
+  }
+  return prefsUpdate
+}
+
+// Seller slot-filling: the missing profile fields, most important first
+function missingSellerFields(prefs = {}) {
+  const requiredFirst = ['seller_address', 'seller_price']
+  const secondary = ['seller_property_type', 'seller_bedrooms', 'seller_bathrooms']
+  const optional = ['seller_year_built', 'seller_square_feet', 'seller_lot_size', 'seller_condition', 'seller_occupancy', 'seller_timeline', 'seller_hoa_fee']
+  return [...requiredFirst, ...secondary, ...optional].filter(key => {
+    const val = prefs[key]
+    return val === undefined || val === null || (typeof val === 'string' && val.trim() === '')
+  })
+}
+
+async function createAssistantTransaction(db, { lead, transaction_info, preferences, agent_name, original_message }) {
+  const txInfo = transaction_info || {}
+  const resolvedType = txInfo.transaction_type || (lead.lead_type === 'buyer' ? 'purchase' : 'sale')
+  const priceValue = typeof txInfo.price === 'number' ? txInfo.price : (typeof txInfo.price === 'string' ? parseFloat(txInfo.price.toString().replace(/[^0-9.]/g, '')) : undefined)
+  const listingPrice = typeof txInfo.listing_price === 'number' ? txInfo.listing_price : (resolvedType === 'sale' ? priceValue : undefined)
+  const contractPrice = typeof txInfo.contract_price === 'number' ? txInfo.contract_price : (resolvedType !== 'sale' ? priceValue : undefined)
+  const closingDate = txInfo.closing_date ? new Date(txInfo.closing_date) : null
+
+  const initialStage = (resolvedType === 'purchase') ? 'pre_approval' : 'pre_listing'
+  const transactionDoc = {
+    id: uuidv4(),
+    lead_id: lead.id,
+    property_address: txInfo.property_address || preferences?.zipcode || '',
+    ...addressFields(txInfo.property_address || preferences?.zipcode || ''),
+    client_name: lead.name,
+    client_email: lead.email,
+    client_phone: lead.phone,
+    transaction_type: resolvedType || 'sale',
+    current_stage: initialStage,
+    assigned_agent: agent_name || lead.assigned_agent || 'AI Assistant',
+    listing_price: listingPrice,
+    contract_price: contractPrice,
+    closing_date: closingDate,
+    created_at: new Date(),
+    updated_at: new Date(),
+    stage_history: [{
+      stage: initialStage,
+      entered_at: new Date(),
+      status: 'active'
+    }],
+    source: 'assistant',
+    original_message: original_message
+  }
+
+  await db.collection('transactions').insertOne(transactionDoc)
+  await createDefaultChecklistItems(db, transactionDoc.id, initialStage, resolvedType)
+
+  const { _id, ...cleanedTx } = transactionDoc
+  return cleanedTx
+}
+
+// Lead capture: resolve (or create) the lead, then search properties, generate insights
+// and create the transaction concurrently, then persist insights and the conversation
+async function runCapturePipeline(db, { parsed_data, original_message, agent_name, incomingLeadId, timings }) {
+  let { lead_info = {}, preferences = {}, intent = '', summary = '', transaction_info = {} } = parsed_data || {}
+  lead_info = lead_info || {}
+  transaction_info = transaction_info || {}
+
+  const wholeMessage = (original_message || '').toString()
+  const lcWhole = wholeMessage.toLowerCase()
+  const sellerHints = (
+    /\bseller\b/.test(lcWhole) ||
+    /\bsell(?:ing)?\b/.test(lcWhole) ||
+    /\blist(?:ing)?\b/.test(lcWhole) ||
+    /\basking\s+price\b/.test(lcWhole) ||
+    /\bmy\s+(?:house|home|condo|apartment)\b/.test(lcWhole)
+  )
+  const explicitSellerFields = Boolean(
+    (preferences && (preferences.seller_address || preferences.seller_price)) ||
+    (transaction_info && (transaction_info.listing_price || transaction_info.property_address))
+  )
+  const sellerSignals = sellerHints || explicitSellerFields
+  if (!lead_info.lead_type && sellerSignals) {
+    lead_info.lead_type = 'seller'
+  }
+
+  if ((lead_info.lead_type || '').toLowerCase() === 'seller') {
+    preferences = preferences || {}
+    if (!preferences.seller_address && transaction_info?.property_address) {
+      preferences.seller_address = transaction_info.property_address
+    }
+    if (preferences.seller_price == null) {
+      const priceNum = typeof transaction_info?.listing_price === 'number' ? transaction_info.listing_price
+        : (typeof transaction_info?.price === 'number' ? transaction_info.price : findLikelyPrice(wholeMessage))
+      if (typeof priceNum === 'number' && isFinite(priceNum)) preferences.seller_price = priceNum
+    }
+  }
+
+  const hasLeadInfo = Boolean(lead_info.name || lead_info.email || lead_info.phone)
+  const cleanedIncoming = sanitizePreferences(preferences)
+  // Nothing to capture: answer with the general snapshot instead of an empty search
+  if (String(intent || '').toLowerCase() === 'other' && !hasLeadInfo && !incomingLeadId && !sellerSignals && Object.keys(cleanedIncoming).length === 0) {
+    const snapshot = await stage(timings, 'intent', () => fulfillIntent(db, { intent: 'general.suggestions', agent: agent_name }))
+    return { ...snapshot, summary }
+  }
+
+  // Step 1: Find or create the lead
+  let lead = await stage(timings, 'resolve_lead', () =>
+    findLeadForMessage(db, { leadId: incomingLeadId, email: lead_info.email, phone: lead_info.phone, name: lead_info.name })
+  )
+  let isNewLead = false
+
+  await stage(timings, 'save_lead', async () => {
+    if (!lead && (hasLeadInfo || sellerSignals)) {
+      const defaultName = lead_info.name || (sellerSignals ? 'Unknown Seller' : 'Unknown')
+      const leadType = (lead_info.lead_type || (sellerSignals ? 'seller' : 'buyer')).toLowerCase()
+      let newPrefs = preferences || {}
+      if (leadType === 'seller') {
+        const effectivePrefs = Object.keys(cleanedIncoming).length ? cleanedIncoming : newPrefs
+        newPrefs = { ...newPrefs, ...sellerPreferenceUpdates(effectivePrefs, transaction_info, wholeMessage) }
+      }
+      const newLead = {
+        id: uuidv4(),
+        name: defaultName,
+        email: lead_info.email || null,
+        phone: lead_info.phone || null,
+        ...leadIdentityFields(lead_info.email, lead_info.phone, defaultName),
+        lead_type: leadType,
+        preferences: newPrefs,
+        assigned_agent: agent_name || null,
+        source: 'assistant',
+        tags: [],
+        status: 'new',
+        created_at: new Date(),
+        updated_at: new Date()
+      }
+      await db.collection('leads').insertOne(newLead)
+      lead = newLead
+      isNewLead = true
+    } else if (lead) {
+      // Incoming preferences, plus seller fields found in the message, in one write
+      const effectivePrefs = Object.keys(cleanedIncoming).length ? cleanedIncoming : (lead.preferences || {})
+      const sellerUpdates = String(lead.lead_type || lead_info.lead_type || '').toLowerCase() === 'seller'
+        ? sellerPreferenceUpdates(effectivePrefs, transaction_info, wholeMessage)
+        : {}
+      if (Object.keys(cleanedIncoming).length || Object.keys(sellerUpdates).length) {
+        lead = await db.collection('leads').findOneAndUpdate(
+          { id: lead.id },
+          { $set: { preferences: { ...(lead.preferences || {}), ...cleanedIncoming, ...sellerUpdates }, updated_at: new Date() } },
+          { returnDocument: 'after' }
+        ) || lead
+      }
+    }
+  })
+
+  // Step 2: Sellers get insights (no listing search); buyers get a property search first
+  const effectivePrefs = Object.keys(cleanedIncoming).length ? cleanedIncoming : (lead?.preferences || {})
+  const leadType = String(lead?.lead_type || lead_info?.lead_type || '').toLowerCase()
+  const normalizedIntent = (intent || '').toString().toLowerCase()
+  const isCreateTransaction = normalizedIntent.includes('create_transaction') ||
+    (normalizedIntent.includes('create') && normalizedIntent.includes('transaction')) ||
+    normalizedIntent.includes('open a deal') ||
+    normalizedIntent.includes('start a transaction') ||
+    normalizedIntent.includes('create deal')
+
+  const searchDone = leadType === 'seller'
+    ? Promise.resolve([])
+    : stage(timings, 'property_search', async () => {
+        const result = await searchProperties(mapLeadPreferencesToFilters(effectivePrefs))
+        return Array.isArray(result) ? result : (result?.properties || [])
+      })
+  const insightsDone = searchDone.then(properties =>
+    stage(timings, 'insights', () => generateLeadInsights(lead, leadType === 'seller' ? [] : properties))
+  ).catch(e => {
+    console.warn('AI recommendation generation failed:', e)
+    return 'Your request has been processed.'
+  })
+  const transactionDone = isCreateTransaction && lead
+    ? stage(timings, 'create_transaction', () =>
+        createAssistantTransaction(db, { lead, transaction_info, preferences, agent_name, original_message })
+      ).catch(txErr => {
+        console.error('Assistant create transaction error:', txErr)
+        return null
+      })
+    : Promise.resolve(null)
+  const [properties, aiRecommendations, createdTransaction] = await Promise.all([searchDone, insightsDone, transactionDone])
+
+  let assistantAnswer = ''
+  const missingFields = leadType === 'seller' ? missingSellerFields(lead?.preferences || {}) : []
+  if (missingFields.length > 0) {
+    // Ask for up to 3 fields at a time
+    const pretty = (k) => k
+      .replace(/^seller_/, '')
+      .replace(/_/g, ' ')
+      .replace(/\b\w/g, (c) => c.toUpperCase())
+    assistantAnswer = `I saved the details I have. Could you share the following missing info to complete the seller profile: ${missingFields.slice(0, 3).map(pretty).join(', ')}?`
+  }
+
+  // Step 3: Persist insights for the UI and the conversation history
+  const conversationEntry = {
+    id: uuidv4(),
+    agent_message: original_message,
+    parsed_data,
+    lead_id: lead?.id || null,
+    transaction_id: createdTransaction?.id || null,
+    properties_found: properties.length,
+    ai_response: aiRecommendations,
+    created_at: new Date()
+  }
+  await stage(timings, 'persist', () => Promise.all([
+    lead?.id && aiRecommendations
+      ? db.collection('leads').updateOne(
+          { id: lead.id },
+          { $set: { ai_insights: aiRecommendations, updated_at: new Date() } }
+        ).catch(e => console.warn('Failed to persist ai_insights in assistant.match:', e))
+      : null,
+    logWrite('assistant_conversations', conversationEntry)
+  ]))
+
+  return {
+    lead: lead ? { ...lead, _id: undefined } : null,
+    is_new_lead: isNewLead,
+    created_transaction: createdTransaction || null,
+    transaction_id: createdTransaction?.id || null,
+    properties: properties.slice(0, 10),
+    properties_count: properties.length,
+    ai_recommendations: aiRecommendations,
+    answer: assistantAnswer || undefined,
+    require_more_details: Boolean(assistantAnswer),
+    missing_fields: assistantAnswer ? missingFields : [],
+    conversation_id: conversationEntry.id,
+    summary: summary
+  }
+}
+
+// Answers for read intents (and the general snapshot)
+async function fulfillIntent(db, { intent, entities = {}, agent, limit = 5 }) {
+  const now = new Date()
+  const startOfToday = new Date(now); startOfToday.setHours(0,0,0,0)
+  const endOfToday = new Date(now); endOfToday.setHours(23,59,59,999)
+
+  const agentFilterTx = agent ? { assigned_agent: agent } : {}
+  const agentFilterTasks = agent ? { assignee: agent } : {}
+
+  if (intent === 'transactions.status') {
+    const txQuery = { ...agentFilterTx, current_stage: { $ne: 'closed' } }
+    if (entities.transaction_id) txQuery.id = entities.transaction_id
+    if (entities.address) {
+      const rx = new RegExp(escapeRegex(entities.address), 'i')
+      txQuery.$or = [
+        { address: rx },
+        { property_address: rx },
+        { 'property.address': rx },
+        { 'property.full_address': rx },
+        { title: rx }
+      ]
+    }
+    // Search by client name and related leads if provided
+    if (entities.client_name) {
+      const nameRx = new RegExp(escapeRegex(entities.client_name), 'i')
+      txQuery.$or = [ ...(txQuery.$or || []), { client_name: nameRx } ]
+      try {
+        const leads = await db.collection('leads').find({ name: nameRx }).project({ id: 1 }).toArray()
+        const leadIds = leads.map(l => l.id).filter(Boolean)
+        if (leadIds.length) {
+          txQuery.$or.push({ lead_id: { $in: leadIds } })
+        }
+      } catch (_) { /* ignore lead lookup errors */ }
+    }
+    const txs = await db.collection('transactions')
+      .find(txQuery)
+      .sort({ updated_at: -1 })
+      .limit(limit)
+      .toArray()
+    const enriched = await Promise.all(txs.map(async (tx) => {
+      const nextTasks = await findTasks(db, { transaction_id: tx.id, status: { $ne: 'completed' } }, { sort: { due_date: 1 }, limit: 3 })
+      return { ...stripId(tx), next_tasks: nextTasks.map(stripId) }
+    }))
+    const bullets = enriched.map(t => `Deal ${t.id || ''} (${t.title || t.property_address || t.address || 'Untitled'}): stage ${t.current_stage || 'n/a'}; next ${t.next_tasks?.[0]?.title || 'no pending tasks'}`)
+    const answer = makeAnswer('Here is the current status of your active transactions:', bullets.length ? bullets : ['No matching transactions found'])
+    return { intent, answer, transactions: enriched }
+  }
+
+  if (intent === 'tasks.overdue') {
+    const overdue = await findTasks(db, { status: { $ne: 'completed' }, due_date: { $lt: now }, ...agentFilterTasks }, { sort: { due_date: 1 }, limit: 20 })
+    const bullets = overdue.slice(0,5).map(t => `${t.title} (due ${new Date(t.due_date).toLocaleDateString()})`)
+    const answer = makeAnswer('High-priority overdue tasks:', bullets.length ? bullets : ['No overdue tasks'])
+    return { intent, answer, tasks: overdue.map(stripId) }
+  }
+
+  if (intent === 'tasks.today') {
+    const today = await findTasks(db, { status: { $ne: 'completed' }, due_date: { $gte: startOfToday, $lte: endOfToday }, ...agentFilterTasks }, { sort: { due_date: 1 }, limit: 20 })
+    const bullets = today.slice(0,5).map(t => `${t.title} (due ${new Date(t.due_date).toLocaleTimeString([], {hour: '2-digit', minute: '2-digit'})})`)
+    const answer = makeAnswer("Today's tasks:", bullets.length ? bullets : ['No tasks due today'])
+    return { intent, answer, tasks: today.map(stripId) }
+  }
+
+  if (intent === 'alerts.summary') {
+    const alerts = await getSmartAlerts(db, agent ? { agent } : {})
+    const list = alerts?.alerts || []
+    const bullets = list.slice(0,5).map(a => `${a.title || a.alert_type} (${a.priority || 'normal'})`)
+    const answer = makeAnswer('Smart alerts:', bullets.length ? bullets : ['No active alerts'])
+    return { intent, answer, alerts: list.map(stripId), total: alerts?.total ?? list.length }
+  }
+
+  if (intent === 'pipeline.summary') {
+    const txs = await db.collection('transactions')
+      .find({ ...agentFilterTx }, { projection: { current_stage: 1 } })
+      .toArray()
+    const byStage = {}
+    for (const tx of txs) { const s = (tx.current_stage || 'unknown'); byStage[s] = (byStage[s] || 0) + 1 }
+    const bullets = Object.entries(byStage).map(([s,c]) => `${s}: ${c}`)
+    const answer = makeAnswer('Pipeline summary by stage:', bullets.length ? bullets : ['No transactions'])
+    return { intent, answer, summary: byStage, total: txs.length }
+  }
+
+  if (intent === 'leads.overview') {
+    // Resolve lead by name, prioritizing sellers
+    const nameRaw = entities.client_name || ''
+    const sanitizeName = (s) => (s || '')
+      .toString()
+      .replace(/\b(please|thanks|thank\s+you)\b/gi, ' ')
+      .replace(/[^a-zA-Z\s'\-]/g, ' ')
+      .replace(/\s+/g, ' ')
+      .trim()
+    const cleanedName = sanitizeName(nameRaw)
+    let lead = null
+    try {
+      if (cleanedName) {
+        const nameRx = new RegExp(escapeRegex(cleanedName), 'i')
+        const candidates = await db.collection('leads')
+          .find({ name: nameRx })
+          .sort({ updated_at: -1 })
+          .limit(5)
+          .toArray()
+        if (candidates && candidates.length) {
+          // Prefer sellers
+          lead = candidates.find(l => String(l.lead_type || '').toLowerCase() === 'seller') || candidates[0]
+        } else {
+          // Fallback token-based search requiring all parts to be present in name
+          const parts = cleanedName.split(/\s+/).filter(Boolean)
+          if (parts.length) {
+            const andConds = parts.map(p => ({ name: new RegExp(escapeRegex(p), 'i') }))
+            const tokenMatches = await db.collection('leads')
+              .find({ $and: andConds })
+              .sort({ updated_at: -1 })
+              .limit(5)
+              .toArray()
+            if (tokenMatches && tokenMatches.length) {
+              lead = tokenMatches.find(l => String(l.lead_type || '').toLowerCase() === 'seller') || tokenMatches[0]
+            }
+          }
+        }
+      } else {
+        // Fallback to most recent seller
+        lead = await db.collection('leads').find({ lead_type: 'seller' }).sort({ updated_at: -1 }).limit(1).next()
+      }
+    } catch (_) { /* ignore lookup errors */ }
+
+    if (!lead) {
+      const who = cleanedName ? ` for ${cleanedName}` : ''
+      const answer = makeAnswer(`I couldn't find a matching seller lead${who}.`, [
+        'Try using the exact client name as saved in CRM',
+        'Or provide an email/phone so I can locate the lead'
+      ])
+      return { intent, answer }
+    }
+
+    const prefs = lead.preferences || {}
+    const sellerAddress = prefs.seller_address || prefs.address
+    const sellerPrice = prefs.seller_price ?? prefs.asking_price
+    const bullets = [
+      `Name: ${lead.name}${lead.lead_type ? ` (${lead.lead_type})` : ''}`,
+      `Contact: ${lead.email || '—'} | ${lead.phone || '—'}`,
+      sellerAddress ? `Address: ${sellerAddress}` : null,
+      sellerPrice != null ? `Asking price: $${Number(sellerPrice).toLocaleString()}` : null,
+      prefs.seller_property_type ? `Property: ${prefs.seller_property_type}${prefs.seller_bedrooms ? ` • ${prefs.seller_bedrooms} bd` : ''}${prefs.seller_bathrooms ? ` • ${prefs.seller_bathrooms} ba` : ''}` : null,
+      prefs.seller_year_built ? `Year built: ${prefs.seller_year_built}` : null,
+      prefs.seller_square_feet ? `Size: ${prefs.seller_square_feet} sqft` : null,
+      prefs.seller_lot_size ? `Lot: ${prefs.seller_lot_size}` : null,
+      prefs.seller_condition ? `Condition: ${prefs.seller_condition}` : null,
+      prefs.seller_occupancy ? `Occupancy: ${prefs.seller_occupancy}` : null,
+      prefs.seller_timeline ? `Timeline to list: ${prefs.seller_timeline}` : null,
+      prefs.seller_hoa_fee != null ? `HOA: ${prefs.seller_hoa_fee ? `$${Number(prefs.seller_hoa_fee).toLocaleString()}/mo` : '—'}` : null,
+      prefs.seller_description ? `Notes: ${prefs.seller_description}` : null,
+      lead.updated_at ? `Last updated: ${new Date(lead.updated_at).toLocaleString()}` : null
+    ]
+    const overview = makeAnswer(`Seller lead overview for ${lead.name}:`, bullets)
+
+    // Dynamic next steps suggestions
+    const actions = []
+    const soonish = (prefs.seller_timeline || '').toString().toLowerCase().includes('week') || (prefs.seller_timeline || '').toString().toLowerCase().includes('soon')
+    actions.push('Schedule a listing consultation and walkthrough')
+    actions.push('Prepare CMA with 3–5 comps and pricing strategy')
+    if (prefs.seller_condition && /needs|repair|fix|update/i.test(prefs.seller_condition)) actions.push('Outline repair/refresh plan (paint, fixtures, minor repairs)')
+    else actions.push('Create a light staging/declutter checklist')
+    actions.push('Book professional photography and floor plan')
+    actions.push('Gather docs: HOA, disclosures, utility averages, survey')
+    actions.push('Draft listing timeline and MLS remarks')
+    if (soonish) actions.push('Expedite prep: compress timeline to 1–2 weeks with daily checkpoints')
+    const nextSteps = makeAnswer('Suggested next steps:', actions)
+
+    // Optional AI insights reuse
+    let insights = ''
+    try {
+      if (String(lead.lead_type || '').toLowerCase() === 'seller') {
+        insights = await generateLeadInsights(lead, [])
+      }
+    } catch (_) { /* non-fatal */ }
+
+    const answer = `${overview}\n\n${nextSteps}${insights ? `\n\nAI Insights:\n\n${insights}` : ''}`
+    return { intent, answer, lead: stripId(lead), ai_recommendations: insights }
+  }
+
+  // Fallback: brief suggestions snapshot (independent reads, run together)
+  const [recentLeads, overdueCount, alertsResult] = await Promise.all([
+    db.collection('leads').find(agent ? { assigned_agent: agent } : {}).sort({ created_at: -1 }).limit(5).toArray(),
+    countTasks(db, { status: { $ne: 'completed' }, due_date: { $lt: now }, ...(agent ? { assignee: agent } : {}) }),
+    getSmartAlerts(db, agent ? { agent } : {})
+  ])
+  const bullets = [
+    `${recentLeads.length} recent leads`,
+    `${overdueCount} overdue tasks`,
+    `${(alertsResult?.total ?? (alertsResult?.alerts?.length ?? 0))} smart alerts`
+  ]
+  const answer = makeAnswer('Here is a quick snapshot:', bullets)
+  return { intent: intent || 'general.suggestions', answer, recent_leads: recentLeads.map(stripId), overdue_tasks: overdueCount, smart_alerts: (alertsResult?.alerts || []).map(stripId) }
+}
+
+// POST /api/assistant/match - Answer a question about CRM data, or match/create the lead,
+// search properties and optionally create a transaction. Accepts a raw query (parsed here)
+// or the output of /assistant/parse (parsed_data, or intent + entities).
+export async function matchMessage({ request, db }) {
+  const timings = {}
+  try {
+    const body = await request.json()
+    let { parsed_data, original_message, agent_name, lead_id: incomingLeadId, intent, entities } = body
+
+    // Allow flexible inputs from frontend: query/text/message/original_message
+    const query = (body.query || body.text || body.message || original_message || '').toString()
+    if (!original_message && query) original_message = query
+    const agent = body.agent || agent_name
+
+    if (!parsed_data && !READ_INTENTS.has(intent) && query) {
+      try {
+        const parsed = await stage(timings, 'parse', () => parseQuery(query))
+        intent = parsed.intent
+        entities = parsed.entities
+        parsed_data = parsed.parsed_data
+      } catch (e) {
+        console.warn('Assistant parse failed:', e)
+      }
+    }
+
+    if (READ_INTENTS.has(intent)) {
+      const result = await stage(timings, 'intent', () =>
+        fulfillIntent(db, { intent, entities: entities || {}, agent, limit: Number(body.limit) || 5 })
+      )
+      logTimings(intent, timings)
+      return handleCORS(NextResponse.json({ success: true, ...result, timings }))
+    }
+
+    // If still no parsed_data and also no query, return a gentle success with snapshot guidance
+    if (!parsed_data && !query) {
+      return handleCORS(NextResponse.json({
+        success: true,
+        intent: 'general.suggestions',
+        answer: 'No message provided. Ask me about tasks, alerts, pipeline status, or say: "Just met Priya Sharma. 2BHK in Frisco under $500K."',
+        summary: 'Awaiting input'
+      }))
+    }
+
+    const result = await runCapturePipeline(db, { parsed_data, original_message, agent_name, incomingLeadId, timings })
+    logTimings(result.intent || parsed_data?.intent, timings)
+    return handleCORS(NextResponse.json({ success: true, ...result, timings }))
+  } catch (error) {
+    console.error('Assistant match error:', error)
+    return handleCORS(NextResponse.json({
+      success: false,
+      error: "Failed to process request",
+      details: error.message
+    }, { status: 500 }))
+  }
+}
+
+// GET /api/assistant/conversations - Get conversation history
+export async function listConversations({ db }) {
+  try {
+    // Read our own buffered writes
+    await flushCollection('assistant_conversations')
+    const conversations = await db.collection('assistant_conversations')
+      .find({})
+      .sort({ created_at: -1 })
+      .limit(50)
+      .toArray()
+
+    const cleanedConversations = conversations.map(({ _id, ...rest }) => rest)
+    
+    return handleCORS(NextResponse.json(cleanedConversations))
+  } catch (error) {
+    console.error('Error fetching conversations:', error)
+    return handleCORS(NextResponse.json(
+      { error: "Failed to fetch conversations" }, 
+      { status: 500 }
+    ))
+  }
+}
+
+// GET /api/assistant/intents - list supported capabilities for UI/help
+export async function listIntents() {
+  try {
+    return handleCORS(NextResponse.json({
+      success: true,
+      intents: [
+        { key: 'leads.overview', examples: ['tell me about Priya (seller)', 'seller overview for John', 'how to start with Akash the seller'] },
+        { key: 'transactions.status', examples: ['status of my Frisco deal', 'any updates on transaction 123?'] },
+        { key: 'tasks.overdue', examples: ['high priority tasks', 'overdue tasks'] },
+        { key: 'tasks.today', examples: ["what's due today", 'today\'s checklist'] },
+        { key: 'alerts.summary', examples: ['any alerts?', 'smart alerts summary'] },
+        { key: 'pipeline.summary', examples: ['pipeline summary', 'deals by stage'] },
+        { key: 'general.suggestions', examples: ['what should I do next?'] }
+      ]
+    }))
+  } catch (error) {
+    console.error('Assistant intents error:', error)
+    return handleCORS(NextResponse.json({ success: false, error: 'Failed to load intents' }, { status: 500 }))
+  }
+}
+
+// GET /api/assistant/suggestions - Aggregated assistant suggestions/workload
+export async function getSuggestions({ request, db }) {
+  try {
+    const url = new URL(request.url)
+    const agent = url.searchParams.get('agent')
+    const limit = parseInt(url.searchParams.get('limit')) || 5
+
+    const now = new Date()
+    const startOfToday = new Date(now)
+    startOfToday.setHours(0, 0, 0, 0)
+    const endOfToday = new Date(now)
+    endOfToday.setHours(23, 59, 59, 999)
+    const sevenDaysFromNow = new Date(now.getTime() + 7 * 24 * 60 * 60 * 1000)
+    const sevenDaysAgo = new Date(now.getTime() - 7 * 24 * 60 * 60 * 1000)
+
+    const agentFilterTx = agent ? { assigned_agent: agent } : {}
+    const agentFilterLead = agent ? { assigned_agent: agent } : {}
+    const agentFilterTasks = agent ? { assignee: agent } : {}
+
+    // Recent leads
+    const recentLeads = await db.collection('leads')
+      .find(agentFilterLead)
+      .sort({ created_at: -1 })
+      .limit(limit)
+      .toArray()
+
+    // Active transactions
+    const activeTx = await db.collection('transactions')
+      .find({ current_stage: { $ne: 'closed' }, ...agentFilterTx })
+      .sort({ created_at: -1 })
+      .toArray()
+    // Index transactions by id for quick lookup
+    const txMap = new Map((activeTx || []).map(tx => [tx.id, tx]))
+
+    // Checklist queries
+    const overdueChecklist = await findTasks(db, { status: { $ne: 'completed' }, due_date: { $lt: now }, ...agentFilterTasks }, { sort: { due_date: 1 }, limit: 10 })
+    const overdueHydrated = overdueChecklist.map(t => {
+      const tx = txMap.get(t.transaction_id)
+      return { ...t, client_name: tx?.client_name, property_address: tx?.property_address }
+    })
+
+    const todayChecklist = await findTasks(db, { status: { $ne: 'completed' }, due_date: { $gte: startOfToday, $lte: endOfToday }, ...agentFilterTasks }, { sort: { due_date: 1 }, limit: 10 })
+    const todayHydrated = todayChecklist.map(t => {
+      const tx = txMap.get(t.transaction_id)
+      return { ...t, client_name: tx?.client_name, property_address: tx?.property_address }
+    })
+
+    const upcomingChecklist = await findTasks(db, { status: { $ne: 'completed' }, due_date: { $gt: now, $lte: sevenDaysFromNow }, ...agentFilterTasks }, { sort: { due_date: 1 }, limit: 10 })
+
+    // Ensure we have transactions for all referenced checklist items (not just activeTx)
+    try {
+      const idSet = new Set([
+        ...overdueChecklist.map(t => t.transaction_id).filter(Boolean),
+        ...todayChecklist.map(t => t.transaction_id).filter(Boolean),
+        ...upcomingChecklist.map(t => t.transaction_id).filter(Boolean)
+      ])
+      const missing = [...idSet].filter(id => !txMap.has(id))
+      for (const [id, tx] of await getLoader(db).loadMany('transactions', missing)) txMap.set(id, tx)
+    } catch (_) { /* non-fatal */ }
+    const upcomingHydrated = upcomingChecklist.map(t => {
+      const tx = txMap.get(t.transaction_id)
+      return { ...t, client_name: tx?.client_name, property_address: tx?.property_address }
+    })
+
+    // Stalled deals (inactive > 7 days)
+    const stalledDeals = await db.collection('transactions')
+      .find({ current_stage: { $ne: 'closed' }, updated_at: { $lt: sevenDaysAgo }, ...agentFilterTx })
+      .sort({ updated_at: 1 })
+      .limit(10)
+      .toArray()
+
+    // Smart alerts reuse
+    const alertsResult = await getSmartAlerts(db, agent ? { agent } : {})
+
+    // Recent assistant activity
+    const recentActivity = await db.collection('assistant_conversations')
+      .find({})
+      .sort({ created_at: -1 })
+      .limit(10)
+      .toArray()
+
+    // Totals for summary
+    const leadsTotal = await db.collection('leads').countDocuments(agentFilterLead)
+    const overdueCount = await countTasks(db, { status: { $ne: 'completed' }, due_date: { $lt: now }, ...agentFilterTasks })
+    const dueTodayCount = await countTasks(db, { status: { $ne: 'completed' }, due_date: { $gte: startOfToday, $lte: endOfToday }, ...agentFilterTasks })
+    const upcomingCount = await countTasks(db, { status: { $ne: 'completed' }, due_date: { $gt: now, $lte: sevenDaysFromNow }, ...agentFilterTasks })
+
+    // Sanitize helper
+    const stripId = (doc) => {
+      if (!doc) return doc
+      const { _id, ...rest } = doc
+      return rest
+    }
+
+    // Build Next Best Actions (Phase 1): combine top overdue/today tasks and a top alert, and score them
+    const nbaItems = []
+    const pushTaskNBA = (t, tag) => {
+      const due = new Date(t.due_date)
+      const msLeft = due - now
+      const daysLeft = Math.floor(msLeft / 86400000)
+      const isOverdue = msLeft < 0
+      const urgency = isOverdue ? 'overdue' : (due >= startOfToday && due <= endOfToday ? 'due_today' : 'due_soon')
+      const base = isOverdue ? 92 : (urgency === 'due_today' ? 78 : 65)
+      const timeAdj = isFinite(daysLeft) ? Math.max(-10, Math.min(10, -daysLeft * 2)) : 0
+      const title = String(t.title || 'Task')
+      const est = taskDuration(t)
+      const priority_score = Math.max(0, Math.min(100, base + timeAdj))
+      const reasonBits = []
+      if (isOverdue) {
+        const days = Math.ceil((now - due) / 86400000)
+        reasonBits.push(`Overdue by ${days} day${days === 1 ? '' : 's'}`)
+      } else if (urgency === 'due_today') {
+        reasonBits.push('Due today')
+      } else {
+        reasonBits.push(`Due in ${daysLeft} day${daysLeft === 1 ? '' : 's'}`)
+      }
+      if (t.client_name) reasonBits.push(`Client: ${t.client_name}`)
+      const labelDue = isNaN(due) ? '—' : (urgency === 'due_today' ? 'today' : `due ${due.toLocaleDateString()}`)
+      nbaItems.push({
+        key: `task:${t.id}`,
+        type: 'task',
+        id: t.id,
+        label: `Complete: ${title} (${labelDue})`,
+        client_name: t.client_name,
+        property_address: t.property_address,
+        transaction_id: t.transaction_id,
+        est_duration_min: est,
+        priority_score,
+        urgency,
+        impact: 'medium',
+        reason: reasonBits.join(' • '),
+        can_auto_complete: false,
+        source: tag
+      })
+    }
+
+    const pushAlertNBA = (a) => {
+      const title = a.message || a.description || a.alert_type || 'Alert'
+      const est = 2
+      const priority_score = a.priority === 'urgent' ? 90 : a.priority === 'high' ? 80 : 60
+      nbaItems.push({
+        key: `alert:${a.id}`,
+        type: 'alert',
+        id: a.id,
+        label: `Dismiss alert: ${title}`,
+        est_duration_min: est,
+        priority_score,
+        urgency: a.priority === 'urgent' ? 'urgent' : 'normal',
+        impact: a.priority === 'urgent' ? 'high' : 'medium',
+        reason: a.alert_type ? `Type: ${a.alert_type}` : 'Smart alert',
+        can_auto_complete: true,
+        source: 'alert'
+      })
+    }
+
+    // Top N tasks
+    for (const t of overdueHydrated.slice(0, 3)) pushTaskNBA(t, 'overdue')
+    if (nbaItems.length < 3) {
+      for (const t of todayHydrated) {
+        if (nbaItems.length >= 3) break
+        // avoid duplicates by id
+        if (nbaItems.some(i => i.type === 'task' && i.id === t.id)) continue
+        pushTaskNBA(t, 'today')
+      }
+    }
+    // Add one alert if we still have space
+    if (nbaItems.length < 3 && (alertsResult?.alerts || []).length > 0) {
+      pushAlertNBA(alertsResult.alerts[0])
+    }
+    // Sort by score desc and take up to `limit`
+    nbaItems.sort((a, b) => (b.priority_score || 0) - (a.priority_score || 0))
+    const nextBestActions = nbaItems.slice(0, limit)
+
+    const suggestions = {
+      success: true,
+      generated_at: new Date(),
+      filters_applied: { agent: agent || null, limit },
+      summary: {
+        leads_total: leadsTotal,
+        active_deals: activeTx.length,
+        overdue_tasks: overdueCount,
+        due_today: dueTodayCount,
+        upcoming_week: upcomingCount,
+        stalled_deals: stalledDeals.length,
+        recent_conversations: recentActivity.length,
+        smart_alerts: alertsResult?.total ?? (alertsResult?.alerts?.length || 0)
+      },
+      overdue_checklist: overdueHydrated.map(stripId),
+      today_tasks: todayHydrated.map(stripId),
+      upcoming_tasks: upcomingHydrated.map(stripId),
+      stalled_deals: stalledDeals.map(tx => ({
+        ...stripId(tx),
+        days_inactive: Math.ceil((now - new Date(tx.updated_at)) / (1000 * 60 * 60 * 24))
+      })),
+      recent_leads: recentLeads.map(stripId),
+      recent_activity: recentActivity.map(stripId),
+      smart_alerts: (alertsResult?.alerts || []).map(stripId),
+      next_best_actions: nextBestActions
+    }
+
+    return handleCORS(NextResponse.json(suggestions))
+  } catch (error) {
+    console.error('Assistant suggestions error:', error)
+    return handleCORS(NextResponse.json({
+      success: false,
+      error: 'Failed to get assistant suggestions'
+    }, { status: 500 }))
+  }
+}
+
+// GET /api/assistant/stream - Server-Sent Events stream for real-time updates
+export async function openStream() {
+  try {
+    const stream = new ReadableStream({
+      start(controller) {
+        const g = globalThis
+        if (!g.__crmSSE) g.__crmSSE = { clients: new Set() }
+        g.__crmSSE.clients.add(controller)
+        // Changes made on other instances reach this client through the invalidation feed
+        followInvalidations()
+        // Initial event
+        try { controller.enqueue(`event: ready\ndata: {"ts": ${Date.now()}}\n\n`) } catch (_) {}
+        const pingId = setInterval(() => {
+          try { controller.enqueue(`event: ping\ndata: ${Date.now()}\n\n`) } catch (_) {}
+        }, 15000)
+        controller._cleanup = () => {
+          clearInterval(pingId)
+          try { g.__crmSSE.clients.delete(controller) } catch (_) {}
+          try { controller.close() } catch (_) {}
+        }
+      },
+      cancel() { try { this._cleanup && this._cleanup() } catch (_) {} }
+    })
+    const res = new Response(stream, {
+      headers: {
+        'Content-Type': 'text/event-stream',
+        'Connection': 'keep-alive',
+        'Cache-Control': 'no-cache'
+      }
+    })
+    return handleCORS(res)
+  } catch (error) {
+    console.error('SSE stream error:', error)
+    return handleCORS(NextResponse.json({ success: false, error: 'SSE stream failed' }, { status: 500 }))
+  }
+}
+
+export const routes = [
+  { method: 'POST', path: '/assistant/parse', handler: parseMessage },
+  { method: 'POST', path: '/assistant/match', handler: matchMessage },
+  { method: 'GET', path: '/assistant/conversations', handler: listConversations },
+  { method: 'GET', path: '/assistant/intents', handler: listIntents },
+  { method: 'GET', path: '/assistant/suggestions', handler: getSuggestions },
+  { method: 'GET', path: '/assistant/stream', handler: openStream }
+]
@@ -0,0 +1,484 @@
+import { v4 as uuidv4 } from 'uuid'
+import { NextResponse } from 'next/server'
+import { handleCORS } from '@/lib/api/http'
+import { getStageOrder } from '@/lib/api/checklists'
+import { buildChecklistTree, checklistETag, ensureChecklistIndexes, etagMatches, findChecklistItems } from '@/lib/api/checklist-view'
+import { bumpChecklistVersion, withChecklistWrite } from '@/lib/api/rollups'
+import { scheduleAlertRefresh } from '@/lib/api/alerts'
+import { invalidate } from '@/lib/api/invalidation'
+import { receiveMultipart, UploadError } from '@/lib/api/multipart'
+import { VOICE_MEMO_MAX_BYTES, voiceMemoPath, enqueueTranscription, cancelTranscriptions, removeVoiceMemoFiles } from '@/lib/api/voice-memos'
+import { estimateTaskDuration, replanTasks } from '@/lib/api/plans'
+import { getChecklistItem, getTemplateStorage, loadChecklistItems, materializeChecklistItem, removeTemplateItem } from '@/lib/api/checklist-templates'
+
+// GET /api/transactions/:id/checklist[?stage=&status=&view=tree] - Checklist items for a
+// transaction, ordered by stage, order and title. view=tree nests subtasks under their parent
+// and groups by stage. Conditional: send the ETag back in If-None-Match to get a 304 when the
+// checklist hasn't changed.
+export async function listChecklist({ request, db, params }) {
+  try {
+    const transactionId = params.id
+    const url = new URL(request.url)
+    const stage = url.searchParams.get('stage')
+    const status = url.searchParams.get('status')
+    const view = url.searchParams.get('view') === 'tree' ? 'tree' : 'flat'
+
+    const [transaction] = await Promise.all([
+      db.collection('transactions').findOne({ id: transactionId }, { projection: { _id: 0, id: 1, checklist_version: 1 } }),
+      ensureChecklistIndexes(db)
+    ])
+    if (!transaction) {
+      return handleCORS(NextResponse.json({ success: false, error: 'Transaction not found' }, { status: 404 }))
+    }
+
+    const etag = checklistETag(transaction, `${view}|${stage || ''}|${status || ''}`)
+    const headers = { ETag: etag, 'Cache-Control': 'private, no-cache' }
+    if (etagMatches(request, etag)) {
+      return handleCORS(new NextResponse(null, { status: 304, headers }))
+    }
+
+    const query = { transaction_id: transactionId }
+    if (stage) query.stage = stage
+    if (status) query.status = status
+    const items = await findChecklistItems(db, query)
+    const version = transaction.checklist_version || 0
+
+    const body = view === 'tree'
+      ? { success: true, version, stages: buildChecklistTree(items), total: items.length }
+      : { success: true, version, checklist_items: items, total: items.length }
+    return handleCORS(NextResponse.json(body, { headers }))
+  } catch (error) {
+    console.error('Error fetching checklist items:', error)
+    return handleCORS(
+      NextResponse.json(
+        { success: false, error: 'Failed to fetch checklist items' },
+        { status: 500 }
+      )
+    )
+  }
+}
+
+// POST /api/transactions/:id/checklist - Manually add a checklist item to a transaction
+export async function createChecklistItem({ request, db, params }) {
+  try {
+    const transactionId = params.id
+    const body = await request.json()
+
+    const transaction = await db.collection('transactions').findOne({ id: transactionId })
+    if (!transaction) {
+      return handleCORS(NextResponse.json({ success: false, error: 'Transaction not found' }, { status: 404 }))
+    }
+
+    if (!body.title || typeof body.title !== 'string') {
+      return handleCORS(NextResponse.json({ success: false, error: 'title is required' }, { status: 400 }))
+    }
+
+    const txType = (transaction.transaction_type || 'sale').toLowerCase()
+    let stage = (body.stage || transaction.current_stage)
+
+    const parentId = body.parent_id || null
+    let order
+    let stage_order
+
+    if (parentId) {
+      // Validate parent exists in same transaction
+      const parent = await getChecklistItem(db, parentId)
+      if (!parent || parent.transaction_id !== transactionId) {
+        return handleCORS(NextResponse.json({ success: false, error: 'Invalid parent_id: parent not found in this transaction' }, { status: 400 }))
+      }
+      // Child should inherit parent's stage/order for grouping
+      stage = parent.stage
+      order = parent.order || 1
+      stage_order = parent.stage_order || getStageOrder(stage, txType)
+    } else {
+      // Determine next order within this stage for a new parent item
+      const existing = await loadChecklistItems(db, { transaction_id: transactionId, stage })
+      order = existing.length + 1
+      stage_order = getStageOrder(stage, txType)
+    }
+
+    const due_date = body.due_date
+      ? new Date(body.due_date)
+      : (body.due_days ? new Date(Date.now() + Number(body.due_days) * 24 * 60 * 60 * 1000) : null)
+
+    const weight = (body.weight !== undefined && Number.isFinite(Number(body.weight))) ? Number(body.weight) : 1
+    const duration = (value, title) => (Number(value) > 0 ? Number(value) : estimateTaskDuration(title))
+
+    const item = {
+      id: uuidv4(),
+      transaction_id: transactionId,
+      title: body.title,
+      description: body.description || '',
+      stage,
+      status: body.status || 'not_started',
+      priority: body.priority || 'medium',
+      assignee: body.assignee || '',
+      due_date,
+      completed_date: null,
+      notes: body.notes || '',
+      order,
+      stage_order,
+      dependencies: Array.isArray(body.dependencies) ? body.dependencies : [],
+      weight,
+      est_duration_min: duration(body.est_duration_min, body.title),
+      parent_id: parentId,
+      created_at: new Date(),
+      updated_at: new Date()
+    }
+
+    // If creating a parent with provided subtasks, insert them as children
+    let children = []
+    if (!parentId && Array.isArray(body.subtasks) && body.subtasks.length > 0) {
+      children = body.subtasks
+        .filter(st => st && typeof st.title === 'string' && st.title.trim() !== '')
+        .map((st) => ({
+          id: uuidv4(),
+          transaction_id: transactionId,
+          title: st.title,
+          description: st.description || '',
+          stage,
+          status: st.status || 'not_started',
+          priority: st.priority || (body.priority || 'medium'),
+          assignee: st.assignee || '',
+          due_date: st.due_date ? new Date(st.due_date) : (st.due_days ? new Date(Date.now() + Number(st.due_days) * 24 * 60 * 60 * 1000) : null),
+          completed_date: null,
+          notes: st.notes || '',
+          order,
+          stage_order,
+          dependencies: Array.isArray(st.dependencies) ? st.dependencies : [],
+          weight: (st.weight !== undefined && Number.isFinite(Number(st.weight))) ? Number(st.weight) : 1,
+          est_duration_min: duration(st.est_duration_min, st.title),
+          parent_id: item.id,
+          created_at: new Date(),
+          updated_at: new Date()
+        }))
+    }
+
+    await withChecklistWrite(db, transactionId, [stage], async (session) => {
+      await db.collection('checklist_items').insertOne(item, { session })
+      if (children.length > 0) {
+        await db.collection('checklist_items').insertMany(children, { session })
+      }
+    })
+    scheduleAlertRefresh(transactionId)
+    replanTasks([item, ...children])
+
+    const { _id, ...cleanedItem } = item
+    // SSE broadcast so clients refresh lists
+    try {
+      const g = globalThis
+      if (g.__crmSSE?.clients) {
+        const msg = (ev, data) => `event: ${ev}\ndata: ${JSON.stringify(data)}\n\n`
+        for (const c of g.__crmSSE.clients) { try { c.enqueue(msg('tasks:changed', { action: 'created', id: item.id, transaction_id: transactionId })) } catch {} }
+        for (const c of g.__crmSSE.clients) { try { c.enqueue(msg('suggestions:update', { reason: 'task_created', id: item.id })) } catch {} }
+      }
+    } catch (_) { /* ignore SSE errors */ }
+    return handleCORS(NextResponse.json({ success: true, checklist_item: cleanedItem }, { status: 201 }))
+  } catch (error) {
+    console.error('Error creating checklist item:', error)
+    return handleCORS(NextResponse.json({ success: false, error: 'Failed to create checklist item' }, { status: 500 }))
+  }
+}
+
+// PUT /api/checklist/:id - Update checklist item
+export async function updateChecklistItem({ request, db, params }) {
+  try {
+    const itemId = params.id
+    const body = await request.json()
+
+    const existing = await getChecklistItem(db, itemId)
+    if (!existing) {
+      return handleCORS(NextResponse.json({ success: false, error: 'Checklist item not found' }, { status: 404 }))
+    }
+
+    const updateData = { updated_at: new Date() }
+
+    // Whitelist fields
+    if ('title' in body) {
+      updateData.title = body.title
+      updateData.est_duration_min = estimateTaskDuration(body.title)
+    }
+    if ('description' in body) updateData.description = body.description || ''
+    if ('priority' in body) updateData.priority = body.priority || 'medium'
+    if ('assignee' in body) updateData.assignee = body.assignee || ''
+    if ('notes' in body) updateData.notes = body.notes || ''
+    if ('dependencies' in body && Array.isArray(body.dependencies)) updateData.dependencies = body.dependencies
+    if ('due_date' in body) {
+      updateData.due_date = body.due_date ? new Date(body.due_date) : null
+    }
+    // Allow scheduling fields for calendar planning
+    if ('scheduled_start' in body) {
+      updateData.scheduled_start = body.scheduled_start ? new Date(body.scheduled_start) : null
+    }
+    if ('scheduled_end' in body) {
+      updateData.scheduled_end = body.scheduled_end ? new Date(body.scheduled_end) : null
+    }
+    // Basic validation if either schedule field is provided
+    if ('scheduled_start' in body || 'scheduled_end' in body) {
+      const s = ('scheduled_start' in body)
+        ? (body.scheduled_start ? new Date(body.scheduled_start) : null)
+        : (existing.scheduled_start ? new Date(existing.scheduled_start) : null)
+      const e = ('scheduled_end' in body)
+        ? (body.scheduled_end ? new Date(body.scheduled_end) : null)
+        : (existing.scheduled_end ? new Date(existing.scheduled_end) : null)
+      if (s && e && e <= s) {
+        return handleCORS(NextResponse.json({ success: false, error: 'scheduled_end must be after scheduled_start' }, { status: 400 }))
+      }
+    }
+    if ('est_duration_min' in body) {
+      if (!(Number(body.est_duration_min) > 0)) {
+        return handleCORS(NextResponse.json({ success: false, error: 'Invalid est_duration_min' }, { status: 400 }))
+      }
+      updateData.est_duration_min = Number(body.est_duration_min)
+    }
+    if ('weight' in body) {
+      if (body.weight === null || body.weight === undefined) {
+        // ignore
+      } else if (!Number.isFinite(Number(body.weight))) {
+        return handleCORS(NextResponse.json({ success: false, error: 'Invalid weight' }, { status: 400 }))
+      } else {
+        updateData.weight = Number(body.weight)
+      }
+    }
+
+    // Handle parent assignment changes
+    if ('parent_id' in body) {
+      if (body.parent_id === existing.id) {
+        return handleCORS(NextResponse.json({ success: false, error: 'parent_id cannot reference the item itself' }, { status: 400 }))
+      }
+      if (body.parent_id === null || body.parent_id === '' ) {
+        updateData.parent_id = null
+      } else {
+        const parent = await getChecklistItem(db, body.parent_id)
+        if (!parent || parent.transaction_id !== existing.transaction_id) {
+          return handleCORS(NextResponse.json({ success: false, error: 'Invalid parent_id: parent not found in this transaction' }, { status: 400 }))
+        }
+        updateData.parent_id = parent.id
+        // Align grouping with parent
+        updateData.stage = parent.stage
+        updateData.stage_order = parent.stage_order || getStageOrder(parent.stage)
+        updateData.order = parent.order || 1
+      }
+    }
+
+    // Handle status changes based on previous status
+    if ('status' in body) {
+      updateData.status = body.status
+      if (body.status === 'completed' && existing.status !== 'completed') {
+        updateData.completed_date = new Date()
+      } else if (body.status !== 'completed' && existing.status === 'completed') {
+        updateData.completed_date = null
+      }
+    }
+
+    // The first change to a template item stores it
+    const cleanedItem = await withChecklistWrite(db, existing.transaction_id, [existing.stage, updateData.stage], (session) =>
+      existing.virtual
+        ? materializeChecklistItem(db, existing, { $set: updateData }, session)
+        : db.collection('checklist_items').findOneAndUpdate(
+          { id: itemId },
+          { $set: updateData },
+          { session, returnDocument: 'after', projection: { _id: 0 } }
+        )
+    )
+
+    if (!cleanedItem) {
+      return handleCORS(NextResponse.json({
+        success: false,
+        error: "Checklist item not found"
+      }, { status: 404 }))
+    }
+
+    scheduleAlertRefresh(existing.transaction_id)
+    replanTasks([cleanedItem])
+    invalidate(['tasks', 'suggestions'], { transactionId: existing.transaction_id })
+
+    // SSE broadcast to notify clients about checklist updates
+    try {
+      const g = globalThis
+      if (g.__crmSSE?.clients) {
+        const msg = (ev, data) => `event: ${ev}\ndata: ${JSON.stringify(data)}\n\n`
+        for (const c of g.__crmSSE.clients) { try { c.enqueue(msg('tasks:changed', { action: 'updated', id: itemId, fields: Object.keys(updateData || {}) })) } catch {} }
+        for (const c of g.__crmSSE.clients) { try { c.enqueue(msg('suggestions:update', { reason: 'task_updated', id: itemId })) } catch {} }
+      }
+    } catch (_) { /* ignore SSE errors */ }
+
+    return handleCORS(NextResponse.json({
+      success: true,
+      checklist_item: cleanedItem
+    }))
+  } catch (error) {
+    console.error('Error updating checklist item:', error)
+    return handleCORS(NextResponse.json({
+      success: false,
+      error: 'Failed to update checklist item'
+    }, { status: 500 }))
+  }
+}
+
+// DELETE /api/checklist/:id - Delete checklist item
+export async function deleteChecklistItem({ db, params }) {
+  try {
+    const itemId = params.id
+    
+    const existing = await getChecklistItem(db, itemId)
+    const result = existing
+      ? await withChecklistWrite(db, existing.transaction_id, [existing.stage], async (session) => {
+          // Template items are also removed from the seed so they aren't rebuilt from the template
+          if (existing.template_key) await removeTemplateItem(db, itemId, session)
+          if (existing.virtual) return { deletedCount: 1 }
+          return db.collection('checklist_items').deleteOne({ id: itemId }, { session })
+        })
+      : { deletedCount: 0 }
+    
+    if (result.deletedCount === 0) {
+      return handleCORS(NextResponse.json({
+        success: false,
+        error: "Checklist item not found"
+      }, { status: 404 }))
+    }
+    scheduleAlertRefresh(existing.transaction_id)
+    replanTasks([{ id: itemId }], { removed: true })
+    invalidate(['tasks', 'suggestions'], { transactionId: existing.transaction_id })
+    // Queued transcriptions for these memos are dropped by the workers
+    await removeVoiceMemoFiles(existing.voice_memos)
+
+    // SSE broadcast so clients refresh lists
+    try {
+      const g = globalThis
+      if (g.__crmSSE?.clients) {
+        const msg = (ev, data) => `event: ${ev}\ndata: ${JSON.stringify(data)}\n\n`
+        for (const c of g.__crmSSE.clients) { try { c.enqueue(msg('tasks:changed', { action: 'deleted', id: itemId })) } catch {} }
+        for (const c of g.__crmSSE.clients) { try { c.enqueue(msg('suggestions:update', { reason: 'task_deleted', id: itemId })) } catch {} }
+      }
+    } catch (_) { /* ignore SSE errors */ }
+
+    return handleCORS(NextResponse.json({
+      message: "Checklist item deleted successfully"
+    }))
+  } catch (error) {
+    console.error('Error deleting checklist item:', error)
+    return handleCORS(NextResponse.json({
+      success: false,
+      error: 'Failed to delete checklist item'
+    }, { status: 500 }))
+  }
+}
+
+// POST /api/checklist/:id/voice - Upload a voice memo (multipart/form-data). The audio is
+// streamed to disk and the memo returned with transcription 'pending'; the transcript is
+// filled in by the background workers (tasks:changed over SSE when done).
+export async function uploadVoiceMemo({ request, db, params }) {
+  try {
+    const itemId = params.id
+    const existing = await getChecklistItem(db, itemId)
+    if (!existing) {
+      return handleCORS(NextResponse.json({ success: false, error: 'Checklist item not found' }, { status: 404 }))
+    }
+    if (!process.env.OPENAI_API_KEY) {
+      return handleCORS(NextResponse.json({ success: false, error: 'OPENAI_API_KEY not configured for transcription' }, { status: 500 }))
+    }
+
+    const memoId = uuidv4()
+    const { fileName, filePath } = await voiceMemoPath(itemId, memoId)
+    let upload
+    try {
+      upload = await receiveMultipart(request, { fileField: 'audio', filePath, maxFileBytes: VOICE_MEMO_MAX_BYTES })
+    } catch (e) {
+      if (!(e instanceof UploadError)) throw e
+      return handleCORS(NextResponse.json({ success: false, error: e.status === 413 ? e.message : 'Expected multipart/form-data with an "audio" file' }, { status: e.status }))
+    }
+    if (!upload.file || upload.file.size === 0) {
+      await removeVoiceMemoFiles([{ audio_file: fileName }])
+      return handleCORS(NextResponse.json({ success: false, error: 'Missing audio file in form field "audio"' }, { status: 400 }))
+    }
+
+    const durationSec = Number(upload.fields.duration)
+    const memo = {
+      id: memoId,
+      text: '',
+      transcription: 'pending',
+      note: (upload.fields.note || '').toString(),
+      duration_sec: Number.isFinite(durationSec) ? durationSec : null,
+      audio_file: fileName,
+      mime: (upload.file.type || 'audio/webm').toString(),
+      size_bytes: upload.file.size,
+      created_at: new Date()
+    }
+
+    const memoUpdate = { $push: { voice_memos: memo }, $set: { updated_at: new Date() } }
+    const updated = existing.virtual
+      ? await materializeChecklistItem(db, existing, memoUpdate)
+      : await db.collection('checklist_items').findOneAndUpdate(
+        { id: itemId },
+        memoUpdate,
+        { returnDocument: 'after', projection: { _id: 0 } }
+      )
+    if (!updated) {
+      // Item deleted while the upload was streaming
+      await removeVoiceMemoFiles([memo])
+      return handleCORS(NextResponse.json({ success: false, error: 'Checklist item not found' }, { status: 404 }))
+    }
+    await bumpChecklistVersion(db, existing.transaction_id)
+    await enqueueTranscription(db, itemId, memoId)
+    replanTasks([updated])
+    invalidate(['tasks'], { transactionId: existing.transaction_id })
+
+    return handleCORS(NextResponse.json({ success: true, memo, checklist_item: updated }, { status: 201 }))
+  } catch (error) {
+    console.error('Error uploading voice memo:', error)
+    return handleCORS(NextResponse.json({ success: false, error: 'Failed to upload voice memo' }, { status: 500 }))
+  }
+}
+
+// DELETE /api/checklist/:id/voice/:memoId - Delete a transcribed memo
+export async function deleteVoiceMemo({ db, params }) {
+  try {
+    const itemId = params.id
+    const memoId = params.memoId
+    const existing = await getChecklistItem(db, itemId)
+    if (!existing) {
+      return handleCORS(NextResponse.json({ success: false, error: 'Checklist item not found' }, { status: 404 }))
+    }
+    const memos = Array.isArray(existing.voice_memos) ? existing.voice_memos : []
+    const memo = memos.find(m => m.id === memoId)
+    if (!memo) {
+      return handleCORS(NextResponse.json({ success: false, error: 'Voice memo not found' }, { status: 404 }))
+    }
+    await db.collection('checklist_items').updateOne(
+      { id: itemId },
+      { $pull: { voice_memos: { id: memoId } }, $set: { updated_at: new Date() } }
+    )
+    await bumpChecklistVersion(db, existing.transaction_id)
+    await cancelTranscriptions(db, [memoId])
+    await removeVoiceMemoFiles([memo])
+    invalidate(['tasks'], { transactionId: existing.transaction_id })
+    return handleCORS(NextResponse.json({ success: true }))
+  } catch (error) {
+    console.error('Error deleting voice memo:', error)
+    return handleCORS(NextResponse.json({ success: false, error: 'Failed to delete voice memo' }, { status: 500 }))
+  }
+}
+
+// GET /api/checklist/templates - Default checklist templates and the storage they save.
+// ?transaction_id= also returns that transaction's seeds.
+export async function listChecklistTemplates({ request, db }) {
+  try {
+    const url = new URL(request.url)
+    const result = await getTemplateStorage(db, url.searchParams.get('transaction_id'))
+    return handleCORS(NextResponse.json({ success: true, ...result }))
+  } catch (error) {
+    console.error('Error fetching checklist templates:', error)
+    return handleCORS(NextResponse.json({ success: false, error: 'Failed to fetch checklist templates' }, { status: 500 }))
+  }
+}
+
+export const routes = [
+  { method: 'GET', path: '/transactions/:id/checklist', handler: listChecklist },
+  { method: 'POST', path: '/transactions/:id/checklist', handler: createChecklistItem },
+  { method: 'PUT', path: '/checklist/:id', handler: updateChecklistItem },
+  { method: 'DELETE', path: '/checklist/:id', handler: deleteChecklistItem },
+  { method: 'POST', path: '/checklist/:id/voice', handler: uploadVoiceMemo },
+  { method: 'DELETE', path: '/checklist/:id/voice/:memoId', handler: deleteVoiceMemo },
+  { method: 'GET', path: '/checklist/templates', handler: listChecklistTemplates }
+]
@@ -0,0 +1,29 @@
+import { NextResponse } from 'next/server'
+import { handleCORS } from '@/lib/api/http'
+import { ExportError, exportStream, prepareExport } from '@/lib/api/export'
+
+// GET /api/export/:resource?format=ndjson|csv[&fields=a,b.c][&limit=][&cursor=][&<filters>]
+// Streams transactions, leads or checklists (see lib/api/export.js for filters and cursors)
+export async function exportResource({ request, db, params }) {
+  let plan
+  try {
+    plan = prepareExport(params.resource, new URL(request.url).searchParams)
+  } catch (error) {
+    if (!(error instanceof ExportError)) throw error
+    return handleCORS(NextResponse.json({ success: false, error: error.message }, { status: error.status }))
+  }
+
+  const csv = plan.format === 'csv'
+  return handleCORS(new Response(exportStream(db, plan), {
+    status: 200,
+    headers: {
+      'Content-Type': csv ? 'text/csv; charset=utf-8' : 'application/x-ndjson',
+      'Content-Disposition': `attachment; filename="${plan.resource}.${csv ? 'csv' : 'ndjson'}"`,
+      'Cache-Control': 'no-cache'
+    }
+  }))
+}
+
+export const routes = [
+  { method: 'GET', path: '/export/:resource', handler: exportResource }
+]
@@ -0,0 +1,12 @@
+import { NextResponse } from 'next/server'
+import { handleCORS } from '@/lib/api/http'
+import { getStartupReport } from '@/lib/api/startup'
+
+// GET /api/health/startup - Startup phase timings for this server process
+export async function getStartup() {
+  return handleCORS(NextResponse.json({ success: true, ...getStartupReport() }))
+}
+
+export const routes = [
+  { method: 'GET', path: '/health/startup', handler: getStartup, db: false }
+]
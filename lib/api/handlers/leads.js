@@ -0,0 +1,436 @@
+import { v4 as uuidv4 } from 'uuid'
+import { NextResponse } from 'next/server'
+import { handleCORS } from '@/lib/api/http'
+import { callOpenAI } from '@/lib/api/openai'
+import { fetchProperties, mapLeadPreferencesToFilters } from '@/lib/api/properties'
+import { checkDuplicateLead, ensureLeadIndexes, generateLeadInsights, leadIdentityFields, normalizeEmail, normalizeName, normalizePhone } from '@/lib/api/leads'
+import { importLeads, parseCsv, parseNdjson, readLines } from '@/lib/api/lead-import'
+import { ENRICHMENT_MODE, enqueueLeadEnrichment } from '@/lib/api/enrichment'
+
+// GET /api/leads - Get all leads with search
+export async function listLeads({ request, db }) {
+  const url = new URL(request.url)
+  const search = url.searchParams.get('search')
+  const leadType = url.searchParams.get('lead_type')
+  
+  let query = {}
+  
+  if (search) {
+    query.$or = [
+      { name: { $regex: search, $options: 'i' } },
+      { email: { $regex: search, $options: 'i' } },
+      { phone: { $regex: search, $options: 'i' } }
+    ]
+  }
+  
+  if (leadType) {
+    query.lead_type = leadType
+  }
+  
+  const leads = await db.collection('leads')
+    .find(query)
+    .sort({ created_at: -1 })
+    .limit(100)
+    .toArray()
+
+  const cleanedLeads = leads.map(({ _id, ...rest }) => rest)
+  return handleCORS(NextResponse.json(cleanedLeads))
+}
+
+// POST /api/leads - Create new lead
+export async function createLead({ request, db }) {
+  const body = await request.json()
+  
+  if (!body.name || !body.email || !body.phone) {
+    return handleCORS(NextResponse.json(
+      { error: "Name, email, and phone are required" }, 
+      { status: 400 }
+    ))
+  }
+
+  // Check for duplicates
+  await ensureLeadIndexes(db)
+  const duplicate = await checkDuplicateLead(db, body.email, body.phone)
+  if (duplicate) {
+    return handleCORS(NextResponse.json(
+      { error: "Lead with this email or phone already exists", existing_lead: duplicate.id }, 
+      { status: 409 }
+    ))
+  }
+
+  const lead = {
+    id: uuidv4(),
+    name: body.name,
+    email: body.email,
+    phone: body.phone,
+    ...leadIdentityFields(body.email, body.phone, body.name),
+    lead_type: body.lead_type || 'buyer',
+    preferences: body.preferences || {},
+    assigned_agent: body.assigned_agent || null,
+    tags: body.tags || [],
+    source: body.source || 'manual',
+    status: 'new',
+    created_at: new Date(),
+    updated_at: new Date()
+  }
+
+  if (ENRICHMENT_MODE === 'sync') {
+    await db.collection('leads').insertOne(lead)
+
+    // Generate AI insights
+    const insights = await generateLeadInsights(lead)
+    if (insights) {
+      await db.collection('leads').updateOne(
+        { id: lead.id },
+        { $set: { ai_insights: insights, ai_insights_status: 'ready', updated_at: new Date() } }
+      )
+      lead.ai_insights = insights
+      lead.ai_insights_status = 'ready'
+    }
+  } else {
+    // Insights are filled in by the enrichment workers; clients hear about it via leads:changed
+    lead.ai_insights_status = 'pending'
+    await db.collection('leads').insertOne(lead)
+    await enqueueLeadEnrichment(db, lead.id)
+  }
+
+  const { _id, ...cleanedLead } = lead
+  return handleCORS(NextResponse.json(cleanedLead, { status: 201 }))
+}
+
+// POST /api/leads/import - Bulk import from NDJSON (default) or CSV (?format=csv or a
+// text/csv body). Streams back one NDJSON result line per input row, then a summary
+// line. AI insights are queued for the enrichment workers unless ?enrich=0.
+export async function importLeadsStream({ request, db }) {
+  const url = new URL(request.url)
+  const contentType = request.headers.get('content-type') || ''
+  const format = url.searchParams.get('format') || (contentType.includes('csv') ? 'csv' : 'ndjson')
+  const enrich = !['0', 'false'].includes(url.searchParams.get('enrich'))
+  const source = url.searchParams.get('source') || 'import'
+
+  if (!['csv', 'ndjson'].includes(format)) {
+    return handleCORS(NextResponse.json({ error: "format must be csv or ndjson" }, { status: 400 }))
+  }
+  if (!request.body) {
+    return handleCORS(NextResponse.json({ error: "Request body is required" }, { status: 400 }))
+  }
+
+  await ensureLeadIndexes(db)
+  const lines = readLines(request.body)
+  const records = format === 'csv' ? parseCsv(lines) : parseNdjson(lines)
+  const encoder = new TextEncoder()
+  let cancelled = false
+
+  const stream = new ReadableStream({
+    // Results are queued without waiting on the reader: clients usually finish uploading
+    // before they read the response, and blocking here would stall the upload.
+    start(controller) {
+      ;(async () => {
+        try {
+          for await (const out of importLeads(db, records, { enrich, source })) {
+            if (cancelled) return
+            const lines = Array.isArray(out) ? out : [out]
+            controller.enqueue(encoder.encode(lines.map(l => JSON.stringify(l)).join('\n') + '\n'))
+          }
+        } catch (error) {
+          console.error('Lead import error:', error)
+          try { controller.enqueue(encoder.encode(JSON.stringify({ error: "Import aborted", message: error.message }) + '\n')) } catch (_) {}
+        }
+        try { controller.close() } catch (_) {}
+      })()
+    },
+    cancel() { cancelled = true }
+  })
+
+  return handleCORS(new Response(stream, {
+    status: 200,
+    headers: { 'Content-Type': 'application/x-ndjson', 'Cache-Control': 'no-cache' }
+  }))
+}
+
+// GET /api/leads/:id - Get specific lead
+export async function getLead({ db, params }) {
+  const leadId = params.id
+  const lead = await db.collection('leads').findOne({ id: leadId })
+  
+  if (!lead) {
+    return handleCORS(NextResponse.json(
+      { error: "Lead not found" }, 
+      { status: 404 }
+    ))
+  }
+
+  const { _id, ...cleanedLead } = lead
+  return handleCORS(NextResponse.json(cleanedLead))
+}
+
+// PUT /api/leads/:id - Update lead
+export async function updateLead({ request, db, params }) {
+  const leadId = params.id
+  const body = await request.json()
+  
+  const updateData = {
+    ...body,
+    updated_at: new Date()
+  }
+  delete updateData.id
+  delete updateData.created_at
+  if ('email' in body) updateData.email_normalized = normalizeEmail(body.email)
+  if ('phone' in body) updateData.phone_normalized = normalizePhone(body.phone)
+  if ('name' in body) updateData.name_normalized = normalizeName(body.name)
+
+  const cleanedLead = await db.collection('leads').findOneAndUpdate(
+    { id: leadId },
+    { $set: updateData },
+    { returnDocument: 'after', projection: { _id: 0 } }
+  )
+
+  if (!cleanedLead) {
+    return handleCORS(NextResponse.json(
+      { error: "Lead not found" }, 
+      { status: 404 }
+    ))
+  }
+
+  return handleCORS(NextResponse.json(cleanedLead))
+}
+
+// DELETE /api/leads/:id - Delete lead
+export async function deleteLead({ db, params }) {
+  const leadId = params.id
+  
+  const result = await db.collection('leads').deleteOne({ id: leadId })
+  
+  if (result.deletedCount === 0) {
+    return handleCORS(NextResponse.json(
+      { error: "Lead not found" }, 
+      { status: 404 }
+    ))
+  }
+
+  return handleCORS(NextResponse.json({ message: "Lead deleted successfully" }))
+}
+
+// DELETE /api/leads?source=<tag> - Delete every lead from one source (e.g. one import run)
+export async function deleteLeadsBySource({ request, db }) {
+  const source = new URL(request.url).searchParams.get('source')
+  if (!source) {
+    return handleCORS(NextResponse.json({ error: "source is required" }, { status: 400 }))
+  }
+
+  const result = await db.collection('leads').deleteMany({ source })
+
+  return handleCORS(NextResponse.json({ message: "Leads deleted successfully", deleted: result.deletedCount }))
+}
+
+// POST /api/leads/:id/match - AI-powered property matching
+export async function matchLeadProperties({ db, params }) {
+  const leadId = params.id
+  const lead = await db.collection('leads').findOne({ id: leadId })
+  
+  if (!lead) {
+    return handleCORS(NextResponse.json(
+      { error: "Lead not found" }, 
+      { status: 404 }
+    ))
+  }
+
+  // If lead is a seller, skip property search and produce seller-focused insights
+  const leadTypeForMatch = String(lead?.lead_type || '').toLowerCase()
+  if (leadTypeForMatch === 'seller') {
+    // Enrich seller preferences from transaction info if available
+    const prefs = lead.preferences || {}
+    const tx = lead.transaction_info || {}
+    const enrichedPrefs = { ...prefs }
+    if (!enrichedPrefs.seller_address && tx.property_address) {
+      enrichedPrefs.seller_address = tx.property_address
+    }
+    if (enrichedPrefs.seller_price == null) {
+      const txPrice = tx.listing_price ?? tx.asking_price ?? tx.price ?? null
+      if (txPrice != null) enrichedPrefs.seller_price = txPrice
+    }
+    // Persist preference enrichment if changed
+    try {
+      if (JSON.stringify(enrichedPrefs) !== JSON.stringify(prefs)) {
+        await db.collection('leads').updateOne(
+          { id: leadId },
+          { $set: { preferences: enrichedPrefs, updated_at: new Date() } }
+        )
+      }
+    } catch (e) {
+      console.warn('Failed to enrich seller preferences for lead', leadId, e)
+    }
+    const sellerLead = { ...lead, preferences: enrichedPrefs }
+    // Generate seller-specific insights (no property suggestions)
+    const insights = await generateLeadInsights(sellerLead, [])
+    // Persist insights
+    let cleanedSellerLead = {}
+    try {
+      cleanedSellerLead = await db.collection('leads').findOneAndUpdate(
+        { id: leadId },
+        { $set: { ai_insights: insights, last_matched_at: new Date(), updated_at: new Date() } },
+        { returnDocument: 'after', projection: { _id: 0 } }
+      ) || {}
+    } catch (e) {
+      console.warn('Failed to persist ai_insights for seller lead', leadId, e)
+    }
+    return handleCORS(NextResponse.json({
+      lead_id: leadId,
+      properties: [],
+      ai_recommendations: insights,
+      total_found: 0,
+      filters_applied: {},
+      filter_policy: 'seller_no_search',
+      updated_lead: cleanedSellerLead
+    }))
+  }
+
+  // Search properties based on lead preferences (strict mapping)
+  const filters = mapLeadPreferencesToFilters(lead.preferences || {})
+  const propertySearchResult = await fetchProperties(filters)
+  const properties = propertySearchResult?.properties || []
+
+  // Apply strict, preference-aligned filtering so AI only sees valid candidates
+  const desiredZip = filters.location ? String(filters.location).slice(0, 5) : null
+  const minBeds = filters.beds ? Number(filters.beds) : null
+  const minBaths = filters.baths ? Number(filters.baths) : null
+  const minPrice = filters.min_price ? Number(filters.min_price) : null
+  const maxPrice = filters.max_price ? Number(filters.max_price) : null
+
+  function filterStrict(list) {
+    return list.filter(p => {
+      if (desiredZip && String(p.zipcode || '').slice(0, 5) !== desiredZip) return false
+      if (minBeds !== null && !(typeof p.bedrooms === 'number' && p.bedrooms >= minBeds)) return false
+      if (minBaths !== null && !(typeof p.bathrooms === 'number' && p.bathrooms >= minBaths)) return false
+      if (minPrice !== null || maxPrice !== null) {
+        if (typeof p.price !== 'number') return false
+        if (minPrice !== null && p.price < minPrice) return false
+        if (maxPrice !== null && p.price > maxPrice) return false
+      }
+      return true
+    })
+  }
+
+  // Progressive relaxation in case of zero strict matches
+  let matchingPool = filterStrict(properties)
+  let filterPolicy = 'strict'
+
+  if (matchingPool.length === 0) {
+    // Allow unknown baths
+    matchingPool = properties.filter(p => {
+      if (desiredZip && String(p.zipcode || '').slice(0, 5) !== desiredZip) return false
+      if (minBeds !== null && !(typeof p.bedrooms === 'number' && p.bedrooms >= minBeds)) return false
+      if (minPrice !== null || maxPrice !== null) {
+        if (typeof p.price !== 'number') return false
+        if (minPrice !== null && p.price < minPrice) return false
+        if (maxPrice !== null && p.price > maxPrice) return false
+      }
+      return true
+    })
+    if (matchingPool.length > 0) filterPolicy = 'relaxed:allow_unknown_baths'
+  }
+
+  if (matchingPool.length === 0) {
+    // Allow unknown beds too
+    matchingPool = properties.filter(p => {
+      if (desiredZip && String(p.zipcode || '').slice(0, 5) !== desiredZip) return false
+      if (minBaths !== null && !(typeof p.bathrooms === 'number' && p.bathrooms >= minBaths)) return false
+      if (minPrice !== null || maxPrice !== null) {
+        if (typeof p.price !== 'number') return false
+        if (minPrice !== null && p.price < minPrice) return false
+        if (maxPrice !== null && p.price > maxPrice) return false
+      }
+      return true
+    })
+    if (matchingPool.length > 0) filterPolicy = 'relaxed:allow_unknown_beds_baths'
+  }
+
+  if (matchingPool.length === 0 && (minPrice !== null || maxPrice !== null)) {
+    // Expand price by ±10%
+    const adjMin = minPrice !== null ? Math.floor(minPrice * 0.9) : null
+    const adjMax = maxPrice !== null ? Math.ceil(maxPrice * 1.1) : null
+    matchingPool = properties.filter(p => {
+      if (desiredZip && String(p.zipcode || '').slice(0, 5) !== desiredZip) return false
+      if (minBeds !== null && typeof p.bedrooms === 'number' && p.bedrooms < minBeds) return false
+      if (minBaths !== null && typeof p.bathrooms === 'number' && p.bathrooms < minBaths) return false
+      if (typeof p.price !== 'number') return false
+      if (adjMin !== null && p.price < adjMin) return false
+      if (adjMax !== null && p.price > adjMax) return false
+      return true
+    })
+    if (matchingPool.length > 0) filterPolicy = 'relaxed:price_10pct'
+  }
+
+  // Final fallback to original list to avoid empty UX (AI will explicitly state mismatch)
+  if (matchingPool.length === 0) {
+    matchingPool = properties
+    filterPolicy = 'fallback:unfiltered'
+  }
+  
+  // Generate AI matching insights
+  const matchingInsights = await callOpenAI('o1-mini', [
+    {
+      role: "system",
+      content: "You are a precise real estate matching expert. Only recommend properties that satisfy the lead's stated constraints. If none satisfy, say so and suggest adjustments."
+    },
+    {
+      role: "user",
+      content: `Lead: ${lead.name} (${lead.lead_type})
+      Preferences: ${JSON.stringify(lead.preferences)}
+      Applied Filters (strict): ${JSON.stringify(filters)}
+      Candidate Properties (post-filter, up to 5): ${JSON.stringify(matchingPool.slice(0, 5))}
+      Filter Policy Used: ${filterPolicy}
+
+      Rules:
+      - Only select properties that meet min bedrooms, min bathrooms, and price range when these are provided.
+      - If zipcode is specified, only consider that zipcode.
+      - Do not include properties with unknown values for required constraints.
+      - If no properties meet constraints, clearly state none match and propose specific, practical adjustments.
+
+      Output (Markdown):
+      ### AI Insights
+      1) For each of the top 3 matches, show:
+         - Address
+         - Price (USD, commas)
+         - Bedrooms / Bathrooms
+         - Reason for Match (explicitly reference how it meets the constraints)
+      ### Summary
+      - Brief recap of how matches satisfy the constraints. If Filter Policy is not 'strict', briefly note what was relaxed.
+      ### Next Steps
+      - 2-3 concise actions for the agent.`
+    }
+  ])
+
+  // Persist AI insights on the lead for display in UI
+  let cleanedUpdatedLead = {}
+  try {
+    cleanedUpdatedLead = await db.collection('leads').findOneAndUpdate(
+      { id: leadId },
+      { $set: { ai_insights: matchingInsights, updated_at: new Date(), last_matched_at: new Date() } },
+      { returnDocument: 'after', projection: { _id: 0 } }
+    ) || {}
+  } catch (e) {
+    console.warn('Failed to persist ai_insights for lead', leadId, e)
+  }
+
+  return handleCORS(NextResponse.json({
+    lead_id: leadId,
+    properties: matchingPool.slice(0, 10),
+    ai_recommendations: matchingInsights,
+    total_found: properties.length,
+    filters_applied: filters,
+    filter_policy: filterPolicy,
+    updated_lead: cleanedUpdatedLead
+  }))
+}
+
+export const routes = [
+  { method: 'GET', path: '/leads', handler: listLeads },
+  { method: 'POST', path: '/leads', handler: createLead },
+  { method: 'POST', path: '/leads/import', handler: importLeadsStream },
+  { method: 'DELETE', path: '/leads', handler: deleteLeadsBySource },
+  { method: 'GET', path: '/leads/:id', handler: getLead },
+  { method: 'PUT', path: '/leads/:id', handler: updateLead },
+  { method: 'DELETE', path: '/leads/:id', handler: deleteLead },
+  { method: 'POST', path: '/leads/:id/match', handler: matchLeadProperties }
+]
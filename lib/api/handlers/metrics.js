@@ -0,0 +1,24 @@
+import { NextResponse } from 'next/server'
+import { handleCORS } from '@/lib/api/http'
+import { getDbMetrics } from '@/lib/api/db-metrics'
+import { renderPrometheus } from '@/lib/api/metrics'
+import '@/lib/api/telemetry'
+
+// GET /api/metrics - Prometheus text exposition of all API, upstream, scheduler and DB metrics
+export async function getPrometheusMetrics() {
+  return handleCORS(new NextResponse(renderPrometheus(), {
+    status: 200,
+    headers: { 'Content-Type': 'text/plain; version=0.0.4; charset=utf-8' }
+  }))
+}
+
+// GET /api/metrics/db - MongoDB command latency and document counts per collection/operation
+export async function getDbMetricsReport() {
+  return handleCORS(NextResponse.json({ success: true, ...getDbMetrics() }))
+}
+
+// Metrics must stay readable when the database is the thing that's slow
+export const routes = [
+  { method: 'GET', path: '/metrics', handler: getPrometheusMetrics, db: false },
+  { method: 'GET', path: '/metrics/db', handler: getDbMetricsReport, db: false }
+]
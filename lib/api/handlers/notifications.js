@@ -0,0 +1,135 @@
+import { v4 as uuidv4 } from 'uuid'
+import { NextResponse } from 'next/server'
+import { connectToMongo } from '@/lib/api/db'
+import { handleCORS } from '@/lib/api/http'
+
+// --- Notifications API ---
+// GET /api/notifications
+export async function listNotifications({ request }) {
+  try {
+    const url = new URL(request.url)
+    const limit = Math.max(1, Math.min(200, Number(url.searchParams.get('limit')) || 50))
+    const countOnly = url.searchParams.get('countOnly') === '1'
+    const coll = (await connectToMongo()).collection('notifications')
+    if (countOnly) {
+      const total = await coll.countDocuments()
+      const unread = await coll.countDocuments({ status: 'unread' })
+      return handleCORS(NextResponse.json({ success: true, total, unread }))
+    }
+    const items = await coll.find({}).sort({ created_at: -1 }).limit(limit).toArray()
+    return handleCORS(NextResponse.json({ success: true, items: items.map(({ _id, ...rest }) => rest) }))
+  } catch (e) {
+    console.error('Notifications list error', e)
+    return handleCORS(NextResponse.json({ success: false, error: 'Failed to list notifications' }, { status: 500 }))
+  }
+}
+
+// POST /api/notifications (create)
+export async function createNotification({ request }) {
+  try {
+    const body = await request.json().catch(() => ({}))
+    const notif = {
+      id: uuidv4(),
+      type: body.type || 'general',
+      title: body.title || null,
+      message: body.message || body.description || '',
+      meta: body.meta || {},
+      status: 'unread',
+      created_at: new Date(),
+      updated_at: new Date(),
+      snooze_until: null
+    }
+    const coll = (await connectToMongo()).collection('notifications')
+    await coll.insertOne(notif)
+    // SSE broadcast
+    try {
+      const g = globalThis
+      if (g.__crmSSE?.clients) {
+        const msg = (ev, data) => `event: ${ev}\ndata: ${JSON.stringify(data)}\n\n`
+        for (const c of g.__crmSSE.clients) { try { c.enqueue(msg('notifications:changed', { action: 'created', id: notif.id })) } catch {} }
+      }
+    } catch (_) {}
+    return handleCORS(NextResponse.json({ success: true, notification: notif }, { status: 201 }))
+  } catch (e) {
+    console.error('Notifications create error', e)
+    return handleCORS(NextResponse.json({ success: false, error: 'Failed to create notification' }, { status: 500 }))
+  }
+}
+
+// POST /api/notifications/:id/read
+export async function markNotificationRead({ params }) {
+  try {
+    const id = params.id
+    const coll = (await connectToMongo()).collection('notifications')
+    await coll.updateOne({ id }, { $set: { status: 'read', updated_at: new Date() } })
+    globalThis.__crmSnoozeQueue?.cancel(id)
+    try {
+      const g = globalThis
+      if (g.__crmSSE?.clients) {
+        const msg = (ev, data) => `event: ${ev}\ndata: ${JSON.stringify(data)}\n\n`
+        for (const c of g.__crmSSE.clients) { try { c.enqueue(msg('notifications:changed', { action: 'read', id })) } catch {} }
+      }
+    } catch (_) {}
+    return handleCORS(NextResponse.json({ success: true }))
+  } catch (e) {
+    console.error('Notifications read error', e)
+    return handleCORS(NextResponse.json({ success: false, error: 'Failed to mark read' }, { status: 500 }))
+  }
+}
+
+// POST /api/notifications/:id/snooze
+export async function snoozeNotification({ request, params }) {
+  try {
+    const id = params.id
+    const body = await request.json().catch(() => ({}))
+    const minutes = Math.max(1, Number(body.minutes) || 30)
+    const until = new Date(Date.now() + minutes * 60 * 1000)
+    const coll = (await connectToMongo()).collection('notifications')
+    await coll.updateOne({ id }, { $set: { status: 'snoozed', snooze_until: until, updated_at: new Date() } })
+    globalThis.__crmSnoozeQueue?.schedule(id, until)
+    try {
+      const g = globalThis
+      if (g.__crmSSE?.clients) {
+        const msg = (ev, data) => `event: ${ev}\ndata: ${JSON.stringify(data)}\n\n`
+        for (const c of g.__crmSSE.clients) { try { c.enqueue(msg('notifications:changed', { action: 'snoozed', id, until })) } catch {} }
+      }
+    } catch (_) {}
+    return handleCORS(NextResponse.json({ success: true }))
+  } catch (e) {
+    console.error('Notifications snooze error', e)
+    return handleCORS(NextResponse.json({ success: false, error: 'Failed to snooze' }, { status: 500 }))
+  }
+}
+
+// POST /api/notifications/clear-read
+export async function clearReadNotifications() {
+  try {
+    const coll = (await connectToMongo()).collection('notifications')
+    // Prefer deleteMany, fallback to manual loop if unavailable
+    if (typeof coll.deleteMany === 'function') {
+      await coll.deleteMany({ status: 'read' })
+    } else {
+      const all = await coll.find({}).toArray()
+      for (const n of all) { if (n.status === 'read') { try { await coll.deleteOne({ id: n.id }) } catch {} } }
+    }
+    try {
+      const g = globalThis
+      if (g.__crmSSE?.clients) {
+        const msg = (ev, data) => `event: ${ev}\ndata: ${JSON.stringify(data)}\n\n`
+        for (const c of g.__crmSSE.clients) { try { c.enqueue(msg('notifications:changed', { action: 'clear_read' })) } catch {} }
+      }
+    } catch (_) {}
+    return handleCORS(NextResponse.json({ success: true }))
+  } catch (e) {
+    console.error('Notifications clear-read error', e)
+    return handleCORS(NextResponse.json({ success: false, error: 'Failed to clear read' }, { status: 500 }))
+  }
+}
+
+export const routes = [
+  { method: 'GET', path: '/notifications', handler: listNotifications },
+  { method: 'POST', path: '/notifications', handler: createNotification },
+  { method: 'POST', path: '/notifications/:id/read', handler: markNotificationRead },
+  { method: 'POST', path: '/notifications/:id/snooze', handler: snoozeNotification },
+  { method: 'POST', path: '/notifications/clear-read', handler: clearReadNotifications }
+]
@@ -0,0 +1,169 @@
+import { NextResponse } from 'next/server'
+import { handleCORS } from '@/lib/api/http'
+import { getOpenAIUtility, callOpenAI } from '@/lib/api/openai'
+import { countTokens, tokenizerReady } from '@/lib/api/tokenizer'
+
+// GET /api/openai/usage - Get OpenAI usage statistics
+export async function getUsage() {
+  try {
+    const stats = getOpenAIUtility().getUsageStats()
+    return handleCORS(NextResponse.json({
+      success: true,
+      ...stats
+    }))
+  } catch (error) {
+    console.error('Error getting OpenAI usage stats:', error)
+    return handleCORS(NextResponse.json({
+      success: false,
+      error: 'Failed to get usage statistics'
+    }, { status: 500 }))
+  }
+}
+
+// POST /api/openai/test - Test OpenAI utility with various models
+export async function testModel({ request }) {
+  try {
+    const body = await request.json()
+    let { model = 'gpt-4o-mini', test_type = 'simple', enable_streaming = false, prompt, priority } = body
+
+    let messages = []
+    let options = {}
+
+    switch (test_type) {
+      case 'simple':
+        messages = [
+          { role: 'system', content: 'You are a helpful assistant.' },
+          { role: 'user', content: 'Say hello in exactly 5 words.' }
+        ]
+        break
+      case 'cost_test':
+        messages = [
+          { role: 'system', content: 'You are a real estate expert.' },
+          { role: 'user', content: 'Explain the home buying process in detail with all steps, requirements, and timeline.' }
+        ]
+        options.maxTokens = 500
+        break
+      case 'streaming':
+        messages = [
+          { role: 'system', content: 'You are a creative writer.' },
+          { role: 'user', content: 'Write a short story about a real estate agent.' }
+        ]
+        options.stream = true
+        options.maxTokens = 300
+        break
+      case 'custom':
+        messages = [
+          { role: 'system', content: 'You are a helpful assistant.' },
+          { role: 'user', content: String(prompt || 'Say hello in exactly 5 words.') }
+        ]
+        options.maxTokens = 100
+        break
+      case 'error_test':
+        // Test with invalid model to trigger fallback
+        model = 'invalid-model'
+        messages = [
+          { role: 'user', content: 'Test error handling' }
+        ]
+        break
+    }
+
+    if (enable_streaming && test_type !== 'streaming') {
+      options.stream = true
+    }
+    if (priority) options.priority = priority
+
+    const result = await callOpenAI(model, messages, options)
+
+    return handleCORS(NextResponse.json({
+      success: true,
+      model: model,
+      test_type,
+      response: result,
+      options_used: options,
+      message: 'OpenAI utility test completed successfully'
+    }))
+  } catch (error) {
+    console.error('OpenAI test error:', error)
+    return handleCORS(NextResponse.json({
+      success: false,
+      error: error.message,
+      details: 'OpenAI utility test failed'
+    }, { status: 500 }))
+  }
+}
+
+// POST /api/openai/reset-usage - Reset daily usage (admin only)
+export async function resetUsage() {
+  try {
+    await getOpenAIUtility().resetDailyUsage()
+    return handleCORS(NextResponse.json({
+      success: true,
+      message: 'Daily usage reset successfully'
+    }))
+  } catch (error) {
+    console.error('Error resetting usage:', error)
+    return handleCORS(NextResponse.json({
+      success: false,
+      error: 'Failed to reset usage'
+    }, { status: 500 }))
+  }
+}
+
+// GET /api/openai/models - Get supported models and their limits
+export async function listModels() {
+  try {
+    const openaiUtility = getOpenAIUtility()
+    return handleCORS(NextResponse.json({
+      success: true,
+      models: openaiUtility.tokenLimits,
+      current_limits: {
+        daily_cost_limit: openaiUtility.dailyCostLimit,
+        max_single_request_cost: 5.00,
+        max_retries: openaiUtility.maxRetries,
+        base_delay: openaiUtility.baseDelay,
+        max_delay: openaiUtility.maxDelay
+      },
+      usage_summary: openaiUtility.getUsageStats()
+    }))
+  } catch (error) {
+    console.error('Error getting model info:', error)
+    return handleCORS(NextResponse.json({
+      success: false,
+      error: 'Failed to get model information'
+    }, { status: 500 }))
+  }
+}
+
+// POST /api/openai/tokens - Count tokens for the given texts (o200k_base, or the heuristic
+// while the tokenizer vocab isn't loaded)
+export async function countTextTokens({ request }) {
+  try {
+    const body = await request.json().catch(() => ({}))
+    const texts = Array.isArray(body.texts) ? body.texts.map(String) : []
+    if (texts.length === 0) {
+      return handleCORS(NextResponse.json({ success: false, error: 'texts must be a non-empty array' }, { status: 400 }))
+    }
+    const openaiUtility = getOpenAIUtility()
+    await openaiUtility.ensureTokenizer()
+    const exact = tokenizerReady()
+    return handleCORS(NextResponse.json({
+      success: true,
+      tokenizer: exact ? 'o200k_base' : 'heuristic',
+      counts: texts.map(text => exact ? countTokens(text) : openaiUtility.estimateTokenCount(text))
+    }))
+  } catch (error) {
+    console.error('Error counting tokens:', error)
+    return handleCORS(NextResponse.json({
+      success: false,
+      error: 'Failed to count tokens'
+    }, { status: 500 }))
+  }
+}
+
+export const routes = [
+  { method: 'GET', path: '/openai/usage', handler: getUsage },
+  { method: 'POST', path: '/openai/test', handler: testModel },
+  { method: 'POST', path: '/openai/reset-usage', handler: resetUsage },
+  { method: 'GET', path: '/openai/models', handler: listModels },
+  { method: 'POST', path: '/openai/tokens', handler: countTextTokens }
+]
@@ -0,0 +1,81 @@
+import { v4 as uuidv4 } from 'uuid'
+import { NextResponse } from 'next/server'
+import { connectToMongo } from '@/lib/api/db'
+import { handleCORS } from '@/lib/api/http'
+import { getDayPlan, planOptions } from '@/lib/api/plans'
+
+// POST /api/assistant/plan - Generate a time-blocked plan from selected items. Plans are
+// cached per (agent, day, selection) and kept current by task writes (lib/api/plans.js).
+export async function generatePlan({ request, db }) {
+  try {
+    const body = await request.json().catch(() => ({}))
+    const { selected_keys = [], agent = null } = body || {}
+    const db = await connectToMongo()
+
+    const selectedKeys = Array.isArray(selected_keys) ? selected_keys.filter(k => typeof k === 'string' && k) : []
+    const { plan, items, cached } = await getDayPlan(db, { agent, selectedKeys, options: planOptions(body || {}) })
+    return handleCORS(NextResponse.json({ success: true, plan, items, cached }))
+  } catch (error) {
+    console.error('Assistant plan error:', error)
+    return handleCORS(NextResponse.json({ success: false, error: 'Failed to build plan' }, { status: 500 }))
+  }
+}
+
+// POST /api/assistant/plan/save - Persist a generated plan to the database
+export async function savePlan({ request, db }) {
+  try {
+    const body = await request.json().catch(() => ({}))
+    const {
+      agent = null,
+      plan = {},
+      items = [],
+      title = null,
+      calendar_export = null
+    } = body || {}
+    const db = await connectToMongo()
+
+    const doc = {
+      id: uuidv4(),
+      agent,
+      title: title || `Plan ${new Date().toLocaleDateString()}`,
+      plan,
+      items,
+      calendar_export: calendar_export || null,
+      created_at: new Date(),
+      updated_at: new Date()
+    }
+
+    await db.collection('assistant_plans').insertOne(doc)
+
+    return handleCORS(NextResponse.json({ success: true, plan_id: doc.id }))
+  } catch (error) {
+    console.error('Assistant plan save error:', error)
+    return handleCORS(NextResponse.json({ success: false, error: 'Failed to save plan' }, { status: 500 }))
+  }
+}
+
+// GET /api/assistant/plan/latest - Fetch latest saved plan (optionally by agent)
+export async function getLatestPlan({ request, db }) {
+  try {
+    const url = new URL(request.url)
+    const agentQ = url.searchParams.get('agent') || null
+    const db = await connectToMongo()
+    const query = agentQ ? { agent: agentQ } : {}
+    const latest = await db.collection('assistant_plans').find(query).sort({ created_at: -1 }).limit(1).toArray()
+    const doc = latest && latest[0] ? latest[0] : null
+    if (!doc) {
+      return handleCORS(NextResponse.json({ success: true, plan: null }))
+    }
+    const { _id, ...rest } = doc
+    return handleCORS(NextResponse.json({ success: true, plan: rest }))
+  } catch (error) {
+    console.error('Assistant latest plan error:', error)
+    return handleCORS(NextResponse.json({ success: false, error: 'Failed to load latest plan' }, { status: 500 }))
+  }
+}
+
+export const routes = [
+  { method: 'POST', path: '/assistant/plan', handler: generatePlan },
+  { method: 'POST', path: '/assistant/plan/save', handler: savePlan },
+  { method: 'GET', path: '/assistant/plan/latest', handler: getLatestPlan }
+]
@@ -0,0 +1,167 @@
+import { v4 as uuidv4 } from 'uuid'
+import { NextResponse } from 'next/server'
+import { handleCORS } from '@/lib/api/http'
+import { bumpChecklistVersion, withChecklistWrite } from '@/lib/api/rollups'
+import { scheduleAlertRefresh } from '@/lib/api/alerts'
+import { invalidate } from '@/lib/api/invalidation'
+import { replanTasks } from '@/lib/api/plans'
+import { DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, rankDayTasks } from '@/lib/api/day-tasks'
+import { getChecklistItem, materializeChecklistItem, parseTemplateItemId } from '@/lib/api/checklist-templates'
+
+// GET /api/pmd/tasks?date=YYYY-MM-DD[&agent=][&offset=&limit=][&ids=a,b]
+// Open tasks ranked by ai_score, one page at a time (see lib/api/day-tasks.js). `ids` returns
+// just those tasks, for a saved plan whose items fall outside the loaded pages.
+export async function listDayTasks({ request, db }) {
+  try {
+    const url = new URL(request.url)
+    const dateStr = url.searchParams.get('date') || new Date().toISOString().slice(0,10)
+    const agent = url.searchParams.get('agent')
+    const offset = Math.max(0, parseInt(url.searchParams.get('offset')) || 0)
+    const limit = Math.min(MAX_PAGE_SIZE, Math.max(1, parseInt(url.searchParams.get('limit')) || DEFAULT_PAGE_SIZE))
+    const idsParam = url.searchParams.get('ids')
+    const ids = idsParam ? idsParam.split(',').map(s => s.trim()).filter(Boolean) : null
+
+    const { tasks, has_more } = await rankDayTasks(db, { date: dateStr, agent, offset, limit, ids })
+    return handleCORS(NextResponse.json({
+      success: true,
+      tasks,
+      offset,
+      limit,
+      has_more,
+      next_offset: has_more ? offset + tasks.length : null
+    }))
+  } catch (error) {
+    console.error('PMD tasks error', error)
+    return handleCORS(NextResponse.json({ success: false, error: 'Failed to fetch PMD tasks' }, { status: 500 }))
+  }
+}
+
+// POST /api/pmd/plans - Save snapshot of today's selected tasks
+export async function saveDayPlan({ request, db }) {
+  try {
+    const body = await request.json().catch(() => ({}))
+    const date = body.date || new Date().toISOString().slice(0,10)
+    const agent = body.agent || null
+    const items = Array.isArray(body.items) ? body.items : []
+    const doc = {
+      id: uuidv4(),
+      date,
+      agent,
+      items,
+      created_at: new Date(),
+      updated_at: new Date()
+    }
+    await db.collection('pmd_plans').insertOne(doc)
+    const { _id, ...cleaned } = doc
+    return handleCORS(NextResponse.json({ success: true, plan: cleaned }, { status: 201 }))
+  } catch (error) {
+    console.error('PMD save error', error)
+    return handleCORS(NextResponse.json({ success: false, error: 'Failed to save plan' }, { status: 500 }))
+  }
+}
+
+// GET /api/pmd/plans/latest?date=YYYY-MM-DD[&agent=]
+export async function getLatestDayPlan({ request, db }) {
+  try {
+    const url = new URL(request.url)
+    const date = url.searchParams.get('date') || new Date().toISOString().slice(0,10)
+    const agent = url.searchParams.get('agent')
+    const query = { date }
+    if (agent) query.agent = agent
+    const plan = await db.collection('pmd_plans').find(query).sort({ created_at: -1 }).limit(1).toArray()
+    if (!plan || plan.length === 0) {
+      return handleCORS(NextResponse.json({ success: true, plan: null }))
+    }
+    const { _id, ...cleaned } = plan[0]
+    return handleCORS(NextResponse.json({ success: true, plan: cleaned }))
+  } catch (error) {
+    console.error('PMD latest error', error)
+    return handleCORS(NextResponse.json({ success: false, error: 'Failed to load latest plan' }, { status: 500 }))
+  }
+}
+
+// POST /api/tasks/:id/snooze { until }
+export async function snoozeTask({ request, db, params }) {
+  try {
+    const itemId = params.id
+    const body = await request.json().catch(() => ({}))
+    const until = body.until ? new Date(body.until) : null
+    if (!until || isNaN(until)) {
+      return handleCORS(NextResponse.json({ success: false, error: 'Invalid until' }, { status: 400 }))
+    }
+    const existing = await getChecklistItem(db, itemId)
+    if (!existing) return handleCORS(NextResponse.json({ success: false, error: 'Task not found' }, { status: 404 }))
+    const update = { $set: { due_date: until, updated_at: new Date() } }
+    const cleaned = await withChecklistWrite(db, existing.transaction_id, [existing.stage], (session) =>
+      existing.virtual
+        ? materializeChecklistItem(db, existing, update, session)
+        : db.collection('checklist_items').findOneAndUpdate(
+          { id: itemId },
+          update,
+          { session, returnDocument: 'after', projection: { _id: 0 } }
+        )
+    )
+    if (!cleaned) return handleCORS(NextResponse.json({ success: false, error: 'Task not found' }, { status: 404 }))
+    scheduleAlertRefresh(existing.transaction_id)
+    replanTasks([cleaned])
+    invalidate(['tasks', 'suggestions'], { transactionId: existing.transaction_id })
+    // SSE broadcast to refresh panels
+    try {
+      const g = globalThis
+      if (g.__crmSSE?.clients) {
+        const msg = (ev, data) => `event: ${ev}\ndata: ${JSON.stringify(data)}\n\n`
+        for (const c of g.__crmSSE.clients) { try { c.enqueue(msg('tasks:changed', { action: 'snoozed', id: itemId, until })) } catch {} }
+        for (const c of g.__crmSSE.clients) { try { c.enqueue(msg('suggestions:update', { reason: 'task_snoozed', id: itemId })) } catch {} }
+      }
+    } catch (_) { /* ignore SSE errors */ }
+    return handleCORS(NextResponse.json({ success: true, task: cleaned }))
+  } catch (error) {
+    console.error('Snooze error', error)
+    return handleCORS(NextResponse.json({ success: false, error: 'Failed to snooze task' }, { status: 500 }))
+  }
+}
+
+// POST /api/tasks/:id/dismiss { date }
+export async function dismissTask({ request, db, params }) {
+  try {
+    const itemId = params.id
+    const body = await request.json().catch(() => ({}))
+    const date = body.date || new Date().toISOString().slice(0,10)
+    const update = { $addToSet: { dismissed_dates: date }, $set: { updated_at: new Date() } }
+    let cleaned = await db.collection('checklist_items').findOneAndUpdate(
+      { id: itemId },
+      update,
+      { returnDocument: 'after', projection: { _id: 0 } }
+    )
+    if (!cleaned && parseTemplateItemId(itemId)) {
+      // A template item that hasn't been stored yet
+      const existing = await getChecklistItem(db, itemId)
+      if (existing?.virtual) cleaned = await materializeChecklistItem(db, existing, update)
+    }
+    if (!cleaned) return handleCORS(NextResponse.json({ success: false, error: 'Task not found' }, { status: 404 }))
+    await bumpChecklistVersion(db, cleaned.transaction_id)
+    replanTasks([cleaned])
+    invalidate(['tasks', 'suggestions'], { transactionId: cleaned.transaction_id })
+    // SSE broadcast so UI updates immediately
+    try {
+      const g = globalThis
+      if (g.__crmSSE?.clients) {
+        const msg = (ev, data) => `event: ${ev}\ndata: ${JSON.stringify(data)}\n\n`
+        for (const c of g.__crmSSE.clients) { try { c.enqueue(msg('tasks:changed', { action: 'dismissed', id: itemId, date })) } catch {} }
+        for (const c of g.__crmSSE.clients) { try { c.enqueue(msg('suggestions:update', { reason: 'task_dismissed', id: itemId })) } catch {} }
+      }
+    } catch (_) { /* ignore SSE errors */ }
+    return handleCORS(NextResponse.json({ success: true, task: cleaned }))
+  } catch (error) {
+    console.error('Dismiss error', error)
+    return handleCORS(NextResponse.json({ success: false, error: 'Failed to dismiss task' }, { status: 500 }))
+  }
+}
+
+export const routes = [
+  { method: 'GET', path: '/pmd/tasks', handler: listDayTasks },
+  { method: 'POST', path: '/pmd/plans', handler: saveDayPlan },
+  { method: 'GET', path: '/pmd/plans/latest', handler: getLatestDayPlan },
+  { method: 'POST', path: '/tasks/:id/snooze', handler: snoozeTask },
+  { method: 'POST', path: '/tasks/:id/dismiss', handler: dismissTask }
+]
@@ -0,0 +1,140 @@
+import { v4 as uuidv4 } from 'uuid'
+import { NextResponse } from 'next/server'
+import { handleCORS } from '@/lib/api/http'
+import { fetchProperties } from '@/lib/api/properties'
+import { logWrite } from '@/lib/api/write-behind'
+
+// GET /api/properties - Enhanced property search with comprehensive filters
+export async function listProperties({ request }) {
+  const url = new URL(request.url)
+  const filters = {
+    location: url.searchParams.get('location'),
+    beds: url.searchParams.get('beds'),
+    baths: url.searchParams.get('baths'),
+    min_price: url.searchParams.get('min_price'),
+    max_price: url.searchParams.get('max_price'),
+    listing_status: url.searchParams.get('listing_status') || 'for_sale',
+    property_type: url.searchParams.get('property_type'),
+    sort_by: url.searchParams.get('sort_by'),
+    limit: parseInt(url.searchParams.get('limit')) || 60,
+    offset: parseInt(url.searchParams.get('offset')) || 0,
+    // debug passthrough
+    debug: url.searchParams.get('debug') === '1' || url.searchParams.get('debug') === 'true',
+    include_raw: url.searchParams.get('include_raw') === '1' || url.searchParams.get('include_raw') === 'true'
+  }
+  
+  // Remove null/undefined values
+  Object.keys(filters).forEach(key => {
+    if (filters[key] === null || filters[key] === undefined || filters[key] === '') {
+      delete filters[key]
+    }
+  })
+  
+  const result = await fetchProperties(filters)
+  
+  return handleCORS(NextResponse.json({
+    success: true,
+    ...result,
+    search_performed_at: new Date().toISOString()
+  }))
+}
+
+// POST /api/properties/search - Advanced property search with saved filters
+export async function searchPropertiesWithFilters({ request, db }) {
+  const body = await request.json()
+  
+  const filters = {
+    location: body.location,
+    beds: body.beds,
+    baths: body.baths,
+    min_price: body.min_price,
+    max_price: body.max_price,
+    listing_status: body.listing_status || 'for_sale',
+    property_type: body.property_type,
+    sort_by: body.sort_by || 'price_asc',
+    limit: body.limit || 60,
+    offset: body.offset || 0,
+    // debug passthrough
+    debug: !!body.debug,
+    include_raw: !!body.include_raw
+  }
+  
+  const result = await fetchProperties(filters)
+  
+  // Save search to database for analytics
+  try {
+    const searchRecord = {
+      id: uuidv4(),
+      filters: filters,
+      results_count: result.total,
+      timestamp: new Date(),
+      user_agent: request.headers.get('user-agent')
+    }
+    
+    await logWrite('property_searches', searchRecord)
+  } catch (error) {
+    console.error('Failed to save search record:', error)
+    // Don't fail the request if search logging fails
+  }
+  
+  return handleCORS(NextResponse.json({
+    success: true,
+    ...result,
+    search_performed_at: new Date().toISOString()
+  }))
+}
+
+// GET /api/properties/:id - Get specific property details
+export async function getProperty({ params }) {
+  const propertyId = params.id
+  
+  try {
+    // In a real implementation, you'd fetch from RealEstateAPI by ID
+    // For now, we'll use fallback data
+    const mockProperty = {
+      id: propertyId,
+      address: '123 Property Street',
+      city: 'Dallas',
+      state: 'TX',
+      zipcode: '75201',
+      price: 450000,
+      bedrooms: 3,
+      bathrooms: 2.5,
+      square_feet: 2200,
+      property_type: 'Single Family',
+      listing_status: 'for_sale',
+      description: 'Beautiful family home with modern amenities and updates throughout.',
+      images: [],
+      listing_date: new Date().toISOString(),
+      days_on_market: 15,
+      mls_number: 'MLS123456',
+      lot_size: '0.25 acres',
+      year_built: 2018,
+      garage: 2,
+      pool: false,
+      fireplace: true,
+      agent_info: {
+        name: 'Jane Smith',
+        phone: '(555) 123-4567',
+        email: 'jane@realestate.com'
+      }
+    }
+    
+    return handleCORS(NextResponse.json({
+      success: true,
+      property: mockProperty
+    }))
+  } catch (error) {
+    console.error('Error fetching property details:', error)
+    return handleCORS(NextResponse.json({
+      success: false,
+      error: 'Property not found'
+    }, { status: 404 }))
+  }
+}
+
+export const routes = [
+  { method: 'GET', path: '/properties', handler: listProperties },
+  { method: 'POST', path: '/properties/search', handler: searchPropertiesWithFilters },
+  { method: 'GET', path: '/properties/:id', handler: getProperty }
+]
@@ -0,0 +1,29 @@
+import { NextResponse } from 'next/server'
+import { handleCORS } from '@/lib/api/http'
+import { getRetentionStatus, runRetention } from '@/lib/api/retention'
+
+// GET /api/retention - Retention policies, their current cutoffs and the last job run
+export async function getRetention({ db }) {
+  try {
+    return handleCORS(NextResponse.json({ success: true, ...(await getRetentionStatus(db)) }))
+  } catch (error) {
+    console.error('Retention status error', error)
+    return handleCORS(NextResponse.json({ success: false, error: 'Failed to load retention status' }, { status: 500 }))
+  }
+}
+
+// POST /api/retention/run - Archive and purge expired documents now
+export async function runRetentionNow({ db }) {
+  try {
+    const run = await runRetention(db)
+    return handleCORS(NextResponse.json({ success: true, run }))
+  } catch (error) {
+    console.error('Retention run error', error)
+    return handleCORS(NextResponse.json({ success: false, error: 'Retention run failed' }, { status: 500 }))
+  }
+}
+
+export const routes = [
+  { method: 'GET', path: '/retention', handler: getRetention },
+  { method: 'POST', path: '/retention/run', handler: runRetentionNow }
+]
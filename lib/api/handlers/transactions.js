@@ -0,0 +1,417 @@
+import { v4 as uuidv4 } from 'uuid'
+import { NextResponse } from 'next/server'
+import { handleCORS } from '@/lib/api/http'
+import { validateStageTransition, createDefaultChecklistItems, getStageOrder } from '@/lib/api/checklists'
+import { addressFields, ensureAddressIndexes, findTransactionByAddress } from '@/lib/api/address'
+import { removeVoiceMemoFiles } from '@/lib/api/voice-memos'
+import { deleteTransactionRollups, getTransactionRollups, rollupOverdue } from '@/lib/api/rollups'
+import { scheduleAlertRefresh } from '@/lib/api/alerts'
+import { getLoader } from '@/lib/api/loader'
+import { replanTasks } from '@/lib/api/plans'
+import { deleteChecklistSeeds, loadChecklistItems } from '@/lib/api/checklist-templates'
+
+// GET /api/transactions - Get all transactions
+export async function listTransactions({ request, db }) {
+  try {
+    const url = new URL(request.url)
+    const status = url.searchParams.get('status')
+    const agent = url.searchParams.get('agent')
+    const limit = parseInt(url.searchParams.get('limit')) || 50
+    
+    let query = {}
+    if (status) query.status = status
+    if (agent) query.assigned_agent = agent
+    
+    const transactions = await db.collection('transactions')
+      .find(query)
+      .sort({ created_at: -1 })
+      .limit(limit)
+      .toArray()
+
+    const cleanedTransactions = transactions.map(({ _id, ...rest }) => rest)
+    
+    return handleCORS(NextResponse.json({
+      success: true,
+      transactions: cleanedTransactions,
+      total: cleanedTransactions.length
+    }))
+  } catch (error) {
+    console.error('Error fetching transactions:', error)
+    return handleCORS(NextResponse.json({
+      success: false,
+      error: 'Failed to fetch transactions'
+    }, { status: 500 }))
+  }
+}
+
+// POST /api/transactions - Create new transaction
+export async function createTransaction({ request, db }) {
+  try {
+    const body = await request.json()
+    
+    if (!body.property_address || !body.client_name) {
+      return handleCORS(NextResponse.json({
+        success: false,
+        error: "Property address and client name are required"
+      }, { status: 400 }))
+    }
+
+    const txType = (body.transaction_type || 'sale').toLowerCase()
+    const initialStage = txType === 'purchase' ? 'pre_approval' : 'pre_listing'
+    const transaction = {
+      id: uuidv4(),
+      property_address: body.property_address,
+      ...addressFields(body.property_address),
+      client_name: body.client_name,
+      client_email: body.client_email,
+      client_phone: body.client_phone,
+      transaction_type: txType, // sale, purchase, lease
+      current_stage: initialStage,
+      assigned_agent: body.assigned_agent,
+      listing_price: body.listing_price,
+      contract_price: body.contract_price,
+      closing_date: body.closing_date,
+      created_at: new Date(),
+      updated_at: new Date(),
+      stage_history: [{
+        stage: initialStage,
+        entered_at: new Date(),
+        status: 'active'
+      }]
+    }
+
+    await ensureAddressIndexes(db)
+    await db.collection('transactions').insertOne(transaction)
+
+    // Create default checklist items for the initial stage
+    await createDefaultChecklistItems(db, transaction.id, initialStage, txType)
+    scheduleAlertRefresh(transaction.id)
+
+    const { _id, ...cleanedTransaction } = transaction
+    return handleCORS(NextResponse.json({
+      success: true,
+      transaction: cleanedTransaction
+    }, { status: 201 }))
+  } catch (error) {
+    console.error('Error creating transaction:', error)
+    return handleCORS(NextResponse.json({
+      success: false,
+      error: 'Failed to create transaction'
+    }, { status: 500 }))
+  }
+}
+
+// GET /api/transactions/lookup?address= - Find a transaction by (approximate) property address
+export async function lookupTransactionByAddress({ request, db }) {
+  try {
+    const address = new URL(request.url).searchParams.get('address')
+    if (!address) {
+      return handleCORS(NextResponse.json({
+        success: false,
+        error: "address is required"
+      }, { status: 400 }))
+    }
+
+    const found = await findTransactionByAddress(db, address, { projection: { _id: 0 } })
+    if (!found) {
+      return handleCORS(NextResponse.json({
+        success: false,
+        error: "Transaction not found",
+        property_address: address
+      }, { status: 404 }))
+    }
+
+    const { _id, address_tokens, ...transaction } = found.transaction
+    return handleCORS(NextResponse.json({
+      success: true,
+      transaction,
+      match: found.match,
+      score: Math.round(found.score * 100) / 100
+    }))
+  } catch (error) {
+    console.error('Error looking up transaction by address:', error)
+    return handleCORS(NextResponse.json({
+      success: false,
+      error: 'Failed to look up transaction'
+    }, { status: 500 }))
+  }
+}
+
+// GET /api/transactions/:id - Get specific transaction
+export async function getTransaction({ db, params }) {
+  try {
+    const transactionId = params.id
+    const transaction = await db.collection('transactions').findOne({ id: transactionId })
+    
+    if (!transaction) {
+      return handleCORS(NextResponse.json({
+        success: false,
+        error: "Transaction not found"
+      }, { status: 404 }))
+    }
+
+    const { _id, ...cleanedTransaction } = transaction
+    return handleCORS(NextResponse.json({
+      success: true,
+      transaction: cleanedTransaction
+    }))
+  } catch (error) {
+    console.error('Error fetching transaction:', error)
+    return handleCORS(NextResponse.json({
+      success: false,
+      error: 'Failed to fetch transaction'
+    }, { status: 500 }))
+  }
+}
+
+// PUT /api/transactions/:id - Update transaction
+export async function updateTransaction({ request, db, params }) {
+  try {
+    const transactionId = params.id
+    const body = await request.json()
+    
+    const updateData = {
+      ...body,
+      updated_at: new Date()
+    }
+    delete updateData.id
+    delete updateData.created_at
+    delete updateData.checklist_version
+    if ('property_address' in body) Object.assign(updateData, addressFields(body.property_address))
+
+    // Returns the updated document, so there's no read-back
+    const updatedTransaction = await db.collection('transactions').findOneAndUpdate(
+      { id: transactionId },
+      { $set: updateData },
+      { returnDocument: 'after', projection: { _id: 0 } }
+    )
+
+    if (!updatedTransaction) {
+      return handleCORS(NextResponse.json({
+        success: false,
+        error: "Transaction not found"
+      }, { status: 404 }))
+    }
+
+    getLoader(db).prime('transactions', updatedTransaction)
+    scheduleAlertRefresh(transactionId)
+
+    return handleCORS(NextResponse.json({
+      success: true,
+      transaction: updatedTransaction
+    }))
+  } catch (error) {
+    console.error('Error updating transaction:', error)
+    return handleCORS(NextResponse.json({
+      success: false,
+      error: 'Failed to update transaction'
+    }, { status: 500 }))
+  }
+}
+
+// DELETE /api/transactions/:id - Delete transaction and associated checklist items
+export async function deleteTransaction({ db, params }) {
+  try {
+    const transactionId = params.id
+
+    // Read before the transaction goes: its checklist is loaded through it
+    const items = await loadChecklistItems(db, { transaction_id: transactionId })
+    const result = await db.collection('transactions').deleteOne({ id: transactionId })
+
+    if (result.deletedCount === 0) {
+      return handleCORS(NextResponse.json({
+        success: false,
+        error: "Transaction not found"
+      }, { status: 404 }))
+    }
+
+    // Also delete related checklist items (and their voice memo audio)
+    await removeVoiceMemoFiles(items.flatMap(i => i.voice_memos || []))
+    replanTasks(items, { removed: true })
+    await db.collection('checklist_items').deleteMany({ transaction_id: transactionId })
+    await deleteChecklistSeeds(db, transactionId)
+    await deleteTransactionRollups(db, transactionId)
+    // Resolves the deal's remaining alerts
+    scheduleAlertRefresh(transactionId)
+
+    return handleCORS(NextResponse.json({
+      success: true,
+      message: "Transaction deleted successfully",
+      deleted_checklist_items: items.length
+    }))
+  } catch (error) {
+    console.error('Error deleting transaction:', error)
+    return handleCORS(NextResponse.json({
+      success: false,
+      error: 'Failed to delete transaction'
+    }, { status: 500 }))
+  }
+}
+
+// POST /api/transactions/:id/stage-transition - Transition to next stage with validation
+export async function transitionStage({ request, db, params }) {
+  try {
+    const transactionId = params.id
+    const body = await request.json()
+
+    // validateStageTransition loads the same document; the loader makes that one read
+    const loader = getLoader(db)
+    const transaction = await loader.load('transactions', transactionId)
+    if (!transaction) {
+      return handleCORS(NextResponse.json({
+        success: false,
+        error: "Transaction not found"
+      }, { status: 404 }))
+    }
+
+    const target_stage = body.target_stage || body.targetStage
+    const force = !!body.force
+    const currentStage = transaction.current_stage
+    const txType = (transaction.transaction_type || 'sale').toLowerCase()
+
+    if (!target_stage || typeof target_stage !== 'string') {
+      return handleCORS(NextResponse.json({
+        success: false,
+        error: "target_stage is required"
+      }, { status: 400 }))
+    }
+
+    // Validate stage transition (rules decide; AI explanation is cached/background unless STAGE_VALIDATION_MODE=ai)
+    const validationResult = await validateStageTransition(db, transactionId, currentStage, target_stage, force)
+
+    if (!validationResult.valid && !force) {
+      return handleCORS(NextResponse.json({
+        success: false,
+        error: "Stage transition validation failed",
+        validation_errors: validationResult.errors,
+        missing_tasks: validationResult.missing_tasks,
+        recommendations: validationResult.recommendations,
+        validation_key: validationResult.validation_key,
+        ai_explanation_status: validationResult.ai_explanation_status,
+        ai_explanation: validationResult.ai_explanation,
+        can_force: true
+      }, { status: 422 }))
+    }
+
+    // Update transaction stage and history
+    await db.collection('transactions').updateOne(
+      { id: transactionId },
+      {
+        $set: {
+          current_stage: target_stage,
+          updated_at: new Date()
+        },
+        $push: {
+          stage_history: {
+            stage: target_stage,
+            entered_at: new Date(),
+            status: 'active',
+            transitioned_from: currentStage,
+            validation_result: validationResult
+          }
+        }
+      }
+    )
+    loader.clear('transactions', transactionId)
+
+    // Create default checklist items for the new stage (buyer vs seller aware)
+    const createdItems = await createDefaultChecklistItems(db, transactionId, target_stage, txType)
+    scheduleAlertRefresh(transactionId)
+
+    return handleCORS(NextResponse.json({
+      success: true,
+      from_stage: currentStage,
+      to_stage: target_stage,
+      created_items: createdItems,
+      validation_result: validationResult
+    }, { status: 201 }))
+  } catch (error) {
+    console.error('Error processing stage transition:', error)
+    return handleCORS(NextResponse.json({
+      success: false,
+      error: 'Failed to process stage transition'
+    }, { status: 500 }))
+  }
+}
+
+// GET /api/transactions/:id/stage-validation?target_stage= - Dry-run validation (includes the
+// cached AI explanation once it's ready)
+export async function getStageValidation({ request, db, params }) {
+  try {
+    const transactionId = params.id
+    const targetStage = new URL(request.url).searchParams.get('target_stage')
+    if (!targetStage) {
+      return handleCORS(NextResponse.json({
+        success: false,
+        error: "target_stage is required"
+      }, { status: 400 }))
+    }
+
+    const transaction = await getLoader(db).load('transactions', transactionId)
+    if (!transaction) {
+      return handleCORS(NextResponse.json({
+        success: false,
+        error: "Transaction not found"
+      }, { status: 404 }))
+    }
+
+    const validation = await validateStageTransition(db, transactionId, transaction.current_stage, targetStage)
+    return handleCORS(NextResponse.json({
+      success: true,
+      from_stage: transaction.current_stage,
+      to_stage: targetStage,
+      validation
+    }))
+  } catch (error) {
+    console.error('Error validating stage transition:', error)
+    return handleCORS(NextResponse.json({
+      success: false,
+      error: 'Failed to validate stage transition'
+    }, { status: 500 }))
+  }
+}
+
+// GET /api/transactions/:id/rollups - Per-stage checklist progress (overdue as of now)
+export async function getStageRollups({ db, params }) {
+  try {
+    const transactionId = params.id
+    const transaction = await db.collection('transactions').findOne({ id: transactionId }, { projection: { transaction_type: 1, current_stage: 1 } })
+    if (!transaction) {
+      return handleCORS(NextResponse.json({
+        success: false,
+        error: "Transaction not found"
+      }, { status: 404 }))
+    }
+
+    const txType = (transaction.transaction_type || 'sale').toLowerCase()
+    const now = new Date()
+    const rollups = ((await getTransactionRollups(db, [transactionId])).get(transactionId) || [])
+      .map(r => ({ ...r, overdue: rollupOverdue(r, now).length }))
+      .sort((a, b) => getStageOrder(a.stage, txType) - getStageOrder(b.stage, txType))
+
+    return handleCORS(NextResponse.json({
+      success: true,
+      transaction_id: transactionId,
+      current_stage: transaction.current_stage,
+      rollups
+    }))
+  } catch (error) {
+    console.error('Error fetching stage rollups:', error)
+    return handleCORS(NextResponse.json({
+      success: false,
+      error: 'Failed to fetch stage rollups'
+    }, { status: 500 }))
+  }
+}
+
+export const routes = [
+  { method: 'GET', path: '/transactions', handler: listTransactions },
+  { method: 'POST', path: '/transactions', handler: createTransaction },
+  { method: 'GET', path: '/transactions/lookup', handler: lookupTransactionByAddress },
+  { method: 'GET', path: '/transactions/:id', handler: getTransaction },
+  { method: 'PUT', path: '/transactions/:id', handler: updateTransaction },
+  { method: 'DELETE', path: '/transactions/:id', handler: deleteTransaction },
+  { method: 'POST', path: '/transactions/:id/stage-transition', handler: transitionStage },
+  { method: 'GET', path: '/transactions/:id/stage-validation', handler: getStageValidation },
+  { method: 'GET', path: '/transactions/:id/rollups', handler: getStageRollups }
+]
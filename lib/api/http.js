@@ -0,0 +1,9 @@
+// Helper function to handle CORS
+export function handleCORS(response) {
+  response.headers.set('Access-Control-Allow-Origin', '*')
+  response.headers.set('Access-Control-Allow-Methods', 'GET, POST, PUT, DELETE, OPTIONS')
+  response.headers.set('Access-Control-Allow-Headers', 'Content-Type, Authorization, If-None-Match')
+  response.headers.set('Access-Control-Expose-Headers', 'ETag, X-DB-Round-Trips')
+  response.headers.set('Access-Control-Allow-Credentials', 'true')
+  return response
+}
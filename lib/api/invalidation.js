@@ -0,0 +1,225 @@
+import { randomUUID } from 'crypto'
+import { connectToMongo } from '@/lib/api/db'
+import { getRequestContext } from '@/lib/api/request-context'
+
+// Change notifications for clients. Every successful API write publishes an `invalidate`
+// event on the /api/assistant/stream SSE channel naming the resources it touched, so open
+// pages refetch only what changed instead of polling. Payload:
+//   { resources: { tasks: ['<transaction id>', ...], notifications: null, ... }, ts }
+// A list scopes the change to those transactions; null means "anything of this kind".
+// Notices are coalesced over a short window so a burst of writes (an import, a checklist
+// bulk edit, a scheduler run) reaches each tab as one event.
+//
+// Tabs may be connected to any instance, so each flushed notice is also appended to a capped
+// collection (invalidation_feed) that every instance with SSE clients tails, passing on the
+// notices other instances wrote, to its clients and to in-process caches that registered
+// with onRemoteInvalidation (e.g. cached day plans). The feed is read with one tailable cursor
+// in insertion (natural) order, so no ordering is assumed between ids written by different
+// instances; a placeholder document keeps the feed from being empty, which would close a
+// tailable cursor at once.
+const COALESCE_MS = 250
+const FEED = 'invalidation_feed'
+const FEED_BYTES = 4 * 1024 * 1024
+// Delay before tailing again after the feed cursor ends or fails, doubling up to FEED_MAX_RETRY_MS
+const FEED_RETRY_MS = 1000
+const FEED_MAX_RETRY_MS = 30000
+const INSTANCE = randomUUID()
+
+// Resources touched by each write route. Routes whose handlers know more (e.g. which
+// transaction a checklist item belongs to) add it with invalidate(); routes not listed
+// here don't change anything clients display.
+const SCOPED = Symbol('transaction scoped')
+const ROUTE_RESOURCES = {
+  'POST /transactions': ['transactions', 'tasks', 'suggestions'],
+  'PUT /transactions/:id': [SCOPED, 'transactions', 'tasks', 'suggestions'],
+  'DELETE /transactions/:id': [SCOPED, 'transactions', 'tasks', 'suggestions'],
+  'POST /transactions/:id/stage-transition': [SCOPED, 'transactions', 'tasks', 'suggestions'],
+  'POST /transactions/:id/checklist': [SCOPED, 'tasks', 'suggestions'],
+  'PUT /checklist/:id': ['tasks', 'suggestions'],
+  'DELETE /checklist/:id': ['tasks', 'suggestions'],
+  'POST /checklist/:id/voice': ['tasks'],
+  'DELETE /checklist/:id/voice/:memoId': ['tasks'],
+  'POST /tasks/:id/snooze': ['tasks', 'suggestions'],
+  'POST /tasks/:id/dismiss': ['tasks', 'suggestions'],
+  'POST /pmd/plans': ['plans', 'suggestions'],
+  'POST /assistant/plan/save': ['plans', 'suggestions'],
+  'POST /assistant/parse': ['leads', 'transactions', 'suggestions'],
+  'POST /assistant/match': ['leads', 'transactions', 'suggestions'],
+  'POST /leads': ['leads', 'suggestions'],
+  'POST /leads/import': ['leads', 'suggestions'],
+  'PUT /leads/:id': ['leads', 'suggestions'],
+  'DELETE /leads': ['leads', 'suggestions'],
+  'DELETE /leads/:id': ['leads', 'suggestions'],
+  'POST /notifications': ['notifications'],
+  'POST /notifications/:id/read': ['notifications'],
+  'POST /notifications/:id/snooze': ['notifications'],
+  'POST /notifications/clear-read': ['notifications'],
+  'POST /alerts/dismiss/:id': ['alerts', 'suggestions']
+}
+
+function state() {
+  return globalThis.__crmInvalidation || (globalThis.__crmInvalidation = { pending: new Map(), timer: null, feed: null, following: false, listeners: new Set() })
+}
+
+// resources: Map<resource, Set<transaction id> | null>
+function merge(into, resources) {
+  for (const [resource, ids] of resources) {
+    const current = into.get(resource)
+    if (current === null) continue
+    if (ids === null) into.set(resource, null)
+    else into.set(resource, new Set([...(current || []), ...ids]))
+  }
+}
+
+function toMap(resources, transactionId) {
+  const ids = transactionId ? new Set([transactionId]) : null
+  return new Map(resources.map(resource => [resource, ids]))
+}
+
+// Write an SSE event to the /api/assistant/stream clients connected to this instance
+export function sendToClients(event, payload) {
+  const clients = globalThis.__crmSSE?.clients
+  if (!clients) return
+  const message = `event: ${event}\ndata: ${JSON.stringify(payload)}\n\n`
+  for (const c of clients) { try { c.enqueue(message) } catch {} }
+}
+
+// A change made by background work: its own event for the pages listening to it, and the
+// invalidation every page (on any instance) acts on
+export function notifyChange(event, payload, resources, { transactionId = null } = {}) {
+  sendToClients(event, payload)
+  invalidate(resources, { transactionId })
+}
+
+function ensureFeed() {
+  const s = state()
+  if (!s.feed) {
+    s.feed = (async () => {
+      const db = await connectToMongo()
+      if (typeof db.createCollection === 'function') {
+        try {
+          await db.createCollection(FEED, { capped: true, size: FEED_BYTES })
+        } catch (e) {
+          // Created by another instance
+          if (e?.codeName !== 'NamespaceExists' && e?.code !== 48) throw e
+        }
+      }
+      return db.collection(FEED)
+    })().catch((e) => {
+      s.feed = null
+      throw e
+    })
+  }
+  return s.feed
+}
+
+function flush() {
+  const s = state()
+  s.timer = null
+  if (s.pending.size === 0) return
+  const resources = {}
+  for (const [resource, ids] of s.pending) resources[resource] = ids ? [...ids] : null
+  s.pending = new Map()
+
+  sendToClients('invalidate', { resources, ts: Date.now() })
+  ensureFeed()
+    .then(feed => feed.insertOne({ instance: INSTANCE, resources, at: new Date() }))
+    .catch(e => console.warn('Invalidation feed write error', e))
+}
+
+// _id of the newest document in the feed (a placeholder is added to an empty feed)
+async function feedHead(feed) {
+  const [head] = await feed.find({}, { sort: { $natural: -1 }, limit: 1, projection: { _id: 1 } }).toArray()
+  if (head) return head._id
+  const { insertedId } = await feed.insertOne({ instance: null, resources: {}, at: new Date() })
+  return insertedId
+}
+
+// Tail the feed and pass other instances' notices to this instance's clients and listeners.
+// Started when the first SSE client connects or a listener registers; runs for the life of
+// the process. Notices already in the feed when it starts are skipped; after the cursor is
+// lost it resumes behind the last notice seen, or at the newest one if the capped collection
+// has overwritten that.
+export function followInvalidations() {
+  const s = state()
+  if (s.following) return
+  s.following = true
+  let resumeAfter = null
+  let failures = 0
+  const tail = async () => {
+    try {
+      const feed = await ensureFeed()
+      if (resumeAfter === null || !(await feed.findOne({ _id: resumeAfter }, { projection: { _id: 1 } }))) {
+        if (resumeAfter !== null) console.warn('Invalidation feed position lost, resuming at the newest notice')
+        resumeAfter = await feedHead(feed)
+      }
+      let skipping = true
+      const cursor = feed.find({}, { tailable: true, awaitData: true })
+      for await (const notice of cursor) {
+        if (skipping) {
+          skipping = String(notice._id) !== String(resumeAfter)
+          continue
+        }
+        resumeAfter = notice._id
+        failures = 0
+        if (!notice.instance || notice.instance === INSTANCE) continue
+        sendToClients('invalidate', { resources: notice.resources, ts: Date.now() })
+        for (const listener of s.listeners) {
+          try { listener(notice.resources) } catch (e) { console.warn('Invalidation listener error', e) }
+        }
+      }
+    } catch (e) {
+      failures++
+      console.warn('Invalidation feed tail error', e)
+    }
+    const timer = setTimeout(tail, Math.min(FEED_RETRY_MS * 2 ** failures, FEED_MAX_RETRY_MS))
+    if (typeof timer.unref === 'function') timer.unref()
+  }
+  tail()
+}
+
+// Call `listener(resources)` (the feed payload) for every notice another instance publishes,
+// so state cached in this process can drop what changed elsewhere
+export function onRemoteInvalidation(listener) {
+  state().listeners.add(listener)
+  followInvalidations()
+}
+
+function publish(resources) {
+  const s = state()
+  merge(s.pending, resources)
+  if (!s.timer) s.timer = setTimeout(flush, COALESCE_MS)
+}
+
+// Announce a change. Inside an API request it's held until the response succeeds (a failed
+// write announces nothing); anywhere else (background workers, schedulers) it's published
+// right away.
+export function invalidate(resources, { transactionId = null } = {}) {
+  const changes = toMap(resources, transactionId)
+  const context = getRequestContext()
+  // Timers started during a request inherit its context; once that request has finished,
+  // treat them as background work
+  if (context && !context.invalidationsPublished) {
+    if (!context.invalidations) context.invalidations = new Map()
+    merge(context.invalidations, changes)
+  } else {
+    publish(changes)
+  }
+}
+
+// Called by the API route once a request has been handled
+export function publishRequestInvalidations(context, method, pattern, params, status) {
+  if (!context) return
+  context.invalidationsPublished = true
+  if (status >= 400) return
+  const changes = context.invalidations || new Map()
+  const rule = ROUTE_RESOURCES[`${method} ${pattern}`]
+  if (rule) {
+    // What the handler reported is more specific than the route's defaults
+    const scoped = rule[0] === SCOPED
+    for (const [resource, ids] of toMap(scoped ? rule.slice(1) : rule, scoped ? params?.id : null)) {
+      if (!changes.has(resource)) changes.set(resource, ids)
+    }
+  }
+  if (changes.size > 0) publish(changes)
+}
@@ -0,0 +1,213 @@
+import { v4 as uuidv4 } from 'uuid'
+import { leadIdentityFields } from '@/lib/api/leads'
+import { enqueueLeadEnrichment } from '@/lib/api/enrichment'
+
+// Bulk lead import. Input rows are parsed as they stream in, grouped into chunks, and each
+// chunk costs one duplicate lookup (on the normalized email/phone indexes) plus one
+// insertMany, instead of a findOne + insertOne + AI call per lead.
+const CHUNK_SIZE = 500
+
+const PREFERENCE_COLUMNS = ['zipcode', 'min_price', 'max_price', 'bedrooms', 'bathrooms', 'property_type']
+const NUMERIC_PREFERENCES = new Set(['min_price', 'max_price', 'bedrooms', 'bathrooms'])
+
+// Split a byte stream into text lines without buffering the whole body
+export async function* readLines(body) {
+  const reader = body.getReader()
+  const decoder = new TextDecoder()
+  let buffer = ''
+  for (;;) {
+    const { value, done } = await reader.read()
+    if (done) break
+    buffer += decoder.decode(value, { stream: true })
+    let idx
+    while ((idx = buffer.indexOf('\n')) !== -1) {
+      yield buffer.slice(0, idx).replace(/\r$/, '')
+      buffer = buffer.slice(idx + 1)
+    }
+  }
+  buffer += decoder.decode()
+  if (buffer) yield buffer.replace(/\r$/, '')
+}
+
+export async function* parseNdjson(lines) {
+  let row = 0
+  for await (const line of lines) {
+    if (!line.trim()) continue
+    row++
+    try {
+      const data = JSON.parse(line)
+      yield data && typeof data === 'object' && !Array.isArray(data)
+        ? { row, data }
+        : { row, error: 'Row is not a JSON object' }
+    } catch {
+      yield { row, error: 'Invalid JSON' }
+    }
+  }
+}
+
+// RFC 4180 fields; returns null when a quoted field continues on the next line
+function splitCsvRecord(text) {
+  const fields = []
+  let field = ''
+  let quoted = false
+  for (let i = 0; i < text.length; i++) {
+    const ch = text[i]
+    if (quoted) {
+      if (ch === '"' && text[i + 1] === '"') { field += '"'; i++ }
+      else if (ch === '"') quoted = false
+      else field += ch
+    } else if (ch === '"') quoted = true
+    else if (ch === ',') { fields.push(field); field = '' }
+    else field += ch
+  }
+  if (quoted) return null
+  fields.push(field)
+  return fields
+}
+
+function csvRowToLead(headers, values) {
+  const data = { preferences: {} }
+  headers.forEach((header, i) => {
+    const value = (values[i] ?? '').trim()
+    if (value === '') return
+    const key = header.startsWith('preferences.') ? header.slice('preferences.'.length) : header
+    if (header.startsWith('preferences.') || PREFERENCE_COLUMNS.includes(key)) {
+      data.preferences[key] = NUMERIC_PREFERENCES.has(key) && !Number.isNaN(Number(value)) ? Number(value) : value
+    } else if (key === 'tags') {
+      data.tags = value.split(/[;|]/).map(t => t.trim()).filter(Boolean)
+    } else {
+      data[key] = value
+    }
+  })
+  return data
+}
+
+export async function* parseCsv(lines) {
+  let headers = null
+  let pending = null
+  let row = 0
+  for await (const line of lines) {
+    const text = pending === null ? line : `${pending}\n${line}`
+    const values = splitCsvRecord(text)
+    if (values === null) { pending = text; continue }
+    pending = null
+    if (!headers) {
+      headers = values.map(h => h.trim().toLowerCase())
+      continue
+    }
+    if (values.every(v => !v.trim())) continue
+    row++
+    yield { row, data: csvRowToLead(headers, values) }
+  }
+  if (pending !== null) yield { row: row + 1, error: 'Unterminated quoted field' }
+}
+
+function buildLead(data, defaults) {
+  const now = new Date()
+  return {
+    id: uuidv4(),
+    name: String(data.name).trim(),
+    email: String(data.email).trim(),
+    phone: String(data.phone).trim(),
+    ...leadIdentityFields(data.email, data.phone, data.name),
+    lead_type: data.lead_type || 'buyer',
+    preferences: data.preferences || {},
+    assigned_agent: data.assigned_agent || null,
+    tags: Array.isArray(data.tags) ? data.tags : [],
+    source: data.source || defaults.source,
+    status: 'new',
+    ...(defaults.enrich ? { ai_insights_status: 'pending' } : {}),
+    created_at: now,
+    updated_at: now
+  }
+}
+
+// Consume parsed records and yield an array of per-row results for each chunk, followed
+// by a final { summary }. Duplicates are detected both within the import (first row
+// wins) and against existing leads.
+export async function* importLeads(db, records, { enrich = true, source = 'import' } = {}) {
+  const coll = db.collection('leads')
+  const seenEmails = new Map()
+  const seenPhones = new Map()
+  const summary = { rows: 0, created: 0, duplicates: 0, invalid: 0, failed: 0 }
+  let chunk = []
+
+  const flush = async () => {
+    const entries = chunk
+    chunk = []
+    const leads = entries.filter(e => e.lead).map(e => e.lead)
+
+    if (leads.length > 0) {
+      const emails = leads.map(l => l.email_normalized).filter(Boolean)
+      const phones = leads.map(l => l.phone_normalized).filter(Boolean)
+      const existing = await coll.find(
+        { $or: [{ email_normalized: { $in: emails } }, { phone_normalized: { $in: phones } }] },
+        { projection: { _id: 0, id: 1, email_normalized: 1, phone_normalized: 1 } }
+      ).toArray()
+      const byEmail = new Map(existing.filter(l => l.email_normalized).map(l => [l.email_normalized, l.id]))
+      const byPhone = new Map(existing.filter(l => l.phone_normalized).map(l => [l.phone_normalized, l.id]))
+
+      for (const entry of entries) {
+        if (!entry.lead) continue
+        const dup = byEmail.get(entry.lead.email_normalized) || byPhone.get(entry.lead.phone_normalized)
+        if (dup) {
+          entry.result = { row: entry.row, status: 'duplicate', existing_lead: dup }
+          entry.lead = null
+        }
+      }
+
+      const toInsert = entries.filter(e => e.lead)
+      if (toInsert.length > 0) {
+        const failedIdx = new Set()
+        try {
+          await coll.insertMany(toInsert.map(e => e.lead), { ordered: false })
+        } catch (e) {
+          // Unordered bulk insert: everything but the reported rows went in
+          const writeErrors = e?.writeErrors || e?.result?.getWriteErrors?.() || []
+          if (writeErrors.length === 0) throw e
+          for (const we of writeErrors) failedIdx.add(we.index)
+        }
+        toInsert.forEach((entry, i) => {
+          entry.result = failedIdx.has(i)
+            ? { row: entry.row, status: 'failed', error: 'Insert failed' }
+            : { row: entry.row, status: 'created', id: entry.lead.id }
+        })
+        if (enrich) {
+          await enqueueLeadEnrichment(db, toInsert.filter((_, i) => !failedIdx.has(i)).map(e => e.lead.id))
+        }
+      }
+    }
+
+    const results = entries.map(e => e.result)
+    for (const r of results) {
+      if (r.status === 'created') summary.created++
+      else if (r.status === 'duplicate') summary.duplicates++
+      else if (r.status === 'invalid') summary.invalid++
+      else summary.failed++
+    }
+    return results
+  }
+
+  for await (const record of records) {
+    summary.rows++
+    const { row, data, error } = record
+    if (error) {
+      chunk.push({ row, result: { row, status: 'invalid', error } })
+    } else if (!data.name || !data.email || !data.phone) {
+      chunk.push({ row, result: { row, status: 'invalid', error: 'Name, email, and phone are required' } })
+    } else {
+      const lead = buildLead(data, { enrich, source })
+      const dupOf = seenEmails.get(lead.email_normalized) || seenPhones.get(lead.phone_normalized)
+      if (dupOf) {
+        chunk.push({ row, result: { row, status: 'duplicate', duplicate_of_row: dupOf } })
+      } else {
+        if (lead.email_normalized) seenEmails.set(lead.email_normalized, row)
+        if (lead.phone_normalized) seenPhones.set(lead.phone_normalized, row)
+        chunk.push({ row, lead })
+      }
+    }
+    if (chunk.length >= CHUNK_SIZE) yield await flush()
+  }
+  if (chunk.length > 0) yield await flush()
+  yield { summary }
+}
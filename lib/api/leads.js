@@ -0,0 +1,240 @@
+import { callOpenAI } from '@/lib/api/openai'
+import { fetchProperties, mapLeadPreferencesToFilters } from '@/lib/api/properties'
+
+// Helper function to extract names from messages (fallback parsing)
+export function extractNameFromMessage(message) {
+  // Simple regex to find potential names
+  const namePatterns = [
+    /met\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)/i,
+    /client\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)/i,
+    /([A-Z][a-z]+\s+[A-Z][a-z]+)(?:\s+wants|is\s+looking|needs)/i
+  ]
+  
+  for (const pattern of namePatterns) {
+    const match = message.match(pattern)
+    if (match && match[1]) {
+      return match[1].trim()
+    }
+  }
+  
+  return null
+}
+
+// Canonical forms used for duplicate detection, stored alongside the raw values
+export function normalizeEmail(email) {
+  const v = String(email ?? '').trim().toLowerCase()
+  return v || null
+}
+
+export function normalizePhone(phone) {
+  let digits = String(phone ?? '').replace(/\D/g, '')
+  // Treat +1 555... and 555... as the same US number
+  if (digits.length === 11 && digits.startsWith('1')) digits = digits.slice(1)
+  return digits || null
+}
+
+// Case/whitespace-insensitive name, for exact-name lookups ("priya  SHARMA" -> "priya sharma")
+export function normalizeName(name) {
+  const v = String(name ?? '').trim().replace(/\s+/g, ' ').toLowerCase()
+  return v || null
+}
+
+export function leadIdentityFields(email, phone, name) {
+  return { email_normalized: normalizeEmail(email), phone_normalized: normalizePhone(phone), name_normalized: normalizeName(name) }
+}
+
+// Indexes for dedupe lookups, plus a one-time backfill of the normalized fields on
+// leads written before they existed. Runs once per process.
+export async function ensureLeadIndexes(db) {
+  const g = globalThis
+  if (g.__crmLeadIndexes) return g.__crmLeadIndexes
+  g.__crmLeadIndexes = (async () => {
+    const coll = db.collection('leads')
+    try {
+      if (typeof coll.createIndex === 'function') {
+        await coll.createIndex({ email_normalized: 1 })
+        await coll.createIndex({ phone_normalized: 1 })
+        await coll.createIndex({ name_normalized: 1 })
+        await coll.createIndex({ id: 1 })
+      }
+      const missing = await coll
+        .find({ $or: [{ email_normalized: { $exists: false } }, { name_normalized: { $exists: false } }] }, { projection: { id: 1, email: 1, phone: 1, name: 1 } })
+        .toArray()
+      for (let i = 0; i < missing.length; i += 1000) {
+        await coll.bulkWrite(missing.slice(i, i + 1000).map(l => ({
+          updateOne: { filter: { id: l.id }, update: { $set: leadIdentityFields(l.email, l.phone, l.name) } }
+        })), { ordered: false })
+      }
+    } catch (e) {
+      console.warn('Lead index/backfill error', e)
+    }
+  })()
+  return g.__crmLeadIndexes
+}
+
+// Lead deduplication check
+export async function checkDuplicateLead(db, email, phone) {
+  const { email_normalized, phone_normalized } = leadIdentityFields(email, phone)
+  // Both clauses hit an index; older leads get the normalized fields from ensureLeadIndexes
+  const clauses = [
+    ...(email_normalized ? [{ email_normalized }] : []),
+    ...(phone_normalized ? [{ phone_normalized }] : [])
+  ]
+  if (clauses.length === 0) return null
+  const existingLead = await db.collection('leads').findOne({ $or: clauses })
+  return existingLead
+}
+
+// Best existing lead for an assistant message, in one query over indexed fields. An
+// explicit lead id wins, then an email/phone match, then the most recently updated lead
+// with exactly that name.
+export async function findLeadForMessage(db, { leadId, email, phone, name } = {}) {
+  const { email_normalized, phone_normalized, name_normalized } = leadIdentityFields(email, phone, name)
+  const clauses = [
+    ...(leadId ? [{ id: String(leadId) }] : []),
+    ...(email_normalized ? [{ email_normalized }] : []),
+    ...(phone_normalized ? [{ phone_normalized }] : []),
+    ...(name_normalized ? [{ name_normalized }] : [])
+  ]
+  if (clauses.length === 0) return null
+  await ensureLeadIndexes(db)
+  const candidates = await db.collection('leads').find({ $or: clauses }).sort({ updated_at: -1 }).limit(20).toArray()
+  const rank = (l) => {
+    if (leadId && l.id === String(leadId)) return 0
+    if ((email_normalized && l.email_normalized === email_normalized) || (phone_normalized && l.phone_normalized === phone_normalized)) return 1
+    return 2
+  }
+  let best = null
+  for (const lead of candidates) {
+    if (!best || rank(lead) < rank(best)) best = lead
+  }
+  return best
+}
+
+// options.priority: 'background' when nobody is waiting on the result (enrichment queue)
+export async function generateLeadInsights(lead, properties = [], { priority = 'interactive' } = {}) {
+  const leadType = String(lead?.lead_type || '').toLowerCase()
+
+  // Seller: provide valuation/pricing/listing-prep insights. Do NOT fetch listings.
+  if (leadType === 'seller') {
+    const prefs = lead?.preferences || {}
+    const sellerAddress = prefs.seller_address || prefs.address || null
+    const sellerPrice = prefs.seller_price ?? prefs.asking_price ?? null
+    // Normalize seller detail fields so the AI has explicit structured facts
+    const sellerDetails = {
+      address: sellerAddress || null,
+      asking_price: sellerPrice,
+      property_type: prefs.seller_property_type ?? prefs.property_type ?? null,
+      bedrooms: prefs.seller_bedrooms ?? prefs.bedrooms ?? null,
+      bathrooms: prefs.seller_bathrooms ?? prefs.bathrooms ?? null,
+      year_built: prefs.seller_year_built ?? prefs.year_built ?? null,
+      square_feet: prefs.seller_square_feet ?? prefs.square_feet ?? null,
+      lot_size: prefs.seller_lot_size ?? prefs.lot_size ?? null,
+      condition: prefs.seller_condition ?? prefs.condition ?? null,
+      occupancy: prefs.seller_occupancy ?? prefs.occupancy ?? null,
+      timeline_to_list: prefs.seller_timeline ?? prefs.timeline ?? null,
+      hoa_fee_monthly: prefs.seller_hoa_fee ?? prefs.hoa_fee ?? null,
+      notes: prefs.seller_description ?? prefs.notes ?? null,
+      zipcode: prefs.zipcode ?? null
+    }
+
+    const messages = [
+      {
+        role: "system",
+        content: "You are a precise real estate listing advisor. For seller leads, provide valuation context, pricing strategy, listing preparation guidance, and next steps. Do NOT recommend purchase listings. Keep it concise and actionable."
+      },
+      {
+        role: "user",
+        content: `Lead: ${lead.name} (seller)
+Seller Details (structured JSON): ${JSON.stringify(sellerDetails)}
+
+Instructions:
+- Treat the Seller Details as ground truth; explicitly incorporate known facts (beds/baths, year, square feet, lot size, condition, occupancy, timeline, HOA fee, notes) into your assumptions and recommendations.
+- Do NOT suggest properties to buy or include property listings.
+- Provide a realistic valuation range with clear assumptions tied to the property's specifics and micro-location. If the address or zipcode is known, reflect that context without fabricating comps.
+- Recommend a pricing strategy (e.g., list slightly below/at/above comps) and expected buyer response, referencing the property's condition, size, and occupancy where relevant.
+- Provide a concise listing prep checklist tailored to the specifics (e.g., if condition is Good, focus on touch-ups; if Vacant, emphasize staging options; if HOA present, note disclosure items).
+- Close with 2-3 concrete next steps for the agent with the seller.
+
+Output (Markdown):
+### AI Insights
+- Valuation Range and Assumptions (reference relevant facts like beds/baths, year, sqft, lot size, condition)
+- Pricing Strategy and Rationale (tie to demand for the given property type/size and occupancy)
+- Listing Preparation Checklist (tailored to the provided details)
+### Next Steps
+- Action 1
+- Action 2
+${sellerAddress ? '- Suggest obtaining a CMA for the specific address.' : ''}`
+      }
+    ]
+
+    return await callOpenAI('gpt-4o-mini', messages, { priority })
+  }
+
+  // Buyer (default): use existing property matching logic.
+  // Pull real inventory using lead preferences if properties not provided
+  let fetchedProps = properties
+  try {
+    if (!Array.isArray(fetchedProps) || fetchedProps.length === 0) {
+      const filters = mapLeadPreferencesToFilters(lead?.preferences || {})
+      const res = await fetchProperties(filters)
+      fetchedProps = res?.properties || []
+
+      // Apply strict filtering to align with constraints
+      const desiredZip = filters.location ? String(filters.location).slice(0, 5) : null
+      const minBeds = filters.beds ? Number(filters.beds) : null
+      const minBaths = filters.baths ? Number(filters.baths) : null
+      const minPrice = filters.min_price ? Number(filters.min_price) : null
+      const maxPrice = filters.max_price ? Number(filters.max_price) : null
+
+      fetchedProps = fetchedProps.filter(p => {
+        if (desiredZip && String(p.zipcode || '').slice(0, 5) !== desiredZip) return false
+        if (minBeds !== null && !(typeof p.bedrooms === 'number' && p.bedrooms >= minBeds)) return false
+        if (minBaths !== null && !(typeof p.bathrooms === 'number' && p.bathrooms >= minBaths)) return false
+        if (minPrice !== null || maxPrice !== null) {
+          if (typeof p.price !== 'number') return false
+          if (minPrice !== null && p.price < minPrice) return false
+          if (maxPrice !== null && p.price > maxPrice) return false
+        }
+        return true
+      })
+    }
+  } catch (e) {
+    console.warn('generateLeadInsights property fetch/filter failed, continuing with provided properties.', e)
+  }
+
+  const topProps = Array.isArray(fetchedProps) ? fetchedProps.slice(0, 5) : []
+
+  const messages = [
+    {
+      role: "system",
+      content: "You are a precise real estate matching expert. Only recommend properties that satisfy the lead's stated constraints. If none satisfy, say so and suggest adjustments."
+    },
+    {
+      role: "user",
+      content: `Lead: ${lead.name} (${lead.lead_type})
+      Preferences: ${JSON.stringify(lead.preferences)}
+      Candidate Properties (up to 5): ${JSON.stringify(topProps)}
+
+      Rules:
+      - Only select properties that meet min bedrooms, min bathrooms, and price range when these are provided.
+      - If zipcode is specified, only consider that zipcode.
+      - Do not include properties with unknown values for required constraints.
+      - If no properties meet constraints, clearly state none match and propose specific, practical adjustments.
+
+      Output (Markdown):
+      ### AI Insights
+      1) For each of the top 3 matches, show:
+         - Address
+         - Price (USD, commas)
+         - Bedrooms / Bathrooms
+         - Reason for Match (explicitly reference how it meets the constraints)
+      ### Summary
+      - Brief recap of how matches satisfy the constraints.
+      ### Next Steps
+      - 2-3 concise actions for the agent.`
+    }
+  ]
+
+  return await callOpenAI('gpt-4o-mini', messages, { priority })
+}
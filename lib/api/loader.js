@@ -0,0 +1,94 @@
+import { getRequestContext } from '@/lib/api/request-context'
+
+// Request-scoped document loader. Lookups by `id` made in the same tick are batched into one
+// `{ id: { $in: [...] } }` query per collection, and each document is fetched at most once per
+// request, so a handler and the helpers it calls (validateStageTransition, hydration of task
+// lists, ...) can each ask for the transaction they need without paying another round trip.
+// Documents are shared between callers: copy before modifying. Writes should prime() the
+// document they got back (findOneAndUpdate) or clear() it. Batches are answered from a plain
+// { id: 1 } index, created (once per process, not waited for) when the first loader is set up
+// for the collections below and on the first batch for any other.
+const ID_INDEXED = ['transactions', 'checklist_items']
+
+function state() {
+  return globalThis.__crmLoader || (globalThis.__crmLoader = { indexed: new Set() })
+}
+
+function ensureIdIndex(db, collection) {
+  const { indexed } = state()
+  if (indexed.has(collection)) return
+  indexed.add(collection)
+  const coll = db.collection(collection)
+  if (typeof coll.createIndex !== 'function') return
+  coll.createIndex({ id: 1 }).catch((e) => {
+    indexed.delete(collection)
+    console.warn(`Loader index error for ${collection}`, e)
+  })
+}
+
+export function getLoader(db) {
+  const context = getRequestContext()
+  if (!context) return createLoader(db)
+  if (!context.loader || context.loader.db !== db) context.loader = createLoader(db)
+  return context.loader
+}
+
+function createLoader(db) {
+  for (const collection of ID_INDEXED) ensureIdIndex(db, collection)
+  // `${collection}:${id}` -> Promise<doc | null>
+  const cache = new Map()
+  // collection -> Map<id, { resolve, reject }> waiting for the next batch
+  const queues = new Map()
+
+  async function flush(collection) {
+    const queue = queues.get(collection)
+    queues.delete(collection)
+    ensureIdIndex(db, collection)
+    try {
+      const docs = await db.collection(collection)
+        .find({ id: { $in: [...queue.keys()] } }, { projection: { _id: 0 } })
+        .toArray()
+      const byId = new Map(docs.map(doc => [doc.id, doc]))
+      for (const [id, waiter] of queue) waiter.resolve(byId.get(id) || null)
+    } catch (error) {
+      for (const [id, waiter] of queue) {
+        cache.delete(`${collection}:${id}`)
+        waiter.reject(error)
+      }
+    }
+  }
+
+  function load(collection, id) {
+    if (!id) return Promise.resolve(null)
+    const key = `${collection}:${id}`
+    if (!cache.has(key)) {
+      if (!queues.has(collection)) {
+        queues.set(collection, new Map())
+        queueMicrotask(() => flush(collection))
+      }
+      cache.set(key, new Promise((resolve, reject) => queues.get(collection).set(id, { resolve, reject })))
+    }
+    return cache.get(key)
+  }
+
+  // Map of id -> document for the ids that exist
+  async function loadMany(collection, ids) {
+    const unique = [...new Set(ids.filter(Boolean))]
+    const docs = await Promise.all(unique.map(id => load(collection, id)))
+    return new Map(docs.filter(Boolean).map(doc => [doc.id, doc]))
+  }
+
+  function prime(collection, doc) {
+    if (doc?.id) {
+      const { _id, ...clean } = doc
+      cache.set(`${collection}:${doc.id}`, Promise.resolve(clean))
+    }
+    return doc
+  }
+
+  function clear(collection, id) {
+    cache.delete(`${collection}:${id}`)
+  }
+
+  return { db, load, loadMany, prime, clear }
+}
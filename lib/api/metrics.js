@@ -0,0 +1,138 @@
+// In-process metrics registry (counters, gauges, histograms with labels).
+// Lives on globalThis so every bundle and dev hot reloads record into the same series.
+const registry = globalThis.__crmMetrics || (globalThis.__crmMetrics = new Map())
+
+// Latency buckets in seconds
+export const DEFAULT_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+
+const labelKey = (labelNames, labels = {}) => labelNames.map(n => String(labels[n] ?? '')).join('\u0001')
+
+function register(type, name, help, labelNames, extra = {}) {
+  const existing = registry.get(name)
+  if (existing) return existing
+  const metric = { type, name, help, labelNames, series: new Map(), ...extra }
+  registry.set(name, metric)
+  return metric
+}
+
+function seriesFor(metric, labels, init) {
+  const key = labelKey(metric.labelNames, labels)
+  let series = metric.series.get(key)
+  if (!series) {
+    series = { labels: Object.fromEntries(metric.labelNames.map(n => [n, String(labels?.[n] ?? '')])), ...init() }
+    metric.series.set(key, series)
+  }
+  return series
+}
+
+export function counter(name, help, labelNames = []) {
+  const metric = register('counter', name, help, labelNames)
+  return {
+    inc(labels, value = 1) {
+      seriesFor(metric, labels, () => ({ value: 0 })).value += value
+    }
+  }
+}
+
+export function gauge(name, help, labelNames = []) {
+  const metric = register('gauge', name, help, labelNames)
+  return {
+    set(labels, value) {
+      seriesFor(metric, labels, () => ({ value: 0 })).value = value
+    },
+    inc(labels, value = 1) {
+      seriesFor(metric, labels, () => ({ value: 0 })).value += value
+    },
+    dec(labels, value = 1) {
+      seriesFor(metric, labels, () => ({ value: 0 })).value -= value
+    }
+  }
+}
+
+export function histogram(name, help, labelNames = [], buckets = DEFAULT_BUCKETS) {
+  const metric = register('histogram', name, help, labelNames, { buckets })
+  return {
+    observe(labels, value) {
+      const series = seriesFor(metric, labels, () => ({ counts: new Array(metric.buckets.length).fill(0), sum: 0, count: 0 }))
+      const idx = metric.buckets.findIndex(b => value <= b)
+      if (idx !== -1) series.counts[idx]++
+      series.sum += value
+      series.count++
+    },
+    // Time an async function, observing seconds under labels (or labels(result, error))
+    async time(labels, fn) {
+      const start = process.hrtime.bigint()
+      let result
+      let error
+      try {
+        result = await fn()
+        return result
+      } catch (e) {
+        error = e
+        throw e
+      } finally {
+        const seconds = Number(process.hrtime.bigint() - start) / 1e9
+        this.observe(typeof labels === 'function' ? labels(result, error) : labels, seconds)
+      }
+    }
+  }
+}
+
+export function getMetric(name) {
+  return registry.get(name) || null
+}
+
+// Estimate a quantile (seconds) from histogram bucket counts
+export function quantileFromBuckets(buckets, counts, q) {
+  const total = counts.reduce((a, b) => a + b, 0)
+  if (total === 0) return 0
+  const target = q * total
+  let seen = 0
+  for (let i = 0; i < buckets.length; i++) {
+    seen += counts[i]
+    if (seen >= target) return buckets[i]
+  }
+  return buckets[buckets.length - 1]
+}
+
+// Callbacks run right before rendering, for gauges that are sampled rather than tracked
+const collectors = globalThis.__crmMetricCollectors || (globalThis.__crmMetricCollectors = new Map())
+
+export function registerCollector(name, fn) {
+  collectors.set(name, fn)
+}
+
+const escapeLabel = (v) => String(v).replace(/\\/g, '\\\\').replace(/"/g, '\\"').replace(/\n/g, '\\n')
+
+function formatLabels(labels, extra = {}) {
+  const entries = [...Object.entries(labels), ...Object.entries(extra)]
+  if (entries.length === 0) return ''
+  return `{${entries.map(([k, v]) => `${k}="${escapeLabel(v)}"`).join(',')}}`
+}
+
+// Prometheus text exposition format (version 0.0.4)
+export function renderPrometheus() {
+  for (const fn of collectors.values()) {
+    try { fn() } catch (e) { console.warn('Metrics collector error', e) }
+  }
+  const lines = []
+  for (const metric of registry.values()) {
+    lines.push(`# HELP ${metric.name} ${metric.help}`)
+    lines.push(`# TYPE ${metric.name} ${metric.type}`)
+    for (const s of metric.series.values()) {
+      if (metric.type !== 'histogram') {
+        lines.push(`${metric.name}${formatLabels(s.labels)} ${s.value}`)
+        continue
+      }
+      let cumulative = 0
+      metric.buckets.forEach((le, i) => {
+        cumulative += s.counts[i]
+        lines.push(`${metric.name}_bucket${formatLabels(s.labels, { le })} ${cumulative}`)
+      })
+      lines.push(`${metric.name}_bucket${formatLabels(s.labels, { le: '+Inf' })} ${s.count}`)
+      lines.push(`${metric.name}_sum${formatLabels(s.labels)} ${s.sum}`)
+      lines.push(`${metric.name}_count${formatLabels(s.labels)} ${s.count}`)
+    }
+  }
+  return lines.join('\n') + '\n'
+}
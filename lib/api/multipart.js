@@ -0,0 +1,150 @@
+import { createWriteStream, promises as fs } from 'fs'
+import { once } from 'events'
+import { finished } from 'stream/promises'
+
+// Streaming multipart/form-data reader. Text fields are collected (size-capped) and one
+// file field is written straight to disk as it arrives, so memory use stays at roughly one
+// network chunk per upload regardless of the file's size.
+const MAX_HEADER_BYTES = 16 * 1024
+const MAX_FIELD_BYTES = 64 * 1024
+
+export class UploadError extends Error {
+  constructor(status, message) {
+    super(message)
+    this.status = status
+  }
+}
+
+function boundaryOf(contentType) {
+  const match = /boundary=(?:"([^"]+)"|([^;]+))/i.exec(contentType || '')
+  return match ? (match[1] || match[2]).trim() : null
+}
+
+function parsePartHeaders(text) {
+  const headers = {}
+  for (const line of text.split('\r\n')) {
+    const idx = line.indexOf(':')
+    if (idx > 0) headers[line.slice(0, idx).trim().toLowerCase()] = line.slice(idx + 1).trim()
+  }
+  const disposition = headers['content-disposition'] || ''
+  const param = (key) => {
+    const m = new RegExp(`${key}="([^"]*)"`, 'i').exec(disposition) || new RegExp(`${key}=([^;]+)`, 'i').exec(disposition)
+    return m ? m[1].trim() : null
+  }
+  return { name: param('name'), filename: param('filename'), type: headers['content-type'] || null }
+}
+
+// Reads the request body, writing the `fileField` part to `filePath`. Returns
+// { fields, file: { path, size, type, filename } | null }. Throws UploadError (400/413);
+// a partially written file is removed.
+export async function receiveMultipart(request, { fileField, filePath, maxFileBytes }) {
+  const boundary = boundaryOf(request.headers.get('content-type'))
+  if (!boundary || !request.body) throw new UploadError(400, 'Expected a multipart/form-data body')
+  const declared = Number(request.headers.get('content-length'))
+  if (Number.isFinite(declared) && declared > maxFileBytes + MAX_FIELD_BYTES) {
+    throw new UploadError(413, `Upload exceeds ${maxFileBytes} bytes`)
+  }
+
+  // Every delimiter is preceded by CRLF; prefixing one lets the first boundary match too
+  const delimiter = Buffer.from(`\r\n--${boundary}`)
+  const reader = request.body.getReader()
+  const fields = {}
+  let file = null
+  let out = null // current part: { kind: 'file', stream } | { kind: 'field', name, chunks, size } | { kind: 'skip' }
+  let state = 'preamble'
+  let buf = Buffer.from('\r\n')
+
+  const write = async (chunk) => {
+    if (chunk.length === 0 || !out) return
+    if (out.kind === 'file') {
+      file.size += chunk.length
+      if (file.size > maxFileBytes) throw new UploadError(413, `Upload exceeds ${maxFileBytes} bytes`)
+      if (out.stream.errored) throw out.stream.errored
+      if (!out.stream.write(chunk)) await once(out.stream, 'drain')
+    } else if (out.kind === 'field') {
+      out.size += chunk.length
+      if (out.size > MAX_FIELD_BYTES) throw new UploadError(413, `Field "${out.name}" is too large`)
+      out.chunks.push(chunk)
+    }
+  }
+
+  const endPart = async () => {
+    if (out?.kind === 'file') {
+      out.stream.end()
+      await finished(out.stream)
+    } else if (out?.kind === 'field') {
+      fields[out.name] = Buffer.concat(out.chunks).toString('utf8')
+    }
+    out = null
+  }
+
+  const startPart = (headers) => {
+    if (headers.filename != null && headers.name === fileField && !file) {
+      file = { path: filePath, size: 0, type: headers.type, filename: headers.filename }
+      const stream = createWriteStream(filePath)
+      // Write errors surface through errored/drain/finished; without a listener a late one
+      // (e.g. after destroy()) would crash the process
+      stream.on('error', () => {})
+      out = { kind: 'file', stream }
+    } else if (headers.filename == null && headers.name) {
+      out = { kind: 'field', name: headers.name, chunks: [], size: 0 }
+    } else {
+      out = { kind: 'skip' }
+    }
+  }
+
+  try {
+    let closed = false
+    while (!closed) {
+      const { value, done } = await reader.read()
+      if (value) buf = buf.length ? Buffer.concat([buf, Buffer.from(value)]) : Buffer.from(value)
+
+      for (;;) {
+        if (state === 'preamble' || state === 'body') {
+          const idx = buf.indexOf(delimiter)
+          if (idx === -1) {
+            // Keep enough of the tail to recognise a delimiter split across chunks
+            const keep = Math.min(buf.length, delimiter.length - 1)
+            if (state === 'body') await write(buf.subarray(0, buf.length - keep))
+            buf = buf.subarray(buf.length - keep)
+            break
+          }
+          if (state === 'body') {
+            await write(buf.subarray(0, idx))
+            await endPart()
+          }
+          buf = buf.subarray(idx + delimiter.length)
+          state = 'delimiter'
+        }
+        if (state === 'delimiter') {
+          if (buf.length < 2) break
+          if (buf[0] === 0x2d && buf[1] === 0x2d) { // "--": closing delimiter
+            closed = true
+            break
+          }
+          state = 'headers'
+        }
+        if (state === 'headers') {
+          const end = buf.indexOf('\r\n\r\n')
+          if (end === -1) {
+            if (buf.length > MAX_HEADER_BYTES) throw new UploadError(400, 'Malformed multipart headers')
+            break
+          }
+          // Skip the CRLF (and any transport padding) that ends the delimiter line
+          startPart(parsePartHeaders(buf.subarray(0, end).toString('utf8').replace(/^[ \t]*\r\n/, '')))
+          buf = buf.subarray(end + 4)
+          state = 'body'
+        }
+      }
+      if (done && !closed) throw new UploadError(400, 'Multipart body ended early')
+    }
+    reader.cancel().catch(() => {})
+    return { fields, file }
+  } catch (error) {
+    if (!(error instanceof UploadError)) console.warn('Multipart upload error', error)
+    reader.cancel().catch(() => {})
+    if (out?.kind === 'file') out.stream.destroy()
+    if (file) await fs.unlink(filePath).catch(() => {})
+    throw error
+  }
+}
@@ -0,0 +1,191 @@
+import { counter, gauge, histogram } from '@/lib/api/metrics'
+
+// Client-side view of OpenAI's per-model rate limits. Each model gets a request bucket and a
+// token bucket that refill continuously at the RPM/TPM rate but only hold one second's
+// worth, since OpenAI enforces per-minute limits over short intervals and a full minute's
+// burst would be throttled anyway. Callers wait in a priority queue until both buckets can
+// cover them. A 429 pauses the whole model for its retry-after window, so concurrent
+// callers back off together once instead of each retrying into it.
+export const PRIORITIES = { interactive: 0, background: 1 }
+
+const queueDepth = gauge('crm_openai_queue_depth', 'OpenAI calls waiting for rate-limit budget', ['model', 'priority'])
+const queueWait = histogram('crm_openai_queue_wait_seconds', 'Time OpenAI calls spent waiting for rate-limit budget', ['model', 'priority'])
+const throttled = counter('crm_openai_throttled_total', '429 responses that paused a model bucket', ['model'])
+
+const priorityName = (p) => Object.keys(PRIORITIES).find(k => PRIORITIES[k] === p) || String(p)
+
+class ModelLimiter {
+  constructor(model, rpm, tpm) {
+    this.model = model
+    this.rpm = rpm
+    this.tpm = tpm
+    this.requestBurst = Math.max(1, rpm / 60)
+    this.tokenBurst = Math.max(1, tpm / 60)
+    this.requests = this.requestBurst
+    this.tokens = this.tokenBurst
+    this.refilledAt = Date.now()
+    this.pausedUntil = 0
+    this.heap = []
+    this.seq = 0
+    this.timer = null
+  }
+
+  refill(now) {
+    const elapsed = now - this.refilledAt
+    this.refilledAt = now
+    this.requests = Math.min(this.requestBurst, this.requests + elapsed * this.rpm / 60000)
+    this.tokens = Math.min(this.tokenBurst, this.tokens + elapsed * this.tpm / 60000)
+  }
+
+  // Resolves once the call may be sent; tokens is the estimated prompt + completion size.
+  // A `ticket` ({ priority }) shared by several callers raises the wait to its priority and
+  // lets promote() move it up while it's queued.
+  acquire(tokens, priority = PRIORITIES.interactive, ticket = null) {
+    return new Promise(resolve => {
+      if (ticket) priority = Math.min(priority, ticket.priority)
+      // Oversized calls wait for a full bucket and settle() charges the rest afterwards
+      const item = { tokens: Math.min(tokens, this.tokenBurst), priority, seq: this.seq++, enqueuedAt: Date.now(), resolve }
+      if (ticket) Object.assign(ticket, { limiter: this, item })
+      this.push(item)
+      queueDepth.inc({ model: this.model, priority: priorityName(priority) })
+      this.drain()
+    })
+  }
+
+  // Re-queue a waiting call at its ticket's (raised) priority
+  promote(ticket) {
+    const { item } = ticket
+    const index = item ? this.heap.indexOf(item) : -1
+    if (index === -1 || item.priority <= ticket.priority) return
+    queueDepth.dec({ model: this.model, priority: priorityName(item.priority) })
+    item.priority = ticket.priority
+    queueDepth.inc({ model: this.model, priority: priorityName(item.priority) })
+    this.siftUp(index)
+    this.drain()
+  }
+
+  // Correct the reservation once the real token usage is known (may go negative)
+  settle(reserved, actual) {
+    this.refill(Date.now())
+    this.tokens = Math.min(this.tokenBurst, this.tokens + Math.min(reserved, this.tokenBurst) - actual)
+  }
+
+  pause(ms) {
+    this.pausedUntil = Math.max(this.pausedUntil, Date.now() + ms)
+    // Drop whatever budget we thought we had; the server says it's gone
+    this.requests = Math.min(this.requests, 0)
+    throttled.inc({ model: this.model })
+  }
+
+  drain() {
+    if (this.timer) { clearTimeout(this.timer); this.timer = null }
+    while (this.heap.length > 0) {
+      const now = Date.now()
+      if (now < this.pausedUntil) return this.wake(this.pausedUntil - now)
+      this.refill(now)
+      const next = this.heap[0]
+      if (this.requests >= 1 && this.tokens >= next.tokens) {
+        this.pop()
+        this.requests -= 1
+        this.tokens -= next.tokens
+        const labels = { model: this.model, priority: priorityName(next.priority) }
+        queueDepth.dec(labels)
+        queueWait.observe(labels, (now - next.enqueuedAt) / 1000)
+        next.resolve()
+        continue
+      }
+      const waitMs = Math.max(
+        (1 - this.requests) * 60000 / this.rpm,
+        (next.tokens - this.tokens) * 60000 / this.tpm
+      )
+      return this.wake(Math.ceil(waitMs))
+    }
+  }
+
+  wake(ms) {
+    this.timer = setTimeout(() => this.drain(), Math.max(1, ms))
+    if (typeof this.timer.unref === 'function') this.timer.unref()
+  }
+
+  // Binary min-heap on (priority, arrival order)
+  less(a, b) {
+    return a.priority !== b.priority ? a.priority < b.priority : a.seq < b.seq
+  }
+
+  push(item) {
+    this.heap.push(item)
+    this.siftUp(this.heap.length - 1)
+  }
+
+  siftUp(i) {
+    const h = this.heap
+    while (i > 0) {
+      const parent = (i - 1) >> 1
+      if (!this.less(h[i], h[parent])) break
+      ;[h[i], h[parent]] = [h[parent], h[i]]
+      i = parent
+    }
+  }
+
+  pop() {
+    const h = this.heap
+    const top = h[0]
+    const last = h.pop()
+    if (h.length > 0) {
+      h[0] = last
+      let i = 0
+      for (;;) {
+        const l = 2 * i + 1
+        const r = l + 1
+        let m = i
+        if (l < h.length && this.less(h[l], h[m])) m = l
+        if (r < h.length && this.less(h[r], h[m])) m = r
+        if (m === i) break
+        ;[h[i], h[m]] = [h[m], h[i]]
+        i = m
+      }
+    }
+    return top
+  }
+
+  snapshot() {
+    this.refill(Date.now())
+    return {
+      rpm: this.rpm,
+      tpm: this.tpm,
+      available_requests: Math.floor(this.requests),
+      available_tokens: Math.floor(this.tokens),
+      queued: this.heap.length,
+      paused_ms: Math.max(0, this.pausedUntil - Date.now())
+    }
+  }
+}
+
+export class RateLimiter {
+  constructor(limitsByModel) {
+    this.limits = limitsByModel
+    this.models = new Map()
+  }
+
+  forModel(model) {
+    let limiter = this.models.get(model)
+    if (!limiter) {
+      const { rpm, tpm } = this.limits[model] || {}
+      limiter = new ModelLimiter(model, rpm || 500, tpm || 200000)
+      this.models.set(model, limiter)
+    }
+    return limiter
+  }
+
+  snapshot() {
+    return Object.fromEntries([...this.models].map(([model, l]) => [model, l.snapshot()]))
+  }
+}
+
+// Retry-After for a 429: OpenAI sends retry-after-ms and/or retry-after (seconds)
+export function retryAfterMs(headers) {
+  const ms = Number(headers?.get?.('retry-after-ms'))
+  if (ms > 0) return ms
+  const seconds = Number(headers?.get?.('retry-after'))
+  return seconds > 0 ? seconds * 1000 : null
+}
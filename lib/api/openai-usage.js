@@ -0,0 +1,204 @@
+import { connectToMongo } from '@/lib/api/db'
+
+// OpenAI usage accounting.
+// - UsageLog: the most recent requests in a fixed-size ring, with running per-model and
+//   per-route sums updated on insert and eviction, so stats never rescan the log.
+// - CostLedger: today's spend, persisted to the openai_usage collection (one document per
+//   UTC day) by periodically $inc-ing the unflushed delta and reading back the total, so the
+//   daily budget holds across restarts and is shared between instances. Spend made before
+//   UTC midnight is still written to its own day after the rollover.
+const LOG_SIZE = Math.max(1, Number(process.env.OPENAI_USAGE_LOG_SIZE) || 1000)
+const FLUSH_MS = Math.max(1000, Number(process.env.OPENAI_USAGE_FLUSH_MS) || 15000)
+
+function emptyAggregate() {
+  return { requests: 0, successes: 0, tokens: 0, successTokens: 0, cost: 0, responseTime: 0, successResponseTime: 0 }
+}
+
+function applyEntry(agg, entry, sign) {
+  agg.requests += sign
+  agg.cost += sign * (entry.cost || 0)
+  agg.responseTime += sign * (entry.responseTime || 0)
+  const tokens = (entry.inputTokens || 0) + (entry.outputTokens || 0)
+  agg.tokens += sign * tokens
+  if (entry.success) {
+    agg.successes += sign
+    agg.successTokens += sign * tokens
+    agg.successResponseTime += sign * (entry.responseTime || 0)
+  }
+}
+
+export class UsageLog {
+  constructor(capacity = LOG_SIZE) {
+    this.capacity = capacity
+    this.clear()
+  }
+
+  clear() {
+    this.buffer = new Array(this.capacity)
+    this.start = 0
+    this.size = 0
+    this.total = emptyAggregate()
+    this.byModel = new Map()
+    this.byRoute = new Map()
+  }
+
+  bucket(map, key) {
+    let agg = map.get(key)
+    if (!agg) {
+      agg = emptyAggregate()
+      map.set(key, agg)
+    }
+    return agg
+  }
+
+  apply(entry, sign) {
+    applyEntry(this.total, entry, sign)
+    applyEntry(this.bucket(this.byModel, entry.model), entry, sign)
+    applyEntry(this.bucket(this.byRoute, entry.route || 'background'), entry, sign)
+  }
+
+  push(entry) {
+    if (this.size === this.capacity) {
+      this.apply(this.buffer[this.start], -1)
+      this.buffer[this.start] = entry
+      this.start = (this.start + 1) % this.capacity
+    } else {
+      this.buffer[(this.start + this.size) % this.capacity] = entry
+      this.size++
+    }
+    this.apply(entry, 1)
+  }
+}
+
+const utcDay = (d = new Date()) => d.toISOString().slice(0, 10)
+const emptyDelta = () => ({ cost: 0, requests: 0, input_tokens: 0, output_tokens: 0, models: {} })
+
+function mergeDelta(into, delta) {
+  into.cost += delta.cost
+  into.requests += delta.requests
+  into.input_tokens += delta.input_tokens
+  into.output_tokens += delta.output_tokens
+  for (const [model, cost] of Object.entries(delta.models)) into.models[model] = (into.models[model] || 0) + cost
+  return into
+}
+
+export class CostLedger {
+  constructor() {
+    this.day = utcDay()
+    this.persisted = 0 // today's total as of the last read from MongoDB (all instances)
+    this.pending = emptyDelta()
+    this.earlier = new Map() // day -> unflushed spend of days that have ended
+    this.flushing = 0 // cost of a delta that's been taken from pending but not yet read back
+    this.synced = null
+    this.timer = null
+    this.refresher = null
+  }
+
+  rollover() {
+    const today = utcDay()
+    if (today === this.day) return
+    const [day, unflushed] = [this.day, this.pending]
+    this.day = today
+    this.persisted = 0
+    this.pending = emptyDelta()
+    // Spend not yet flushed still belongs to the day it was made
+    if (unflushed.requests > 0) {
+      this.carry(day, unflushed)
+      this.schedule()
+    }
+  }
+
+  carry(day, delta) {
+    if (day === this.day) mergeDelta(this.pending, delta)
+    else this.earlier.set(day, mergeDelta(this.earlier.get(day) || emptyDelta(), delta))
+  }
+
+  costToday() {
+    this.rollover()
+    return this.persisted + this.flushing + this.pending.cost
+  }
+
+  record({ model, cost = 0, inputTokens = 0, outputTokens = 0 }) {
+    this.rollover()
+    const p = this.pending
+    p.cost += cost
+    p.requests += 1
+    p.input_tokens += inputTokens
+    p.output_tokens += outputTokens
+    p.models[model] = (p.models[model] || 0) + cost
+    this.schedule()
+  }
+
+  schedule() {
+    if (this.timer) return
+    this.timer = setTimeout(() => {
+      this.timer = null
+      this.flush()
+    }, FLUSH_MS)
+    if (typeof this.timer.unref === 'function') this.timer.unref()
+  }
+
+  // Load today's total once before the first budget check, then re-read it every FLUSH_MS so
+  // an instance that isn't spending still sees what the others spend
+  ready() {
+    if (!this.synced) {
+      this.synced = (async () => {
+        try {
+          const coll = (await connectToMongo()).collection('openai_usage')
+          if (typeof coll.createIndex === 'function') await coll.createIndex({ day: 1 }, { unique: true })
+        } catch (e) {
+          console.warn('OpenAI usage index error', e)
+        }
+        await this.flush()
+        this.refresher = setInterval(() => this.flush(), FLUSH_MS)
+        if (typeof this.refresher.unref === 'function') this.refresher.unref()
+      })()
+    }
+    return this.synced
+  }
+
+  async flush() {
+    this.rollover()
+    const day = this.day
+    const delta = this.pending
+    this.pending = emptyDelta()
+    const deltas = [...this.earlier, [day, delta]].filter(([, d]) => d.requests > 0)
+    this.earlier = new Map()
+    this.flushing += delta.cost
+    let written = 0
+    try {
+      const coll = (await connectToMongo()).collection('openai_usage')
+      for (const [deltaDay, d] of deltas) {
+        const inc = { total_cost: d.cost, requests: d.requests, input_tokens: d.input_tokens, output_tokens: d.output_tokens }
+        for (const [model, cost] of Object.entries(d.models)) inc[`cost_by_model.${model.replace(/\./g, '_')}`] = cost
+        await coll.updateOne({ day: deltaDay }, { $inc: inc, $set: { updated_at: new Date() } }, { upsert: true })
+        written++
+      }
+      const doc = await coll.findOne({ day }, { projection: { total_cost: 1 } })
+      if (day === this.day) this.persisted = doc?.total_cost || 0
+    } catch (e) {
+      // Keep the unwritten deltas for the next attempt (under their own day)
+      for (const [deltaDay, d] of deltas.slice(written)) this.carry(deltaDay, d)
+      if (written < deltas.length) this.schedule()
+      console.warn('OpenAI usage flush error', e)
+    } finally {
+      this.flushing -= delta.cost
+    }
+  }
+
+  async reset() {
+    this.rollover()
+    this.persisted = 0
+    this.pending = emptyDelta()
+    try {
+      const coll = (await connectToMongo()).collection('openai_usage')
+      await coll.updateOne(
+        { day: this.day },
+        { $set: { total_cost: 0, requests: 0, input_tokens: 0, output_tokens: 0, cost_by_model: {}, reset_at: new Date(), updated_at: new Date() } },
+        { upsert: true }
+      )
+    } catch (e) {
+      console.warn('OpenAI usage reset error', e)
+    }
+  }
+}
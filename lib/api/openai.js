@@ -0,0 +1,567 @@
+import { createHash } from 'crypto'
+import { markPhase } from '@/lib/api/startup'
+import { counter } from '@/lib/api/metrics'
+import { PRIORITIES, RateLimiter, retryAfterMs } from '@/lib/api/openai-limiter'
+import { CostLedger, UsageLog } from '@/lib/api/openai-usage'
+import { getRequestContext } from '@/lib/api/request-context'
+import { countTokens, loadTokenizer } from '@/lib/api/tokenizer'
+import { observeUpstream, recordCacheLookup } from '@/lib/api/telemetry'
+
+// How long the first OpenAI call waits for the tokenizer vocab before budgeting heuristically
+const TOKENIZER_WAIT_MS = 2000
+const TOKEN_CACHE_SIZE = 1000
+const TOKEN_CACHE_MIN_LENGTH = 64
+
+const coalescedCalls = counter('crm_openai_coalesced_total', 'OpenAI calls answered by an identical in-flight request', ['model'])
+
+// Enhanced OpenAI Agent Utilities with advanced features
+export class OpenAIUtility {
+  constructor() {
+    this.apiKey = process.env.OPENAI_API_KEY
+    this.baseURL = process.env.OPENAI_BASE_URL || 'https://api.openai.com/v1'
+    this.maxRetries = 3
+    this.baseDelay = 1000 // 1 second
+    this.maxDelay = 30000 // 30 seconds
+    // rpm/tpm: account rate limits (tier 1 defaults), overridable with OPENAI_RPM / OPENAI_TPM
+    this.tokenLimits = {
+      'gpt-4o-mini': { input: 128000, output: 16000, cost_per_1k_input: 0.00015, cost_per_1k_output: 0.0006, rpm: 500, tpm: 200000 },
+      'o1-mini': { input: 128000, output: 65536, cost_per_1k_input: 0.003, cost_per_1k_output: 0.012, rpm: 500, tpm: 200000 },
+      'gpt-4o': { input: 128000, output: 4096, cost_per_1k_input: 0.005, cost_per_1k_output: 0.015, rpm: 500, tpm: 30000 }
+    }
+    for (const limits of Object.values(this.tokenLimits)) {
+      if (Number(process.env.OPENAI_RPM) > 0) limits.rpm = Number(process.env.OPENAI_RPM)
+      if (Number(process.env.OPENAI_TPM) > 0) limits.tpm = Number(process.env.OPENAI_TPM)
+    }
+    // Shared across every caller in the process; OPENAI_RATE_LIMIT=0 turns it off
+    this.rateLimiter = process.env.OPENAI_RATE_LIMIT === '0' ? null : new RateLimiter(this.tokenLimits)
+    this.inflight = new Map()
+    // Exact counts for system prompts, which are built from the same templates on every call;
+    // keyed by a hash of the text so long prompts aren't held in memory twice
+    this.tokenCountCache = new Map()
+    this.requestLog = new UsageLog()
+    this.costLedger = new CostLedger()
+    this.dailyCostLimit = 50.00 // $50 daily limit
+  }
+
+  // Load the BPE vocab (retried with backoff after a failure), waiting at most
+  // TOKENIZER_WAIT_MS; the load carries on in the background if it's slower and later calls
+  // pick it up
+  async ensureTokenizer() {
+    await Promise.race([loadTokenizer(), new Promise(resolve => setTimeout(resolve, TOKENIZER_WAIT_MS).unref?.())])
+  }
+
+  // Exact BPE count, memoized when `cache` is set (system prompts); null until the tokenizer
+  // is loaded
+  exactTokenCount(text, { cache = false } = {}) {
+    if (!cache || text.length < TOKEN_CACHE_MIN_LENGTH) return countTokens(text)
+    const key = createHash('sha1').update(text).digest('base64')
+    const cached = this.tokenCountCache.get(key)
+    if (cached !== undefined) {
+      recordCacheLookup('token_counts', true)
+      // Refresh recency so frequently reused prompts stay cached
+      this.tokenCountCache.delete(key)
+      this.tokenCountCache.set(key, cached)
+      return cached
+    }
+    const count = countTokens(text)
+    if (count === null) return null
+    recordCacheLookup('token_counts', false)
+    this.tokenCountCache.set(key, count)
+    if (this.tokenCountCache.size > TOKEN_CACHE_SIZE) {
+      this.tokenCountCache.delete(this.tokenCountCache.keys().next().value)
+    }
+    return count
+  }
+
+  // Token count: exact when the tokenizer is loaded, tiktoken-style approximation otherwise
+  estimateTokenCount(text, model = 'gpt-4o-mini', options = {}) {
+    if (!text) return 0
+    const exact = this.exactTokenCount(String(text), options)
+    if (exact !== null) return exact
+    
+    // Rough approximation: 1 token ≈ 4 characters for English text
+    // More accurate for code and structured content
+    const baseCount = Math.ceil(text.length / 4)
+    
+    // Adjust for model-specific tokenization patterns
+    const modelAdjustments = {
+      'gpt-4o-mini': 1.0,
+      'o1-mini': 1.1, // O1 models tend to use slightly more tokens
+      'gpt-4o': 1.0
+    }
+    
+    return Math.ceil(baseCount * (modelAdjustments[model] || 1.0))
+  }
+
+  // Calculate message token count including chat formatting (3 per message, 3 to prime the reply)
+  calculateMessageTokens(messages, model = 'gpt-4o-mini') {
+    let totalTokens = 0
+    
+    for (const message of messages) {
+      // Add tokens for role and content
+      totalTokens += this.estimateTokenCount(message.role, model)
+      totalTokens += this.estimateTokenCount(message.content, model, { cache: message.role === 'system' })
+      if (message.name) totalTokens += this.estimateTokenCount(message.name, model) + 1
+      // Add overhead tokens for message formatting
+      totalTokens += 3
+    }
+    
+    // Add conversation overhead
+    totalTokens += 3
+    
+    return totalTokens
+  }
+
+  // Keep as many lines as fit in maxTokens (callers order them most important first) and
+  // note how many were left out
+  fitLinesToTokens(lines, maxTokens, model = 'gpt-4o-mini') {
+    const kept = []
+    let used = 0
+    for (const line of lines) {
+      const cost = this.estimateTokenCount(line, model) + 1
+      if (used + cost > maxTokens) break
+      kept.push(line)
+      used += cost
+    }
+    if (kept.length < lines.length) kept.push(`- ...and ${lines.length - kept.length} more not shown`)
+    return kept.join('\n')
+  }
+
+  // Cost calculation and budget checking
+  calculateCost(inputTokens, outputTokens, model = 'gpt-4o-mini') {
+    const limits = this.tokenLimits[model]
+    if (!limits) return 0
+
+    const inputCost = (inputTokens / 1000) * limits.cost_per_1k_input
+    const outputCost = (outputTokens / 1000) * limits.cost_per_1k_output
+    
+    return inputCost + outputCost
+  }
+
+  // Today's spend across all instances (last synced total + this process's unflushed share)
+  get totalCost() {
+    return this.costLedger.costToday()
+  }
+
+  // Check if request would exceed budget limits
+  checkBudgetLimits(estimatedCost) {
+    const projectedTotal = this.totalCost + estimatedCost
+    
+    if (projectedTotal > this.dailyCostLimit) {
+      throw new Error(`Request would exceed daily cost limit. Current: $${this.totalCost.toFixed(4)}, Estimated: $${estimatedCost.toFixed(4)}, Limit: $${this.dailyCostLimit}`)
+    }
+
+    if (estimatedCost > 5.00) {
+      throw new Error(`Single request cost too high: $${estimatedCost.toFixed(4)}. Maximum allowed: $5.00`)
+    }
+  }
+
+  // Exponential backoff calculation
+  calculateBackoffDelay(attemptNumber) {
+    const delay = this.baseDelay * Math.pow(2, attemptNumber - 1)
+    const jitter = Math.random() * 0.1 * delay // Add 10% jitter
+    return Math.min(delay + jitter, this.maxDelay)
+  }
+
+  // Enhanced error handling and classification
+  classifyError(error, response = null) {
+    const status = response?.status || error.status || 0
+    const errorData = error.response?.data || error.data || {}
+    const errorCode = errorData.error?.code || errorData.code
+    const errorType = errorData.error?.type || errorData.type
+    
+    return {
+      status,
+      code: errorCode,
+      type: errorType,
+      message: errorData.error?.message || errorData.message || error.message,
+      isRetryable: status === 429 || status === 503 || status === 502 || status >= 500,
+      isRateLimit: status === 429,
+      isBudgetIssue: errorCode === 'insufficient_quota' || errorCode === 'quota_exceeded',
+      isModelIssue: status === 404 && errorType === 'invalid_request_error'
+    }
+  }
+
+  // Stream response handler
+  async handleStreamResponse(response, onChunk = null) {
+    if (!response.body) {
+      throw new Error('No response body for streaming')
+    }
+
+    const reader = response.body.getReader()
+    const decoder = new TextDecoder()
+    let buffer = ''
+    let fullContent = ''
+
+    try {
+      while (true) {
+        const { done, value } = await reader.read()
+        if (done) break
+
+        buffer += decoder.decode(value, { stream: true })
+        const lines = buffer.split('\n')
+        buffer = lines.pop() || ''
+
+        for (const line of lines) {
+          if (line.startsWith('data: ')) {
+            const data = line.slice(6).trim()
+            if (data === '[DONE]') continue
+
+            try {
+              const parsed = JSON.parse(data)
+              const content = parsed.choices?.[0]?.delta?.content
+              if (content) {
+                fullContent += content
+                if (onChunk) onChunk(content)
+              }
+            } catch (parseError) {
+              console.warn('Failed to parse streaming chunk:', parseError)
+            }
+          }
+        }
+      }
+
+      return fullContent
+    } finally {
+      reader.releaseLock()
+    }
+  }
+
+  // Main entry point. Identical non-streaming requests that are already in flight share
+  // one upstream call (coalesce: false opts out), which waits for rate-limit budget at the
+  // most urgent priority among its callers.
+  async callOpenAI(model = 'gpt-4o-mini', messages, options = {}) {
+    if (options.stream || options.coalesce === false) {
+      return this.executeCompletion(model, messages, options)
+    }
+    const { maxTokens = null, temperature = 0.7, topP = 1.0, frequencyPenalty = 0, presencePenalty = 0, stop = null } = options
+    const priority = PRIORITIES[options.priority] ?? PRIORITIES.interactive
+    const key = JSON.stringify([model, messages, maxTokens, temperature, topP, frequencyPenalty, presencePenalty, stop])
+    const pending = this.inflight.get(key)
+    if (pending) {
+      coalescedCalls.inc({ model })
+      if (priority < pending.ticket.priority) {
+        pending.ticket.priority = priority
+        pending.ticket.limiter?.promote(pending.ticket)
+      }
+      return pending.call
+    }
+    const ticket = { priority }
+    const call = this.executeCompletion(model, messages, { ...options, ticket }).finally(() => this.inflight.delete(key))
+    this.inflight.set(key, { call, ticket })
+    return call
+  }
+
+  async executeCompletion(model = 'gpt-4o-mini', messages, options = {}) {
+    const {
+      stream = false,
+      onChunk = null,
+      maxTokens = null,
+      temperature = 0.7,
+      topP = 1.0,
+      frequencyPenalty = 0,
+      presencePenalty = 0,
+      stop = null,
+      skipBudgetCheck = false,
+      customRetries = null,
+      // 'interactive' (user waiting) is served before 'background' when rate limited
+      priority = 'interactive',
+      // Shared with coalesced callers (callOpenAI), who may raise its priority while queued
+      ticket = null,
+      // Timeouts (ms): separate defaults for streaming vs non-streaming
+      requestTimeoutMs = 20000,
+      streamTimeoutMs = 60000
+    } = options
+
+    // Map deprecated/alias model names
+    if (model === 'o1-mini') {
+      // 'o1-mini' is an internal alias for 'gpt-4o-mini'.
+      // The public OpenAI endpoint rejects the former with
+      // "unsupported_value: messages[0].role does not support 'system'"
+      // so we transparently switch to the supported model name.
+      model = 'gpt-4o-mini'
+    }
+
+    // Validate model
+    if (!this.tokenLimits[model]) {
+      console.warn(`Unknown model: ${model}, using gpt-4o-mini as fallback`)
+      model = 'gpt-4o-mini'
+    }
+
+    // Validate API key
+    if (!this.apiKey) {
+      throw new Error('OpenAI API key not configured')
+    }
+
+    // Calculate token usage and cost
+    await this.ensureTokenizer()
+    const inputTokens = this.calculateMessageTokens(messages, model)
+    const estimatedOutputTokens = maxTokens || this.tokenLimits[model].output / 4
+    const estimatedCost = this.calculateCost(inputTokens, estimatedOutputTokens, model)
+
+    // Budget checks
+    if (!skipBudgetCheck) {
+      await this.costLedger.ready()
+      this.checkBudgetLimits(estimatedCost)
+    }
+
+    // Token limit validation
+    const modelLimits = this.tokenLimits[model]
+    if (inputTokens > modelLimits.input) {
+      throw new Error(`Input tokens (${inputTokens}) exceed model limit (${modelLimits.input})`)
+    }
+
+    // Build request payload
+    const requestPayload = {
+      model,
+      messages,
+      max_tokens: maxTokens,
+      temperature,
+      top_p: topP,
+      frequency_penalty: frequencyPenalty,
+      presence_penalty: presencePenalty,
+      stream
+    }
+
+    if (stop) requestPayload.stop = stop
+
+    // Remove null/undefined values
+    Object.keys(requestPayload).forEach(key => {
+      if (requestPayload[key] === null || requestPayload[key] === undefined) {
+        delete requestPayload[key]
+      }
+    })
+
+    const maxRetries = customRetries ?? this.maxRetries
+    let lastError = null
+    const limiter = this.rateLimiter?.forModel(model)
+    const reservedTokens = inputTokens + (maxTokens || 1000)
+
+    // Retry loop with exponential backoff
+    for (let attempt = 1; attempt <= maxRetries + 1; attempt++) {
+      if (limiter) await limiter.acquire(reservedTokens, PRIORITIES[priority] ?? PRIORITIES.interactive, ticket)
+      const requestStart = Date.now()
+      
+      let timeoutRef
+      const controller = new AbortController()
+      const timeoutMs = stream ? streamTimeoutMs : requestTimeoutMs
+      try {
+        timeoutRef = setTimeout(() => controller.abort(new Error('Request timed out')), timeoutMs)
+        const response = await fetch(`${this.baseURL}/chat/completions`, {
+          method: 'POST',
+          headers: {
+            'Authorization': `Bearer ${this.apiKey}`,
+            'Content-Type': 'application/json',
+            'User-Agent': 'RealEstate-CRM/1.0'
+          },
+          body: JSON.stringify(requestPayload),
+          signal: controller.signal
+        })
+
+        const responseTime = Date.now() - requestStart
+
+        // Handle streaming response
+        if (stream && response.ok) {
+          const content = await this.handleStreamResponse(response, onChunk)
+          const outputTokens = this.estimateTokenCount(content, model)
+          const actualCost = this.calculateCost(inputTokens, outputTokens, model)
+          
+          // Log successful request
+          this.logRequest({
+            model,
+            inputTokens,
+            outputTokens,
+            cost: actualCost,
+            responseTime,
+            attempt,
+            success: true,
+            stream: true
+          })
+
+          this.costLedger.record({ model, cost: actualCost, inputTokens, outputTokens })
+          limiter?.settle(reservedTokens, inputTokens + outputTokens)
+          return content
+        }
+
+        // Handle non-streaming response
+        if (response.ok) {
+          const data = await response.json()
+          const content = data.choices?.[0]?.message?.content || ''
+          const usage = data.usage
+          const actualOutputTokens = usage?.completion_tokens || this.estimateTokenCount(content, model)
+          const actualInputTokens = usage?.prompt_tokens || inputTokens
+          const actualCost = this.calculateCost(actualInputTokens, actualOutputTokens, model)
+
+          // Log successful request
+          this.logRequest({
+            model,
+            inputTokens: actualInputTokens,
+            outputTokens: actualOutputTokens,
+            cost: actualCost,
+            responseTime,
+            attempt,
+            success: true,
+            usage
+          })
+
+          this.costLedger.record({ model, cost: actualCost, inputTokens: actualInputTokens, outputTokens: actualOutputTokens })
+          limiter?.settle(reservedTokens, usage?.total_tokens || actualInputTokens + actualOutputTokens)
+          return content
+        }
+
+        // Handle error response
+        const errorData = await response.json().catch(() => ({}))
+        const error = new Error(`OpenAI API Error: ${response.status}`)
+        error.status = response.status
+        error.data = errorData
+        error.retryAfterMs = retryAfterMs(response.headers)
+        throw error
+      } catch (error) {
+        lastError = error
+        const errorInfo = this.classifyError(error)
+        
+        // Log failed request
+        this.logRequest({
+          model,
+          inputTokens,
+          outputTokens: 0,
+          cost: 0,
+          responseTime: Date.now() - requestStart,
+          attempt,
+          success: false,
+          error: errorInfo
+        })
+
+        console.error(`OpenAI API attempt ${attempt} failed:`, errorInfo)
+        if (limiter) {
+          // Nothing was generated; give back the completion part of the reservation
+          limiter.settle(reservedTokens, inputTokens)
+          if (errorInfo.isRateLimit) limiter.pause(error.retryAfterMs || this.calculateBackoffDelay(attempt))
+        }
+
+        // Don't retry on non-retryable errors
+        if (!errorInfo.isRetryable || attempt > maxRetries) {
+          break
+        }
+
+        // A 429 has paused the model's limiter, so the next acquire() already waits it out;
+        // sleeping here as well would stack the two delays
+        if (limiter && errorInfo.isRateLimit) {
+          console.log(`Retrying after the rate-limit pause... (attempt ${attempt + 1}/${maxRetries + 1})`)
+          continue
+        }
+
+        // Calculate backoff delay
+        const delay = (errorInfo.isRateLimit && error.retryAfterMs) || this.calculateBackoffDelay(attempt)
+        console.log(`Retrying in ${delay}ms... (attempt ${attempt + 1}/${maxRetries + 1})`)
+        
+        // Wait before retry
+        await new Promise(resolve => setTimeout(resolve, delay))
+      } finally {
+        if (timeoutRef) clearTimeout(timeoutRef)
+      }
+    }
+
+    // All retries exhausted, throw the last error
+    const errorInfo = this.classifyError(lastError)
+    
+    if (errorInfo.isRateLimit) {
+      throw new Error(`Rate limit exceeded after ${maxRetries} retries. Please try again later.`)
+    } else if (errorInfo.isBudgetIssue) {
+      throw new Error(`OpenAI quota exceeded. Please check your billing.`)
+    } else if (errorInfo.isModelIssue) {
+      throw new Error(`Model '${model}' is not available. Please try a different model.`)
+    } else {
+      throw new Error(`OpenAI API failed after ${maxRetries} retries: ${errorInfo.message}`)
+    }
+  }
+
+  // Request logging for monitoring and debugging
+  logRequest(requestInfo) {
+    const logEntry = {
+      timestamp: new Date().toISOString(),
+      route: getRequestContext()?.route || 'background',
+      ...requestInfo
+    }
+    
+    // Fixed-size ring; the oldest entry drops out of the rolling aggregates
+    this.requestLog.push(logEntry)
+    const outcome = requestInfo.success ? 'ok' : (requestInfo.error?.status ? `http_${requestInfo.error.status}` : 'network')
+    observeUpstream('openai', requestInfo.model, (requestInfo.responseTime || 0) / 1000, outcome)
+
+    // Console logging for monitoring
+    if (requestInfo.success) {
+      console.log(`✅ OpenAI ${requestInfo.model}: ${requestInfo.inputTokens}+${requestInfo.outputTokens} tokens, $${requestInfo.cost.toFixed(4)}, ${requestInfo.responseTime}ms`)
+    } else {
+      console.error(`❌ OpenAI ${requestInfo.model} failed: ${requestInfo.error.message}`)
+    }
+  }
+
+  // Get usage statistics (request stats cover the last requestLog.capacity calls; cost is today's)
+  getUsageStats() {
+    const total = this.requestLog.total
+    const totalCost = this.totalCost
+
+    return {
+      totalRequests: total.requests,
+      successfulRequests: total.successes,
+      successRate: total.requests ? (total.successes / total.requests) * 100 : 0,
+      totalCost,
+      totalTokens: total.successTokens,
+      avgResponseTime: total.successes ? Math.round(total.successResponseTime / total.successes) : 0,
+      dailyCostLimit: this.dailyCostLimit,
+      remainingBudget: Math.max(0, this.dailyCostLimit - totalCost),
+      modelUsage: this.getModelUsageBreakdown(),
+      routeUsage: this.getRouteUsageBreakdown(),
+      rateLimits: this.rateLimiter ? this.rateLimiter.snapshot() : null
+    }
+  }
+
+  breakdown(map) {
+    const out = {}
+    for (const [key, agg] of map) {
+      if (agg.requests === 0) continue
+      out[key] = {
+        requests: agg.requests,
+        tokens: agg.tokens,
+        cost: agg.cost,
+        avgResponseTime: Math.round(agg.responseTime / agg.requests)
+      }
+    }
+    return out
+  }
+
+  // Model usage breakdown
+  getModelUsageBreakdown() {
+    return this.breakdown(this.requestLog.byModel)
+  }
+
+  // Usage by API route ('background' for work outside a request)
+  getRouteUsageBreakdown() {
+    return this.breakdown(this.requestLog.byRoute)
+  }
+
+  // Reset daily usage (for production, this would be automated)
+  async resetDailyUsage() {
+    this.requestLog.clear()
+    await this.costLedger.reset()
+    console.log('✅ Daily usage reset')
+  }
+}
+
+// Shared instance, created on first use so importing the API doesn't pay for it
+export function getOpenAIUtility() {
+  if (!globalThis.__crmOpenAI) {
+    globalThis.__crmOpenAI = new OpenAIUtility()
+    markPhase('openai_utility_init')
+  }
+  return globalThis.__crmOpenAI
+}
+
+export function fitLinesToTokens(lines, maxTokens, model = 'gpt-4o-mini') {
+  return getOpenAIUtility().fitLinesToTokens(lines, maxTokens, model)
+}
+
+export async function callOpenAI(model = 'gpt-4o-mini', messages, options = {}) {
+  return await getOpenAIUtility().callOpenAI(model, messages, options)
+}
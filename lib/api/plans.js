@@ -0,0 +1,326 @@
+import { createHash } from 'crypto'
+import { getLoader } from '@/lib/api/loader'
+import { invalidate, onRemoteInvalidation } from '@/lib/api/invalidation'
+import { findTasks } from '@/lib/api/checklist-templates'
+import { recordCacheLookup } from '@/lib/api/telemetry'
+
+// Day plans for POST /api/assistant/plan. A plan is a ranked list of items (tasks, alerts)
+// laid out as time blocks in a workday window. Ranked lists are cached per
+// (agent, day, selection) so toggling back to an earlier selection, or asking for the same
+// selection with a different window, doesn't go back to the database. Task writes re-plan
+// the cached entries containing that task in place (replanTasks): blocks before the change
+// keep their times and only the ones after it shift. Without start_time the window is anchored
+// where the plan was first laid out, so those patches survive later requests. The cache is per
+// process: task and alert writes on other instances (invalidation feed) evict what they touch.
+const CACHE_SIZE = Number(process.env.ASSISTANT_PLAN_CACHE_SIZE) || 200
+const DAY_MS = 86400000
+
+function state() {
+  return globalThis.__crmPlanCache || (globalThis.__crmPlanCache = { entries: new Map(), listening: false })
+}
+
+// Minutes a task is expected to take, from its title. Stored on checklist items as
+// est_duration_min when they're written; computed here only for items from before that.
+export function estimateTaskDuration(title) {
+  const lower = String(title || '').toLowerCase()
+  if (/call|phone|ring/.test(lower)) return 5
+  if (/email|text|sms|follow[- ]?up/.test(lower)) return 8
+  if (/mls|syndication|listing entry|photos|staging/.test(lower)) return 30
+  return 15
+}
+
+export function taskDuration(task) {
+  const stored = Number(task?.est_duration_min)
+  return Number.isFinite(stored) && stored > 0 ? stored : estimateTaskDuration(task?.title)
+}
+
+// Priority and urgency depend on the time of day, so they're computed per plan, not stored
+function scoreTask(task, now) {
+  const due = new Date(task.due_date)
+  const msLeft = due - now
+  const daysLeft = Math.floor(msLeft / DAY_MS)
+  const isOverdue = msLeft < 0
+  const startOfToday = new Date(now); startOfToday.setHours(0,0,0,0)
+  const endOfToday = new Date(now); endOfToday.setHours(23,59,59,999)
+  const urgency = isOverdue ? 'overdue' : (due && due >= startOfToday && due <= endOfToday ? 'due_today' : 'due_soon')
+  const base = isOverdue ? 92 : (urgency === 'due_today' ? 78 : 65)
+  const timeAdj = isFinite(daysLeft) ? Math.max(-10, Math.min(10, -daysLeft * 2)) : 0
+  return { priority_score: Math.max(0, Math.min(100, base + timeAdj)), urgency }
+}
+
+function taskItem(task, tx, now) {
+  const due = task.due_date ? new Date(task.due_date) : null
+  const labelDue = due ? (due.toDateString() === now.toDateString() ? 'today' : `due ${due.toLocaleDateString()}`) : '—'
+  const clientName = tx?.client_name || task.client_name
+  return {
+    key: `task:${task.id}`,
+    type: 'task',
+    id: task.id,
+    label: `Complete: ${task.title || 'Task'} (${labelDue})`,
+    transaction_id: task.transaction_id,
+    client_name: clientName,
+    property_address: tx?.property_address || task.property_address,
+    est_duration_min: taskDuration(task),
+    ...scoreTask(task, now),
+    reason: clientName ? `Client: ${clientName}` : undefined
+  }
+}
+
+function alertItem(alert) {
+  const title = alert.message || alert.description || alert.alert_type || 'Alert'
+  return {
+    key: `alert:${alert.id}`,
+    type: 'alert',
+    id: alert.id,
+    label: `Dismiss alert: ${title}`,
+    est_duration_min: 2,
+    priority_score: alert.priority === 'urgent' ? 90 : alert.priority === 'high' ? 80 : 60,
+    urgency: alert.priority === 'urgent' ? 'urgent' : 'normal',
+    reason: alert.alert_type ? `Type: ${alert.alert_type}` : 'Smart alert'
+  }
+}
+
+const byPriority = (a, b) => (b.priority_score || 0) - (a.priority_score || 0)
+
+export function planOptions(body = {}) {
+  return {
+    start_time: body.start_time || null,
+    workday_start_hour: body.workday_start_hour ?? 9,
+    workday_end_hour: body.workday_end_hour ?? 17,
+    buffer_min: body.buffer_min ?? 10,
+    max_items: body.max_items ?? 10,
+    roll_to_next_workday: !!body.roll_to_next_workday,
+    min_block_min: body.min_block_min ?? 25
+  }
+}
+
+// Workday window the plan is laid out in
+function planWindow(options, now) {
+  const start = (() => {
+    if (options.start_time) {
+      const dt = new Date(options.start_time)
+      if (!isNaN(dt)) return dt
+    }
+    const s = new Date(now)
+    const wdStart = new Date(now); wdStart.setHours(options.workday_start_hour, 0, 0, 0)
+    return s < wdStart ? wdStart : s
+  })()
+  let workEnd = new Date(start); workEnd.setHours(options.workday_end_hour, 0, 0, 0)
+  // If we are after work hours and asked to roll, push to next day window
+  if (options.roll_to_next_workday && workEnd <= start) {
+    start.setDate(start.getDate() + 1)
+    start.setHours(options.workday_start_hour, 0, 0, 0)
+    workEnd = new Date(start); workEnd.setHours(options.workday_end_hour, 0, 0, 0)
+  }
+  return { start, workEnd }
+}
+
+// Time blocks for `items` in rank order; an item that doesn't fit goes to overflow and later,
+// shorter ones may still fit. `previous` blocks before `from` are kept as they are.
+function layoutBlocks(items, window, options, previous = [], from = 0) {
+  const blocks = previous.slice(0, from)
+  let cursor = new Date(window.start)
+  for (const block of blocks) {
+    if (block.scheduled_end) cursor = new Date(new Date(block.scheduled_end).getTime() + options.buffer_min * 60000)
+  }
+  for (const it of items.slice(from)) {
+    const dur = Math.max(Number(options.min_block_min) || 25, Number(it.est_duration_min || options.min_block_min))
+    const end = new Date(cursor.getTime() + dur * 60000)
+    if (end <= window.workEnd) {
+      blocks.push({ ...it, scheduled_start: cursor.toISOString(), scheduled_end: end.toISOString() })
+      cursor = new Date(end.getTime() + options.buffer_min * 60000)
+    } else {
+      blocks.push({ ...it })
+    }
+  }
+  return blocks
+}
+
+function planResponse(entry) {
+  const { window, blocks } = entry.layout
+  const scheduled = blocks.filter(b => b.scheduled_end)
+  const overflow = blocks.filter(b => !b.scheduled_end)
+  const planItems = [...scheduled, ...overflow]
+  return {
+    plan: {
+      date: new Date(window.start).toISOString().slice(0,10),
+      started_at: window.start.toISOString(),
+      ends_at: window.workEnd.toISOString(),
+      total_items: planItems.length,
+      scheduled_items: scheduled.length,
+      total_duration_min: scheduled.reduce((sum, i) => sum + (i.est_duration_min || 0), 0),
+      revision: entry.revision
+    },
+    items: planItems
+  }
+}
+
+async function rankItems(db, { agent, selectedKeys, maxItems, now }) {
+  const agentFilterTasks = agent ? { assignee: agent } : {}
+  let tasks = []
+  let alerts = []
+  if (selectedKeys.length > 0) {
+    const taskIds = selectedKeys.filter(k => k.startsWith('task:')).map(k => k.split(':')[1]).filter(Boolean)
+    const alertIds = selectedKeys.filter(k => k.startsWith('alert:')).map(k => k.split(':')[1]).filter(Boolean)
+    ;[tasks, alerts] = await Promise.all([
+      taskIds.length ? findTasks(db, { id: { $in: taskIds }, ...agentFilterTasks }) : [],
+      alertIds.length ? db.collection('smart_alerts').find({ id: { $in: alertIds } }).toArray() : []
+    ])
+  } else {
+    // No selection: the earliest-due open tasks up to the end of today
+    const endOfToday = new Date(now); endOfToday.setHours(23,59,59,999)
+    tasks = await findTasks(db, { status: { $ne: 'completed' }, due_date: { $lte: endOfToday }, ...agentFilterTasks }, { sort: { due_date: 1 }, limit: maxItems })
+  }
+
+  const txMap = await getLoader(db).loadMany('transactions', tasks.map(t => t.transaction_id))
+  const items = [
+    ...tasks.map(t => taskItem(t, txMap.get(t.transaction_id), now)),
+    ...alerts.map(alertItem)
+  ]
+  items.sort(byPriority)
+  return items.slice(0, maxItems)
+}
+
+function remember(entry) {
+  const { entries } = state()
+  entries.delete(entry.key)
+  entries.set(entry.key, entry)
+  // Drop finished days, then the least recently used
+  const today = new Date().toISOString().slice(0,10)
+  for (const [key, e] of entries) if (e.day < today) entries.delete(key)
+  while (entries.size > CACHE_SIZE) entries.delete(entries.keys().next().value)
+}
+
+// Drop cached plans that a task or alert write on another instance may have changed: plans with
+// tasks of the transactions it names (all, when unscoped) and every no-selection plan, or
+// plans listing an alert
+function evictRemote(resources) {
+  const tasks = resources?.tasks
+  const alerts = resources?.alerts !== undefined
+  if (tasks === undefined && !alerts) return
+  for (const [key, entry] of state().entries) {
+    const stale = (tasks !== undefined && (tasks === null || entry.auto
+        || entry.items.some(it => it.type === 'task' && tasks.includes(it.transaction_id))))
+      || (alerts && entry.items.some(it => it.type === 'alert'))
+    if (stale) state().entries.delete(key)
+  }
+}
+
+// The plan for `agent` and `selectedKeys` (or the day's top tasks when empty)
+export async function getDayPlan(db, { agent = null, selectedKeys = [], options, now = new Date() }) {
+  const s = state()
+  if (!s.listening) {
+    s.listening = true
+    onRemoteInvalidation(evictRemote)
+  }
+  const current = planWindow(options, now)
+  const day = current.start.toISOString().slice(0,10)
+  const selection = selectedKeys.length > 0 ? [...new Set(selectedKeys)].sort().join(',') : `auto:${options.max_items}`
+  const key = createHash('sha1').update(JSON.stringify([agent, day, selection])).digest('hex')
+  const optionsKey = JSON.stringify(options)
+
+  const { entries } = s
+  let entry = entries.get(key)
+  const cached = !!entry
+  recordCacheLookup('assistant_plans', cached)
+  if (!entry) {
+    const items = await rankItems(db, { agent, selectedKeys, maxItems: options.max_items, now })
+    entry = { key, agent, day, auto: selectedKeys.length === 0, items, layout: null, revision: 0 }
+  }
+  // The default window starts at `now`; keep the one the cached plan was laid out in so its
+  // blocks (and replanTasks' patches to them) stay put. Different options or a different
+  // start_time lay the cached items out again, keeping their ranking.
+  const anchored = !options.start_time && entry.layout?.optionsKey === optionsKey
+  const window = anchored ? entry.layout.window : current
+  const moved = entry.layout && (entry.layout.window.start.getTime() !== window.start.getTime()
+    || entry.layout.window.workEnd.getTime() !== window.workEnd.getTime())
+  if (!entry.layout || entry.layout.optionsKey !== optionsKey || moved) {
+    entry.layout = { optionsKey, options, window, blocks: layoutBlocks(entry.items, window, options) }
+  }
+  remember(entry)
+  return { ...planResponse(entry), cached }
+}
+
+// Re-plan cached entries after task writes. `tasks` are the documents as written (or just
+// `{ id }` with `removed`). A task leaves a plan when it's completed, deleted, dismissed for
+// the plan's day, snoozed past its window or assigned away from the plan's agent; otherwise its duration and rank are refreshed.
+// Blocks ranked before the change keep their times. No-selection plans that a task could now
+// belong to, or that lose a task (the next one due would take its place), are dropped and
+// rebuilt on the next request.
+export function replanTasks(tasks, { removed = false } = {}) {
+  const now = new Date()
+  let changed = false
+  for (const [key, entry] of state().entries) {
+    for (const task of tasks) {
+      if (!task?.id) continue
+      const index = entry.items.findIndex(it => it.key === `task:${task.id}`)
+      const { workEnd } = entry.layout.window
+      const due = task.due_date ? new Date(task.due_date) : null
+      const leaves = removed
+        || task.status === 'completed'
+        || (Array.isArray(task.dismissed_dates) && task.dismissed_dates.includes(entry.day))
+        || (due && due > workEnd)
+        || (entry.agent && task.assignee !== undefined && task.assignee !== entry.agent)
+
+      if (index === -1) {
+        const eligible = !leaves && entry.auto && due && (!entry.agent || task.assignee === entry.agent)
+        if (eligible) {
+          state().entries.delete(key)
+          changed = true
+          break
+        }
+        continue
+      }
+
+      changed = true
+      if (leaves && entry.auto) {
+        state().entries.delete(key)
+        break
+      }
+      if (leaves) {
+        entry.items.splice(index, 1)
+        relayout(entry, index)
+        continue
+      }
+      const previous = entry.items[index]
+      const updated = {
+        ...taskItem(task, null, now),
+        client_name: previous.client_name,
+        property_address: previous.property_address,
+        reason: previous.reason
+      }
+      entry.items.splice(index, 1)
+      let to = entry.items.findIndex(it => byPriority(updated, it) < 0)
+      if (to === -1) to = entry.items.length
+      entry.items.splice(to, 0, updated)
+      if (to === index && updated.est_duration_min === previous.est_duration_min) {
+        // Same rank and length: only the label changes, every block keeps its time
+        const block = entry.layout.blocks[index]
+        entry.layout.blocks[index] = { ...updated, scheduled_start: block.scheduled_start, scheduled_end: block.scheduled_end }
+        entry.revision++
+      } else {
+        relayout(entry, Math.min(index, to))
+      }
+    }
+  }
+  if (changed) invalidate(['plans'])
+}
+
+// Alerts leave every cached plan once dismissed
+export function replanAlert(alertId) {
+  let changed = false
+  for (const entry of state().entries.values()) {
+    const index = entry.items.findIndex(it => it.key === `alert:${alertId}`)
+    if (index === -1) continue
+    entry.items.splice(index, 1)
+    relayout(entry, index)
+    changed = true
+  }
+  if (changed) invalidate(['plans'])
+}
+
+function relayout(entry, from) {
+  const { options, window, blocks } = entry.layout
+  entry.layout = { ...entry.layout, blocks: layoutBlocks(entry.items, window, options, blocks, from) }
+  entry.revision++
+}
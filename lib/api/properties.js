@@ -0,0 +1,822 @@
+import { timedFetch } from '@/lib/api/telemetry'
+
+// Fetch images for a single property by provider ID or address parts
+export async function fetchPropertyImages(query = {}) {
+  const { id, address, city, state, zipcode } = query
+  try {
+    // Prepare multiple precise body shapes to avoid ambiguous queries
+    const attempts = []
+    if (id) {
+      attempts.push({ id })
+      attempts.push({ property_id: id })
+      attempts.push({ propertyId: id })
+      attempts.push({ mls_id: id })
+      attempts.push({ mlsId: id })
+    }
+    if (address || city || state || zipcode) {
+      // Structured address
+      attempts.push({ address: address || undefined, city: city || undefined, state: state || undefined, zip: zipcode || undefined })
+      // Alternate street key
+      if (address) attempts.push({ street: address, city: city || undefined, state: state || undefined, zip: zipcode || undefined })
+      if (address) attempts.push({ street_address: address, city: city || undefined, state: state || undefined, zip: zipcode || undefined })
+      if (address) attempts.push({ address_line1: address, city: city || undefined, state: state || undefined, zip: zipcode || undefined })
+      // Full address string as last resort
+      const parts = []
+      if (address) parts.push(address)
+      const cityStateZip = [city, state, zipcode].filter(Boolean).join(' ')
+      if (cityStateZip) parts.push(cityStateZip)
+      const full = parts.join(', ')
+      if (full) attempts.push({ address: full })
+    }
+
+    const endpoints = [
+      'https://api.realestateapi.com/v2/PropertyDetail',
+      'https://api.realestateapi.com/v2/PropertyDetails',
+      'https://api.realestateapi.com/v2/Property',
+    ]
+
+    let detail = null
+    let lastErr = null
+    for (const url of endpoints) {
+      for (const body of attempts) {
+        try {
+          const controller = new AbortController()
+          const attemptTimeoutMs = 10000
+          const timeoutRef = setTimeout(() => controller.abort(new Error('Request timed out')), attemptTimeoutMs)
+          const res = await timedFetch('realestateapi', 'property_detail', url, {
+            method: 'POST',
+            headers: {
+              accept: 'application/json',
+              'content-type': 'application/json',
+              'x-api-key': process.env.REAL_ESTATE_API_KEY,
+              'x-user-id': process.env.REAL_ESTATE_USER_ID || 'CRMApp'
+            },
+            body: JSON.stringify(body),
+            signal: controller.signal
+          })
+          clearTimeout(timeoutRef)
+          if (!res.ok) {
+            lastErr = new Error(`Detail ${url} ${res.status}`)
+            continue
+          }
+          detail = await res.json()
+          break
+        } catch (e) {
+          lastErr = e
+          continue
+        }
+      }
+      if (detail) break
+    }
+
+    if (!detail) {
+      if (lastErr) console.warn('Property detail fetch failed', lastErr)
+      return { images: [], primary_image: null, debug_detail: null }
+    }
+
+    // Collect image URLs robustly
+    const urls = []
+    const pushUrl = (u) => {
+      if (!u || typeof u !== 'string') return
+      const s = u.trim()
+      if (!/^https?:\/\//i.test(s)) return
+      urls.push(s)
+    }
+    const urlFromObj = (o) => o && (o.url || o.href || o.src || o.link || o.image || o.photo || o.mediaUrl || o.media_url || o.full || o.large || o.original || o.medium || o.small || o.thumb || o.thumbnail || o.url_full || o.url_small || o.url_thumb || o.thumbnail_url)
+
+    const seen = new Set()
+    const queue = [{ obj: detail, depth: 0 }]
+    const maxDepth = 5
+    while (queue.length) {
+      const { obj, depth } = queue.shift()
+      if (!obj || typeof obj !== 'object' || seen.has(obj) || depth > maxDepth) continue
+      seen.add(obj)
+      if (Array.isArray(obj)) {
+        for (const v of obj) {
+          if (typeof v === 'string') pushUrl(v)
+          else if (typeof v === 'object') {
+            const u = urlFromObj(v)
+            if (u) pushUrl(u)
+            queue.push({ obj: v, depth: depth + 1 })
+          }
+        }
+      } else {
+        for (const [k, v] of Object.entries(obj)) {
+          const key = k.toLowerCase()
+          if (typeof v === 'string') {
+            if (key.includes('url') || key.includes('photo') || key.includes('image')) pushUrl(v)
+          } else if (typeof v === 'object') {
+            const u = urlFromObj(v)
+            if (u) pushUrl(u)
+            // Prioritize obvious containers
+            if (Array.isArray(v) || key.includes('photo') || key.includes('image') || key.includes('media')) {
+              queue.push({ obj: v, depth: depth + 1 })
+            }
+          }
+        }
+      }
+    }
+
+    // Dedupe
+    const out = []
+    const seenUrl = new Set()
+    for (const u of urls) {
+      if (!seenUrl.has(u)) { seenUrl.add(u); out.push(u) }
+    }
+
+    return {
+      images: out,
+      primary_image: out[0] || null,
+      debug_detail: process.env.NODE_ENV !== 'production' ? detail : undefined
+    }
+  } catch (error) {
+    console.error('fetchPropertyImages error', error)
+    return { images: [], primary_image: null }
+  }
+}
+
+// Query MLS Search for photos by address/city/state/zip or listing id
+export async function fetchMLSPhotos(query = {}) {
+  const { id, address, city, state, zipcode } = query
+  try {
+    const url = 'https://api.realestateapi.com/v2/MLSSearch'
+    // MLSSearch expects top-level fields (no filters wrapper)
+    const body = {
+      size: 5,
+      address: address || undefined,
+      city: city || undefined,
+      state: state || undefined,
+      zip: zipcode || undefined,
+      listing_id: id || undefined,
+      property_id: id || undefined
+    }
+
+    // Use AbortController-based timeout
+    let res
+    {
+      const controller = new AbortController()
+      const timeoutMs = 8000
+      const timeoutRef = setTimeout(() => controller.abort(new Error('Request timed out')), timeoutMs)
+      try {
+        res = await timedFetch('realestateapi', 'mls_photos', url, {
+          method: 'POST',
+          headers: {
+            accept: 'application/json',
+            'content-type': 'application/json',
+            'x-api-key': process.env.REAL_ESTATE_MLS_API_KEY || process.env.REAL_ESTATE_API_KEY,
+            'x-user-id': process.env.REAL_ESTATE_USER_ID || 'CRMApp'
+          },
+          body: JSON.stringify(body),
+          signal: controller.signal
+        })
+      } catch (err) {
+        if (err && err.name === 'AbortError') {
+          console.warn('MLSSearch request aborted (timeout)')
+          return { images: [], primary_image: null }
+        }
+        throw err
+      } finally {
+        clearTimeout(timeoutRef)
+      }
+    }
+
+    if (!res.ok) {
+      let errTxt = ''
+      try { errTxt = await res.text() } catch {}
+      console.warn('MLSSearch request failed', res.status, errTxt?.slice(0, 300))
+      return { images: [], primary_image: null }
+    }
+
+    const data = await res.json()
+    const items = Array.isArray(data?.results) ? data.results : (Array.isArray(data) ? data : [])
+    if (items.length === 0) return { images: [], primary_image: null }
+
+    // Reuse robust URL extraction on the first couple of items
+    const urls = []
+    const pushUrl = (u) => {
+      if (!u || typeof u !== 'string') return
+      const s = u.trim()
+      if (!/^https?:\/\//i.test(s)) return
+      urls.push(s)
+    }
+    const urlFromObj = (o) => o && (o.url || o.href || o.src || o.link || o.image || o.photo || o.mediaUrl || o.media_url || o.full || o.large || o.original || o.medium || o.small || o.thumb || o.thumbnail || o.url_full || o.url_small || o.url_thumb || o.thumbnail_url)
+    const scan = (root) => {
+      const seen = new Set()
+      const queue = [{ obj: root, depth: 0 }]
+      const maxDepth = 5
+      while (queue.length) {
+        const { obj, depth } = queue.shift()
+        if (!obj || typeof obj !== 'object' || seen.has(obj) || depth > maxDepth) continue
+        seen.add(obj)
+        if (Array.isArray(obj)) {
+          for (const v of obj) {
+            if (typeof v === 'string') pushUrl(v)
+            else if (typeof v === 'object') {
+              const u = urlFromObj(v)
+              if (u) pushUrl(u)
+              queue.push({ obj: v, depth: depth + 1 })
+            }
+          }
+        } else {
+          for (const [k, v] of Object.entries(obj)) {
+            const key = k.toLowerCase()
+            if (typeof v === 'string') {
+              if (key.includes('url') || key.includes('photo') || key.includes('image')) pushUrl(v)
+            } else if (typeof v === 'object') {
+              const u = urlFromObj(v)
+              if (u) pushUrl(u)
+              if (Array.isArray(v) || key.includes('photo') || key.includes('image') || key.includes('media')) {
+                queue.push({ obj: v, depth: depth + 1 })
+              }
+            }
+          }
+        }
+      }
+    }
+
+    // Scan first up to 3 results
+    items.slice(0, 3).forEach(scan)
+
+    // Dedupe
+    const out = []
+    const seenUrl = new Set()
+    for (const u of urls) { if (!seenUrl.has(u)) { seenUrl.add(u); out.push(u) } }
+
+    return { images: out, primary_image: out[0] || null, debug_mls_sample: process.env.NODE_ENV !== 'production' ? items[0] : undefined }
+  } catch (e) {
+    console.warn('fetchMLSPhotos error', e)
+    return { images: [], primary_image: null }
+  }
+}
+
+// Real Estate API Integration - Enhanced Property Search
+export async function fetchProperties(filters = {}) {
+  try {
+    const { 
+      location, 
+      beds, 
+      baths, 
+      min_price, 
+      max_price, 
+      listing_status = 'for_sale',
+      property_type,
+      sort_by,
+      limit = 60,
+      offset = 0
+    } = filters
+
+    // Use the v2 MLSSearch endpoint (POST)
+    const url = (process.env.PROPERTY_SEARCH_URL || 'https://api.realestateapi.com/v2/MLSSearch')
+
+    // Build MLSSearch request body
+    const requestBody = {
+      // core required filters per product decision
+      size: Math.min(250, Number(limit) || 60),
+      active: true,
+      sold: false,
+      has_photos: true,
+      include_photos: true,
+      // pass-through if provided
+      property_type: property_type || undefined
+    }
+    // Pagination with MLSSearch uses resultIndex (1-based per API samples)
+    if (Number(offset) > 0) {
+      requestBody.resultIndex = Number(offset)
+    }
+
+    // Map filters -> MLSSearch schema
+    if (beds) requestBody.bedrooms_min = Number(beds)
+    if (baths) requestBody.bathrooms_min = Number(baths)
+    if (min_price) requestBody.listing_price_min = Number(min_price)
+    if (max_price) requestBody.listing_price_max = Number(max_price)
+
+    if (location) {
+      // Normalize location: support ZIP, ZIP+4, "City, ST", full state name, or 2-letter state code
+      const stateMap = {
+        alabama: 'AL', alaska: 'AK', arizona: 'AZ', arkansas: 'AR', california: 'CA', colorado: 'CO',
+        connecticut: 'CT', delaware: 'DE', 'district of columbia': 'DC', florida: 'FL', georgia: 'GA',
+        hawaii: 'HI', idaho: 'ID', illinois: 'IL', indiana: 'IN', iowa: 'IA', kansas: 'KS', kentucky: 'KY',
+        louisiana: 'LA', maine: 'ME', maryland: 'MD', massachusetts: 'MA', michigan: 'MI', minnesota: 'MN',
+        mississippi: 'MS', missouri: 'MO', montana: 'MT', nebraska: 'NE', nevada: 'NV', 'new hampshire': 'NH',
+        'new jersey': 'NJ', 'new mexico': 'NM', 'new york': 'NY', 'north carolina': 'NC', 'north dakota': 'ND',
+        ohio: 'OH', oklahoma: 'OK', oregon: 'OR', pennsylvania: 'PA', 'rhode island': 'RI', 'south carolina': 'SC',
+        'south dakota': 'SD', tennessee: 'TN', texas: 'TX', utah: 'UT', vermont: 'VT', virginia: 'VA',
+        washington: 'WA', 'west virginia': 'WV', wisconsin: 'WI', wyoming: 'WY'
+      }
+      const normalizeStateAbbr = (s) => {
+        if (!s) return null
+        const t = String(s).trim()
+        if (/^[A-Za-z]{2}$/.test(t)) return t.toUpperCase()
+        const key = t.toLowerCase()
+        return stateMap[key] || null
+      }
+      const loc = String(location).trim()
+      if (/^\d{5}(-\d{4})?$/.test(loc)) {
+         requestBody.zip = loc.slice(0, 5)
+      } else if (loc.includes(',')) {
+        const [cityPart, statePart] = loc.split(',').map(s => s.trim()).slice(0, 2)
+        if (cityPart) requestBody.city = cityPart
+        const st = normalizeStateAbbr(statePart)
+        if (st) requestBody.state = st
+      } else {
+        const st = normalizeStateAbbr(loc)
+        if (st) {
+          requestBody.state = st
+        } else {
+          requestBody.city = loc
+        }
+      }
+    }
+
+    // Temporarily omit sort to avoid 400 errors while we confirm other fields
+    // if (sort_by) {
+    //   const sortMap = {
+    //     'price_asc': { list_price: 'asc' },
+    //     'price_desc': { list_price: 'desc' },
+    //     'date_desc': { list_date: 'desc' },
+    //   };
+    //   if (sortMap[sort_by]) {
+    //     requestBody.sort = sortMap[sort_by];
+    //   }
+    // }
+
+
+    // Use AbortController for a hard timeout (Node/Next fetch doesn't support a 'timeout' option)
+    const controller = new AbortController()
+    const timeoutMs = 10000
+    const timeoutRef = setTimeout(() => controller.abort(new Error('Request timed out')), timeoutMs)
+    let response
+    try {
+      response = await timedFetch('realestateapi', 'mls_search', url, {
+        method: 'POST',
+        headers: {
+          accept: 'application/json',
+          'content-type': 'application/json',
+          // Use MLS API key for MLSSearch
+          'x-api-key': process.env.REAL_ESTATE_MLS_API_KEY || process.env.REAL_ESTATE_API_KEY,
+          'x-user-id': process.env.REAL_ESTATE_USER_ID || 'CRMApp'
+        },
+        body: JSON.stringify(requestBody),
+        signal: controller.signal
+      })
+    } catch (err) {
+      if (err && (err.name === 'AbortError' || /timed out/i.test(String(err.message || '')))) {
+        console.error('Real Estate API request aborted (timeout):', err)
+        return generateFallbackProperties(filters)
+      }
+      throw err
+    } finally {
+      clearTimeout(timeoutRef)
+    }
+    
+    if (!response.ok) {
+      const errorBody = await response.text();
+      console.error('Real Estate API Error:', {
+        status: response.status,
+        statusText: response.statusText,
+        url: url,
+        response_body: errorBody
+      })
+      
+      // Return fallback/mock data for development
+      return generateFallbackProperties(filters)
+    }
+    
+    const data = await response.json()
+  // Normalize response structure (MLSSearch returns data[])
+  const rawProps = data.properties || data.results || data.data || []
+  
+  // Add metadata
+  const normalized = rawProps.map(src => {
+    // Prefer MLSSearch nested listing/public shapes
+    const listing = src?.listing || {}
+    const publicRec = src?.public || {}
+    const addrObj = listing.address || (src && typeof src.address === 'object' && src.address !== null ? src.address : null)
+    const street = (listing?.address?.unparsedAddress)
+      || (addrObj ? (addrObj.street || addrObj.address || addrObj.line1 || addrObj.line || '') : null)
+      || (src.street_address || src.address_line1 || src.street || src.address || '')
+    const city = (listing?.address?.city)
+      || (addrObj && (addrObj.city || addrObj.town)) || src.city || ''
+    const state = (listing?.address?.stateOrProvince)
+      || (addrObj && (addrObj.state || addrObj.region)) || src.state || ''
+    const zipcode = (listing?.address?.zipCode)
+      || (addrObj && (addrObj.zip || addrObj.zipcode || addrObj.postal_code))
+      || src.zipcode || src.zip_code || src.postal_code || ''
+
+    // Normalize price from various possible sources
+    const priceTuples = [
+        [listing?.leadTypes?.mlsListingPrice, 'listing.leadTypes.mlsListingPrice'],
+        [listing?.listPriceLow, 'listing.listPriceLow'],
+        [src.price, 'price'],
+        [src.list_price, 'list_price'],
+        [src.listPrice, 'listPrice'],
+        [src.listing_price, 'listing_price'],
+        [src.asking_price, 'asking_price'],
+        [src.current_price, 'current_price'],
+        [src.original_list_price, 'original_list_price'],
+        [src.originalListPrice, 'originalListPrice'],
+        [src.original_price, 'original_price'],
+        [src.close_price, 'close_price'],
+        [src.sold_price, 'sold_price'],
+        [src?.list?.price, 'list.price'],
+        [src?.prices?.list, 'prices.list'],
+        [src?.details?.list_price, 'details.list_price'],
+        [src?.listing?.list_price, 'listing.list_price'],
+        [src?.listing?.price, 'listing.price'],
+        [src?.price?.list, 'price.list'],
+      ].filter(([v]) => v !== undefined && v !== null)
+      const rawPrice = priceTuples.length > 0 ? priceTuples[0][0] : null
+      let price_source = priceTuples.length > 0 ? priceTuples[0][1] : undefined
+      let price = typeof rawPrice === 'string'
+        ? (rawPrice.trim() === '' ? null : Number(rawPrice.replace(/[^0-9.]/g, '')))
+        : (typeof rawPrice === 'number' ? rawPrice : null)
+
+      // Deep fallback: recursively search for any key containing 'price'
+      if (price == null) {
+        const seen = new Set()
+        const queue = [{ obj: src, depth: 0 }]
+        const maxDepth = 4
+        while (queue.length) {
+          const { obj, depth } = queue.shift()
+          if (!obj || typeof obj !== 'object' || seen.has(obj) || depth > maxDepth) continue
+          seen.add(obj)
+          for (const [k, v] of Object.entries(obj)) {
+            if (v == null) continue
+            const key = k.toLowerCase()
+            if (key.includes('price') || key === 'lp' || key === 'listprice' || key === 'list_price') {
+              if (typeof v === 'number') { price = v; price_source = k; break }
+              if (typeof v === 'string') {
+                const num = Number(v.replace(/[^0-9.]/g, ''))
+                if (!Number.isNaN(num)) { price = num; price_source = k; break }
+              }
+              if (typeof v === 'object' && v.amount) {
+                const num = typeof v.amount === 'string' ? Number(v.amount.replace(/[^0-9.]/g, '')) : v.amount
+                if (!Number.isNaN(num)) { price = num; price_source = `${k}.amount`; break }
+              }
+            }
+            if (typeof v === 'object') queue.push({ obj: v, depth: depth + 1 })
+          }
+          if (price != null) break
+        }
+      }
+
+      // Normalize images and a primary thumbnail from various possible sources
+      const urlFrom = (val) => {
+        if (!val) return null
+        if (typeof val === 'string') return val
+        if (typeof val === 'object') {
+          return (
+            val.url || val.href || val.src || val.link || val.image || val.photo ||
+            val.mediaUrl || val.media_url || val.highRes || val.midRes || val.lowRes || val.large || val.full ||
+            val.original || val.medium || val.small || val.thumb || val.thumbnail ||
+            val.url_full || val.url_small || val.url_thumb || val.thumbnail_url || null
+          )
+        }
+        return null
+      }
+      // Prefer media.primaryListingImageUrl and media.photosList if present (but we'll ignore in final return to keep MLSDetail enrichment only)
+      const media = src?.media || listing?.media
+      let images = []
+      if (media) {
+        if (typeof media.primaryListingImageUrl === 'string') images.push(media.primaryListingImageUrl)
+        if (Array.isArray(media.photosList)) {
+          media.photosList.forEach(p => {
+            const u = (p && (p.highRes || p.midRes || p.lowRes)) || urlFrom(p)
+            if (u) images.push(u)
+          })
+        }
+      }
+      // 1) Shallow candidates
+      const imageArrays = [
+        src.images,
+        src.photos,
+        src.photo_urls,
+        src.image_urls,
+        src?.media?.photos,
+        src?.media,
+        src?.images?.all,
+        src?.images,
+        src?.photos?.results,
+        src?.listing?.photos,
+        src.mlsPhotos,
+        src.mls_photos,
+        src.mls_photo_urls,
+        src.mlsPhotoUrls
+      ].filter(Boolean)
+      imageArrays.forEach(arr => {
+        if (Array.isArray(arr)) {
+          arr.forEach(it => {
+            const u = urlFrom(it)
+            if (u) images.push(u)
+          })
+        } else {
+          const u = urlFrom(arr)
+          if (u) images.push(u)
+        }
+      })
+
+      // 2) Recursive deep scan for any keys containing photo/image/media with URL-ish strings
+      const pushUrl = (u) => {
+        if (!u || typeof u !== 'string') return
+        const s = u.trim()
+        if (!/^https?:\/\//i.test(s)) return
+        images.push(s)
+      }
+      const seenDeep = new Set()
+      const queueDeep = [{ obj: src, depth: 0 }]
+      const maxDeep = 4
+      while (queueDeep.length) {
+        const { obj, depth } = queueDeep.shift()
+        if (!obj || typeof obj !== 'object' || seenDeep.has(obj) || depth > maxDeep) continue
+        seenDeep.add(obj)
+        if (Array.isArray(obj)) {
+          for (const v of obj) {
+            if (typeof v === 'string') pushUrl(v)
+            else if (typeof v === 'object') {
+              const u = urlFrom(v)
+              if (u) pushUrl(u)
+              queueDeep.push({ obj: v, depth: depth + 1 })
+            }
+          }
+        } else {
+          for (const [k, v] of Object.entries(obj)) {
+            const key = k.toLowerCase()
+            if (typeof v === 'string') {
+              if (key.includes('photo') || key.includes('image') || key.includes('media') || key.includes('thumbnail') || key.includes('url')) {
+                pushUrl(v)
+              }
+            } else if (typeof v === 'object') {
+              const u = urlFrom(v)
+              if (u) pushUrl(u)
+              if (Array.isArray(v) || key.includes('photo') || key.includes('image') || key.includes('media')) {
+                queueDeep.push({ obj: v, depth: depth + 1 })
+              }
+            }
+          }
+        }
+      }
+      const singlePrimary = urlFrom(
+        src.primary_photo_url || src.primaryImage || src.thumbnail_url || src.main_image_url || src.image_url || src.photo_url
+      )
+      if (singlePrimary) images.unshift(singlePrimary)
+      // Dedupe while preserving order
+      const seenImg = new Set()
+      images = images.filter(u => {
+        if (seenImg.has(u)) return false
+        seenImg.add(u)
+        return true
+      })
+      const primary_image = images.length > 0 ? images[0] : null
+
+      // Extract possible MLS listing id if available
+      const mls_id = (
+        listing?.mlsNumber || src.mls_listing_id || src.mlsListingId || src.mlsListingID || src.mls_id || src.mlsId || src.mls_number || src.mlsNumber ||
+        src.listing_id || src.listingId || src.id || null
+      )
+
+      // Prefer the provider's identifier if present
+      const provider_id = (
+        mls_id || src.id || src.property_id || src.propertyId ||
+        src.apn || src.parcel_number || src.parcelNumber || src.property_identifier || null
+      )
+
+      return {
+        id: provider_id || `prop_${Date.now()}_${Math.random()}`,
+        provider_id,
+        // Use only the street line for the title. City/State/ZIP are shown separately in the card.
+        address: street || [city, state].filter(Boolean).join(', '),
+        city,
+        state,
+        zipcode,
+        price,
+        price_source,
+        // Use photos returned inline from MLSSearch/media extraction.
+        primary_image,
+        bedrooms: (listing?.property?.bedroomsTotal ?? src.bedrooms ?? src.beds ?? publicRec?.bedrooms ?? null),
+        bathrooms: (listing?.property?.bathroomsTotal ?? src.bathrooms ?? src.baths ?? publicRec?.bathrooms ?? null),
+        square_feet: (listing?.property?.livingArea ?? src.square_feet ?? src.sqft ?? (publicRec?.squareFeet ? Number(publicRec.squareFeet) : null)),
+        property_type: (listing?.property?.propertyType || (Array.isArray(listing?.property?.propertySubType) && listing.property.propertySubType[0]) || src.property_type || src.type || ''),
+        listing_status: (listing?.standardStatus || listing?.customStatus || src.listing_status || src.status || ''),
+        description: src.description || '',
+        images,
+        listing_date: src.listing_date || src.date_listed || null,
+        days_on_market: src.days_on_market || src.dom || null,
+        mls_number: mls_id || src.mls_number || src.mls_id || null,
+        mls_id,
+        lot_size: (listing?.property?.lotSizeSquareFeet ?? (publicRec?.lotSquareFeet ? Number(publicRec.lotSquareFeet) : null) ?? src.lot_size ?? null),
+        year_built: (listing?.property?.yearBuilt ?? publicRec?.yearBuilt ?? src.year_built ?? null),
+        garage: src.garage || 0,
+        pool: src.pool || false,
+        fireplace: src.fireplace || false
+      }
+    })
+
+  // MLSDetail image enrichment removed: using MLSSearch include_photos and inline media.
+
+  // Pagination & totals (MLSSearch uses resultCount/resultIndex)
+  const computedTotal = (
+    typeof data.resultCount === 'number' ? data.resultCount :
+    (typeof data.total === 'number' ? data.total : (typeof data.count === 'number' ? data.count : null))
+  )
+  const returnedCount = Array.isArray(normalized) ? normalized.length : 0
+  const idx = typeof data.resultIndex === 'number' ? data.resultIndex : (Number(offset) || 1)
+  const computedHasMore = (typeof data.has_more === 'boolean')
+    ? data.has_more
+    : (computedTotal !== null && Number.isFinite(idx)
+        ? ((idx - 1) + returnedCount) < computedTotal
+        : (Number.isFinite(Number(limit)) ? returnedCount >= Number(limit) : false))
+
+  return {
+    properties: normalized,
+    total: computedTotal ?? returnedCount,
+    has_more: computedHasMore,
+    filters_applied: filters,
+    // Optional: include a raw provider sample for debugging (dev only)
+    debug_provider_sample: filters && (filters.include_raw || filters.debug) ? (rawProps[0] || null) : undefined,
+    debug_provider_keys: filters && (filters.include_raw || filters.debug) && rawProps[0]
+      ? Object.keys(rawProps[0])
+      : undefined,
+    // legacy debug fields for older UI snippets
+    debug_raw_sample: filters && (filters.include_raw || filters.debug) ? (rawProps[0] || null) : undefined,
+    debug_raw_sample_keys: filters && (filters.include_raw || filters.debug) && rawProps[0]
+      ? Object.keys(rawProps[0])
+      : undefined,
+    debug_enrichment: filters && (filters.include_raw || filters.debug) ? (filters._debug_enrichment || null) : undefined
+  }
+  } catch (error) {
+    console.error('Property Search Error:', error)
+    
+    // Return fallback data on error
+    return generateFallbackProperties(filters)
+  }
+}
+
+// Legacy function for backwards compatibility
+export async function searchProperties(filters = {}) {
+  const result = await fetchProperties(filters)
+  return result.properties || []
+}
+
+// Helpers ------------------------------
+// Remove null/undefined/empty-string values from prefs
+export function sanitizePreferences(prefs = {}) {
+  const clean = {}
+  for (const [k, v] of Object.entries(prefs)) {
+    if (v !== null && v !== undefined && (typeof v !== 'string' || v.trim() !== '')) {
+      clean[k] = v
+    }
+  }
+  return clean
+}
+
+// Map Lead preferences to RealEstateAPI filter schema
+export function mapLeadPreferencesToFilters(prefs = {}) {
+  if (!prefs || typeof prefs !== 'object') return {}
+  return {
+    location: prefs.zipcode || prefs.preferred_zipcode || prefs.location || undefined,
+    beds: prefs.bedrooms || prefs.beds || undefined,
+    baths: prefs.bathrooms || prefs.baths || undefined,
+    min_price: prefs.min_price || prefs.minPrice || undefined,
+    max_price: prefs.max_price || prefs.maxPrice || undefined,
+    property_type: prefs.property_type || prefs.type || undefined,
+  }
+}
+
+export function generateFallbackProperties(filters = {}) {
+  const mockProperties = [
+    {
+      id: 'prop_ca_1',
+      address: '123 Bay Street',
+      city: 'San Francisco',
+      state: 'CA',
+      zipcode: '94121',
+      price: 750000,
+      bedrooms: 3,
+      bathrooms: 2,
+      square_feet: 1800,
+      property_type: 'Single Family',
+      listing_status: 'for_sale',
+      description: 'Charming single-family home near Golden Gate Park.',
+      images: [],
+      listing_date: new Date(Date.now() - 10 * 24 * 60 * 60 * 1000).toISOString(),
+      days_on_market: 10,
+      mls_number: 'MLS999001',
+      lot_size: '0.08',
+      year_built: 1990,
+      garage: 1,
+      pool: false,
+      fireplace: true
+    },
+    {
+      id: 'mock_1',
+      address: '123 Main Street',
+      city: 'Dallas',
+      state: 'TX',
+      zipcode: '75201',
+      price: 450000,
+      bedrooms: 3,
+      bathrooms: 2.5,
+      square_feet: 2200,
+      property_type: 'Single Family',
+      listing_status: 'for_sale',
+      description: 'Beautiful family home in prime location with modern amenities.',
+      images: [],
+      listing_date: new Date().toISOString(),
+      days_on_market: 15,
+      mls_number: 'MLS123456',
+      lot_size: '0.25 acres',
+      year_built: 2018,
+      garage: 2,
+      pool: false,
+      fireplace: true
+    },
+    {
+      id: 'mock_2',
+      address: '456 Oak Avenue',
+      city: 'Frisco',
+      state: 'TX',
+      zipcode: '75034',
+      price: 520000,
+      bedrooms: 4,
+      bathrooms: 3,
+      square_feet: 2800,
+      property_type: 'Single Family',
+      listing_status: 'for_sale',
+      description: 'Spacious home with large backyard and updated kitchen.',
+      images: [],
+      listing_date: new Date(Date.now() - 7 * 24 * 60 * 60 * 1000).toISOString(),
+      days_on_market: 7,
+      mls_number: 'MLS789012',
+      lot_size: '0.33 acres',
+      year_built: 2020,
+      garage: 3,
+      pool: true,
+      fireplace: true
+    },
+    {
+      id: 'mock_3',
+      address: '789 Pine Street',
+      city: 'Austin',
+      state: 'TX',
+      zipcode: '78701',
+      price: 380000,
+      bedrooms: 2,
+      bathrooms: 2,
+      square_feet: 1600,
+      property_type: 'Condo',
+      listing_status: 'for_sale',
+      description: 'Modern downtown condo with city views and walkable amenities.',
+      images: [],
+      listing_date: new Date(Date.now() - 21 * 24 * 60 * 60 * 1000).toISOString(),
+      days_on_market: 21,
+      mls_number: 'MLS345678',
+      lot_size: 'N/A',
+      year_built: 2019,
+      garage: 1,
+      pool: false,
+      fireplace: false
+    }
+  ]
+
+  // Filter mock properties based on criteria
+  let filteredProperties = mockProperties
+
+  if (filters.min_price) {
+    filteredProperties = filteredProperties.filter(p => p.price >= parseInt(filters.min_price))
+  }
+  if (filters.max_price) {
+    filteredProperties = filteredProperties.filter(p => p.price <= parseInt(filters.max_price))
+  }
+  if (filters.beds) {
+    filteredProperties = filteredProperties.filter(p => p.bedrooms >= parseInt(filters.beds))
+  }
+  if (filters.baths) {
+    filteredProperties = filteredProperties.filter(p => p.bathrooms >= parseInt(filters.baths))
+  }
+  if (filters.location) {
+    // Normalize location search
+    const loc = filters.location.toLowerCase()
+    // Map of US states full name -> abbreviation
+    const stateMap = {
+      'alabama':'al','alaska':'ak','arizona':'az','arkansas':'ar',
+      'california':'ca','colorado':'co','connecticut':'ct','delaware':'de','district of columbia':'dc',
+      'florida':'fl','georgia':'ga','hawaii':'hi','idaho':'id','illinois':'il','indiana':'in','iowa':'ia','kansas':'ks','kentucky':'ky','louisiana':'la','maine':'me','maryland':'md','massachusetts':'ma','michigan':'mi','minnesota':'mn','mississippi':'ms','missouri':'mo','montana':'mt','nebraska':'ne','nevada':'nv','new hampshire':'nh','new jersey':'nj','new mexico':'nm','new york':'ny','north carolina':'nc','north dakota':'nd','ohio':'oh','oklahoma':'ok','oregon':'or','pennsylvania':'pa','rhode island':'ri','south carolina':'sc','south dakota':'sd','tennessee':'tn','texas':'tx','utah':'ut','vermont':'vt','virginia':'va','washington':'wa','west virginia':'wv','wisconsin':'wi','wyoming':'wy'
+    }
+    const locAbbr = stateMap[loc] || loc
+
+    const location = filters.location.toLowerCase()
+    filteredProperties = filteredProperties.filter(p => 
+      p.city.toLowerCase().includes(location) || 
+      p.zipcode.includes(location) ||
+      p.state.toLowerCase().includes(location)
+    )
+  }
+
+  return {
+    properties: filteredProperties,
+    total: filteredProperties.length,
+    has_more: false,
+    filters_applied: filters,
+    is_fallback: true
+  }
+}
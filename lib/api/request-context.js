@@ -0,0 +1,14 @@
+import { AsyncLocalStorage } from 'async_hooks'
+
+// Per-request context (the matched route, pending invalidations, the document loader and
+// the DB round-trip count), set by the API route handler so code deep in a call chain can
+// attribute work to the request that caused it.
+const storage = globalThis.__crmRequestContext || (globalThis.__crmRequestContext = new AsyncLocalStorage())
+
+export function runWithRequestContext(context, fn) {
+  return storage.run(context, fn)
+}
+
+export function getRequestContext() {
+  return storage.getStore() || null
+}
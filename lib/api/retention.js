@@ -0,0 +1,229 @@
+import fs from 'fs/promises'
+import path from 'path'
+import { gzipSync } from 'zlib'
+import { connectToMongo } from '@/lib/api/db'
+import { counter } from '@/lib/api/metrics'
+import { timeScheduler } from '@/lib/api/telemetry'
+
+// Retention for the high-churn collections. Each policy keeps `days` of documents by `field`:
+// - archive policies (conversations, read notifications, property searches) are moved by the
+//   retention job into gzip-compressed NDJSON files, one per collection and month of `field`
+//   (RETENTION_ARCHIVE_DIR/<collection>/<collection>-YYYY-MM.ndjson.gz), then deleted;
+// - TTL policies (nudges, saved plans) are derived data and are expired by a MongoDB TTL index.
+//   The job deletes them as well, so the policy holds where the TTL index couldn't be created.
+// Archive policies only run once RETENTION_ARCHIVE_DIR names durable storage; until then their
+// documents stay in MongoDB (a temp directory would lose them on the next reboot). With
+// RETENTION_COMPACT_MIN_DOCUMENTS set, a run ends by compacting collections it removed at least
+// that many documents from. Setting a policy's days to 0 keeps that data forever (an existing
+// TTL index must then be dropped by hand).
+// Archives are appended one gzip member per batch; `zcat` and zlib.gunzip read them as one
+// stream. A crash between the append and the delete can archive a batch twice.
+export const RETENTION_ARCHIVE_DIR = process.env.RETENTION_ARCHIVE_DIR || null
+const RETENTION_INTERVAL_MS = Math.max(60 * 1000, Number(process.env.RETENTION_INTERVAL_MS) || 6 * 60 * 60 * 1000)
+const RETENTION_INITIAL_DELAY_MS = Number(process.env.RETENTION_INITIAL_DELAY_MS) || 10 * 60 * 1000
+// compact blocks the collection (or fails, depending on server version and topology): off by default
+const COMPACT_MIN_DOCUMENTS = Number(process.env.RETENTION_COMPACT_MIN_DOCUMENTS) || 0
+const BATCH_SIZE = 1000
+const DAY_MS = 86400000
+const RUNS = 'retention_runs'
+
+const retainedDays = (name, fallback) => {
+  const value = Number(process.env[name])
+  return process.env[name] !== undefined && process.env[name] !== '' && Number.isFinite(value) && value >= 0 ? value : fallback
+}
+
+export const POLICIES = [
+  { name: 'conversations', collection: 'assistant_conversations', field: 'created_at', days: retainedDays('RETENTION_CONVERSATIONS_DAYS', 180), archive: true },
+  { name: 'notifications', collection: 'notifications', field: 'created_at', filter: { type: { $ne: 'nudge' }, status: 'read' }, days: retainedDays('RETENTION_NOTIFICATIONS_DAYS', 90), archive: true },
+  { name: 'nudges', collection: 'notifications', field: 'created_at', filter: { type: 'nudge' }, days: retainedDays('RETENTION_NUDGES_DAYS', 14), archive: false },
+  { name: 'property_searches', collection: 'property_searches', field: 'timestamp', days: retainedDays('RETENTION_SEARCHES_DAYS', 90), archive: true },
+  { name: 'pmd_plans', collection: 'pmd_plans', field: 'created_at', days: retainedDays('RETENTION_PLANS_DAYS', 30), archive: false },
+  { name: 'assistant_plans', collection: 'assistant_plans', field: 'created_at', days: retainedDays('RETENTION_PLANS_DAYS', 30), archive: false }
+]
+
+const retentionDocuments = counter('crm_retention_documents_total', 'Documents removed by the retention job', ['policy', 'action'])
+
+function state() {
+  return globalThis.__crmRetention || (globalThis.__crmRetention = { indexed: null, running: null, timer: null, lastRun: null })
+}
+
+// Newest-first indexes serve the list reads and the job's cutoff scans; TTL policies get a TTL
+// index instead. TTL indexes need `field` to hold BSON dates, which every writer uses.
+const DATE_INDEXES = [
+  ['assistant_conversations', { created_at: -1 }],
+  ['notifications', { created_at: -1 }],
+  ['property_searches', { timestamp: -1 }]
+]
+
+export function ensureRetentionIndexes(db) {
+  const s = state()
+  if (!s.indexed) {
+    s.indexed = (async () => {
+      for (const [collection, key] of DATE_INDEXES) {
+        try {
+          const coll = db.collection(collection)
+          if (typeof coll.createIndex === 'function') await coll.createIndex(key)
+        } catch (e) {
+          console.warn(`Retention index error (${collection})`, e)
+        }
+      }
+      for (const policy of POLICIES.filter(p => !p.archive && p.days)) {
+        try {
+          if (typeof db.collection(policy.collection).createIndex === 'function') await ensureTtlIndex(db, policy)
+        } catch (e) {
+          console.warn(`Retention index error (${policy.name})`, e)
+        }
+      }
+    })()
+  }
+  return s.indexed
+}
+
+async function ensureTtlIndex(db, policy) {
+  const name = `retention_${policy.name}_ttl`
+  const expireAfterSeconds = Math.round(policy.days * DAY_MS / 1000)
+  const options = { name, expireAfterSeconds }
+  if (policy.filter) options.partialFilterExpression = policy.filter
+  try {
+    await db.collection(policy.collection).createIndex({ [policy.field]: 1 }, options)
+  } catch (e) {
+    // IndexOptionsConflict: the TTL index exists with another retention period
+    if (e?.code !== 85 || typeof db.command !== 'function') throw e
+    await db.command({ collMod: policy.collection, index: { name, expireAfterSeconds } })
+  }
+}
+
+function archivePath(collection, month) {
+  return path.join(RETENTION_ARCHIVE_DIR, collection, `${collection}-${month}.ndjson.gz`)
+}
+
+async function archiveDocuments(policy, docs) {
+  const months = new Map()
+  for (const { _id, ...doc } of docs) {
+    const at = new Date(doc[policy.field])
+    const month = Number.isNaN(at.getTime()) ? 'undated' : at.toISOString().slice(0, 7)
+    if (!months.has(month)) months.set(month, [])
+    months.get(month).push(JSON.stringify(doc))
+  }
+  await fs.mkdir(path.join(RETENTION_ARCHIVE_DIR, policy.collection), { recursive: true })
+  for (const [month, lines] of months) {
+    await fs.appendFile(archivePath(policy.collection, month), gzipSync(lines.join('\n') + '\n'))
+  }
+}
+
+async function applyPolicy(db, policy, now) {
+  const coll = db.collection(policy.collection)
+  const query = { ...policy.filter, [policy.field]: { $lt: new Date(now.getTime() - policy.days * DAY_MS) } }
+  if (!policy.archive) {
+    const { deletedCount = 0 } = await coll.deleteMany(query)
+    if (deletedCount > 0) retentionDocuments.inc({ policy: policy.name, action: 'deleted' }, deletedCount)
+    return { deleted: deletedCount, archived: 0 }
+  }
+  // Oldest first, one batch at a time: archived documents are deleted before the next read
+  let archived = 0
+  for (;;) {
+    const docs = await coll.find(query).sort({ [policy.field]: 1 }).limit(BATCH_SIZE).toArray()
+    if (docs.length === 0) break
+    await archiveDocuments(policy, docs)
+    await coll.deleteMany({ _id: { $in: docs.map(d => d._id) } })
+    archived += docs.length
+    retentionDocuments.inc({ policy: policy.name, action: 'archived' }, docs.length)
+    if (docs.length < BATCH_SIZE) break
+  }
+  return { deleted: archived, archived }
+}
+
+// Apply every policy once. Concurrent calls share a run.
+export function runRetention(db) {
+  const s = state()
+  if (!s.running) {
+    s.running = (async () => {
+      await ensureRetentionIndexes(db)
+      const now = new Date()
+      const started = Date.now()
+      const policies = {}
+      const removed = new Map()
+      for (const policy of POLICIES) {
+        if (!policy.days) {
+          policies[policy.name] = { skipped: true }
+          continue
+        }
+        if (policy.archive && !RETENTION_ARCHIVE_DIR) {
+          policies[policy.name] = { skipped: true, reason: 'RETENTION_ARCHIVE_DIR is not set' }
+          continue
+        }
+        try {
+          policies[policy.name] = await applyPolicy(db, policy, now)
+          removed.set(policy.collection, (removed.get(policy.collection) || 0) + policies[policy.name].deleted)
+        } catch (e) {
+          console.warn(`Retention error (${policy.name})`, e)
+          policies[policy.name] = { error: e.message }
+        }
+      }
+
+      // Give the space freed by a large purge back to the storage engine
+      const compacted = []
+      if (COMPACT_MIN_DOCUMENTS > 0 && typeof db.command === 'function') {
+        for (const [collection, count] of removed) {
+          if (count < COMPACT_MIN_DOCUMENTS) continue
+          try {
+            await db.command({ compact: collection })
+            compacted.push(collection)
+          } catch (e) {
+            console.warn(`Retention compact error (${collection})`, e)
+          }
+        }
+      }
+
+      const result = { ran_at: now, duration_ms: Date.now() - started, policies, compacted }
+      await db.collection(RUNS).updateOne({ id: 'last' }, { $set: result }, { upsert: true })
+      s.lastRun = result
+      return result
+    })().finally(() => { s.running = null })
+  }
+  return s.running
+}
+
+export async function getRetentionStatus(db) {
+  const s = state()
+  const lastRun = s.lastRun || await db.collection(RUNS).findOne({ id: 'last' }, { projection: { _id: 0, id: 0 } })
+  const now = Date.now()
+  return {
+    archive_dir: RETENTION_ARCHIVE_DIR,
+    interval_ms: RETENTION_INTERVAL_MS,
+    policies: POLICIES.map(p => ({
+      name: p.name,
+      collection: p.collection,
+      field: p.field,
+      filter: p.filter || null,
+      days: p.days,
+      mode: !p.days || (p.archive && !RETENTION_ARCHIVE_DIR) ? 'keep' : p.archive ? 'archive' : 'ttl',
+      cutoff: p.days ? new Date(now - p.days * DAY_MS) : null
+    })),
+    last_run: lastRun || null
+  }
+}
+
+// Skips a run when another instance ran recently
+export function startRetentionScheduler() {
+  const s = state()
+  if (s.timer) return
+  if (!RETENTION_ARCHIVE_DIR) console.warn('RETENTION_ARCHIVE_DIR is not set; documents under archive policies are kept in MongoDB')
+  connectToMongo().then(ensureRetentionIndexes).catch(e => console.warn('Retention index error', e))
+  const run = async () => {
+    try {
+      const db = await connectToMongo()
+      const last = await db.collection(RUNS).findOne({ id: 'last' }, { projection: { ran_at: 1 } })
+      if (last?.ran_at && Date.now() - new Date(last.ran_at).getTime() < RETENTION_INTERVAL_MS / 2) return
+      await timeScheduler('retention', () => runRetention(db))
+    } catch (e) {
+      console.warn('Retention scheduler error', e)
+    }
+  }
+  s.timer = setTimeout(() => {
+    run()
+    s.timer = setInterval(run, RETENTION_INTERVAL_MS)
+    if (typeof s.timer.unref === 'function') s.timer.unref()
+  }, RETENTION_INITIAL_DELAY_MS)
+  if (typeof s.timer.unref === 'function') s.timer.unref()
+}
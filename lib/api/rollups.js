@@ -0,0 +1,264 @@
+import { createHash } from 'crypto'
+import { getMongoClient } from '@/lib/api/db'
+import { getLoader } from '@/lib/api/loader'
+import { loadChecklistItems } from '@/lib/api/checklist-templates'
+
+// Per-transaction, per-stage checklist rollups (stage_rollups, one document per
+// transaction + stage). Every checklist write rebuilds the rollups of the stages it touched
+// in the same MongoDB transaction, so stage validation, deal summaries and alerts read one
+// indexed document per stage instead of re-scanning checklist_items. Overdue depends on
+// the clock rather than on writes, so it's derived at read time from the open due dates.
+// Rollups missing for older data are built on first read.
+const ROLLUPS = 'stage_rollups'
+
+function state() {
+  return globalThis.__crmStageRollups || (globalThis.__crmStageRollups = { indexed: null, transactions: null })
+}
+
+// Fingerprint of everything in a stage's checklist that can change the validation outcome
+export function checklistStateHash(items) {
+  const state = [...items]
+    .sort((a, b) => String(a.id).localeCompare(String(b.id)))
+    .map(i => [i.id, i.status, i.parent_id || '', i.priority || '', (i.dependencies || []).join(','), i.title, i.notes || ''].join('\u0001'))
+    .join('\u0002')
+  return createHash('sha1').update(state).digest('hex')
+}
+
+// Effective completeness using normalized parent/child items, plus unmet dependencies
+export function summarizeStageItems(allStageItems) {
+  const parents = allStageItems.filter(i => !i.parent_id)
+  const children = allStageItems.filter(i => i.parent_id)
+
+  const childrenByParent = new Map()
+  for (const c of children) {
+    if (!childrenByParent.has(c.parent_id)) childrenByParent.set(c.parent_id, [])
+    childrenByParent.get(c.parent_id).push(c)
+  }
+
+  const isCompleted = (it) => it.status === 'completed'
+  const parentEffectiveComplete = new Map()
+  for (const p of parents) {
+    const kids = childrenByParent.get(p.id) || []
+    const complete = kids.length > 0 ? kids.every(isCompleted) : isCompleted(p)
+    parentEffectiveComplete.set(p.id, complete)
+  }
+
+  const completedIdSet = new Set([
+    ...children.filter(isCompleted).map(i => i.id),
+    ...parents.filter(p => parentEffectiveComplete.get(p.id)).map(p => p.id)
+  ])
+
+  // Items considered incomplete for validation: incomplete parents (effective) and any incomplete children
+  const incompleteParents = parents.filter(p => !parentEffectiveComplete.get(p.id))
+  const incompleteChildren = children.filter(c => !isCompleted(c))
+  const incompleteItems = [...incompleteParents, ...incompleteChildren]
+  const blockedItems = allStageItems.filter(item => item.status === 'blocked')
+
+  // Check unmet dependencies (for both parents and children)
+  const unmetDependencyItems = []
+  for (const it of allStageItems) {
+    const deps = Array.isArray(it.dependencies) ? it.dependencies : []
+    const unmet = deps.filter(did => !completedIdSet.has(did))
+    if (unmet.length > 0) {
+      unmetDependencyItems.push({ id: it.id, title: it.title, unmet_count: unmet.length })
+    }
+  }
+
+  return {
+    incompleteItems,
+    blockedItems,
+    unmetDependencyItems,
+    parentsTotal: parents.length,
+    parentsComplete: parents.length - incompleteParents.length
+  }
+}
+
+const compactItem = (i) => ({
+  id: i.id,
+  title: i.title,
+  status: i.status,
+  priority: i.priority || 'medium',
+  due_date: i.due_date || null,
+  parent_id: i.parent_id || null,
+  dependencies: Array.isArray(i.dependencies) ? i.dependencies : [],
+  notes: i.notes || '',
+  order: i.order || 0
+})
+
+export function computeStageRollup(transactionId, stage, items) {
+  const summary = summarizeStageItems(items)
+  const completed = items.filter(i => i.status === 'completed').length
+  const openDue = items
+    .filter(i => i.status !== 'completed' && i.due_date)
+    .map(i => new Date(i.due_date))
+    .sort((a, b) => a - b)
+  return {
+    transaction_id: transactionId,
+    stage,
+    total: items.length,
+    completed,
+    open: items.length - completed,
+    blocked: summary.blockedItems.length,
+    progress: items.length > 0 ? Math.round((completed / items.length) * 100) : 0,
+    parents_total: summary.parentsTotal,
+    parents_complete: summary.parentsComplete,
+    effective_complete: summary.incompleteItems.length === 0,
+    incomplete_ids: summary.incompleteItems.map(i => i.id),
+    unmet_dependencies: summary.unmetDependencyItems,
+    earliest_open_due: openDue[0] || null,
+    items: [...items].sort((a, b) => (a.order || 0) - (b.order || 0)).map(compactItem),
+    state_hash: checklistStateHash(items),
+    updated_at: new Date()
+  }
+}
+
+// Validation inputs rebuilt from the stored rollup (same shape as summarizeStageItems)
+export function rollupStageSummary(rollup) {
+  const items = rollup?.items || []
+  const byId = new Map(items.map(i => [i.id, i]))
+  return {
+    incompleteItems: (rollup?.incomplete_ids || []).map(id => byId.get(id)).filter(Boolean),
+    blockedItems: items.filter(i => i.status === 'blocked'),
+    unmetDependencyItems: rollup?.unmet_dependencies || []
+  }
+}
+
+// Open items due before the given time, most overdue first
+export function rollupOverdue(rollup, before = new Date()) {
+  if (!rollup?.earliest_open_due || new Date(rollup.earliest_open_due) >= before) return []
+  return rollup.items
+    .filter(i => i.status !== 'completed' && i.due_date && new Date(i.due_date) < before)
+    .map(i => ({ ...i, stage: rollup.stage, transaction_id: rollup.transaction_id }))
+    .sort((a, b) => new Date(a.due_date) - new Date(b.due_date))
+}
+
+async function ensureRollupIndexes(db) {
+  const s = state()
+  if (!s.indexed) {
+    s.indexed = (async () => {
+      try {
+        const coll = db.collection(ROLLUPS)
+        if (typeof coll.createIndex === 'function') {
+          await coll.createIndex({ transaction_id: 1, stage: 1 }, { unique: true })
+          await db.collection('checklist_items').createIndex({ transaction_id: 1, stage: 1 })
+        }
+      } catch (e) {
+        console.warn('Stage rollup index error', e)
+      }
+    })()
+  }
+  return s.indexed
+}
+
+async function writeRollups(db, rollups, session = undefined) {
+  if (rollups.length === 0) return
+  await db.collection(ROLLUPS).bulkWrite(rollups.map(r => ({
+    updateOne: { filter: { transaction_id: r.transaction_id, stage: r.stage }, update: { $set: r }, upsert: true }
+  })), { ordered: false, session })
+}
+
+// Recompute rollups from the checklist (stored and template items) for the given stages (all of
+// the transaction's stages when stages is null). Stages left without items keep an empty rollup.
+export async function rebuildStageRollups(db, transactionId, stages = null, session = undefined) {
+  const query = { transaction_id: transactionId, ...(stages ? { stage: { $in: stages } } : {}) }
+  const items = await loadChecklistItems(db, query, { session })
+  const byStage = new Map((stages || []).map(stage => [stage, []]))
+  for (const item of items) {
+    if (!byStage.has(item.stage)) byStage.set(item.stage, [])
+    byStage.get(item.stage).push(item)
+  }
+  const rollups = [...byStage].map(([stage, stageItems]) => computeStageRollup(transactionId, stage, stageItems))
+  await writeRollups(db, rollups, session)
+  return rollups
+}
+
+// Every checklist write bumps its transaction's checklist_version; GET .../checklist serves
+// it as the ETag. Writes that don't go through withChecklistWrite call this directly.
+export async function bumpChecklistVersion(db, transactionId, session = undefined) {
+  if (!transactionId) return
+  await db.collection('transactions').updateOne({ id: transactionId }, { $inc: { checklist_version: 1 } }, { session })
+  getLoader(db).clear('transactions', transactionId)
+}
+
+const transactionsUnsupported = (e) =>
+  e?.code === 20 || /Transaction numbers are only allowed|does not support transactions/i.test(e?.message || '')
+
+// Run a checklist write and rebuild the touched stages' rollups atomically with it. On a
+// standalone MongoDB (no transactions) the rollups are rebuilt right after the write.
+export async function withChecklistWrite(db, transactionId, stages, write) {
+  await ensureRollupIndexes(db)
+  const s = state()
+  const touched = [...new Set(stages.filter(Boolean))]
+  const client = getMongoClient()
+
+  if (client && s.transactions !== false) {
+    const session = client.startSession()
+    try {
+      let result
+      await session.withTransaction(async () => {
+        result = await write(session)
+        await rebuildStageRollups(db, transactionId, touched, session)
+        await bumpChecklistVersion(db, transactionId, session)
+      })
+      s.transactions = true
+      return result
+    } catch (e) {
+      if (!transactionsUnsupported(e)) throw e
+      s.transactions = false
+      console.warn('MongoDB transactions unavailable; stage rollups will be rebuilt after each checklist write')
+    } finally {
+      await session.endSession()
+    }
+  }
+
+  const result = await write(undefined)
+  await bumpChecklistVersion(db, transactionId)
+  try {
+    await rebuildStageRollups(db, transactionId, touched)
+  } catch (e) {
+    // Drop the stale rollups so the next read rebuilds them
+    console.warn('Stage rollup rebuild error', e)
+    await db.collection(ROLLUPS).deleteMany({ transaction_id: transactionId, stage: { $in: touched } }).catch(() => {})
+  }
+  return result
+}
+
+export async function getStageRollup(db, transactionId, stage) {
+  await ensureRollupIndexes(db)
+  const rollup = await db.collection(ROLLUPS).findOne({ transaction_id: transactionId, stage }, { projection: { _id: 0 } })
+  if (rollup) return rollup
+  const [rebuilt] = await rebuildStageRollups(db, transactionId, [stage])
+  return rebuilt
+}
+
+// Rollups for several transactions in one query, as a Map of transaction id -> rollups
+export async function getTransactionRollups(db, transactionIds) {
+  await ensureRollupIndexes(db)
+  const ids = [...new Set(transactionIds)]
+  const byTransaction = new Map(ids.map(id => [id, []]))
+  if (ids.length === 0) return byTransaction
+  const rollups = await db.collection(ROLLUPS)
+    .find({ transaction_id: { $in: ids } }, { projection: { _id: 0 } })
+    .toArray()
+  for (const r of rollups) byTransaction.get(r.transaction_id)?.push(r)
+
+  // Transactions written before rollups existed get theirs built now, in one pass
+  const missing = ids.filter(id => byTransaction.get(id).length === 0)
+  if (missing.length > 0) {
+    const items = await loadChecklistItems(db, { transaction_id: { $in: missing } })
+    const groups = new Map()
+    for (const item of items) {
+      const key = `${item.transaction_id}\u0000${item.stage}`
+      if (!groups.has(key)) groups.set(key, [])
+      groups.get(key).push(item)
+    }
+    const built = [...groups.values()].map(group => computeStageRollup(group[0].transaction_id, group[0].stage, group))
+    await writeRollups(db, built)
+    for (const r of built) byTransaction.get(r.transaction_id).push(r)
+  }
+  return byTransaction
+}
+
+export async function deleteTransactionRollups(db, transactionId) {
+  await db.collection(ROLLUPS).deleteMany({ transaction_id: transactionId })
+}
@@ -0,0 +1,65 @@
+// Compiled route table: a trie keyed by path segment, with per-node method maps.
+// Patterns use `:name` segments for parameters, e.g. '/checklist/:id/voice/:memoId'.
+// Static segments are tried before parameters, and matching backtracks into the
+// parameter branch when the static branch has no handler for the method, so
+// GET /properties/search still reaches GET /properties/:id as it always has.
+// Any extra keys on a route entry (e.g. `db: false`) come back as `options` on a match.
+
+function createNode() {
+  return { static: new Map(), param: null, paramName: null, methods: new Map() }
+}
+
+function splitPath(path) {
+  return path.split('/').filter(Boolean)
+}
+
+export function createRouter(routes = []) {
+  const root = createNode()
+
+  for (const { method, path, handler, ...options } of routes) {
+    let node = root
+    for (const segment of splitPath(path)) {
+      if (segment.startsWith(':')) {
+        const name = segment.slice(1)
+        if (!node.param) {
+          node.param = createNode()
+          node.paramName = name
+        } else if (node.paramName !== name) {
+          throw new Error(`Route ${path} names parameter :${name}, conflicting with :${node.paramName}`)
+        }
+        node = node.param
+      } else {
+        if (!node.static.has(segment)) node.static.set(segment, createNode())
+        node = node.static.get(segment)
+      }
+    }
+    if (node.methods.has(method)) {
+      throw new Error(`Duplicate route ${method} ${path}`)
+    }
+    node.methods.set(method, { handler, pattern: path, options })
+  }
+
+  const walk = (node, segments, index, method, params) => {
+    if (index === segments.length) {
+      const entry = node.methods.get(method)
+      return entry ? { ...entry, params } : null
+    }
+    const segment = segments[index]
+    const child = node.static.get(segment)
+    if (child) {
+      const found = walk(child, segments, index + 1, method, params)
+      if (found) return found
+    }
+    if (node.param) {
+      return walk(node.param, segments, index + 1, method, { ...params, [node.paramName]: segment })
+    }
+    return null
+  }
+
+  return {
+    // segments: the already-split catch-all path, e.g. ['leads', '123']
+    match(method, segments) {
+      return walk(root, segments, 0, method, {})
+    }
+  }
+}
@@ -0,0 +1,45 @@
+import { NextResponse } from 'next/server'
+import { handleCORS } from '@/lib/api/http'
+import { routes as leadRoutes } from '@/lib/api/handlers/leads'
+import { routes as propertyRoutes } from '@/lib/api/handlers/properties'
+import { routes as assistantRoutes } from '@/lib/api/handlers/assistant'
+import { routes as planRoutes } from '@/lib/api/handlers/plans'
+import { routes as transactionRoutes } from '@/lib/api/handlers/transactions'
+import { routes as checklistRoutes } from '@/lib/api/handlers/checklist'
+import { routes as pmdRoutes } from '@/lib/api/handlers/pmd'
+import { routes as agentRoutes } from '@/lib/api/handlers/agent'
+import { routes as alertRoutes } from '@/lib/api/handlers/alerts'
+import { routes as openaiRoutes } from '@/lib/api/handlers/openai'
+import { routes as analyticsRoutes } from '@/lib/api/handlers/analytics'
+import { routes as notificationRoutes } from '@/lib/api/handlers/notifications'
+import { routes as retentionRoutes } from '@/lib/api/handlers/retention'
+import { routes as exportRoutes } from '@/lib/api/handlers/export'
+import { routes as healthRoutes } from '@/lib/api/handlers/health'
+import { routes as metricsRoutes } from '@/lib/api/handlers/metrics'
+
+// Root endpoint
+async function apiRoot() {
+  return handleCORS(NextResponse.json({ message: "Real Estate CRM API" }))
+}
+
+// Every API endpoint, compiled into the router by app/api/[[...path]]/route.js.
+// Entries with `db: false` are dispatched without waiting on the MongoDB connection.
+export const routes = [
+  { method: 'GET', path: '/', handler: apiRoot },
+  ...leadRoutes,
+  ...propertyRoutes,
+  ...assistantRoutes,
+  ...planRoutes,
+  ...transactionRoutes,
+  ...checklistRoutes,
+  ...pmdRoutes,
+  ...agentRoutes,
+  ...alertRoutes,
+  ...openaiRoutes,
+  ...analyticsRoutes,
+  ...notificationRoutes,
+  ...retentionRoutes,
+  ...exportRoutes,
+  ...healthRoutes,
+  ...metricsRoutes
+]
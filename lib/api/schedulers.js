@@ -0,0 +1,348 @@
+import { connectToMongo } from '@/lib/api/db'
+import { markPhase } from '@/lib/api/startup'
+import { timeScheduler } from '@/lib/api/telemetry'
+import { startEnrichmentQueue } from '@/lib/api/enrichment'
+import { startTranscriptionQueue } from '@/lib/api/voice-memos'
+import { startAlertScheduler } from '@/lib/api/alerts'
+import { startRetentionScheduler } from '@/lib/api/retention'
+import { invalidate, sendToClients } from '@/lib/api/invalidation'
+
+// Delay before the first nudge scan so it doesn't compete with cold-start traffic
+const NUDGE_INITIAL_DELAY_MS = Number(process.env.NUDGE_INITIAL_DELAY_MS) || 60 * 1000
+const NUDGE_INTERVAL_MS = 30 * 60 * 1000
+
+// --- Nudge Scheduler (Proactive AI Nudges) ---
+function startNudgeScheduler() {
+  if (globalThis.__crmNudgeScheduler) return
+
+  const runNudgeScan = async () => {
+    try {
+      const db = await connectToMongo()
+      const now = new Date()
+      let created = 0
+
+      // Overdue checklist tasks
+      const overdueTasks = await db.collection('checklist').find({
+        status: { $ne: 'completed' },
+        due_date: { $lte: now }
+      }).limit(5).toArray()
+
+      for (const t of overdueTasks) {
+        const payload = {
+          id: `task_${t.id || t._id}`,
+          type: 'checklist_slip',
+          message: `Task overdue: ${t.title || 'Unnamed task'}`,
+          quickAction: { type: 'complete_task', id: t.id || t._id }
+        }
+        sendToClients('nudge', payload)
+        // Persist as a notification (dedupe per hour)
+        try {
+          const coll = db.collection('notifications')
+          const nid = `nudge:${payload.id}:${now.toISOString().slice(0, 13)}`
+          const exists = await coll.findOne({ id: nid })
+          if (!exists) {
+            created++
+            await coll.insertOne({
+              id: nid,
+              type: 'nudge',
+              title: 'Overdue task',
+              message: payload.message,
+              meta: payload,
+              status: 'unread',
+              created_at: new Date(),
+              updated_at: new Date(),
+              snooze_until: null
+            })
+          }
+        } catch (_) {}
+      }
+
+      // Stalled deals (no update in 7 days)
+      const seven = new Date(now.getTime() - 7 * 24 * 60 * 60 * 1000)
+      const stalled = await db.collection('transactions').find({
+        status: { $in: ['active', 'open', 'in_progress'] },
+        updated_at: { $lte: seven }
+      }).limit(3).toArray()
+
+      for (const tx of stalled) {
+        const days = Math.ceil((now - new Date(tx.updated_at)) / 86400000)
+        const payload = {
+          id: `deal_${tx.id || tx._id}`,
+          type: 'stalled_deal',
+          message: `Deal \"${tx.title || tx.property_address || 'Untitled'}\" stalled for ${days} days.`
+        }
+        sendToClients('nudge', payload)
+        // Persist as a notification (dedupe per hour)
+        try {
+          const coll = db.collection('notifications')
+          const nid = `nudge:${payload.id}:${now.toISOString().slice(0, 13)}`
+          const exists = await coll.findOne({ id: nid })
+          if (!exists) {
+            created++
+            await coll.insertOne({
+              id: nid,
+              type: 'nudge',
+              title: 'Stalled deal',
+              message: payload.message,
+              meta: payload,
+              status: 'unread',
+              created_at: new Date(),
+              updated_at: new Date(),
+              snooze_until: null
+            })
+          }
+        } catch (_) {}
+      }
+
+      // Fresh leads (last hour)
+      const hourAgo = new Date(now.getTime() - 60 * 60 * 1000)
+      const leads = await db.collection('leads').find({ created_at: { $gte: hourAgo } }).limit(3).toArray()
+      for (const lead of leads) {
+        const payload = {
+          id: `lead_${lead.id || lead._id}`,
+          type: 'new_lead',
+          message: `New lead: ${lead.name || lead.full_name || 'Prospect'}`,
+          quickAction: { type: 'open_lead', id: lead.id || lead._id }
+        }
+        sendToClients('nudge', payload)
+        // Persist as a notification (dedupe per hour)
+        try {
+          const coll = db.collection('notifications')
+          const nid = `nudge:${payload.id}:${now.toISOString().slice(0, 13)}`
+          const exists = await coll.findOne({ id: nid })
+          if (!exists) {
+            created++
+            await coll.insertOne({
+              id: nid,
+              type: 'nudge',
+              title: 'New lead',
+              message: payload.message,
+              meta: payload,
+              status: 'unread',
+              created_at: new Date(),
+              updated_at: new Date(),
+              snooze_until: null
+            })
+          }
+        } catch (_) {}
+      }
+
+      // Notify panels to refresh suggestions summary
+      sendToClients('suggestions:update', { ts: Date.now() })
+      if (created > 0) invalidate(['notifications'])
+    } catch (e) {
+      console.warn('Nudge scan error', e)
+    }
+  }
+
+  // First scan after the startup delay, then every 30 min
+  const timedNudgeScan = () => timeScheduler('nudge_scan', runNudgeScan)
+  globalThis.__crmNudgeScheduler = setTimeout(() => {
+    timedNudgeScan()
+    globalThis.__crmNudgeScheduler = setInterval(timedNudgeScan, NUDGE_INTERVAL_MS)
+  }, NUDGE_INITIAL_DELAY_MS)
+}
+
+// --- Snooze Wake-up Queue (auto-unsnooze reminders) ---
+// Deadlines live in a min-heap and a single timer is armed for the earliest one, so
+// reminders fire on time without scanning the collection every minute. Entries are
+// invalidated lazily: `deadlines` holds the current deadline per notification and any
+// heap entry that disagrees with it is skipped when popped.
+const MAX_TIMER_DELAY = 2 ** 31 - 1
+// A failed wake-up is retried this long after it failed rather than dropped until the next seed
+const SNOOZE_RETRY_MS = 5 * 1000
+const SNOOZE_RECONCILE_MS = Number(process.env.SNOOZE_RECONCILE_MS) || 10 * 60 * 1000
+
+class SnoozeQueue {
+  constructor() {
+    this.heap = []
+    this.deadlines = new Map()
+    this.timer = null
+    this.timerAt = null
+    this.firing = false
+  }
+
+  push(entry) {
+    const heap = this.heap
+    heap.push(entry)
+    let i = heap.length - 1
+    while (i > 0) {
+      const parent = (i - 1) >> 1
+      if (heap[parent].at <= heap[i].at) break
+      ;[heap[parent], heap[i]] = [heap[i], heap[parent]]
+      i = parent
+    }
+  }
+
+  pop() {
+    const heap = this.heap
+    const top = heap[0]
+    const last = heap.pop()
+    if (heap.length > 0) {
+      heap[0] = last
+      let i = 0
+      for (;;) {
+        const l = 2 * i + 1
+        const r = l + 1
+        let min = i
+        if (l < heap.length && heap[l].at < heap[min].at) min = l
+        if (r < heap.length && heap[r].at < heap[min].at) min = r
+        if (min === i) break
+        ;[heap[min], heap[i]] = [heap[i], heap[min]]
+        i = min
+      }
+    }
+    return top
+  }
+
+  // Drop stale entries sitting on top of the heap
+  peek() {
+    while (this.heap.length > 0) {
+      const top = this.heap[0]
+      if (this.deadlines.get(top.id) === top.at) return top
+      this.pop()
+    }
+    return null
+  }
+
+  schedule(id, until) {
+    const at = new Date(until).getTime()
+    if (!id || !Number.isFinite(at)) return
+    if (this.deadlines.get(id) === at) return
+    this.deadlines.set(id, at)
+    this.push({ id, at })
+    this.arm()
+  }
+
+  cancel(id) {
+    this.deadlines.delete(id)
+  }
+
+  arm() {
+    const next = this.peek()
+    if (!next) {
+      if (this.timer) clearTimeout(this.timer)
+      this.timer = null
+      this.timerAt = null
+      return
+    }
+    if (this.timer && this.timerAt === next.at) return
+    if (this.timer) clearTimeout(this.timer)
+    const delay = Math.min(Math.max(0, next.at - Date.now()), MAX_TIMER_DELAY)
+    this.timerAt = next.at
+    this.timer = setTimeout(() => {
+      this.timer = null
+      this.timerAt = null
+      this.fire()
+    }, delay)
+    if (typeof this.timer.unref === 'function') this.timer.unref()
+  }
+
+  async fire() {
+    if (this.firing) return
+    this.firing = true
+    const ids = []
+    try {
+      const now = Date.now()
+      for (let next = this.peek(); next && next.at <= now; next = this.peek()) {
+        this.pop()
+        this.deadlines.delete(next.id)
+        ids.push(next.id)
+      }
+      if (ids.length > 0) await timeScheduler('snooze_wake', () => wakeSnoozedNotifications(ids))
+    } catch (e) {
+      console.warn('Snooze wake-up error', e)
+      // Put the popped reminders back (unless re-snoozed meanwhile); waking re-checks the
+      // stored deadline, so retrying ones that did get through is harmless
+      const retryAt = Date.now() + SNOOZE_RETRY_MS
+      for (const id of ids) {
+        if (this.deadlines.has(id)) continue
+        this.deadlines.set(id, retryAt)
+        this.push({ id, at: retryAt })
+      }
+    } finally {
+      this.firing = false
+      this.arm()
+    }
+  }
+
+  // Rebuild from the database: picks up snoozes written by other instances and
+  // anything that came due while this process was down.
+  async seed() {
+    const db = await connectToMongo()
+    const coll = db.collection('notifications')
+    const docs = await coll.find(
+      { status: 'snoozed', snooze_until: { $ne: null } },
+      { projection: { _id: 0, id: 1, snooze_until: 1 } }
+    ).sort({ snooze_until: 1 }).toArray()
+    for (const n of docs) this.schedule(n.id, n.snooze_until)
+    return docs.length
+  }
+}
+
+async function wakeSnoozedNotifications(ids) {
+  const db = await connectToMongo()
+  const coll = db.collection('notifications')
+  const now = new Date()
+  // Re-check against the stored deadline so a re-snooze that raced the timer wins
+  const filter = { id: { $in: ids }, status: 'snoozed', snooze_until: { $lte: now } }
+  const due = await coll.find(filter).toArray()
+  if (due.length === 0) return
+  const update = { $set: { status: 'unread', snooze_until: null, updated_at: now } }
+  if (typeof coll.updateMany === 'function') {
+    await coll.updateMany({ ...filter, id: { $in: due.map(n => n.id) } }, update)
+  } else {
+    for (const n of due) { try { await coll.updateOne({ id: n.id }, update) } catch {} }
+  }
+
+  invalidate(['notifications'])
+  for (const n of due) {
+    // Inform clients to refresh counters/lists
+    sendToClients('notifications:changed', { action: 'unsnoozed', id: n.id })
+    // Proactively remind the user with a payload (toast/browser notification on client)
+    sendToClients('notifications:remind', { id: n.id, type: n.type, title: n.title || 'Reminder', message: n.message, meta: n.meta || {} })
+  }
+}
+
+function startSnoozeQueue() {
+  if (globalThis.__crmSnoozeQueue) return
+
+  const queue = new SnoozeQueue()
+  globalThis.__crmSnoozeQueue = queue
+
+  const reconcile = async () => {
+    try {
+      await timeScheduler('snooze_reconcile', () => queue.seed())
+    } catch (e) {
+      console.warn('Snooze queue seed error', e)
+    }
+  }
+
+  ;(async () => {
+    try {
+      const coll = (await connectToMongo()).collection('notifications')
+      if (typeof coll.createIndex === 'function') {
+        await coll.createIndex({ status: 1, snooze_until: 1 })
+      }
+    } catch (e) {
+      console.warn('Snooze index error', e)
+    }
+    await reconcile()
+  })()
+  globalThis.__crmSnoozeReconciler = setInterval(reconcile, SNOOZE_RECONCILE_MS)
+}
+
+// Background jobs run once per process. Called from instrumentation.js after the
+// MongoDB warm-up has been kicked off, and again (as a no-op) by the API route in
+// case the instrumentation hook is disabled.
+export function startSchedulers() {
+  if (globalThis.__crmSchedulersStarted) return
+  globalThis.__crmSchedulersStarted = true
+  markPhase('schedulers_start')
+  startNudgeScheduler()
+  startSnoozeQueue()
+  startEnrichmentQueue()
+  startTranscriptionQueue()
+  startAlertScheduler()
+  startRetentionScheduler()
+}
@@ -0,0 +1,61 @@
+import { performance } from 'perf_hooks'
+
+// Startup-phase timings, measured from process start (performance.timeOrigin).
+// Kept on globalThis so instrumentation.js and the API route bundle share one report.
+function getReport() {
+  if (!globalThis.__crmStartup) {
+    globalThis.__crmStartup = {
+      process_started_at: new Date(performance.timeOrigin).toISOString(),
+      phases: {},
+      first_request: null
+    }
+  }
+  return globalThis.__crmStartup
+}
+
+// Record a named phase. Only the first run of a phase is kept: later runs are warm
+// and would hide what a cold start actually paid for.
+export async function timePhase(name, fn) {
+  const report = getReport()
+  const startedAt = performance.now()
+  try {
+    return await fn()
+  } finally {
+    if (!report.phases[name]) {
+      report.phases[name] = {
+        started_ms: Math.round(startedAt),
+        duration_ms: Math.round(performance.now() - startedAt)
+      }
+    }
+  }
+}
+
+export function markPhase(name) {
+  const report = getReport()
+  if (!report.phases[name]) {
+    report.phases[name] = { started_ms: Math.round(performance.now()), duration_ms: 0 }
+  }
+}
+
+// Keeps the first successful (non-5xx) response only
+export function recordFirstRequest(route, status, startedAt) {
+  const report = getReport()
+  if (report.first_request || status >= 500) return
+  const finishedAt = performance.now()
+  report.first_request = {
+    route,
+    status,
+    started_ms: Math.round(startedAt),
+    duration_ms: Math.round(finishedAt - startedAt),
+    completed_ms: Math.round(finishedAt)
+  }
+  const phases = Object.entries(report.phases)
+    .map(([name, p]) => `${name}=${p.duration_ms}ms@${p.started_ms}`)
+    .join(' ')
+  console.log(`[startup] first response ${status} ${route} after ${report.first_request.completed_ms}ms (${phases})`)
+}
+
+export function getStartupReport() {
+  const report = getReport()
+  return { ...report, uptime_ms: Math.round(performance.now()) }
+}
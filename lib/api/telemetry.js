@@ -0,0 +1,57 @@
+import { counter, gauge, histogram, registerCollector } from '@/lib/api/metrics'
+
+// Application metrics served by GET /api/metrics (database metrics live in db-metrics.js)
+export const httpRequestDuration = histogram('crm_http_request_duration_seconds', 'API request latency by route pattern and status', ['method', 'route', 'status'])
+export const httpInFlight = gauge('crm_http_requests_in_flight', 'API requests currently being handled')
+
+const schedulerDuration = histogram('crm_scheduler_run_duration_seconds', 'Background scheduler run time', ['scheduler', 'outcome'])
+const upstreamDuration = histogram('crm_upstream_request_duration_seconds', 'Calls to external APIs', ['upstream', 'operation', 'outcome'])
+const upstreamErrors = counter('crm_upstream_errors_total', 'Failed calls to external APIs', ['upstream', 'operation', 'reason'])
+const assistantStageDuration = histogram('crm_assistant_stage_duration_seconds', 'Assistant match pipeline stage time', ['stage'])
+const cacheRequests = counter('crm_cache_requests_total', 'Cache lookups by result (hit ratio = hit / all)', ['cache', 'result'])
+
+const sseClients = gauge('crm_sse_clients', 'Connected /api/assistant/stream clients')
+const processMemory = gauge('crm_process_memory_bytes', 'Process memory usage', ['type'])
+
+registerCollector('sse', () => {
+  sseClients.set({}, globalThis.__crmSSE?.clients?.size || 0)
+})
+registerCollector('process', () => {
+  const mem = process.memoryUsage()
+  processMemory.set({ type: 'rss' }, mem.rss)
+  processMemory.set({ type: 'heap_used' }, mem.heapUsed)
+  processMemory.set({ type: 'external' }, mem.external)
+})
+
+// Record one call to an external API; outcome is 'ok' or a short failure reason
+export function observeUpstream(upstream, operation, seconds, outcome = 'ok') {
+  upstreamDuration.observe({ upstream, operation, outcome }, seconds)
+  if (outcome !== 'ok') upstreamErrors.inc({ upstream, operation, reason: outcome })
+}
+
+// fetch() that records latency and failures for an upstream; resolves/rejects like fetch
+export async function timedFetch(upstream, operation, url, init) {
+  const start = process.hrtime.bigint()
+  const elapsed = () => Number(process.hrtime.bigint() - start) / 1e9
+  try {
+    const response = await fetch(url, init)
+    observeUpstream(upstream, operation, elapsed(), response.ok ? 'ok' : `http_${response.status}`)
+    return response
+  } catch (error) {
+    const reason = error?.name === 'AbortError' || error?.name === 'TimeoutError' ? 'timeout' : 'network'
+    observeUpstream(upstream, operation, elapsed(), reason)
+    throw error
+  }
+}
+
+export function timeScheduler(scheduler, fn) {
+  return schedulerDuration.time((_, error) => ({ scheduler, outcome: error ? 'error' : 'ok' }), fn)
+}
+
+export function observeAssistantStage(stage, seconds) {
+  assistantStageDuration.observe({ stage }, seconds)
+}
+
+export function recordCacheLookup(cache, hit) {
+  cacheRequests.inc({ cache, result: hit ? 'hit' : 'miss' })
+}
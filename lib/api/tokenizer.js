@@ -0,0 +1,131 @@
+import { promises as fs } from 'fs'
+import os from 'os'
+import path from 'path'
+
+// Exact token counts for the o200k_base encoding (gpt-4o, gpt-4o-mini, o1-mini).
+// The BPE ranks file OpenAI publishes for tiktoken is downloaded on first use and cached on
+// disk; until it's loaded, callers fall back to the length heuristic. A failed load is retried
+// on a later call after a backoff (RETRY_BASE_MS doubling up to RETRY_MAX_MS).
+// OPENAI_TOKENIZER=heuristic skips loading entirely.
+const VOCAB_URL = process.env.OPENAI_TOKENIZER_VOCAB_URL || 'https://openaipublic.blob.core.windows.net/encodings/o200k_base.tiktoken'
+const CACHE_DIR = process.env.OPENAI_TOKENIZER_CACHE_DIR || path.join(os.tmpdir(), 'crm-tiktoken')
+const CACHE_FILE = path.join(CACHE_DIR, 'o200k_base.tiktoken')
+const MIN_RANKS = 199000 // sanity check on a downloaded/cached file
+const RETRY_BASE_MS = 30 * 1000
+const RETRY_MAX_MS = 30 * 60 * 1000
+
+// o200k_base pre-tokenizer, with tiktoken's inline (?i:...) contractions spelled out for JS
+const CONTRACTION = "(?:'[sS]|'[tT]|'[rR][eE]|'[vV][eE]|'[mM]|'[lL][lL]|'[dD])?"
+const PRETOKENIZE = new RegExp([
+  `[^\\r\\n\\p{L}\\p{N}]?[\\p{Lu}\\p{Lt}\\p{Lm}\\p{Lo}\\p{M}]*[\\p{Ll}\\p{Lm}\\p{Lo}\\p{M}]+${CONTRACTION}`,
+  `[^\\r\\n\\p{L}\\p{N}]?[\\p{Lu}\\p{Lt}\\p{Lm}\\p{Lo}\\p{M}]+[\\p{Ll}\\p{Lm}\\p{Lo}\\p{M}]*${CONTRACTION}`,
+  '\\p{N}{1,3}',
+  ' ?[^\\s\\p{L}\\p{N}]+[\\r\\n/]*',
+  '\\s*[\\r\\n]+',
+  '\\s+(?!\\S)',
+  '\\s+'
+].join('|'), 'gu')
+
+function state() {
+  return globalThis.__crmTokenizer || (globalThis.__crmTokenizer = { ranks: null, loading: null, failures: 0, retryAt: 0 })
+}
+
+// Ranks keyed by the token's bytes as a latin1 string, so byte slices are plain substrings
+export function parseRanks(text) {
+  const ranks = new Map()
+  for (const line of text.split('\n')) {
+    if (!line) continue
+    const space = line.indexOf(' ')
+    ranks.set(Buffer.from(line.slice(0, space), 'base64').toString('latin1'), Number(line.slice(space + 1)))
+  }
+  return ranks
+}
+
+async function readVocab() {
+  try {
+    return await fs.readFile(CACHE_FILE, 'utf8')
+  } catch {}
+  const res = await fetch(VOCAB_URL)
+  if (!res.ok) throw new Error(`Tokenizer vocab download failed: ${res.status}`)
+  const text = await res.text()
+  try {
+    await fs.mkdir(CACHE_DIR, { recursive: true })
+    const tmp = `${CACHE_FILE}.${process.pid}.tmp`
+    await fs.writeFile(tmp, text)
+    await fs.rename(tmp, CACHE_FILE)
+  } catch (e) {
+    console.warn('Tokenizer vocab cache write failed', e)
+  }
+  return text
+}
+
+// Start loading (once at a time); resolves true when exact counting is available
+export function loadTokenizer() {
+  const s = state()
+  if (s.ranks) return Promise.resolve(true)
+  if (process.env.OPENAI_TOKENIZER === 'heuristic') return Promise.resolve(false)
+  if (!s.loading) {
+    if (Date.now() < s.retryAt) return Promise.resolve(false)
+    s.loading = (async () => {
+      try {
+        const ranks = parseRanks(await readVocab())
+        if (ranks.size < MIN_RANKS) {
+          // Don't let a bad cached copy fail every retry
+          await fs.unlink(CACHE_FILE).catch(() => {})
+          throw new Error(`Tokenizer vocab looks truncated (${ranks.size} ranks)`)
+        }
+        s.ranks = ranks
+        s.failures = 0
+        return true
+      } catch (e) {
+        s.failures++
+        const delay = Math.min(RETRY_BASE_MS * 2 ** (s.failures - 1), RETRY_MAX_MS)
+        s.retryAt = Date.now() + delay
+        console.warn(`Tokenizer unavailable, using length heuristic (retrying in ${Math.round(delay / 1000)}s):`, e.message)
+        return false
+      } finally {
+        s.loading = null
+      }
+    })()
+  }
+  return s.loading
+}
+
+export function tokenizerReady() {
+  return Boolean(state().ranks)
+}
+
+// Number of tokens byte-pair merging produces for one pre-tokenized piece (latin1 bytes)
+export function bytePairCount(piece, ranks) {
+  if (ranks.has(piece)) return 1
+  const parts = Array.from(piece)
+  while (parts.length > 1) {
+    let minRank = Infinity
+    let minIdx = -1
+    for (let i = 0; i < parts.length - 1; i++) {
+      const rank = ranks.get(parts[i] + parts[i + 1])
+      if (rank !== undefined && rank < minRank) {
+        minRank = rank
+        minIdx = i
+      }
+    }
+    if (minIdx === -1) break
+    parts.splice(minIdx, 2, parts[minIdx] + parts[minIdx + 1])
+  }
+  return parts.length
+}
+
+export function countWithRanks(text, ranks) {
+  let count = 0
+  for (const [piece] of text.matchAll(PRETOKENIZE)) {
+    count += bytePairCount(Buffer.from(piece, 'utf8').toString('latin1'), ranks)
+  }
+  return count
+}
+
+// Exact count, or null while the vocab isn't loaded
+export function countTokens(text) {
+  const { ranks } = state()
+  if (!ranks) return null
+  return countWithRanks(String(text), ranks)
+}
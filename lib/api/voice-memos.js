@@ -0,0 +1,206 @@
+import { promises as fs, openAsBlob } from 'fs'
+import os from 'os'
+import path from 'path'
+import { v4 as uuidv4 } from 'uuid'
+import { connectToMongo } from '@/lib/api/db'
+import { notifyChange } from '@/lib/api/invalidation'
+import { bumpChecklistVersion } from '@/lib/api/rollups'
+import { getOpenAIUtility } from '@/lib/api/openai'
+import { timedFetch, timeScheduler } from '@/lib/api/telemetry'
+
+// Checklist voice memos. Uploads are streamed to VOICE_MEMO_DIR and the memo is stored at
+// once with transcription 'pending'; Whisper runs on a worker pool fed by
+// voice_transcription_jobs (claimed with leases, like lead enrichment), and each finished
+// memo is announced over SSE as tasks:changed.
+export const VOICE_MEMO_DIR = process.env.VOICE_MEMO_DIR || path.join(os.tmpdir(), 'crm-voice-memos')
+// Whisper rejects files over 25 MB
+export const VOICE_MEMO_MAX_BYTES = Math.max(1, Number(process.env.VOICE_MEMO_MAX_BYTES) || 25 * 1024 * 1024)
+const CONCURRENCY = Math.max(1, Number(process.env.VOICE_TRANSCRIPTION_CONCURRENCY) || 2)
+const LEASE_MS = 5 * 60 * 1000
+const MAX_ATTEMPTS = 3
+const RETRY_DELAY_MS = 30 * 1000
+const RECONCILE_MS = 60 * 1000
+
+const JOBS = 'voice_transcription_jobs'
+
+const EXTENSIONS = { 'audio/webm': 'webm', 'audio/ogg': 'ogg', 'audio/mp4': 'm4a', 'audio/mpeg': 'mp3', 'audio/wav': 'wav', 'audio/x-wav': 'wav' }
+
+function state() {
+  return globalThis.__crmVoiceMemos || (globalThis.__crmVoiceMemos = { active: 0, rerun: false, indexed: false, dir: null, reconciler: null })
+}
+
+const pushSSE = (payload) => notifyChange('tasks:changed', payload, ['tasks'], { transactionId: payload.transaction_id })
+
+async function ensureIndexes(db) {
+  const s = state()
+  if (s.indexed) return
+  s.indexed = true
+  try {
+    const coll = db.collection(JOBS)
+    if (typeof coll.createIndex === 'function') {
+      await coll.createIndex({ status: 1, available_at: 1 })
+      await coll.createIndex({ memo_id: 1 })
+    }
+  } catch (e) {
+    console.warn('Voice transcription index error', e)
+  }
+}
+
+// Where a new memo's audio goes; the directory is created on first use
+export async function voiceMemoPath(itemId, memoId, mime) {
+  const s = state()
+  if (!s.dir) s.dir = fs.mkdir(VOICE_MEMO_DIR, { recursive: true })
+  await s.dir
+  const ext = EXTENSIONS[String(mime || '').split(';')[0]] || 'webm'
+  const fileName = `${itemId}-${memoId}.${ext}`
+  return { fileName, filePath: path.join(VOICE_MEMO_DIR, fileName) }
+}
+
+export async function removeVoiceMemoFiles(memos) {
+  await Promise.all((memos || [])
+    .filter(m => m?.audio_file)
+    .map(m => fs.unlink(path.join(VOICE_MEMO_DIR, path.basename(m.audio_file))).catch(() => {})))
+}
+
+// Queue a stored memo for transcription and wake the workers
+export async function enqueueTranscription(db, itemId, memoId) {
+  await ensureIndexes(db)
+  const now = new Date()
+  await db.collection(JOBS).insertOne({
+    id: uuidv4(),
+    item_id: itemId,
+    memo_id: memoId,
+    status: 'queued',
+    attempts: 0,
+    available_at: now,
+    created_at: now,
+    updated_at: now
+  })
+  kickTranscriptionWorkers()
+}
+
+export async function cancelTranscriptions(db, memoIds) {
+  const ids = (memoIds || []).filter(Boolean)
+  if (ids.length > 0) await db.collection(JOBS).deleteMany({ memo_id: { $in: ids } })
+}
+
+async function claimJob(db) {
+  const now = new Date()
+  return db.collection(JOBS).findOneAndUpdate(
+    {
+      $or: [
+        { status: 'queued', available_at: { $lte: now } },
+        { status: 'running', locked_until: { $lt: now } }
+      ]
+    },
+    { $set: { status: 'running', locked_until: new Date(now.getTime() + LEASE_MS), updated_at: now }, $inc: { attempts: 1 } },
+    { sort: { available_at: 1 }, returnDocument: 'after' }
+  )
+}
+
+async function transcribe(memo) {
+  if (!process.env.OPENAI_API_KEY) throw new Error('OPENAI_API_KEY not configured for transcription')
+  const filePath = path.join(VOICE_MEMO_DIR, path.basename(memo.audio_file))
+  const type = memo.mime || 'audio/webm'
+  // A file-backed Blob is read from disk while the request body is sent
+  const blob = typeof openAsBlob === 'function'
+    ? await openAsBlob(filePath, { type })
+    : new Blob([await fs.readFile(filePath)], { type })
+  const fd = new FormData()
+  fd.append('model', 'whisper-1')
+  fd.append('file', blob, path.basename(memo.audio_file))
+
+  const res = await timedFetch('openai', 'transcription', `${getOpenAIUtility().baseURL}/audio/transcriptions`, {
+    method: 'POST',
+    headers: { Authorization: `Bearer ${process.env.OPENAI_API_KEY}` },
+    body: fd
+  })
+  if (!res.ok) {
+    const errTxt = await res.text().catch(() => '')
+    throw new Error(`Transcription failed: ${res.status} ${errTxt}`)
+  }
+  const json = await res.json()
+  return (json.text || '').toString()
+}
+
+async function setMemo(db, job, item, fields) {
+  await db.collection('checklist_items').updateOne(
+    { id: job.item_id },
+    { $set: Object.fromEntries(Object.entries(fields).map(([k, v]) => [`voice_memos.$[memo].${k}`, v])) },
+    { arrayFilters: [{ 'memo.id': job.memo_id }] }
+  )
+  await bumpChecklistVersion(db, item.transaction_id)
+}
+
+async function processJob(db, job) {
+  const item = await db.collection('checklist_items').findOne({ id: job.item_id }, { projection: { id: 1, transaction_id: 1, voice_memos: 1 } })
+  const memo = (item?.voice_memos || []).find(m => m.id === job.memo_id)
+  if (!memo) {
+    // Memo (or its checklist item) was deleted while queued
+    await db.collection(JOBS).deleteOne({ id: job.id })
+    return
+  }
+
+  try {
+    const text = await transcribe(memo)
+    await setMemo(db, job, item, { text, transcription: 'completed', transcribed_at: new Date() })
+    await db.collection(JOBS).deleteOne({ id: job.id })
+    pushSSE({ action: 'voice_memo_transcribed', id: job.item_id, transaction_id: item.transaction_id, memo_id: job.memo_id, transcription: 'completed' })
+  } catch (e) {
+    console.warn('Voice memo transcription failed', job.memo_id, e)
+    const now = new Date()
+    if ((job.attempts || 0) < MAX_ATTEMPTS) {
+      await db.collection(JOBS).updateOne(
+        { id: job.id },
+        { $set: { status: 'queued', available_at: new Date(now.getTime() + RETRY_DELAY_MS * job.attempts), last_error: String(e?.message || e), updated_at: now } }
+      )
+      return
+    }
+    await db.collection(JOBS).updateOne({ id: job.id }, { $set: { status: 'failed', last_error: String(e?.message || e), updated_at: now } })
+    await setMemo(db, job, item, { transcription: 'failed', transcription_error: String(e?.message || e) })
+    pushSSE({ action: 'voice_memo_transcribed', id: job.item_id, transaction_id: item.transaction_id, memo_id: job.memo_id, transcription: 'failed' })
+  }
+}
+
+async function runWorker() {
+  const s = state()
+  try {
+    const db = await connectToMongo()
+    await ensureIndexes(db)
+    for (;;) {
+      const job = await claimJob(db)
+      if (!job) break
+      await timeScheduler('voice_transcription', () => processJob(db, job))
+    }
+  } catch (e) {
+    console.warn('Voice transcription worker error', e)
+  } finally {
+    s.active--
+    if (s.rerun && s.active === 0) {
+      s.rerun = false
+      kickTranscriptionWorkers()
+    }
+  }
+}
+
+// Start workers up to the concurrency limit; idle workers exit when the queue is empty
+export function kickTranscriptionWorkers() {
+  const s = state()
+  if (s.active >= CONCURRENCY) {
+    s.rerun = true
+    return
+  }
+  while (s.active < CONCURRENCY) {
+    s.active++
+    runWorker()
+  }
+}
+
+// Periodic sweep for retries, expired leases and jobs queued by other instances
+export function startTranscriptionQueue() {
+  const s = state()
+  if (s.reconciler) return
+  kickTranscriptionWorkers()
+  s.reconciler = setInterval(kickTranscriptionWorkers, RECONCILE_MS)
+  if (typeof s.reconciler.unref === 'function') s.reconciler.unref()
+}
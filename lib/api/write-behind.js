@@ -0,0 +1,166 @@
+import { connectToMongo } from '@/lib/api/db'
+import { counter, gauge, histogram, registerCollector } from '@/lib/api/metrics'
+
+// Write-behind log for append-only analytics/audit documents (assistant_conversations,
+// property_searches) that used to be inserted inside the request. logWrite() only appends to
+// an in-memory buffer per collection; a buffer is written with one unordered insertMany when it
+// reaches BATCH_SIZE documents or FLUSH_MS after its first document, whichever comes first.
+// A batch that fails goes back to the front of its buffer and is retried after an exponential
+// backoff (FLUSH_MS doubling up to MAX_BACKOFF_MS); duplicate-key rejections are not retried.
+// Memory is bounded: past MAX_BUFFER pending documents the oldest are dropped (and counted).
+// Buffers are flushed on SIGTERM/SIGINT and when the event loop drains.
+const ENABLED = process.env.WRITE_BEHIND !== '0'
+const BATCH_SIZE = Math.max(1, Number(process.env.WRITE_BEHIND_BATCH_SIZE) || 100)
+const FLUSH_MS = Math.max(10, Number(process.env.WRITE_BEHIND_FLUSH_MS) || 1000)
+const MAX_BUFFER = Math.max(BATCH_SIZE, Number(process.env.WRITE_BEHIND_MAX_BUFFER) || 10000)
+const MAX_BACKOFF_MS = 60000
+
+const flushDuration = histogram('crm_write_behind_flush_duration_seconds', 'Write-behind insertMany time', ['collection', 'outcome'])
+const writtenDocs = counter('crm_write_behind_documents_total', 'Write-behind documents by result (written, retried, dropped, failed)', ['collection', 'result'])
+const bufferedDocs = gauge('crm_write_behind_buffered', 'Write-behind documents waiting to be flushed', ['collection'])
+
+function state() {
+  return globalThis.__crmWriteBehind || (globalThis.__crmWriteBehind = { buffers: new Map(), hooked: false })
+}
+
+registerCollector('write_behind', () => {
+  for (const [collection, buffer] of state().buffers) bufferedDocs.set({ collection }, buffer.docs.length + buffer.inFlight)
+})
+
+function bufferFor(collection) {
+  const s = state()
+  let buffer = s.buffers.get(collection)
+  if (!buffer) {
+    buffer = { docs: [], inFlight: 0, timer: null, flushing: null, failures: 0 }
+    s.buffers.set(collection, buffer)
+  }
+  return buffer
+}
+
+// Queue `doc` for `collection`. With WRITE_BEHIND=0 the insert happens inline (and its errors
+// reach the caller) as before.
+export async function logWrite(collection, doc) {
+  if (!ENABLED) {
+    const db = await connectToMongo()
+    await db.collection(collection).insertOne(doc)
+    return
+  }
+  hookShutdown()
+  const buffer = bufferFor(collection)
+  buffer.docs.push(doc)
+  trimBuffer(collection, buffer)
+  // While a failed batch is backing off, a full buffer waits for the retry timer
+  if (buffer.docs.length >= BATCH_SIZE && buffer.failures === 0) {
+    flushCollection(collection)
+  } else {
+    armTimer(collection, buffer, FLUSH_MS)
+  }
+}
+
+function trimBuffer(collection, buffer) {
+  if (buffer.docs.length + buffer.inFlight <= MAX_BUFFER) return
+  const dropped = Math.min(buffer.docs.length + buffer.inFlight - MAX_BUFFER, buffer.docs.length)
+  buffer.docs.splice(0, dropped)
+  writtenDocs.inc({ collection, result: 'dropped' }, dropped)
+  console.warn(`Write-behind buffer for ${collection} is full, dropped ${dropped} document(s)`)
+}
+
+function armTimer(collection, buffer, delay) {
+  if (buffer.timer) return
+  buffer.timer = setTimeout(() => {
+    buffer.timer = null
+    flushCollection(collection)
+  }, delay)
+  if (typeof buffer.timer.unref === 'function') buffer.timer.unref()
+}
+
+// Documents of a failed unordered insertMany worth another attempt: the ones the driver reports
+// as rejected (minus duplicate keys, which would fail forever), or the whole batch when the
+// error carries no per-document detail and nothing was inserted.
+function retryable(batch, e, inserted) {
+  if (Array.isArray(e?.writeErrors)) {
+    return e.writeErrors.filter(w => w.code !== 11000).map(w => batch[w.index]).filter(Boolean)
+  }
+  return inserted > 0 ? [] : batch
+}
+
+// Write everything pending for `collection`, one batch at a time. Resolves when the buffer is
+// empty or an attempt failed (the batch is then re-queued and retried on a backoff timer);
+// never rejects.
+export function flushCollection(collection) {
+  const buffer = bufferFor(collection)
+  if (buffer.timer) {
+    clearTimeout(buffer.timer)
+    buffer.timer = null
+  }
+  if (!buffer.flushing) {
+    buffer.flushing = (async () => {
+      while (buffer.docs.length > 0) {
+        const batch = buffer.docs.splice(0, BATCH_SIZE)
+        buffer.inFlight = batch.length
+        const start = process.hrtime.bigint()
+        let outcome = 'ok'
+        try {
+          const db = await connectToMongo()
+          await db.collection(collection).insertMany(batch, { ordered: false })
+          writtenDocs.inc({ collection, result: 'written' }, batch.length)
+          buffer.failures = 0
+        } catch (e) {
+          // Unordered: documents that made it in are reported by the driver, the rest go back to
+          // the front of the buffer (oldest first, so they are the first dropped when it is full)
+          outcome = 'error'
+          const inserted = Number(e?.result?.insertedCount ?? e?.insertedCount) || 0
+          const retry = retryable(batch, e, inserted)
+          if (inserted > 0) writtenDocs.inc({ collection, result: 'written' }, inserted)
+          if (batch.length - inserted - retry.length > 0) {
+            writtenDocs.inc({ collection, result: 'failed' }, batch.length - inserted - retry.length)
+          }
+          if (retry.length > 0) writtenDocs.inc({ collection, result: 'retried' }, retry.length)
+          buffer.inFlight = 0
+          buffer.docs.unshift(...retry)
+          trimBuffer(collection, buffer)
+          buffer.failures++
+          console.warn(`Write-behind flush error for ${collection}`, e)
+        } finally {
+          buffer.inFlight = 0
+          flushDuration.observe({ collection, outcome }, Number(process.hrtime.bigint() - start) / 1e9)
+        }
+        if (outcome !== 'ok') break
+      }
+    })().finally(() => {
+      buffer.flushing = null
+      if (buffer.failures > 0 && buffer.docs.length > 0) {
+        clearTimeout(buffer.timer)
+        buffer.timer = null
+        armTimer(collection, buffer, Math.min(FLUSH_MS * 2 ** buffer.failures, MAX_BACKOFF_MS))
+      }
+    })
+  }
+  return buffer.flushing
+}
+
+export function flushAll() {
+  return Promise.all([...state().buffers.keys()].map(flushCollection))
+}
+
+// Registered on first use. Next.js exits on SIGTERM/SIGINT itself unless NEXT_MANUAL_SIG_HANDLE
+// is set; with it set, this handler flushes and then exits.
+function hookShutdown() {
+  const s = state()
+  if (s.hooked) return
+  s.hooked = true
+  for (const signal of ['SIGTERM', 'SIGINT']) {
+    process.once(signal, () => {
+      flushAll().finally(() => {
+        if (process.listenerCount(signal) === 0) process.exit(0)
+      })
+    })
+  }
+  process.on('beforeExit', () => {
+    // Buffers backing off after a failure are left alone, or a down database would keep the
+    // process alive retrying
+    for (const [collection, buffer] of s.buffers) {
+      if (buffer.docs.length > 0 && buffer.failures === 0) flushCollection(collection)
+    }
+  })
+}
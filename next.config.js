@@ -6,6 +6,8 @@ const nextConfig = {
   experimental: {
     // Remove if not using Server Components
     serverComponentsExternalPackages: ['mongodb'],
+    // Enables instrumentation.js (connection warm-up and scheduler start at boot)
+    instrumentationHook: true,
   },
   webpack(config, { dev }) {
     // Use Next.js defaults for file watching in dev to avoid HMR/asset 404 issues
@@ -124,7 +124,12 @@ async function seedDatabase() {
 
     // Insert sample leads
     console.log('Inserting sample leads...');
-    await db.collection('leads').insertMany(sampleLeads);
+    // Same normalization as lib/api/leads.js, used for duplicate detection
+    await db.collection('leads').insertMany(sampleLeads.map(lead => ({
+      ...lead,
+      email_normalized: lead.email.trim().toLowerCase(),
+      phone_normalized: lead.phone.replace(/\D/g, '').replace(/^1(\d{10})$/, '$1')
+    })));
     console.log(`Inserted ${sampleLeads.length} sample leads`);
 
     console.log('Database seeded successfully!');